@@ -0,0 +1,170 @@
+"""Peewee migrations -- 009_add_insight_counts.py."""
+
+import peewee as pw
+import playhouse.postgres_ext as pw_pext
+from peewee_migrate import Migrator
+
+PENDING_INSIGHT_COUNT_FIELDS = (
+    "server_type",
+    "type",
+    "value_tag",
+    "countries",
+    "campaign",
+    "predictor",
+    "reserved_barcode",
+    "automatic_processing",
+)
+
+RECORD_INSIGHT_COUNT_DELTAS_FUNCTION = """
+CREATE OR REPLACE FUNCTION record_insight_count_deltas() RETURNS trigger
+LANGUAGE plpgsql AS $function$
+DECLARE
+    changes text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := 'SELECT *, 1 AS delta FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := 'SELECT *, -1 AS delta FROM old_rows';
+    ELSE
+        changes := 'SELECT *, 1 AS delta FROM new_rows '
+            'UNION ALL SELECT *, -1 AS delta FROM old_rows';
+    END IF;
+
+    EXECUTE 'INSERT INTO pending_insight_count_delta '
+        '(server_type, type, value_tag, countries, campaign, predictor, '
+        'reserved_barcode, automatic_processing, delta) '
+        'SELECT coalesce(server_type, ''''), type, coalesce(value_tag, ''''), '
+        'coalesce(countries, ''[]''), coalesce(campaign, ''[]''), '
+        'coalesce(predictor, ''''), reserved_barcode, automatic_processing, '
+        'sum(delta) '
+        'FROM (' || changes || ') AS changes '
+        'WHERE annotation IS NULL '
+        'GROUP BY 1, 2, 3, 4, 5, 6, 7, 8 HAVING sum(delta) <> 0';
+
+    EXECUTE 'INSERT INTO user_annotation_count_delta (username, delta) '
+        'SELECT username, sum(delta) '
+        'FROM (' || changes || ') AS changes '
+        'WHERE username IS NOT NULL '
+        'GROUP BY 1 HAVING sum(delta) <> 0';
+
+    RETURN NULL;
+END;
+$function$
+"""
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Add the `pending_insight_count` and `user_annotation_count` tables and
+    the triggers that record their changes, and a partial index to fetch
+    pending questions by popularity."""
+
+    @migrator.create_model
+    class PendingInsightCount(pw.Model):
+        id = pw.AutoField()
+        server_type = pw.CharField(max_length=10)
+        type = pw.CharField(max_length=256)
+        value_tag = pw.TextField()
+        countries = pw_pext.BinaryJSONField()
+        campaign = pw_pext.BinaryJSONField()
+        predictor = pw.CharField(max_length=100)
+        reserved_barcode = pw.BooleanField()
+        automatic_processing = pw.BooleanField()
+        count = pw.IntegerField()
+
+        class Meta:
+            table_name = "pending_insight_count"
+            indexes = ((PENDING_INSIGHT_COUNT_FIELDS, True),)
+
+    @migrator.create_model
+    class PendingInsightCountDelta(pw.Model):
+        id = pw.BigAutoField()
+        server_type = pw.CharField(max_length=10)
+        type = pw.CharField(max_length=256)
+        value_tag = pw.TextField()
+        countries = pw_pext.BinaryJSONField()
+        campaign = pw_pext.BinaryJSONField()
+        predictor = pw.CharField(max_length=100)
+        reserved_barcode = pw.BooleanField()
+        automatic_processing = pw.BooleanField()
+        delta = pw.IntegerField()
+
+        class Meta:
+            table_name = "pending_insight_count_delta"
+
+    @migrator.create_model
+    class UserAnnotationCount(pw.Model):
+        username = pw.TextField(primary_key=True)
+        count = pw.IntegerField()
+
+        class Meta:
+            table_name = "user_annotation_count"
+
+    @migrator.create_model
+    class UserAnnotationCountDelta(pw.Model):
+        id = pw.BigAutoField()
+        username = pw.TextField(index=True)
+        delta = pw.IntegerField()
+
+        class Meta:
+            table_name = "user_annotation_count_delta"
+
+    migrator.sql(RECORD_INSIGHT_COUNT_DELTAS_FUNCTION)
+    # Transition tables can't be shared by triggers on several events
+    migrator.sql(
+        "CREATE OR REPLACE TRIGGER product_insight_insert_counts "
+        "AFTER INSERT ON product_insight REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION record_insight_count_deltas()"
+    )
+    migrator.sql(
+        "CREATE OR REPLACE TRIGGER product_insight_update_counts "
+        "AFTER UPDATE ON product_insight "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION record_insight_count_deltas()"
+    )
+    migrator.sql(
+        "CREATE OR REPLACE TRIGGER product_insight_delete_counts "
+        "AFTER DELETE ON product_insight REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION record_insight_count_deltas()"
+    )
+
+    # Initial counts: creating the triggers blocks writes on product_insight
+    # until the migration commits, so no change is counted twice or lost
+    migrator.sql(
+        "INSERT INTO pending_insight_count "
+        "(server_type, type, value_tag, countries, campaign, predictor, "
+        "reserved_barcode, automatic_processing, count) "
+        "SELECT coalesce(server_type, ''), type, coalesce(value_tag, ''), "
+        "coalesce(countries, '[]'), coalesce(campaign, '[]'), "
+        "coalesce(predictor, ''), reserved_barcode, automatic_processing, "
+        "count(*) FROM product_insight "
+        "WHERE annotation IS NULL GROUP BY 1, 2, 3, 4, 5, 6, 7, 8"
+    )
+    migrator.sql(
+        "INSERT INTO user_annotation_count (username, count) "
+        "SELECT username, count(*) FROM product_insight "
+        "WHERE username IS NOT NULL GROUP BY 1"
+    )
+
+    migrator.sql(
+        "CREATE INDEX IF NOT EXISTS product_insight_pending_popularity "
+        "ON product_insight (server_type, unique_scans_n DESC) "
+        "WHERE annotation IS NULL AND automatic_processing = false"
+    )
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    migrator.sql("DROP INDEX IF EXISTS product_insight_pending_popularity")
+    migrator.sql(
+        "DROP TRIGGER IF EXISTS product_insight_insert_counts ON product_insight"
+    )
+    migrator.sql(
+        "DROP TRIGGER IF EXISTS product_insight_update_counts ON product_insight"
+    )
+    migrator.sql(
+        "DROP TRIGGER IF EXISTS product_insight_delete_counts ON product_insight"
+    )
+    migrator.sql("DROP FUNCTION IF EXISTS record_insight_count_deltas()")
+    migrator.remove_model("user_annotation_count_delta")
+    migrator.remove_model("user_annotation_count")
+    migrator.remove_model("pending_insight_count_delta")
+    migrator.remove_model("pending_insight_count")
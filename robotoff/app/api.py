@@ -27,7 +27,7 @@ from PIL import Image
 from sentry_sdk.integrations.falcon import FalconIntegration
 
 from robotoff import settings
-from robotoff.app import schema
+from robotoff.app import events, schema
 from robotoff.app.auth import BasicAuthDecodeError, basic_decode, validate_token
 from robotoff.app.core import (
     SkipVotedOn,
@@ -37,12 +37,18 @@ from robotoff.app.core import (
     get_images,
     get_insights,
     get_logo_annotation,
+    get_pending_insight_counts,
     get_predictions,
+    get_user_annotation_count,
     save_annotation,
     update_logo_annotations,
     validate_params,
 )
-from robotoff.app.middleware import CacheClearMiddleware, DBConnectionMiddleware
+from robotoff.app.middleware import (
+    CacheClearMiddleware,
+    DBConnectionMiddleware,
+    TracingMiddleware,
+)
 from robotoff.batch import import_batch_predictions
 from robotoff.elasticsearch import get_es_client
 from robotoff.insights.extraction import (
@@ -50,6 +56,7 @@ from robotoff.insights.extraction import (
     extract_ocr_predictions,
 )
 from robotoff.insights.question import QuestionFormatter, QuestionFormatterFactory
+from robotoff.logo_annotations import update_logo_annotation_index
 from robotoff.logos import (
     generate_insights_from_annotated_logos,
     generate_insights_from_annotated_logos_job,
@@ -69,7 +76,6 @@ from robotoff.off import OFFAuthentication, generate_image_path
 from robotoff.prediction import image_classifier, ingredient_list, nutrition_extraction
 from robotoff.prediction.category import predict_category
 from robotoff.prediction.langid import predict_lang
-from robotoff.prediction.object_detection import ObjectDetectionModelRegistry
 from robotoff.products import get_product, get_product_dataset_etag
 from robotoff.taxonomy import is_prefixed_value, match_taxonomized_value
 from robotoff.types import (
@@ -83,10 +89,11 @@ from robotoff.types import (
     ProductIdentifier,
     ServerType,
 )
-from robotoff.utils import get_image_from_url, get_logger, http_session
+from robotoff.utils import get_image_from_url, get_logger, http_session, startup
 from robotoff.utils.i18n import TranslationStore
 from robotoff.utils.text import get_tag
 from robotoff.workers.queues import enqueue_job, get_high_queue, low_queue
+from robotoff.workers.scheduling import JobClass
 from robotoff.workers.tasks import download_product_dataset_job
 
 logger = get_logger()
@@ -801,6 +808,10 @@ class ImagePredictionResource:
 
 class ImagePredictorResource:
     def on_get(self, req: falcon.Request, resp: falcon.Response):
+        # Imported here as object detection depends on OpenCV, which is slow
+        # to import
+        from robotoff.prediction.object_detection import ObjectDetectionModelRegistry
+
         image_url = req.get_param("image_url", required=True)
         models: list[str] = req.get_param_as_list("models", required=True)
         threshold: float = req.get_param_as_float("threshold", default=0.5)
@@ -1113,6 +1124,7 @@ class ImageLogoResetResource:
                     insights_deleted,
                 )
 
+        update_logo_annotation_index([logo])
         resp.status = falcon.HTTP_204
 
 
@@ -1156,6 +1168,7 @@ class ImageLogoAnnotateResource:
                 annotated_logos = []
 
         if annotated_logos:
+            update_logo_annotation_index(annotated_logos)
             logo_ids = [logo.id for logo in annotated_logos]
             enqueue_job(
                 generate_insights_from_annotated_logos_job,
@@ -1163,6 +1176,7 @@ class ImageLogoAnnotateResource:
                 # job to a product-specific queue
                 get_high_queue(),
                 {"result_ttl": 0, "timeout": "5m"},
+                job_class=JobClass.interactive,
                 logo_ids=logo_ids,
                 server_type=server_type,
                 auth=auth,
@@ -1191,21 +1205,34 @@ class ImageLogoUpdateResource:
         source_value_tag = get_tag(source_value)
         taxonomy_value = match_taxonomized_value(target_value_tag, target_type)
 
-        query = LogoAnnotation.update(
-            {
-                LogoAnnotation.annotation_type: target_type,
-                LogoAnnotation.annotation_value: target_value,
-                LogoAnnotation.annotation_value_tag: target_value_tag,
-                LogoAnnotation.taxonomy_value: taxonomy_value,
-                LogoAnnotation.username: username,
-                LogoAnnotation.completed_at: completed_at,
-            }
-        ).where(
-            LogoAnnotation.annotation_type == source_type,
-            LogoAnnotation.annotation_value_tag == source_value_tag,
+        query = (
+            LogoAnnotation.update(
+                {
+                    LogoAnnotation.annotation_type: target_type,
+                    LogoAnnotation.annotation_value: target_value,
+                    LogoAnnotation.annotation_value_tag: target_value_tag,
+                    LogoAnnotation.taxonomy_value: taxonomy_value,
+                    LogoAnnotation.username: username,
+                    LogoAnnotation.completed_at: completed_at,
+                }
+            )
+            .where(
+                LogoAnnotation.annotation_type == source_type,
+                LogoAnnotation.annotation_value_tag == source_value_tag,
+            )
+            .returning(LogoAnnotation.id)
+        )
+        logo_ids = [logo_id for (logo_id,) in query.tuples().execute()]
+        update_logo_annotation_index(
+            LogoAnnotation(
+                id=logo_id,
+                annotation_type=target_type,
+                annotation_value=target_value,
+                taxonomy_value=taxonomy_value,
+            )
+            for logo_id in logo_ids
         )
-        updated = query.execute()
-        resp.media = {"updated": updated}
+        resp.media = {"updated": len(logo_ids)}
 
 
 class ANNResource:
@@ -1473,6 +1500,8 @@ class StatusResource:
     def on_get(self, req: falcon.Request, resp: falcon.Response):
         resp.media = {
             "status": "running",
+            # None until this API worker has submitted an event
+            "events": events.event_processor.get_stats(),
         }
 
 
@@ -1540,10 +1569,7 @@ class DumpResource:
 
 class UserStatisticsResource:
     def on_get(self, req: falcon.Request, resp: falcon.Response, username: str):
-        annotation_count = (
-            ProductInsight.select().where(ProductInsight.username == username).count()
-        )
-        resp.media = {"count": {"annotations": annotation_count}}
+        resp.media = {"count": {"annotations": get_user_annotation_count(username)}}
 
 
 class ImageCollection:
@@ -1636,11 +1662,10 @@ class UnansweredQuestionCollection:
 
         predictor = req.get_param("predictor")
 
-        get_insights_ = functools.partial(
-            get_insights,
+        get_pending_insight_counts_ = functools.partial(
+            get_pending_insight_counts,
             server_type=server_type,
             keep_types=[insight_type] if insight_type else None,
-            group_by_value_tag=True,
             limit=count,
             countries=countries,
             automatically_processable=False,
@@ -1650,9 +1675,9 @@ class UnansweredQuestionCollection:
         )
 
         offset: int = (page - 1) * count
-        insights = list(get_insights_(offset=offset))
+        insights = list(get_pending_insight_counts_(offset=offset))
 
-        response["count"] = get_insights_(count=True)
+        response["count"] = get_pending_insight_counts_(count=True)
 
         if not insights:
             response["questions"] = []
@@ -1784,6 +1809,8 @@ def custom_handle_uncaught_exception(
 api = falcon.App(
     middleware=[
         falcon.CORSMiddleware(allow_origins="*", allow_credentials="*"),
+        # Opt-in tracing/profiling of requests, see robotoff.utils.tracing
+        TracingMiddleware(),
         DBConnectionMiddleware(),
         # Clear cache after the request, to keep RAM usage low
         CacheClearMiddleware(),
@@ -1841,3 +1868,11 @@ api.add_route("/api/v1/predictions", PredictionCollection())
 api.add_route("/api/v1/annotation/collection", LogoAnnotationCollection())
 api.add_route("/api/v1/batch/import", BatchJobImportResource())
 api.add_route("/robots.txt", RobotsTxtResource())
+
+# Import modules and load resources listed in the warm-up manifest (see
+# robotoff.utils.startup). Note that cached resources are cleared after each
+# request by CacheClearMiddleware, only imported modules are kept.
+if settings.WARMUP_MANIFEST:
+    with db:
+        startup.warm_up(settings.WARMUP_MANIFEST)
+startup.log_startup_report("API startup report")
@@ -24,8 +24,12 @@ from robotoff.models import (
     ImageModel,
     ImagePrediction,
     LogoAnnotation,
+    PendingInsightCount,
+    PendingInsightCountDelta,
     Prediction,
     ProductInsight,
+    UserAnnotationCount,
+    UserAnnotationCountDelta,
     db,
 )
 from robotoff.off import OFFAuthentication
@@ -235,6 +239,108 @@ def get_insights(
     return query.iterator()
 
 
+def get_pending_insight_counts(
+    server_type: ServerType = ServerType.off,
+    keep_types: list[str] | None = None,
+    countries: list[Country] | None = None,
+    reserved_barcode: bool | None = None,
+    automatically_processable: bool | None = None,
+    campaigns: list[str] | None = None,
+    predictor: str | None = None,
+    limit: int | None = 25,
+    offset: int | None = None,
+    count: bool = False,
+) -> Iterable[tuple[str | None, int]] | int:
+    """Return the number of non-annotated insights for each `value_tag`,
+    sorted by decreasing count.
+
+    The counts are read from the `PendingInsightCount` aggregate table and
+    the deltas that were not folded into it yet, the filters have the same
+    meaning as in `get_insights`.
+
+    :param limit: limit on the number of returned value tags, defaults to 25
+    :param offset: query offset (used for pagination), defaults to None
+    :param count: if True, return the total number of non-annotated insights
+        instead of the counts by value tag, defaults to False
+    :return: either an iterable of (value_tag, count) tuples or the total
+        number of non-annotated insights (if `count=True`)
+    """
+    subqueries = []
+    for model, count_field in (
+        (PendingInsightCount, PendingInsightCount.count),
+        (PendingInsightCountDelta, PendingInsightCountDelta.delta),
+    ):
+        where_clauses = [model.server_type == server_type.name]
+
+        if automatically_processable is not None:
+            where_clauses.append(
+                model.automatic_processing == automatically_processable
+            )
+
+        if keep_types is not None:
+            where_clauses.append(model.type.in_(keep_types))
+
+        if countries is not None:
+            where_clauses.append(
+                model.countries.contains_any(
+                    [COUNTRY_CODE_TO_NAME[c] for c in countries]
+                )
+            )
+
+        if reserved_barcode is not None:
+            where_clauses.append(model.reserved_barcode == reserved_barcode)
+
+        if campaigns is not None:
+            where_clauses.append(model.campaign.contains_all(campaigns))
+
+        if predictor is not None:
+            where_clauses.append(model.predictor == predictor)
+
+        subqueries.append(
+            model.select(model.value_tag, count_field.alias("count")).where(
+                *where_clauses
+            )
+        )
+
+    counts = subqueries[0].union_all(subqueries[1]).alias("counts")
+    total = fn.SUM(counts.c.count)
+
+    if count:
+        return peewee.Select([counts], [fn.COALESCE(total, 0)]).bind(db).scalar()
+
+    # Empty value tags are stored as empty strings in the aggregate tables
+    query = (
+        peewee.Select([counts], [fn.NULLIF(counts.c.value_tag, ""), total])
+        .bind(db)
+        .group_by(counts.c.value_tag)
+        .having(total > 0)
+        .order_by(total.desc(), counts.c.value_tag)
+        .limit(limit)
+        .offset(offset)
+    )
+    return query.tuples().iterator()
+
+
+def get_user_annotation_count(username: str) -> int:
+    """Return the number of insights annotated by `username`, read from the
+    `UserAnnotationCount` aggregate table and the deltas that were not
+    folded into it yet."""
+    count = (
+        UserAnnotationCount.select(UserAnnotationCount.count)
+        .where(UserAnnotationCount.username == username)
+        .scalar()
+        or 0
+    )
+    delta = (
+        UserAnnotationCountDelta.select(
+            fn.COALESCE(fn.SUM(UserAnnotationCountDelta.delta), 0)
+        )
+        .where(UserAnnotationCountDelta.username == username)
+        .scalar()
+    )
+    return count + delta
+
+
 def get_images(
     server_type: ServerType,
     with_predictions: bool | None = False,
@@ -1,5 +1,7 @@
 import logging
-from multiprocessing import Process, SimpleQueue
+import time
+from multiprocessing import Process, Queue, Value
+from queue import Empty, Full
 
 import requests
 
@@ -8,39 +10,164 @@ from robotoff import settings
 logger = logging.getLogger(__name__)
 
 
+class EventDeliveryStats:
+    """Event delivery counters, shared between the API process and the event
+    delivery process."""
+
+    def __init__(self):
+        self.sent = Value("i", 0)
+        self.failed = Value("i", 0)
+        self.dropped = Value("i", 0)
+        # delay between the event submission and its delivery, in seconds
+        self.last_lag = Value("d", 0.0)
+        self.max_lag = Value("d", 0.0)
+
+    def increment(self, name: str, value: int = 1) -> int:
+        counter = getattr(self, name)
+        with counter.get_lock():
+            counter.value += value
+            return counter.value
+
+    def record_lag(self, lag: float):
+        self.last_lag.value = lag
+        with self.max_lag.get_lock():
+            self.max_lag.value = max(self.max_lag.value, lag)
+
+    def to_dict(self) -> dict:
+        return {
+            "sent": self.sent.value,
+            "failed": self.failed.value,
+            "dropped": self.dropped.value,
+            "last_lag": self.last_lag.value,
+            "max_lag": self.max_lag.value,
+        }
+
+
 class EventProcessor:
-    """Send events in an outside process"""
+    """Send events in an outside process.
+
+    Events are buffered in a bounded queue, and the delivery process sends
+    them in batches (see `settings.EVENTS_BATCH_SIZE` and
+    `settings.EVENTS_FLUSH_INTERVAL`), reusing the same HTTP connection.
+    When the queue is full, we wait at most
+    `settings.EVENTS_QUEUE_PUT_TIMEOUT` seconds before dropping the event.
+    """
 
     # the process and queue to send events
     process = None
     queue = None
+    stats = None
 
     def get(self):
         """Start a process to handle events, but only when needed,
         and return communication pipe
         """
         if self.process is None:
-            self.queue = SimpleQueue()
+            self.queue = Queue(maxsize=settings.EVENTS_QUEUE_MAX_SIZE)
+            self.stats = EventDeliveryStats()
             # Create a daemonic process
-            self.process = Process(target=send_events, args=(self.queue,), daemon=True)
+            self.process = Process(
+                target=send_events,
+                args=(
+                    self.queue,
+                    self.stats,
+                    settings.EVENTS_BATCH_SIZE,
+                    settings.EVENTS_FLUSH_INTERVAL,
+                ),
+                daemon=True,
+            )
             self.process.start()
         return self.queue
 
-    def send_async(self, *args, **kwargs):
-        if settings.BaseURLProvider.event_api():
-            queue = self.get()
-            queue.put((settings.BaseURLProvider.event_api(), args, kwargs))
+    def send_async(self, *args, **kwargs) -> bool:
+        """Submit an event to the delivery process.
+
+        :return: True if the event was queued, False if it was dropped
+        """
+        api_url = settings.BaseURLProvider.event_api()
+        if not api_url:
+            return False
+
+        queue = self.get()
+        put_timeout = settings.EVENTS_QUEUE_PUT_TIMEOUT
+        try:
+            queue.put(
+                (api_url, time.time(), args, kwargs),
+                block=put_timeout > 0,
+                timeout=put_timeout if put_timeout > 0 else None,
+            )
+        except Full:
+            dropped = self.stats.increment("dropped")
+            # don't flood the logs during bursts
+            if dropped == 1 or dropped % 100 == 0:
+                logger.warning("Event queue is full, %d events dropped so far", dropped)
+            return False
+        return True
+
+    def get_stats(self) -> dict | None:
+        """Return event delivery statistics, or None if no event was sent
+        yet."""
+        return None if self.stats is None else self.stats.to_dict()
 
 
 # a singleton for event processor
 event_processor = EventProcessor()
 
 
-def send_events(queue):
+def collect_batch(queue, batch_size: int, flush_interval: float) -> list:
+    """Wait for the next event, and return it with all events received
+    afterwards until `batch_size` events are collected or `flush_interval`
+    seconds have elapsed.
+    """
+    batch = [queue.get()]
+    deadline = time.monotonic() + flush_interval
+    while len(batch) < batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(queue.get(timeout=remaining))
+        except Empty:
+            break
+    return batch
+
+
+def flush_events(
+    session: requests.Session, batch: list, stats: EventDeliveryStats
+) -> None:
+    """Send a batch of queued events, using the same session (and connection
+    pool) for all of them."""
+    failed = 0
+    for api_url, submitted_at, args, kwargs in batch:
+        try:
+            send_event(api_url, *args, session=session, **kwargs)
+        except requests.RequestException as e:
+            failed += 1
+            logger.info("Error during event delivery", exc_info=e)
+        stats.record_lag(time.time() - submitted_at)
+
+    stats.increment("sent", len(batch) - failed)
+    if failed:
+        stats.increment("failed", failed)
+    logger.debug("Event batch delivered, stats: %s", stats.to_dict())
+
+
+def send_events(
+    queue,
+    stats: EventDeliveryStats,
+    batch_size: int = settings.EVENTS_BATCH_SIZE,
+    flush_interval: float = settings.EVENTS_FLUSH_INTERVAL,
+    stats_log_interval: float = settings.EVENTS_STATS_LOG_INTERVAL,
+):
     """Loop to send events in a specific process"""
-    while True:
-        api_url, args, kwargs = queue.get()
-        send_event(api_url, *args, **kwargs)
+    next_stats_log = time.monotonic() + stats_log_interval
+    with requests.Session() as session:
+        while True:
+            batch = collect_batch(queue, batch_size, flush_interval)
+            flush_events(session, batch, stats)
+            if time.monotonic() >= next_stats_log:
+                logger.info("Event delivery stats: %s", stats.to_dict())
+                next_stats_log = time.monotonic() + stats_log_interval
 
 
 def send_event(
@@ -50,6 +177,7 @@ def send_event(
     device_id: str,
     barcode: str | None = None,
     server_type: str | None = None,
+    session: requests.Session | None = None,
 ):
     event = {
         "event_type": event_type,
@@ -59,6 +187,9 @@ def send_event(
         "server_type": server_type,
     }
     logger.debug("Event: %s", event)
-    response = requests.post(api_url, json=event)
+    response = (session or requests).post(
+        api_url, json=event, timeout=settings.EVENTS_REQUEST_TIMEOUT
+    )
     logger.debug("Event API response: %s", response)
+    response.raise_for_status()
     return response
@@ -1,5 +1,6 @@
 from robotoff.models import db
 from robotoff.utils.cache import function_cache_register
+from robotoff.utils.tracing import TraceRecorder
 
 
 class DBConnectionMiddleware:
@@ -14,3 +15,22 @@ class DBConnectionMiddleware:
 class CacheClearMiddleware:
     def process_response(self, req, resp, resource, req_succeeded):
         function_cache_register.clear_all()
+
+
+class TracingMiddleware:
+    """Record the trace (and profile if the endpoint is a profiling target)
+    of the request, see robotoff.utils.tracing.
+
+    It must be placed before the other middlewares, so that their processing
+    time is included in the trace."""
+
+    def process_resource(self, req, resp, resource, params):
+        recorder = TraceRecorder.create(f"{req.method} {req.uri_template}", "request")
+        if recorder is not None:
+            recorder.start()
+        req.context.trace_recorder = recorder
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        recorder = req.context.get("trace_recorder")
+        if recorder is not None:
+            recorder.stop(error=None if req_succeeded else resp.status)
@@ -7,15 +7,14 @@ import tempfile
 from pathlib import Path
 
 import duckdb
-from more_itertools import chunked
 
 from robotoff import settings
 from robotoff.insights.importer import import_insights
 from robotoff.models import db
-from robotoff.prediction.langid import predict_lang
+from robotoff.prediction.langid import predict_lang_batch
 from robotoff.types import BatchJobType, Prediction, PredictionType, ServerType
 
-from .buckets import fetch_dataframe_from_gcs, upload_file_to_gcs
+from .buckets import iter_parquet_batches_from_gcs, upload_file_to_gcs
 from .launch import GoogleBatchJobConfig, launch_job
 
 logger = logging.getLogger(__name__)
@@ -31,51 +30,85 @@ def import_batch_predictions(job_type: BatchJobType, batch_dir: str) -> None:
         raise NotImplementedError(f"Batch job type {job_type} not implemented.")
 
 
-def import_spellcheck_batch_predictions(batch_dir: str) -> None:
-    """Import spellcheck predictions from remote storage."""
+def import_spellcheck_batch_predictions(batch_dir: str, batch_size: int = 1000) -> None:
+    """Import spellcheck predictions from remote storage.
+
+    The result file is streamed from the bucket, and processed in batches of
+    `batch_size` rows: the language of all texts of a batch is predicted in a
+    single request, and the predictions of the batch are imported together.
+
+    :param batch_dir: directory of the batch job in the bucket
+    :param batch_size: number of rows processed at once, defaults to 1000
+    """
     # Init
     bucket_name = "robotoff-batch"
     processed_file_path = f"{batch_dir}/postprocessed_data.parquet"
 
     check_google_credentials()
 
-    df = fetch_dataframe_from_gcs(bucket_name=bucket_name, suffix=processed_file_path)
-    logger.debug(
-        "Batch data downloaded from bucket %s/%s", bucket_name, processed_file_path
-    )
-    logger.info("Number of rows in the batch data: %s", len(df))
-
     # We increment to allow import_insights to create a new version
     predictor_version = "llm-v1-" + datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    for batch in chunked((row for _, row in df.iterrows()), 100):
-        predictions = []
-        for row in batch:
-            lang_predictions = predict_lang(row["text"], k=1)
-            lang, lang_confidence = lang_predictions[0].lang, (
-                lang_predictions[0].confidence if lang_predictions else None
-            )
-            predictions.append(
-                Prediction(
-                    type=PredictionType.ingredient_spellcheck,
-                    data={
-                        "original": row["text"],
-                        "correction": row["correction"],
-                        "lang": lang,
-                        "lang_confidence": lang_confidence,
-                    },
-                    value_tag=row["lang"],
-                    barcode=row["code"],
-                    predictor_version=predictor_version,
-                    predictor="fine-tuned-mistral-7b",
-                    automatic_processing=False,
-                )
-            )
+    rows_n = 0
+    for rows in iter_parquet_batches_from_gcs(
+        bucket_name=bucket_name,
+        suffix=processed_file_path,
+        batch_size=batch_size,
+        columns=["code", "text", "correction", "lang"],
+    ):
+        predictions = generate_spellcheck_predictions(rows, predictor_version)
         # Store predictions and insights
         with db:
             import_results = import_insights(
                 predictions=predictions, server_type=ServerType.off
             )
-        logger.info("Batch import results: %s", import_results)
+        rows_n += len(rows)
+        logger.info(
+            "Batch import results (%d rows imported): %s", rows_n, import_results
+        )
+
+    logger.info(
+        "%d rows imported from bucket %s/%s", rows_n, bucket_name, processed_file_path
+    )
+
+
+def generate_spellcheck_predictions(
+    rows: list[dict], predictor_version: str
+) -> list[Prediction]:
+    """Generate ingredient spellcheck predictions from rows of the batch job
+    result file.
+
+    :param rows: the rows, with `code`, `text`, `correction` and `lang` keys
+    :param predictor_version: the predictor version of the predictions
+    :return: the predictions, one per row
+    """
+    if not rows:
+        return []
+
+    lang_predictions_list = predict_lang_batch([row["text"] for row in rows], k=1)
+    predictions = []
+    for row, lang_predictions in zip(rows, lang_predictions_list):
+        lang, lang_confidence = (
+            (lang_predictions[0].lang, lang_predictions[0].confidence)
+            if lang_predictions
+            else (None, None)
+        )
+        predictions.append(
+            Prediction(
+                type=PredictionType.ingredient_spellcheck,
+                data={
+                    "original": row["text"],
+                    "correction": row["correction"],
+                    "lang": lang,
+                    "lang_confidence": lang_confidence,
+                },
+                value_tag=row["lang"],
+                barcode=row["code"],
+                predictor_version=predictor_version,
+                predictor="fine-tuned-mistral-7b",
+                automatic_processing=False,
+            )
+        )
+    return predictions
 
 
 def launch_spellcheck_batch_job(
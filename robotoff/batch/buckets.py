@@ -1,4 +1,7 @@
+from typing import Iterator
+
 import pandas as pd
+import pyarrow.parquet as pq
 from google.cloud import storage  # type: ignore
 
 
@@ -33,3 +36,53 @@ def fetch_dataframe_from_gcs(bucket_name: str, suffix: str) -> pd.DataFrame:
                 f"Could not read parquet file from {bucket_name}/{suffix}. Error: {e}"
             )
         return df
+
+
+def iter_parquet_batches_from_gcs(
+    bucket_name: str,
+    suffix: str,
+    batch_size: int = 1000,
+    columns: list[str] | None = None,
+) -> Iterator[list[dict]]:
+    """Stream a parquet file from Google Storage Bucket, in batches of rows.
+
+    Contrary to `fetch_dataframe_from_gcs`, the file is never fully loaded
+    in memory: it is read record batch by record batch, so that memory usage
+    is bounded by the batch size (and the row group size) rather than by the
+    file size.
+
+    :param bucket_name: Bucket name in GCP storage
+    :param suffix: Path inside the bucket. Should lead to a parquet file.
+    :param batch_size: Maximum number of rows per batch, defaults to 1000
+    :param columns: Columns to read, defaults to None (all columns)
+    :yield: batches of rows, each row being a dict
+    """
+    client = storage.Client()
+    bucket = client.get_bucket(bucket_name)
+    blob = bucket.blob(suffix)
+    with blob.open("rb") as f:
+        try:
+            parquet_file = pq.ParquetFile(f)
+        except Exception as e:
+            raise ValueError(
+                f"Could not read parquet file from {bucket_name}/{suffix}. Error: {e}"
+            )
+        yield from iter_parquet_file_batches(parquet_file, batch_size, columns)
+
+
+def iter_parquet_file_batches(
+    parquet_file: pq.ParquetFile,
+    batch_size: int = 1000,
+    columns: list[str] | None = None,
+) -> Iterator[list[dict]]:
+    """Iterate over the rows of a parquet file, in batches.
+
+    :param parquet_file: The parquet file
+    :param batch_size: Maximum number of rows per batch, defaults to 1000
+    :param columns: Columns to read, defaults to None (all columns)
+    :yield: batches of rows, each row being a dict
+    """
+    for record_batch in parquet_file.iter_batches(
+        batch_size=batch_size, columns=columns
+    ):
+        yield record_batch.to_pylist()
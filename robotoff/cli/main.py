@@ -42,16 +42,52 @@ def run_worker(
 
 
 @app.command()
-def run_update_listener():
+def run_update_listener(
+    consumer_group: Optional[bool] = typer.Option(
+        None,
+        help="Read the stream through a Redis consumer group, with acknowledgement. "
+        "Defaults to the `UPDATE_LISTENER_CONSUMER_GROUP` setting.",
+    ),
+    partition: int = typer.Option(
+        0,
+        help="Index of the partition of products handled by this listener "
+        "(consumer group mode only)",
+    ),
+    num_partitions: Optional[int] = typer.Option(
+        None,
+        help="Total number of listeners (consumer group mode only). "
+        "Defaults to the `UPDATE_LISTENER_NUM_PARTITIONS` setting.",
+    ),
+    consumer_name: Optional[str] = typer.Option(
+        None, help="Name of the consumer in the group, defaults to the hostname"
+    ),
+):
     """Launch a process that listens to product updates published on Redis
-    stream."""
+    stream.
+
+    In consumer group mode, several listeners can be launched, each one
+    handling a single partition of the products.
+    """
     from robotoff import settings
     from robotoff.utils.logger import get_logger
     from robotoff.workers.update_listener import run_update_listener
 
     get_logger()
     settings.init_sentry()
-    run_update_listener()
+    run_update_listener(
+        consumer_group=(
+            settings.UPDATE_LISTENER_CONSUMER_GROUP
+            if consumer_group is None
+            else consumer_group
+        ),
+        partition=partition,
+        num_partitions=(
+            settings.UPDATE_LISTENER_NUM_PARTITIONS
+            if num_partitions is None
+            else num_partitions
+        ),
+        consumer_name=consumer_name,
+    )
 
 
 @app.command()
@@ -363,11 +399,13 @@ def refresh_insights(
     from more_itertools import chunked
     from peewee import fn
 
+    from robotoff import settings
     from robotoff.insights.importer import refresh_insights as refresh_insights_
     from robotoff.models import Prediction as PredictionModel
     from robotoff.models import db
     from robotoff.utils import get_logger
-    from robotoff.workers.queues import enqueue_job, low_queue
+    from robotoff.workers.queues import JobSpec, enqueue_jobs, low_queue
+    from robotoff.workers.scheduling import JobClass
     from robotoff.workers.tasks import refresh_insights_job
 
     logger = get_logger()
@@ -402,12 +440,20 @@ def refresh_insights(
             return
 
         logger.info("Adding refresh_insights jobs in queue...")
-        for product_id_batch in tqdm.tqdm(batches, desc="barcode batch"):
-            enqueue_job(
-                refresh_insights_job,
-                low_queue,
-                job_kwargs={"result_ttl": 0, "timeout": "5m"},
-                product_ids=product_id_batch,
+        with tqdm.tqdm(total=len(batches), desc="barcode batch") as pbar:
+            enqueue_jobs(
+                (
+                    JobSpec(
+                        refresh_insights_job,
+                        queue=low_queue,
+                        job_kwargs={"result_ttl": 0, "timeout": "5m"},
+                        kwargs={"product_ids": product_id_batch},
+                    )
+                    for product_id_batch in batches
+                ),
+                on_progress=pbar.update,
+                job_class=JobClass.backfill,
+                max_queue_depth=settings.RQ_BACKFILL_MAX_QUEUE_DEPTH,
             )
 
 
@@ -425,11 +471,13 @@ def import_images_in_db(
     import tqdm
     from more_itertools import chunked
 
+    from robotoff import settings
     from robotoff.models import ImageModel, db
     from robotoff.off import generate_image_path
     from robotoff.products import DBProductStore, get_product_store
     from robotoff.utils import get_logger
-    from robotoff.workers.queues import enqueue_job, low_queue
+    from robotoff.workers.queues import JobSpec, enqueue_jobs, low_queue
+    from robotoff.workers.scheduling import JobClass
     from robotoff.workers.tasks.import_image import save_image_job
 
     logger = get_logger()
@@ -462,13 +510,20 @@ def import_images_in_db(
     if typer.confirm(
         f"{len(batches)} add image jobs are going to be launched, confirm?"
     ):
-        for batch in tqdm.tqdm(batches, desc="job"):
-            enqueue_job(
-                save_image_job,
-                low_queue,
-                job_kwargs={"result_ttl": 0},
-                batch=batch,
-                server_type=server_type,
+        with tqdm.tqdm(total=len(batches), desc="job") as pbar:
+            enqueue_jobs(
+                (
+                    JobSpec(
+                        save_image_job,
+                        queue=low_queue,
+                        job_kwargs={"result_ttl": 0},
+                        kwargs={"batch": batch, "server_type": server_type},
+                    )
+                    for batch in batches
+                ),
+                on_progress=pbar.update,
+                job_class=JobClass.backfill,
+                max_queue_depth=settings.RQ_BACKFILL_MAX_QUEUE_DEPTH,
             )
 
 
@@ -481,9 +536,43 @@ def run_category_prediction(
     limit: Optional[int] = typer.Option(
         None, help="Maximum numbers of job to launch (default: all)"
     ),
+    bulk: bool = typer.Option(
+        False,
+        help="Predict categories in this process by large batches, instead of "
+        "launching one job per product",
+    ),
+    dataset_path: Optional[Path] = typer.Option(
+        None,
+        help="Path of a local JSONL dump of the dataset to use. If not "
+        "provided, the latest dump is downloaded.",
+    ),
+    batch_size: int = typer.Option(
+        256, help="Number of products sent in each model request (bulk mode)"
+    ),
+    num_workers: int = typer.Option(
+        16,
+        help="Number of threads used to fetch OCR texts and image embeddings "
+        "(bulk mode)",
+    ),
+    checkpoint_path: Optional[Path] = typer.Option(
+        None,
+        help="Path of a checkpoint file used to resume an interrupted run "
+        "(bulk mode)",
+    ),
+    skip_existing: bool = typer.Option(
+        True,
+        help="Skip products that already have category predictions, disable "
+        "it to re-score all products after a model upgrade",
+    ),
 ):
     """Launch category prediction jobs on all products without categories in
-    DB."""
+    DB.
+
+    With `--bulk`, categories are predicted by this process: products are
+    streamed from the dataset dump, OCR texts and image embeddings are
+    fetched concurrently, and products are sent to the model by batches of
+    `--batch-size` products.
+    """
     import tqdm
     from openfoodfacts.dataset import ProductDataset
 
@@ -494,28 +583,59 @@ def run_category_prediction(
     from robotoff.workers.tasks.common import add_category_insight_job
 
     logger = get_logger()
-    # Download the latest dump of the dataset, cache it in DATASET_DIR
-    ds = ProductDataset(force_download=True, download_newer=True, cache_dir=DATASET_DIR)
+    if dataset_path is not None:
+        ds = ProductDataset(dataset_path=dataset_path)
+    else:
+        # Download the latest dump of the dataset, cache it in DATASET_DIR
+        ds = ProductDataset(
+            force_download=True, download_newer=True, cache_dir=DATASET_DIR
+        )
 
     # The category detector only works for food products
     server_type = ServerType.off
 
-    logger.info("Fetching products without categories in DB...")
-    with db:
-        barcode_with_categories = set(
-            barcode
-            for (barcode,) in Prediction.select(Prediction.barcode)
-            .distinct()
-            .where(
-                Prediction.server_type == server_type.name,
-                Prediction.type == PredictionType.category.name,
+    barcode_with_categories: set[str] = set()
+    if skip_existing:
+        logger.info("Fetching products without categories in DB...")
+        with db:
+            barcode_with_categories = set(
+                barcode
+                for (barcode,) in Prediction.select(Prediction.barcode)
+                .distinct()
+                .where(
+                    Prediction.server_type == server_type.name,
+                    Prediction.type == PredictionType.category.name,
+                )
+                .tuples()
+                .limit(limit)
             )
-            .tuples()
-            .limit(limit)
+        logger.info(
+            "%d products with categories already in DB", len(barcode_with_categories)
         )
-    logger.info(
-        "%d products with categories already in DB", len(barcode_with_categories)
-    )
+    if bulk:
+        from robotoff.prediction.category.neural.bulk import (
+            run_bulk_category_prediction,
+        )
+        from robotoff.prediction.category.neural.category_classifier import (
+            CategoryClassifier,
+        )
+        from robotoff.taxonomy import TaxonomyType, get_taxonomy
+
+        result = run_bulk_category_prediction(
+            tqdm.tqdm(ds, desc="products"),
+            CategoryClassifier(get_taxonomy(TaxonomyType.category.name)),
+            server_type=server_type,
+            skip_barcodes=barcode_with_categories,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            triton_uri=triton_uri,
+            checkpoint_path=checkpoint_path,
+            dataset_id=f"{ds.dataset_path}:{ds.dataset_path.stat().st_size}",
+            limit=limit,
+        )
+        logger.info("Bulk category prediction done: %s", result)
+        return
+
     seen: set[str] = set()
     added = 0
     for product in tqdm.tqdm(ds, desc="products"):
@@ -651,12 +771,17 @@ def rerun_import_all_images(
     flags: list[ImportImageFlag] = typer.Option(
         None, help="Flags to use for image import"
     ),
+    max_rate: Optional[float] = typer.Option(
+        None, help="maximum number of jobs enqueued per second, defaults to no limit"
+    ),
 ):
     """Rerun full image import on all images in DB.
 
     This includes launching all ML models and insight extraction from the image and
     associated OCR. To control which tasks are rerun, use the --flags option.
     """
+    import tqdm
+
     from robotoff.workers.tasks.import_image import (
         rerun_import_all_images as _rerun_import_all_images,
     )
@@ -671,10 +796,124 @@ def rerun_import_all_images(
         else f"running following tasks ({', '.join(flag.name for flag in flags_)}) on {count} images, confirm?"
     )
     if typer.confirm(message):
-        _rerun_import_all_images(limit=limit, server_type=server_type, flags=flags_)
+        with tqdm.tqdm(desc="job") as pbar:
+            _rerun_import_all_images(
+                limit=limit,
+                server_type=server_type,
+                flags=flags_,
+                max_rate=max_rate,
+                on_progress=pbar.update,
+            )
     typer.echo("The task was successfully scheduled.")
 
 
+@app.command()
+def backfill_image_fingerprints(
+    server_type: Optional[ServerType] = typer.Option(
+        None, help="Server type of the images, defaults to all server types"
+    ),
+    batch_size: int = typer.Option(
+        500, help="number of fingerprints saved in each DB update"
+    ),
+    num_workers: int = typer.Option(
+        16, help="maximum number of images downloaded concurrently"
+    ),
+    checkpoint_path: Optional[Path] = typer.Option(
+        None,
+        help="path of a checkpoint file, used to resume the backfill after an "
+        "interruption",
+    ),
+    limit: Optional[int] = typer.Option(
+        None,
+        help="the maximum number of images to process, defaults to None (all)",
+        min=1,
+    ),
+) -> None:
+    """Compute the fingerprint of all images in DB that don't have one yet.
+
+    Images are downloaded and hashed in parallel, and fingerprints are saved
+    in DB by batches.
+    """
+    import dataclasses
+
+    from robotoff.images import backfill_image_fingerprints as _backfill
+    from robotoff.models import db
+    from robotoff.utils import get_logger
+
+    logger = get_logger()
+    with db.connection_context():
+        result = _backfill(
+            server_type=server_type,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            checkpoint_path=checkpoint_path,
+            limit=limit,
+            on_batch_saved=lambda result: logger.info(
+                "Fingerprint backfill progress: %s", dataclasses.asdict(result)
+            ),
+        )
+    logger.info("Fingerprint backfill done: %s", result)
+
+
+@app.command()
+def backfill_ingredient_detection(
+    input_path: Path = typer.Argument(
+        ..., help="Path to a (gzipped-)OCR JSONL archive"
+    ),
+    server_type: ServerType = typer.Option(
+        ServerType.off, help="Server type of the archive"
+    ),
+    batch_size: int = typer.Option(
+        256, help="number of OCR results processed and saved together"
+    ),
+    num_workers: int = typer.Option(
+        4, help="number of images whose ingredient lists are parsed concurrently"
+    ),
+    checkpoint_path: Optional[Path] = typer.Option(
+        None,
+        help="path of a checkpoint file, used to resume the backfill after an "
+        "interruption",
+    ),
+    limit: Optional[int] = typer.Option(
+        None, help="the maximum number of OCR results to read, defaults to None (all)"
+    ),
+    triton_uri: Optional[str] = typer.Option(
+        None,
+        help="URI of the Triton Inference Server to use. If not provided, the default value from settings is used.",
+    ),
+) -> None:
+    """Run ingredient detection on all OCR results of an OCR archive, for
+    images that were not processed yet.
+
+    OCR results are sent to the model in batches, and predictions are saved
+    in DB by batches.
+    """
+    import dataclasses
+
+    from robotoff.models import db
+    from robotoff.utils import get_logger
+    from robotoff.workers.tasks.import_image import (
+        backfill_ingredient_detection as _backfill,
+    )
+
+    logger = get_logger()
+    with db.connection_context():
+        result = _backfill(
+            input_path,
+            server_type=server_type,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            checkpoint_path=checkpoint_path,
+            limit=limit,
+            triton_uri=triton_uri,
+            on_batch_saved=lambda result: logger.info(
+                "Ingredient detection backfill progress: %s",
+                dataclasses.asdict(result),
+            ),
+        )
+    logger.info("Ingredient detection backfill done: %s", result)
+
+
 @app.command()
 def run_nutrition_extraction(
     image_url: str = typer.Argument(
@@ -719,6 +958,44 @@ def run_nutrition_extraction(
         pprint("No prediction")
 
 
+@app.command()
+def backfill_nutrition_extraction(
+    server_type: Optional[ServerType] = typer.Option(
+        None, help="Server type of the product, defaults to all food server types"
+    ),
+    limit: Optional[int] = typer.Option(
+        None, help="the maximum number of images to process, defaults to None (all)"
+    ),
+    batch_size: int = typer.Option(32, help="number of images processed in each job"),
+    max_rate: Optional[float] = typer.Option(
+        None, help="maximum number of jobs enqueued per second, defaults to no limit"
+    ),
+) -> None:
+    """Run nutrition extraction on all images in DB that were not processed by
+    the nutrition extraction model yet.
+
+    Images are processed by batches, each job sending its images to the model
+    in batches.
+    """
+    import tqdm
+
+    from robotoff.workers.tasks.import_image import rerun_nutrition_extraction
+
+    count = rerun_nutrition_extraction(
+        limit=limit, server_type=server_type, return_count=True
+    )
+    if typer.confirm(f"running nutrition extraction on {count} images, confirm?"):
+        with tqdm.tqdm(desc="job") as pbar:
+            rerun_nutrition_extraction(
+                limit=limit,
+                server_type=server_type,
+                batch_size=batch_size,
+                max_rate=max_rate,
+                on_progress=pbar.update,
+            )
+        typer.echo("The task was successfully scheduled.")
+
+
 @app.command()
 def init_elasticsearch() -> None:
     """This command is used for index creation."""
@@ -798,6 +1075,128 @@ def add_logo_to_ann(
     logger.info("%s embeddings indexed", added)
 
 
+@app.command()
+def reindex_logos(
+    index_type: Optional[str] = typer.Option(
+        None,
+        help="Type of the vector index: hnsw, int8_hnsw, int4_hnsw or bbq_hnsw. "
+        "If not provided, the value from settings is used.",
+    ),
+    m: int = typer.Option(16, help="Number of neighbors of each HNSW graph node"),
+    ef_construction: int = typer.Option(
+        100, help="Number of candidates considered when building the HNSW graph"
+    ),
+    thread_count: int = typer.Option(4, help="Number of concurrent bulk requests"),
+    chunk_size: int = typer.Option(500, help="Number of logos per bulk request"),
+    swap: bool = typer.Option(
+        True,
+        help="Point the `logo` alias to the new index once it's complete. "
+        "Disable it to build an index for `evaluate-logo-index` only.",
+    ),
+) -> None:
+    """Rebuild the logo ANN index from the logo embeddings stored in DB.
+
+    Searches keep being served by the current index during the rebuild.
+    """
+    import logging
+
+    from robotoff import settings
+    from robotoff.elasticsearch import get_es_client, get_logo_index_config
+    from robotoff.logos import reindex_logos as _reindex_logos
+    from robotoff.models import db
+    from robotoff.utils import get_logger
+
+    logger = get_logger()
+    logging.getLogger("elastic_transport.transport").setLevel(logging.WARNING)
+
+    index_config = get_logo_index_config(
+        index_type or settings.ELASTIC_LOGO_VECTOR_INDEX_TYPE, m, ef_construction
+    )
+    with db.connection_context():
+        index_name = _reindex_logos(
+            get_es_client(),
+            index_config,
+            thread_count=thread_count,
+            chunk_size=chunk_size,
+            swap=swap,
+        )
+    logger.info("Logo index rebuilt: %s", index_name)
+
+
+@app.command()
+def build_logo_annotation_index(
+    check_only: bool = typer.Option(
+        False,
+        help="Only check the consistency of the index with the DB, and rebuild "
+        "it if it's not consistent",
+    ),
+) -> None:
+    """Build the logo annotation index (used for logo label prediction) from
+    the DB."""
+    from robotoff.logo_annotations import (
+        check_logo_annotation_index,
+        get_logo_annotation_index,
+    )
+    from robotoff.models import db
+    from robotoff.utils import get_logger
+
+    logger = get_logger()
+
+    with db.connection_context():
+        if check_only:
+            check = check_logo_annotation_index()
+            logger.info("Check result: %s", check)
+        else:
+            get_logo_annotation_index().build()
+
+
+@app.command()
+def evaluate_logo_index(
+    index_names: list[str] = typer.Argument(
+        ..., help="Names of the logo indices to compare"
+    ),
+    sample_size: int = typer.Option(500, help="Number of queries"),
+    k: int = typer.Option(10, help="Number of nearest neighbors to retrieve"),
+    num_candidates: Optional[int] = typer.Option(
+        None, help="Number of candidates considered on each shard (default: k+1)"
+    ),
+) -> None:
+    """Compare the recall (against exact nearest neighbors computed from the
+    logo embeddings stored in DB), the search latency and the estimated
+    memory usage of several logo indices."""
+    import logging
+
+    from rich.console import Console
+    from rich.table import Table
+
+    from robotoff.elasticsearch import get_es_client
+    from robotoff.logos import evaluate_logo_index as _evaluate_logo_index
+    from robotoff.models import db
+    from robotoff.utils import get_logger
+
+    get_logger()
+    logging.getLogger("elastic_transport.transport").setLevel(logging.WARNING)
+
+    with db.connection_context():
+        results = _evaluate_logo_index(
+            get_es_client(), index_names, sample_size, k, num_candidates
+        )
+
+    table = Table(title=f"Logo index evaluation (recall@{k})")
+    for column in ("index", "type", "recall", "mean (ms)", "p95 (ms)", "memory (MB)"):
+        table.add_column(column)
+    for result in results:
+        table.add_row(
+            result.index_name,
+            result.index_type,
+            f"{result.recall:.4f}",
+            f"{result.mean_latency:.1f}",
+            f"{result.p95_latency:.1f}",
+            f"{result.estimated_memory / 1e6:.1f}",
+        )
+    Console().print(table)
+
+
 @app.command()
 def refresh_logo_nearest_neighbors(
     day_offset: int = typer.Option(7, help="Number of days since last refresh", min=1),
@@ -828,8 +1227,9 @@ def import_logo_embeddings(
         exists=True,
         file_okay=True,
         dir_okay=False,
-        help="HDF5 file containing logo embeddings. Two HDF5 datasets are expected: "
-        "one containing the embeddings and one containing the logo IDs.",
+        help="HDF5 (.h5, .hdf5) or numpy (.npz) file containing logo embeddings. "
+        "Two HDF5 datasets (or numpy arrays) are expected: one containing the "
+        "embeddings and one containing the logo IDs.",
     ),
     embedding_dataset_name: str = typer.Option(
         "embedding",
@@ -843,14 +1243,21 @@ def import_logo_embeddings(
         False,
         help="if the logo embedding already exists in database, update it if True, otherwise ignore it.",
     ),
+    batch_size: int = typer.Option(
+        5_000, help="number of embeddings saved in each transaction"
+    ),
+    checkpoint_path: Optional[Path] = typer.Option(
+        None,
+        help="path of a checkpoint file, used to resume the import after an "
+        "interruption",
+    ),
 ) -> None:
-    """Import logo embeddings in DB from an HDF5 file."""
-    import h5py
-    import numpy as np
-    import tqdm
-    from more_itertools import chunked
+    """Import logo embeddings in DB from an HDF5 or a numpy file.
 
-    from robotoff.models import LogoAnnotation, LogoEmbedding, db
+    Embeddings must be float32 vectors of dimension 512, null (all-zero)
+    embeddings are skipped."""
+    from robotoff.embeddings import import_embeddings_from_file
+    from robotoff.models import LogoEmbedding, db
     from robotoff.utils import get_logger
 
     logger = get_logger()
@@ -861,63 +1268,70 @@ def import_logo_embeddings(
         embedding_dataset_name,
         logo_id_dataset_name,
     )
-
-    with db:
-        existing_logo_ids = set(
-            x[0] for x in LogoAnnotation.select(LogoAnnotation.id).tuples().iterator()
-        )
-        existing_embedding_logo_ids = set(
-            x[0]
-            for x in LogoEmbedding.select(LogoEmbedding.logo_id).tuples().iterator()
+    with db.connection_context():
+        result = import_embeddings_from_file(
+            LogoEmbedding,
+            input_path,
+            embedding_name=embedding_dataset_name,
+            id_name=logo_id_dataset_name,
+            update_if_exists=update_if_exists,
+            batch_size=batch_size,
+            checkpoint_path=checkpoint_path,
         )
+    logger.info("embeddings: %s", result)
 
-    imported = 0
-    updated = 0
-    not_found = 0
-    with h5py.File(input_path, "r") as f:
-        embeddings = f[embedding_dataset_name]
-        logo_ids = f[logo_id_dataset_name]
-        non_zero_indexes = np.flatnonzero(logo_ids[:])
-        max_index = int(non_zero_indexes[-1])
-        logger.info("Number of embeddings in HDF5 file: %d", max_index)
-
-        pbar = tqdm.tqdm(range(max_index), desc="embedding")
-        with db.connection_context():
-            for batch_indices in chunked(pbar, 1000):
-                with db.atomic():
-                    for i in batch_indices:
-                        embedding = embeddings[i]
-                        logo_id = int(logo_ids[i])
-                        assert embedding.shape[0] == 512
-                        assert embedding.dtype == np.float32
-                        assert not np.all(embedding == 0.0)
-                        logo_id = int(logo_ids[i])
-                        if logo_id in existing_logo_ids:
-                            if logo_id not in existing_embedding_logo_ids:
-                                LogoEmbedding.create(
-                                    logo_id=logo_id, embedding=embedding.tobytes()
-                                )
-                                existing_embedding_logo_ids.add(logo_id)
-                                imported += 1
-                            elif update_if_exists:
-                                updated += (
-                                    LogoEmbedding.update(
-                                        {"embedding": embedding.tobytes()}
-                                    )
-                                    .where(LogoEmbedding.logo_id == logo_id)
-                                    .execute()
-                                )
-                        else:
-                            not_found += 1
-                    pbar.postfix = f"imported: {imported}, updated: {updated}, not found: {not_found}"
-        pbar.close()
 
-    logger.info(
-        "embeddings: %d imported, %d updated, %d not found",
-        imported,
-        updated,
-        not_found,
-    )
+@app.command()
+def import_image_embeddings(
+    input_path: Path = typer.Argument(
+        ...,
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+        help="HDF5 (.h5, .hdf5) or numpy (.npz) file containing image embeddings. "
+        "Two HDF5 datasets (or numpy arrays) are expected: one containing the "
+        "embeddings and one containing the image IDs (ID of the image table).",
+    ),
+    embedding_dataset_name: str = typer.Option(
+        "embedding", help="name of the HDF5 dataset corresponding to image embedding"
+    ),
+    image_id_dataset_name: str = typer.Option(
+        "image_id", help="name of the HDF5 dataset corresponding to image ID"
+    ),
+    update_if_exists: bool = typer.Option(
+        False,
+        help="if the image embedding already exists in database, update it if True, otherwise ignore it.",
+    ),
+    batch_size: int = typer.Option(
+        5_000, help="number of embeddings saved in each transaction"
+    ),
+    checkpoint_path: Optional[Path] = typer.Option(
+        None,
+        help="path of a checkpoint file, used to resume the import after an "
+        "interruption",
+    ),
+) -> None:
+    """Import image embeddings in DB from an HDF5 or a numpy file.
+
+    Embeddings must be float32 vectors of dimension 512, null (all-zero)
+    embeddings are skipped."""
+    from robotoff.embeddings import import_embeddings_from_file
+    from robotoff.models import ImageEmbedding, db
+    from robotoff.utils import get_logger
+
+    logger = get_logger()
+    logger.info("Importing image embeddings from %s", input_path)
+    with db.connection_context():
+        result = import_embeddings_from_file(
+            ImageEmbedding,
+            input_path,
+            embedding_name=embedding_dataset_name,
+            id_name=image_id_dataset_name,
+            update_if_exists=update_if_exists,
+            batch_size=batch_size,
+            checkpoint_path=checkpoint_path,
+        )
+    logger.info("embeddings: %s", result)
 
 
 @app.command()
@@ -1095,6 +1509,26 @@ def migrate_db():
         run_migration()
 
 
+@app.command()
+def rebuild_insight_counts():
+    """Recompute the pending insight and user annotation counts used by the
+    question and user statistics endpoints.
+
+    Changes of these counts are recorded by DB triggers and folded into the
+    count tables by the scheduler, this command is only needed to recover
+    from a manual edit of the count tables.
+    """
+    from robotoff.models import db
+    from robotoff.models import rebuild_insight_counts as _rebuild_insight_counts
+    from robotoff.utils import get_logger
+
+    logger = get_logger()
+
+    with db.connection_context():
+        _rebuild_insight_counts()
+    logger.info("Insight counts rebuilt")
+
+
 @app.command()
 def create_migration(
     name: str = typer.Argument(..., help="name of the migration"),
@@ -78,3 +78,53 @@ def download_models():
 
     get_logger()
     triton.download_models()
+
+
+@app.command()
+def serve_stand_in(
+    port: int = typer.Option(8001, help="Port to listen on"),
+    latency: float = typer.Option(
+        0.0, help="Fixed latency of each inference request, in seconds"
+    ),
+    latency_per_item: float = typer.Option(
+        0.0, help="Additional latency per batch item, in seconds"
+    ),
+    jitter: float = typer.Option(
+        0.0,
+        help="Relative random variation of the latency (0.1 means +/- 10%)",
+    ),
+    instance_count: int = typer.Option(
+        1, help="Number of requests processed concurrently by each model"
+    ),
+    max_workers: int = typer.Option(16, help="Number of gRPC worker threads"),
+):
+    """Start a Triton stand-in server, serving all Robotoff models with
+    deterministic synthetic outputs.
+
+    This is useful for load and performance testing without GPU or model
+    files: set `DEFAULT_TRITON_URI` to `localhost:PORT` to use it. Statistics
+    about inference requests are displayed on shutdown.
+    """
+    from robotoff.triton_stand_in import LatencyConfig, start_stand_in_server
+    from robotoff.utils import get_logger
+
+    get_logger()
+    server, servicer, port = start_stand_in_server(
+        f"[::]:{port}",
+        latency=LatencyConfig(base=latency, per_item=latency_per_item, jitter=jitter),
+        instance_count=instance_count,
+        max_workers=max_workers,
+    )
+    typer.echo(f"Triton stand-in server listening on port {port}")
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        server.stop(grace=None)
+
+    for model_name, stats in servicer.stats.items():
+        if stats.requests or stats.failures:
+            typer.echo(
+                f"{model_name}: {stats.requests} requests, {stats.items} items, "
+                f"{stats.failures} failures, "
+                f"{stats.inference_time / max(stats.requests, 1):.4f}s per request"
+            )
@@ -1,22 +1,117 @@
+import copy
+import datetime
 import logging
 
+from elastic_transport import Urllib3HttpNode
 from elasticsearch import Elasticsearch
 
 from robotoff import settings
 from robotoff.types import ElasticSearchIndex
+from robotoff.utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
 
+class TracedHttpNode(Urllib3HttpNode):
+    """Elasticsearch HTTP node that records a span for every request when
+    tracing is enabled."""
+
+    def perform_request(self, method, target, *args, **kwargs):
+        with span(f"{method} {target.split('?', 1)[0]}", "elasticsearch") as span_args:
+            response = super().perform_request(method, target, *args, **kwargs)
+            span_args["status_code"] = response.meta.status
+            return response
+
+
 def get_es_client() -> Elasticsearch:
     return Elasticsearch(
         f"http://{settings.ELASTIC_USER}:{settings.ELASTIC_PASSWORD}@{settings.ELASTIC_HOST}:9200",
         request_timeout=20,  # we might have long running queries
+        node_class=TracedHttpNode,
     )
 
 
-ES_INDEX_CONFIGS: dict[ElasticSearchIndex, dict] = {
-    ElasticSearchIndex.logo: {
+# Dimension of the logo embeddings (CLIP)
+LOGO_EMBEDDING_DIM = 512
+
+# Supported vector index types, mapped to the number of bytes used by each
+# vector dimension in the vector index (memory usage is dominated by this
+# value)
+VECTOR_INDEX_TYPES: dict[str, float] = {
+    "hnsw": 4,
+    "int8_hnsw": 1,
+    "int4_hnsw": 0.5,
+    "bbq_hnsw": 0.125,
+}
+
+# Minimum Elasticsearch version (major, minor) of the quantized vector index
+# types
+VECTOR_INDEX_MIN_VERSIONS: dict[str, tuple[int, int]] = {
+    "int8_hnsw": (8, 12),
+    "int4_hnsw": (8, 15),
+    "bbq_hnsw": (8, 16),
+}
+
+
+def check_vector_index_support(es_client: Elasticsearch, index_config: dict) -> None:
+    """Check that the Elasticsearch cluster supports the vector index types
+    used in `index_config`.
+
+    Older clusters reject unknown vector index types with an obscure mapping
+    error, so we fail early with a clearer message.
+
+    :param es_client: Elasticsearch client
+    :param index_config: the index configuration (settings and mappings)
+    :raises RuntimeError: if a vector index type is not supported by the
+        cluster
+    """
+    index_types = {
+        field["index_options"]["type"]
+        for field in index_config.get("mappings", {}).get("properties", {}).values()
+        if field.get("type") == "dense_vector" and "index_options" in field
+    }
+    required = {
+        index_type: VECTOR_INDEX_MIN_VERSIONS[index_type]
+        for index_type in index_types
+        if index_type in VECTOR_INDEX_MIN_VERSIONS
+    }
+    if not required:
+        return
+
+    version_number = es_client.info()["version"]["number"]
+    version = tuple(int(part) for part in version_number.split("-")[0].split(".")[:2])
+    for index_type, min_version in required.items():
+        if version < min_version:
+            raise RuntimeError(
+                f"vector index type {index_type} requires Elasticsearch >= "
+                f"{min_version[0]}.{min_version[1]}, but the cluster runs "
+                f"{version_number}: upgrade Elasticsearch or use another index "
+                "type (see ELASTIC_LOGO_VECTOR_INDEX_TYPE)"
+            )
+
+
+def get_logo_index_config(
+    index_type: str = settings.ELASTIC_LOGO_VECTOR_INDEX_TYPE,
+    m: int = 16,
+    ef_construction: int = 100,
+) -> dict:
+    """Return the configuration (settings and mappings) of the logo index.
+
+    :param index_type: the type of the vector index, see `VECTOR_INDEX_TYPES`
+        for possible values. Quantized indices (all types except `hnsw`) keep
+        the float vectors on disk, but only the quantized vectors need to fit
+        in memory.
+    :param m: number of neighbors of each node in the HNSW graph
+    :param ef_construction: number of candidates considered when building
+        the HNSW graph
+    :return: the index configuration
+    """
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(
+            f"unknown vector index type: {index_type}, expected one of "
+            f"{list(VECTOR_INDEX_TYPES)}"
+        )
+    return {
         "settings": {
             "number_of_shards": 1,
             "number_of_replicas": 0,
@@ -25,15 +120,45 @@ ES_INDEX_CONFIGS: dict[ElasticSearchIndex, dict] = {
             "properties": {
                 "embedding": {
                     "type": "dense_vector",
-                    "dims": 512,
+                    "dims": LOGO_EMBEDDING_DIM,
                     "index": True,
                     "similarity": "dot_product",
-                    "index_options": {"type": "hnsw", "m": 16, "ef_construction": 100},
+                    "index_options": {
+                        "type": index_type,
+                        "m": m,
+                        "ef_construction": ef_construction,
+                    },
                 },
                 "server_type": {"type": "keyword"},
             },
         },
-    },
+    }
+
+
+def estimate_vector_index_memory(
+    index_type: str,
+    num_vectors: int,
+    dims: int = LOGO_EMBEDDING_DIM,
+    m: int = 16,
+) -> int:
+    """Estimate the memory (in bytes) required to keep the vector index in
+    the page cache, following the Elasticsearch sizing guidelines.
+
+    :param index_type: the type of the vector index
+    :param num_vectors: number of indexed vectors
+    :param dims: dimension of the vectors
+    :param m: number of neighbors of each node in the HNSW graph
+    """
+    # Quantized vectors are stored with a float correction term, and the
+    # HNSW graph stores `m` neighbor IDs (int32) for each vector
+    correction = 0 if index_type == "hnsw" else 4
+    return int(
+        num_vectors * (dims * VECTOR_INDEX_TYPES[index_type] + correction + 4 * m)
+    )
+
+
+ES_INDEX_CONFIGS: dict[ElasticSearchIndex, dict] = {
+    ElasticSearchIndex.logo: get_logo_index_config(),
 }
 
 
@@ -47,9 +172,82 @@ class ElasticsearchExporter:
         """Creates the given index if it doesn't already exist."""
         if not self.es_client.indices.exists(index=index):
             logger.info("Creating index: %s", index)
+            check_vector_index_support(self.es_client, ES_INDEX_CONFIGS[index])
             self.es_client.indices.create(index=index, **ES_INDEX_CONFIGS[index])
 
     def load_all_indices(self) -> None:
         """Create all ES indices if they do not already exist."""
         for index in ES_INDEX_CONFIGS:
             self.load_index(index)
+
+    def create_index_version(
+        self, index: ElasticSearchIndex, index_config: dict | None = None
+    ) -> str:
+        """Create a new timestamped index for `index` (ex: `logo-20240101120000`),
+        to be populated before being exposed with `swap_alias`.
+
+        Refresh is disabled on the new index to speed up bulk indexing, it's
+        enabled again by `swap_alias`.
+
+        :param index: the index
+        :param index_config: the index configuration, defaults to the one in
+            `ES_INDEX_CONFIGS`
+        :return: the name of the created index
+        :raises RuntimeError: if the cluster doesn't support the vector index
+            type of the configuration
+        """
+        index_config = copy.deepcopy(index_config or ES_INDEX_CONFIGS[index])
+        check_vector_index_support(self.es_client, index_config)
+        index_config["settings"]["refresh_interval"] = "-1"
+        index_name = (
+            f"{index.value}-{datetime.datetime.now(datetime.timezone.utc):%Y%m%d%H%M%S}"
+        )
+        logger.info("Creating index: %s", index_name)
+        self.es_client.indices.create(index=index_name, **index_config)
+        return index_name
+
+    def swap_alias(
+        self, index: ElasticSearchIndex, index_name: str, delete_previous: bool = True
+    ) -> list[str]:
+        """Atomically point the `index` alias to `index_name`.
+
+        If `index` is a concrete index (and not an alias), it's deleted in the
+        same atomic operation, so that searches on `index` are never
+        interrupted.
+
+        :param index: the index (alias name)
+        :param index_name: the name of the concrete index the alias should
+            point to
+        :param delete_previous: if True, delete the indices the alias pointed
+            to before
+        :return: the names of the indices the alias pointed to before
+        """
+        self.es_client.indices.put_settings(
+            index=index_name, settings={"index": {"refresh_interval": None}}
+        )
+        self.es_client.indices.refresh(index=index_name)
+
+        actions: list[dict] = []
+        previous_indices: list[str] = []
+        if self.es_client.indices.exists_alias(name=index.value):
+            previous_indices = list(
+                self.es_client.indices.get_alias(name=index.value).keys()
+            )
+            actions += [
+                {"remove": {"index": previous_index, "alias": index.value}}
+                for previous_index in previous_indices
+            ]
+        elif self.es_client.indices.exists(index=index.value):
+            # `index` is a concrete index, created before aliases were used
+            actions.append({"remove_index": {"index": index.value}})
+
+        actions.append({"add": {"index": index_name, "alias": index.value}})
+        logger.info("Updating aliases: %s", actions)
+        self.es_client.indices.update_aliases(actions=actions)
+
+        if delete_previous:
+            for previous_index in previous_indices:
+                if previous_index != index_name:
+                    logger.info("Deleting index: %s", previous_index)
+                    self.es_client.indices.delete(index=previous_index)
+        return previous_indices
@@ -0,0 +1,344 @@
+"""Bulk storage of CLIP embeddings (`LogoEmbedding` and `ImageEmbedding`
+tables, in the `embedding` schema).
+
+Embeddings are loaded in batches with PostgreSQL `COPY` into a temporary
+staging table, and moved to the destination table with a single
+`INSERT ... SELECT ... ON CONFLICT` statement per batch. Rows whose parent
+(logo or image) doesn't exist are skipped. Each batch is committed
+separately, so that an interrupted import can be resumed from the last
+committed batch.
+"""
+
+import dataclasses
+import io
+import logging
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Type
+
+import numpy as np
+import orjson
+from more_itertools import chunked
+
+from robotoff.models import ImageEmbedding, LogoEmbedding, db
+
+logger = logging.getLogger(__name__)
+
+EmbeddingModel = Type[LogoEmbedding] | Type[ImageEmbedding]
+
+# Dimension of the CLIP embeddings
+EMBEDDING_DIM = 512
+
+# Temporary table used to load embeddings with COPY, it's only visible to the
+# current DB connection
+STAGING_TABLE = "embedding_staging"
+
+# The staging rows are moved to the destination table with a single
+# statement. `DISTINCT ON` is required as a row can't be updated twice by
+# the same `INSERT ... ON CONFLICT DO UPDATE` statement. `xmax = 0` is true
+# for inserted rows and false for updated rows.
+_MOVE_STAGING_ROWS_QUERY = """
+INSERT INTO {table} ({key_column}, embedding)
+SELECT DISTINCT ON (s.id) s.id, s.embedding
+FROM {staging_table} AS s
+JOIN {parent_table} AS p ON p.id = s.id
+ORDER BY s.id
+ON CONFLICT ({key_column}) DO {conflict_action}
+RETURNING (xmax = 0) AS inserted;"""
+
+
+@dataclasses.dataclass
+class EmbeddingImportResult:
+    #: number of embeddings created
+    created: int = 0
+    #: number of existing embeddings that were updated
+    updated: int = 0
+    #: number of embeddings that already existed and were left untouched
+    skipped: int = 0
+    #: number of embeddings whose logo or image was not found
+    not_found: int = 0
+    #: number of null (all-zero) embeddings that were ignored
+    null: int = 0
+
+    def __iadd__(self, other: "EmbeddingImportResult") -> "EmbeddingImportResult":
+        for field in dataclasses.fields(self):
+            setattr(
+                self, field.name, getattr(self, field.name) + getattr(other, field.name)
+            )
+        return self
+
+
+def _get_table_name(model) -> str:
+    schema = model._meta.schema
+    table_name = model._meta.table_name
+    return f'"{schema}"."{table_name}"' if schema else f'"{table_name}"'
+
+
+def _create_staging_table() -> None:
+    db.execute_sql(
+        f"""CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+            id BIGINT NOT NULL,
+            embedding BYTEA NOT NULL
+        );"""
+    )
+
+
+def check_embedding(id_: int, embedding: np.ndarray) -> None:
+    """Check that an embedding is a float32 vector of dimension
+    `EMBEDDING_DIM`, as embeddings are stored as raw bytes.
+
+    :param id_: the logo or image ID, used in the error message
+    :param embedding: the embedding to check
+    :raises ValueError: if the embedding is not valid
+    """
+    if embedding.shape != (EMBEDDING_DIM,):
+        raise ValueError(
+            f"invalid embedding shape for ID {id_}: {embedding.shape}, "
+            f"expected ({EMBEDDING_DIM},)"
+        )
+    if embedding.dtype != np.float32:
+        raise ValueError(
+            f"invalid embedding dtype for ID {id_}: {embedding.dtype}, expected float32"
+        )
+
+
+def save_embedding_batch(
+    model: EmbeddingModel,
+    embeddings: list[tuple[int, np.ndarray]],
+    update_if_exists: bool = False,
+) -> EmbeddingImportResult:
+    """Save a batch of embeddings using `COPY`, in the current transaction.
+
+    :param model: the embedding model, either `LogoEmbedding` or
+        `ImageEmbedding`
+    :param embeddings: (logo or image ID, float32 embedding) tuples, items
+        with a null ID and null (all-zero) embeddings are ignored
+    :param update_if_exists: if True, embeddings that already exist are
+        updated, otherwise they are left untouched
+    :return: the import result of the batch
+    :raises ValueError: if an embedding doesn't have the expected shape or
+        dtype (see `check_embedding`), nothing is saved in this case
+    """
+    valid_embeddings = []
+    null_ids = []
+    for id_, embedding in embeddings:
+        # HDF5 datasets are often preallocated, with null IDs for unused rows
+        if id_ <= 0:
+            continue
+        check_embedding(id_, embedding)
+        if not embedding.any():
+            null_ids.append(id_)
+            continue
+        valid_embeddings.append((id_, embedding))
+
+    if null_ids:
+        logger.warning(
+            "%d null embeddings ignored, IDs: %s", len(null_ids), null_ids[:10]
+        )
+    embeddings = valid_embeddings
+    if not embeddings:
+        return EmbeddingImportResult(null=len(null_ids))
+
+    key_field = model._meta.primary_key
+    _create_staging_table()
+    db.execute_sql(f"TRUNCATE {STAGING_TABLE};")
+
+    # COPY text format, bytea values are hex-encoded
+    buffer = io.StringIO()
+    for id_, embedding in embeddings:
+        buffer.write(f"{int(id_)}\t\\\\x{embedding.tobytes().hex()}\n")
+    buffer.seek(0)
+    with db.cursor() as cursor:
+        cursor.copy_expert(f"COPY {STAGING_TABLE} (id, embedding) FROM STDIN", buffer)
+
+    conflict_action = (
+        "UPDATE SET embedding = EXCLUDED.embedding" if update_if_exists else "NOTHING"
+    )
+    cursor = db.execute_sql(
+        _MOVE_STAGING_ROWS_QUERY.format(
+            table=_get_table_name(model),
+            key_column=key_field.column_name,
+            staging_table=STAGING_TABLE,
+            parent_table=_get_table_name(key_field.rel_model),
+            conflict_action=conflict_action,
+        )
+    )
+    inserted = [row[0] for row in cursor.fetchall()]
+    found = db.execute_sql(
+        f"SELECT count(DISTINCT s.id) FROM {STAGING_TABLE} AS s "
+        f"JOIN {_get_table_name(key_field.rel_model)} AS p ON p.id = s.id;"
+    ).fetchone()[0]
+    created = sum(inserted)
+    updated = len(inserted) - created
+    return EmbeddingImportResult(
+        created=created,
+        updated=updated,
+        skipped=found - created - updated,
+        not_found=len({id_ for id_, _ in embeddings}) - found,
+        null=len(null_ids),
+    )
+
+
+def save_embeddings(
+    model: EmbeddingModel,
+    embeddings: Iterable[tuple[int, np.ndarray]],
+    update_if_exists: bool = False,
+    batch_size: int = 5_000,
+    on_batch_saved: Callable[[int, EmbeddingImportResult], None] | None = None,
+) -> EmbeddingImportResult:
+    """Save embeddings in bulk, one transaction per batch.
+
+    :param model: the embedding model, either `LogoEmbedding` or
+        `ImageEmbedding`
+    :param embeddings: an iterable of (logo or image ID, float32 embedding)
+        tuples, it's consumed lazily so it can be larger than memory
+    :param update_if_exists: if True, embeddings that already exist are
+        updated, otherwise they are left untouched
+    :param batch_size: number of embeddings saved in each transaction
+    :param on_batch_saved: function called after each committed batch, with
+        the total number of embeddings consumed so far and the result of the
+        batch. It can be used to report progress or to save a checkpoint.
+    :return: the import result
+    """
+    result = EmbeddingImportResult()
+    consumed = 0
+    for batch in chunked(embeddings, batch_size):
+        with db.atomic():
+            batch_result = save_embedding_batch(model, batch, update_if_exists)
+        result += batch_result
+        consumed += len(batch)
+        logger.debug("%d embeddings saved: %s", consumed, result)
+        if on_batch_saved is not None:
+            on_batch_saved(consumed, batch_result)
+    return result
+
+
+def iter_hdf5_embeddings(
+    file_path: Path,
+    embedding_dataset_name: str = "embedding",
+    id_dataset_name: str = "logo_id",
+    start: int = 0,
+    chunk_size: int = 10_000,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Iterate over the (ID, embedding) pairs stored in an HDF5 file.
+
+    The datasets are read by chunks of `chunk_size` rows. All rows are
+    returned, including rows with a null ID (HDF5 datasets are often
+    preallocated), so that the number of consumed items is the index of the
+    next row to read. Null IDs are ignored by `save_embeddings`.
+
+    :param file_path: path of the HDF5 file
+    :param embedding_dataset_name: name of the embedding dataset
+    :param id_dataset_name: name of the ID dataset
+    :param start: index of the first row to read, used to resume an import
+    :param chunk_size: number of rows read at once
+    """
+    import h5py
+
+    with h5py.File(file_path, "r") as f:
+        embedding_dataset = f[embedding_dataset_name]
+        id_dataset = f[id_dataset_name]
+        for offset in range(start, len(id_dataset), chunk_size):
+            ids = id_dataset[offset : offset + chunk_size]
+            embeddings = embedding_dataset[offset : offset + chunk_size]
+            for id_, embedding in zip(ids, embeddings):
+                yield int(id_), embedding
+
+
+def iter_numpy_embeddings(
+    file_path: Path,
+    embedding_array_name: str = "embedding",
+    id_array_name: str = "logo_id",
+    start: int = 0,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Iterate over the (ID, embedding) pairs stored in a numpy `.npz`
+    archive, see `iter_hdf5_embeddings`.
+
+    :param file_path: path of the `.npz` file
+    :param embedding_array_name: name of the embedding array
+    :param id_array_name: name of the ID array
+    :param start: index of the first row to read, used to resume an import
+    """
+    with np.load(file_path) as data:
+        ids = data[id_array_name]
+        embeddings = data[embedding_array_name]
+        for id_, embedding in zip(ids[start:], embeddings[start:]):
+            yield int(id_), embedding
+
+
+def import_embeddings_from_file(
+    model: EmbeddingModel,
+    input_path: Path,
+    embedding_name: str = "embedding",
+    id_name: str = "logo_id",
+    update_if_exists: bool = False,
+    batch_size: int = 5_000,
+    checkpoint_path: Path | None = None,
+) -> EmbeddingImportResult:
+    """Import embeddings from an HDF5 (`.h5`, `.hdf5`) or a numpy (`.npz`)
+    file.
+
+    If `checkpoint_path` is provided, the index of the next row to import is
+    saved in this file after each committed batch, and the import starts
+    from this index if the file exists. The checkpoint file is deleted once
+    the import is complete.
+
+    :param model: the embedding model, either `LogoEmbedding` or
+        `ImageEmbedding`
+    :param input_path: path of the input file
+    :param embedding_name: name of the embedding dataset/array
+    :param id_name: name of the logo/image ID dataset/array
+    :param update_if_exists: if True, embeddings that already exist are
+        updated, otherwise they are left untouched
+    :param batch_size: number of embeddings saved in each transaction
+    :param checkpoint_path: path of the checkpoint file, optional
+    :return: the import result
+    """
+    import tqdm
+
+    start = 0
+    if checkpoint_path is not None and checkpoint_path.exists():
+        checkpoint = orjson.loads(checkpoint_path.read_bytes())
+        if checkpoint["input_path"] != str(input_path):
+            raise ValueError(
+                f"checkpoint {checkpoint_path} was created for another input file: "
+                f"{checkpoint['input_path']}"
+            )
+        start = checkpoint["offset"]
+        logger.info("Resuming import from row %d", start)
+
+    if input_path.suffix == ".npz":
+        embeddings = iter_numpy_embeddings(input_path, embedding_name, id_name, start)
+    elif input_path.suffix in (".h5", ".hdf5"):
+        embeddings = iter_hdf5_embeddings(input_path, embedding_name, id_name, start)
+    else:
+        raise ValueError(f"unsupported file format: {input_path.suffix}")
+
+    progress = EmbeddingImportResult()
+    pbar = tqdm.tqdm(desc="embedding", initial=start, unit="row")
+
+    def on_batch_saved(consumed: int, batch_result: EmbeddingImportResult) -> None:
+        nonlocal progress
+        progress += batch_result
+        pbar.update(start + consumed - pbar.n)
+        pbar.set_postfix(dataclasses.asdict(progress))
+        if checkpoint_path is not None:
+            checkpoint_path.write_bytes(
+                orjson.dumps(
+                    {"input_path": str(input_path), "offset": start + consumed}
+                )
+            )
+
+    try:
+        result = save_embeddings(
+            model,
+            embeddings,
+            update_if_exists=update_if_exists,
+            batch_size=batch_size,
+            on_batch_saved=on_batch_saved,
+        )
+    finally:
+        pbar.close()
+
+    if checkpoint_path is not None:
+        checkpoint_path.unlink(missing_ok=True)
+    return result
@@ -1,10 +1,14 @@
+import dataclasses
 import datetime
 import logging
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Iterator
 
 import imagehash
 import numpy as np
+import orjson
 from PIL import Image
 
 from robotoff.elasticsearch import get_es_client
@@ -16,9 +20,10 @@ from robotoff.models import (
     LogoEmbedding,
     Prediction,
     ProductInsight,
+    db,
 )
 from robotoff.off import generate_image_path, generate_image_url
-from robotoff.types import JSONType, ProductIdentifier
+from robotoff.types import JSONType, ProductIdentifier, ServerType
 from robotoff.utils import get_image_from_url, http_session
 
 logger = logging.getLogger(__name__)
@@ -162,11 +167,26 @@ def add_image_fingerprint(image_model: ImageModel, overwrite: bool = False) -> N
         logger.debug("image %s already has a fingerprint, skipping", image_model.id)
         return
 
-    image_url = image_model.get_image_url()
+    fingerprint = fetch_image_fingerprint(image_model.get_image_url())
+    if fingerprint is None:
+        return
+
+    image_model.fingerprint = fingerprint
+    ImageModel.bulk_update([image_model], fields=["fingerprint"])
+
+
+def fetch_image_fingerprint(image_url: str, use_cache: bool = True) -> int | None:
+    """Download an image and return its fingerprint.
+
+    :param image_url: the URL of the image
+    :param use_cache: whether to use the local file cache when fetching the
+        image
+    :return: the fingerprint, or None if the image could not be fetched
+    """
     image = typing.cast(
         Image.Image | None,
         get_image_from_url(
-            image_url, error_raise=False, session=http_session, use_cache=True
+            image_url, error_raise=False, session=http_session, use_cache=use_cache
         ),
     )
 
@@ -174,10 +194,9 @@ def add_image_fingerprint(image_model: ImageModel, overwrite: bool = False) -> N
         logger.info(
             "could not fetch image from %s, aborting image fingerprinting", image_url
         )
-        return
+        return None
 
-    image_model.fingerprint = generate_image_fingerprint(image)
-    ImageModel.bulk_update([image_model], fields=["fingerprint"])
+    return generate_image_fingerprint(image)
 
 
 def generate_image_fingerprint(image: Image.Image) -> int:
@@ -197,6 +216,157 @@ def generate_image_fingerprint(image: Image.Image) -> int:
     return fingerprint
 
 
+@dataclasses.dataclass
+class FingerprintBackfillResult:
+    #: number of images whose fingerprint was saved
+    processed: int = 0
+    #: number of images that could not be fetched or fingerprinted
+    failed: int = 0
+    #: ID of the last image considered, the next run starts after it
+    last_id: int = 0
+
+
+def iter_images_without_fingerprint(
+    server_type: ServerType | None = None,
+    start_id: int = 0,
+    batch_size: int = 500,
+) -> Iterator[list[ImageModel]]:
+    """Iterate over non-deleted images without fingerprint, by batches of
+    increasing image ID.
+
+    Batches are fetched with keyset pagination on the image ID, so that
+    each query is fast, whatever the position in the table.
+
+    :param server_type: only return images of this server type, optional
+    :param start_id: only return images with an ID strictly greater than
+        `start_id`
+    :param batch_size: number of images in each batch
+    :return: an iterator of image batches
+    """
+    where_clauses = [
+        ImageModel.fingerprint.is_null(),
+        ImageModel.deleted == False,  # noqa: E712
+    ]
+    if server_type is not None:
+        where_clauses.append(ImageModel.server_type == server_type.name)
+
+    last_id = start_id
+    while True:
+        batch = list(
+            ImageModel.select(
+                ImageModel.id,
+                ImageModel.barcode,
+                ImageModel.source_image,
+                ImageModel.server_type,
+            )
+            .where(ImageModel.id > last_id, *where_clauses)
+            .order_by(ImageModel.id)
+            .limit(batch_size)
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def backfill_image_fingerprints(
+    server_type: ServerType | None = None,
+    batch_size: int = 500,
+    num_workers: int = 16,
+    checkpoint_path: Path | None = None,
+    limit: int | None = None,
+    on_batch_saved: Callable[[FingerprintBackfillResult], None] | None = None,
+) -> FingerprintBackfillResult:
+    """Compute and save the fingerprint of all images that don't have one
+    yet (images imported in bulk or before fingerprinting existed).
+
+    Images are fetched from the DB by batches of `batch_size`, the images of
+    a batch are downloaded and hashed by a pool of `num_workers` threads,
+    and the fingerprints of the batch are saved with a single bulk update.
+
+    If `checkpoint_path` is provided, the ID of the last image of each saved
+    batch is written in this file, and the backfill starts after this ID if
+    the file exists, so that images that could not be fetched are not
+    retried. The checkpoint file is deleted once all images are processed
+    (it's kept if `limit` is provided).
+
+    :param server_type: only fingerprint images of this server type,
+        optional
+    :param batch_size: number of images fingerprinted and saved together
+    :param num_workers: maximum number of images downloaded concurrently
+    :param checkpoint_path: path of the checkpoint file, optional
+    :param limit: maximum number of images to consider (at least 1),
+        optional
+    :param on_batch_saved: function called with the current result after
+        each saved batch, it can be used to report progress
+    :return: the backfill result
+    """
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit must be at least 1, got {limit}")
+
+    server_type_name = server_type.name if server_type is not None else None
+    start_id = 0
+    if checkpoint_path is not None and checkpoint_path.exists():
+        checkpoint = orjson.loads(checkpoint_path.read_bytes())
+        if checkpoint["server_type"] != server_type_name:
+            raise ValueError(
+                f"checkpoint {checkpoint_path} was created for another server type: "
+                f"{checkpoint['server_type']}"
+            )
+        start_id = checkpoint["last_id"]
+        logger.info("Resuming fingerprint backfill after image ID %d", start_id)
+
+    result = FingerprintBackfillResult(last_id=start_id)
+    remaining = limit
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for batch in iter_images_without_fingerprint(server_type, start_id, batch_size):
+            if remaining is not None:
+                batch = batch[:remaining]
+                remaining -= len(batch)
+
+            fingerprints = executor.map(_backfill_image_fingerprint, batch)
+            to_update = []
+            for image_model, fingerprint in zip(batch, fingerprints):
+                if fingerprint is None:
+                    result.failed += 1
+                else:
+                    image_model.fingerprint = fingerprint
+                    to_update.append(image_model)
+
+            if to_update:
+                with db.atomic():
+                    ImageModel.bulk_update(to_update, fields=["fingerprint"])
+            result.processed += len(to_update)
+            result.last_id = batch[-1].id
+
+            if checkpoint_path is not None:
+                checkpoint_path.write_bytes(
+                    orjson.dumps(
+                        {"server_type": server_type_name, "last_id": result.last_id}
+                    )
+                )
+            if on_batch_saved is not None:
+                on_batch_saved(result)
+            if remaining == 0:
+                break
+
+    if checkpoint_path is not None and limit is None:
+        # All images were processed
+        checkpoint_path.unlink(missing_ok=True)
+    return result
+
+
+def _backfill_image_fingerprint(image_model: ImageModel) -> int | None:
+    try:
+        # The backfill reads each image once, don't fill the local cache
+        return fetch_image_fingerprint(image_model.get_image_url(), use_cache=False)
+    except Exception as e:
+        logger.info(
+            "Error while fingerprinting image %s", image_model.source_image, exc_info=e
+        )
+        return None
+
+
 def delete_images(product_id: ProductIdentifier, image_ids: list[str]):
     """Delete images and related items in DB.
 
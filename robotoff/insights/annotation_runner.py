@@ -0,0 +1,273 @@
+"""Automatic annotation of the insights that are eligible for automatic
+processing (`ProductInsight.process_after` is in the past).
+
+Insights are grouped by product, and products are processed concurrently by a
+pool of threads: all the insights of a product are handled by the same thread,
+so that a product is never updated concurrently by Robotoff. Insights that
+only add a value to a taxonomized field of the product (categories, labels,
+brands, stores) are merged into a single Product Opener write request.
+
+Write requests are rate limited per Product Opener server, and retried with
+an exponential backoff if they fail with a transient error (5XX, connection
+error, timeout).
+"""
+
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable
+
+import backoff
+from requests.exceptions import ConnectionError as RequestConnectionError
+from requests.exceptions import HTTPError, SSLError, Timeout
+
+from robotoff import off, settings
+from robotoff.insights.annotate import (
+    ANNOTATOR_MAPPING,
+    AnnotationResult,
+    AnnotationStatus,
+)
+from robotoff.insights.importer import refresh_insights
+from robotoff.models import ProductInsight, db
+from robotoff.types import InsightType, ProductIdentifier, ServerType
+from robotoff.utils.rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Insight types whose annotation only sends `add_*` fields to Product Opener,
+# so that all the insights of these types targeting the same product can be
+# sent in a single write request
+BATCHED_INSIGHT_TYPES = {
+    InsightType.category.name,
+    InsightType.label.name,
+    InsightType.brand.name,
+    InsightType.store.name,
+}
+
+TRANSIENT_ERRORS = (HTTPError, RequestConnectionError, Timeout, SSLError)
+
+
+def _is_permanent_error(e: Exception) -> bool:
+    """Return True if the error is not worth retrying (4XX HTTP errors)."""
+    return (
+        isinstance(e, HTTPError)
+        and e.response is not None
+        and e.response.status_code < 500
+    )
+
+
+def _is_failed_update(result: AnnotationResult) -> bool:
+    return result.status_code == AnnotationStatus.error_failed_update.value
+
+
+def _log_backoff(details) -> None:
+    logger.info(
+        "Product update failed (attempt %d), retrying in %.1f seconds",
+        details["tries"],
+        details["wait"],
+    )
+
+
+class AnnotationRunner:
+    """Annotate insights automatically, with bounded concurrency.
+
+    :param max_workers: the number of products processed concurrently,
+        defaults to `settings.ANNOTATION_MAX_WORKERS`
+    :param rate_limit: the maximum number of write requests per second sent
+        to each Product Opener server, defaults to
+        `settings.ANNOTATION_RATE_LIMIT`
+    """
+
+    def __init__(self, max_workers: int | None = None, rate_limit: float | None = None):
+        self.max_workers = (
+            settings.ANNOTATION_MAX_WORKERS if max_workers is None else max_workers
+        )
+        self.rate_limiter = RateLimiter(
+            settings.ANNOTATION_RATE_LIMIT if rate_limit is None else rate_limit
+        )
+
+    def run(self, insights: Iterable[ProductInsight]) -> dict[str, int]:
+        """Annotate (with `annotation=1`) the provided insights.
+
+        Insights whose annotation failed are left untouched in DB, so that
+        they are processed again during the next run.
+
+        :param insights: the insights to annotate
+        :return: the number of processed and failed insights, and the number
+            of write requests sent to Product Opener
+        """
+        insights_by_product: dict[ProductIdentifier, list[ProductInsight]] = (
+            defaultdict(list)
+        )
+        for insight in insights:
+            insights_by_product[insight.get_product_id()].append(insight)
+
+        stats: Counter[str] = Counter()
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            futures = {
+                executor.submit(
+                    self.process_product, product_id, product_insights
+                ): product_id
+                for product_id, product_insights in insights_by_product.items()
+            }
+            for future in as_completed(futures):
+                product_id = futures[future]
+                try:
+                    stats.update(future.result())
+                except Exception:
+                    logger.exception(
+                        "Error while processing insights of product %s", product_id
+                    )
+                    stats["failed"] += len(insights_by_product[product_id])
+
+        return {
+            "processed": stats["processed"],
+            "failed": stats["failed"],
+            "product_updates": stats["product_updates"],
+        }
+
+    def process_product(
+        self, product_id: ProductIdentifier, insights: list[ProductInsight]
+    ) -> Counter[str]:
+        """Annotate all the insights of a single product.
+
+        This is called from the worker threads, each call uses its own DB
+        connection.
+
+        :param product_id: identifier of the product
+        :param insights: the insights of the product to annotate
+        :return: the processing statistics
+        """
+        stats: Counter[str] = Counter()
+        with db.connection_context():
+            batched = []
+            for insight in insights:
+                if insight.type in BATCHED_INSIGHT_TYPES:
+                    batched.append(insight)
+                else:
+                    stats.update(self.annotate_insight(insight))
+
+            if batched:
+                stats.update(self.annotate_batch(product_id, batched))
+
+            if stats["processed"]:
+                # Refresh the insights once all annotations of the product
+                # are saved
+                for import_result in refresh_insights(product_id):
+                    logger.info(import_result)
+        return stats
+
+    def annotate_insight(self, insight: ProductInsight) -> Counter[str]:
+        """Annotate a single insight, retrying if the update fails with a
+        transient error.
+
+        :param insight: the insight to annotate
+        :return: the processing statistics
+        """
+        logger.info("Annotating insight %s (%s)", insight.id, insight.get_product_id())
+        try:
+            result = self._annotate_with_retry(insight)
+        except Exception as e:
+            # The annotator already rolled back the transaction
+            logger.exception(
+                "exception %s while handling annotation of insight %s (%s)",
+                e,
+                insight.id,
+                insight.get_product_id(),
+            )
+            return Counter(failed=1)
+
+        if _is_failed_update(result):
+            return Counter(failed=1)
+        if result.status_code in (
+            AnnotationStatus.updated.value,
+            AnnotationStatus.user_input_updated.value,
+        ):
+            return Counter(processed=1, product_updates=1)
+        return Counter(processed=1)
+
+    @backoff.on_predicate(
+        backoff.expo,
+        _is_failed_update,
+        max_tries=lambda: settings.ANNOTATION_MAX_TRIES,
+        jitter=backoff.full_jitter,
+        on_backoff=_log_backoff,
+    )
+    def _annotate_with_retry(self, insight: ProductInsight) -> AnnotationResult:
+        self.rate_limiter.acquire(self.get_rate_limit_key(insight.server_type))
+        return ANNOTATOR_MAPPING[insight.type].annotate(insight, 1, update=True)
+
+    def annotate_batch(
+        self, product_id: ProductIdentifier, insights: list[ProductInsight]
+    ) -> Counter[str]:
+        """Annotate insights of the same product, sending the product updates
+        in as few requests as possible.
+
+        All the annotations are performed in a single SQL transaction, that
+        is rolled back if any of the product updates fails.
+
+        :param product_id: identifier of the product
+        :param insights: the insights to annotate, their type must belong to
+            `BATCHED_INSIGHT_TYPES`
+        :return: the processing statistics
+        """
+        stats: Counter[str] = Counter()
+        annotated = 0
+        with db.atomic() as tx:
+            with off.batch_product_updates() as batch:
+                for insight in insights:
+                    logger.info("Annotating insight %s (%s)", insight.id, product_id)
+                    try:
+                        ANNOTATOR_MAPPING[insight.type].annotate(
+                            insight, 1, update=True
+                        )
+                        annotated += 1
+                    except Exception as e:
+                        logger.exception(
+                            "exception %s while handling annotation of insight %s (%s)",
+                            e,
+                            insight.id,
+                            product_id,
+                        )
+                        stats["failed"] += 1
+
+            try:
+                for params, server_type, auth, kwargs in batch.requests:
+                    self._send_update(params, server_type, auth, **kwargs)
+                    stats["product_updates"] += 1
+            except Exception:
+                logger.exception(
+                    "Error while updating product %s, rolling back %d annotations",
+                    product_id,
+                    annotated,
+                )
+                tx.rollback()
+                stats["failed"] += annotated
+                return stats
+
+        stats["processed"] += annotated
+        return stats
+
+    @backoff.on_exception(
+        backoff.expo,
+        TRANSIENT_ERRORS,
+        max_tries=lambda: settings.ANNOTATION_MAX_TRIES,
+        giveup=_is_permanent_error,
+        jitter=backoff.full_jitter,
+        on_backoff=_log_backoff,
+    )
+    def _send_update(
+        self,
+        params: dict,
+        server_type: ServerType,
+        auth: off.OFFAuthentication | None,
+        **kwargs,
+    ) -> None:
+        self.rate_limiter.acquire(self.get_rate_limit_key(server_type))
+        # `update_product` adds the credentials to the parameters, don't
+        # keep them between attempts
+        off.update_product(dict(params), server_type=server_type, auth=auth, **kwargs)
+
+    @staticmethod
+    def get_rate_limit_key(server_type: ServerType | str) -> str:
+        return settings.BaseURLProvider.world(ServerType(server_type))
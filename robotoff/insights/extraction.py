@@ -8,10 +8,6 @@ from PIL import Image
 from robotoff.models import ImageModel, ImagePrediction
 from robotoff.off import get_source_from_url
 from robotoff.prediction import ocr
-from robotoff.prediction.object_detection import (
-    MODELS_CONFIG,
-    ObjectDetectionModelRegistry,
-)
 from robotoff.types import (
     ObjectDetectionModel,
     Prediction,
@@ -76,6 +72,13 @@ def run_object_detection_model(
     :return: return None if the image does not exist in DB, or the created
       `ImagePrediction` otherwise
     """
+    # Imported here as object detection depends on OpenCV, which is slow to
+    # import
+    from robotoff.prediction.object_detection import (
+        MODELS_CONFIG,
+        ObjectDetectionModelRegistry,
+    )
+
     if (
         existing_image_prediction := ImagePrediction.get_or_none(
             image=image_model, model_name=model_name.name
@@ -1,4 +1,5 @@
 import abc
+import functools
 import logging
 import pathlib
 
@@ -9,6 +10,7 @@ from robotoff.products import get_product
 from robotoff.taxonomy import Taxonomy, TaxonomyType, get_taxonomy
 from robotoff.types import InsightType, JSONType, ProductIdentifier
 from robotoff.utils import load_json
+from robotoff.utils.cache import function_cache_register
 from robotoff.utils.i18n import TranslationStore
 
 logger = logging.getLogger(__name__)
@@ -18,7 +20,11 @@ SMALL_IMAGE_SIZE = 200
 THUMB_IMAGE_SIZE = 100
 
 
-LABEL_IMAGES: dict[str, str] = load_json(settings.LABEL_LOGOS_PATH)  # type: ignore
+@functools.cache
+def get_label_images() -> dict[str, str]:
+    """Return a dict mapping label tags to the URL of a reference image of
+    the label."""
+    return load_json(settings.LABEL_LOGOS_PATH)  # type: ignore
 
 
 def generate_selected_images(
@@ -271,7 +277,7 @@ class LabelQuestionFormatter(QuestionFormatter):
 
     def format_question(self, insight: ProductInsight, lang: str) -> Question:
         value_tag: str = insight.value_tag
-        ref_image_url = LABEL_IMAGES.get(value_tag)
+        ref_image_url = get_label_images().get(value_tag)
 
         taxonomy: Taxonomy = get_taxonomy(TaxonomyType.label.name)
         localized_value: str = taxonomy.get_localized_name(value_tag, lang)
@@ -467,3 +473,6 @@ class QuestionFormatterFactory:
             InsightType.brand.name,
             InsightType.packaging.name,
         ]
+
+
+function_cache_register.register(get_label_images)
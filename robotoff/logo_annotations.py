@@ -0,0 +1,388 @@
+"""Index of logo annotations, used for logo label prediction (see
+`robotoff.logos.predict_proba_batch`).
+
+The index maps the ID of each annotated logo to its label. It's stored in
+Robotoff Redis, so that it's shared by all processes (API, workers,...),
+and kept up to date incrementally when logos are annotated through the API:
+
+- `LOGO_ANNOTATION_INDEX_KEY` is a hash mapping logo IDs to labels
+- `LOGO_ANNOTATION_VERSION_KEY` is incremented after each write
+- `LOGO_ANNOTATION_CHANGES_KEY` is a sorted set storing, for each logo ID,
+  the version of the last write that updated it
+
+Each process keeps a local copy of the index, and only fetches the logos that
+changed since its last synchronization. The index is built from the DB the
+first time it's used, and can be checked against the DB with
+`check_logo_annotation_index`.
+"""
+
+import dataclasses
+import functools
+import logging
+import uuid
+from typing import Iterable, Iterator
+
+import orjson
+from peewee import Expression
+from redis import Redis
+from redis.exceptions import RedisError
+
+from robotoff.models import LogoAnnotation
+from robotoff.redis import Lock, LockedResourceException, redis_conn
+from robotoff.types import LogoLabelType
+from robotoff.utils.cache import function_cache_register
+
+logger = logging.getLogger(__name__)
+
+LOGO_ANNOTATION_INDEX_KEY = "robotoff:logo-annotations"
+LOGO_ANNOTATION_VERSION_KEY = "robotoff:logo-annotations:version"
+LOGO_ANNOTATION_CHANGES_KEY = "robotoff:logo-annotations:changes"
+# Version of the last full build: processes whose local copy is older must
+# reload the full index
+LOGO_ANNOTATION_BUILD_VERSION_KEY = "robotoff:logo-annotations:build-version"
+
+
+def get_logo_label(
+    annotation_type: str | None,
+    annotation_value: str | None,
+    taxonomy_value: str | None,
+) -> LogoLabelType | None:
+    """Return the label of a logo used for label prediction, or None if the
+    logo should not be used (not annotated, or annotated with a value that
+    is not in the taxonomy)."""
+    if annotation_type is None:
+        return None
+    if annotation_value is None:
+        return (annotation_type, None)
+    if taxonomy_value is not None:
+        return (annotation_type, taxonomy_value)
+    return None
+
+
+def _get_annotated_logo_where_clause() -> Expression:
+    return LogoAnnotation.annotation_type.is_null(False) & (
+        LogoAnnotation.annotation_value.is_null()
+        | LogoAnnotation.taxonomy_value.is_null(False)
+    )
+
+
+def iter_logo_labels(
+    logo_ids: list[int] | None = None,
+) -> Iterator[tuple[int, LogoLabelType]]:
+    """Iterate over the labels of annotated logos stored in DB.
+
+    :param logo_ids: only return the labels of these logos, optional
+    :return: an iterator of (logo ID, label) tuples
+    """
+    where_clause = _get_annotated_logo_where_clause()
+    if logo_ids is not None:
+        where_clause &= LogoAnnotation.id.in_(logo_ids)
+    for logo_id, annotation_type, annotation_value, taxonomy_value in (
+        LogoAnnotation.select(
+            LogoAnnotation.id,
+            LogoAnnotation.annotation_type,
+            LogoAnnotation.annotation_value,
+            LogoAnnotation.taxonomy_value,
+        )
+        .where(where_clause)
+        .tuples()
+        .iterator()
+    ):
+        label = get_logo_label(annotation_type, annotation_value, taxonomy_value)
+        if label is not None:
+            yield logo_id, label
+
+
+def _serialize_label(label: LogoLabelType) -> bytes:
+    return orjson.dumps(label)
+
+
+def _deserialize_label(value: bytes) -> LogoLabelType:
+    annotation_type, annotation_value = orjson.loads(value)
+    return (annotation_type, annotation_value)
+
+
+@dataclasses.dataclass
+class LogoAnnotationIndexCheck:
+    #: number of annotated logos in DB
+    db_count: int
+    #: number of logos in the index
+    index_count: int
+    #: IDs of the sampled logos whose label differs between the DB and the
+    #: index
+    mismatched_ids: list[int]
+
+    @property
+    def is_consistent(self) -> bool:
+        return self.db_count == self.index_count and not self.mismatched_ids
+
+
+class LogoAnnotationIndex:
+    """A logo annotation index stored in Redis, with a local copy kept in
+    sync incrementally.
+
+    :param connection: the Redis connection
+    """
+
+    def __init__(self, connection: Redis):
+        self.connection = connection
+        self.annotations: dict[int, LogoLabelType] = {}
+        # Version of the local copy, None if it was never loaded
+        self.version: int | None = None
+
+    def get(self) -> dict[int, LogoLabelType]:
+        """Return the logo annotations, after synchronizing the local copy
+        with Redis.
+
+        If the index was never built and another process is still building
+        it, the labels are fetched from the DB, without updating the local
+        copy.
+
+        :return: a dict mapping logo IDs to labels
+        """
+        version, build_version = (
+            None if value is None else int(value)
+            for value in self.connection.mget(
+                LOGO_ANNOTATION_VERSION_KEY, LOGO_ANNOTATION_BUILD_VERSION_KEY
+            )
+        )
+        if build_version is None:
+            # The index was never built
+            if not self.build(force=False):
+                logger.info("Logo annotation index not available, using the DB")
+                return dict(iter_logo_labels())
+            self.load()
+        elif self.version is None or self.version < build_version:
+            self.load()
+        elif version is not None and version > self.version:
+            self.load_changes(version)
+        return self.annotations
+
+    def load(self) -> None:
+        """Load the full index from Redis."""
+        with self.connection.pipeline(transaction=True) as pipeline:
+            pipeline.get(LOGO_ANNOTATION_VERSION_KEY)
+            pipeline.hgetall(LOGO_ANNOTATION_INDEX_KEY)
+            version, items = pipeline.execute()
+        self.annotations = {
+            int(logo_id): _deserialize_label(value) for logo_id, value in items.items()
+        }
+        self.version = int(version or 0)
+        logger.info(
+            "Logo annotation index loaded: %d logos (version %d)",
+            len(self.annotations),
+            self.version,
+        )
+
+    def load_changes(self, version: int) -> None:
+        """Update the local copy with the logos that changed since the last
+        synchronization.
+
+        :param version: the current version of the index
+        """
+        changed_ids = self.connection.zrangebyscore(
+            LOGO_ANNOTATION_CHANGES_KEY, f"({self.version}", version
+        )
+        if changed_ids:
+            # If a logo was updated again in the meantime, we get the most
+            # recent label (and the logo will be fetched again on next
+            # synchronization)
+            values = self.connection.hmget(LOGO_ANNOTATION_INDEX_KEY, changed_ids)
+            for logo_id, value in zip(changed_ids, values):
+                if value is None:
+                    self.annotations.pop(int(logo_id), None)
+                else:
+                    self.annotations[int(logo_id)] = _deserialize_label(value)
+        logger.debug(
+            "%d logo annotations updated (version %s -> %s)",
+            len(changed_ids),
+            self.version,
+            version,
+        )
+        self.version = version
+
+    def update(self, labels: dict[int, LogoLabelType | None]) -> None:
+        """Update the label of logos in the index.
+
+        :param labels: a dict mapping logo IDs to their new label, or None if
+            the logo must be removed from the index
+        """
+        if not labels:
+            return
+
+        def _update(pipeline) -> None:
+            version = int(pipeline.get(LOGO_ANNOTATION_VERSION_KEY) or 0) + 1
+            pipeline.multi()
+            for logo_id, label in labels.items():
+                if label is None:
+                    pipeline.hdel(LOGO_ANNOTATION_INDEX_KEY, logo_id)
+                else:
+                    pipeline.hset(
+                        LOGO_ANNOTATION_INDEX_KEY, logo_id, _serialize_label(label)
+                    )
+            pipeline.zadd(
+                LOGO_ANNOTATION_CHANGES_KEY,
+                {str(logo_id): version for logo_id in labels},
+            )
+            pipeline.set(LOGO_ANNOTATION_VERSION_KEY, version)
+
+        # Optimistic locking: the transaction is retried if another process
+        # updated the index concurrently
+        self.connection.transaction(_update, LOGO_ANNOTATION_VERSION_KEY)
+
+    def build(self, force: bool = True, batch_size: int = 10_000) -> bool:
+        """Build the index from the DB.
+
+        The new index is written in a temporary key, and replaces the current
+        one atomically. Updates that happened during the build are applied
+        to the new index, so that they are not lost.
+
+        :param force: if False, the index is not built if it already exists
+            (ex: if it was built by another process while we were waiting for
+            the lock)
+        :param batch_size: number of logos written to Redis at once
+        :return: False if another process was still building the index after
+            waiting for the lock, True otherwise
+        """
+        try:
+            with Lock(name="robotoff:logo-annotations:build", timeout=300, expire=600):
+                if force or not self.connection.exists(
+                    LOGO_ANNOTATION_BUILD_VERSION_KEY
+                ):
+                    self._build(batch_size)
+        except LockedResourceException:
+            logger.warning("Logo annotation index is already being built")
+            return False
+        return True
+
+    def _build(self, batch_size: int) -> None:
+        start_version = int(self.connection.get(LOGO_ANNOTATION_VERSION_KEY) or 0)
+        tmp_key = f"{LOGO_ANNOTATION_INDEX_KEY}:tmp:{uuid.uuid4().hex}"
+        count = 0
+        batch: dict[int, bytes] = {}
+        for logo_id, label in iter_logo_labels():
+            batch[logo_id] = _serialize_label(label)
+            if len(batch) >= batch_size:
+                self.connection.hset(tmp_key, mapping=batch)  # type: ignore
+                count += len(batch)
+                batch = {}
+        if batch:
+            self.connection.hset(tmp_key, mapping=batch)  # type: ignore
+            count += len(batch)
+
+        def _swap(pipeline) -> None:
+            changed_ids = pipeline.zrangebyscore(
+                LOGO_ANNOTATION_CHANGES_KEY, f"({start_version}", "+inf"
+            )
+            values = (
+                pipeline.hmget(LOGO_ANNOTATION_INDEX_KEY, changed_ids)
+                if changed_ids
+                else []
+            )
+            version = int(pipeline.get(LOGO_ANNOTATION_VERSION_KEY) or 0) + 1
+            pipeline.multi()
+            for logo_id, value in zip(changed_ids, values):
+                if value is None:
+                    pipeline.hdel(tmp_key, logo_id)
+                else:
+                    pipeline.hset(tmp_key, logo_id, value)
+            if count or changed_ids:
+                pipeline.rename(tmp_key, LOGO_ANNOTATION_INDEX_KEY)
+            else:
+                pipeline.delete(LOGO_ANNOTATION_INDEX_KEY)
+            pipeline.set(LOGO_ANNOTATION_VERSION_KEY, version)
+            pipeline.set(LOGO_ANNOTATION_BUILD_VERSION_KEY, version)
+
+        try:
+            self.connection.transaction(_swap, LOGO_ANNOTATION_VERSION_KEY)
+        finally:
+            self.connection.delete(tmp_key)
+        logger.info("Logo annotation index built: %d logos", count)
+
+    def check(self, sample_size: int = 200) -> LogoAnnotationIndexCheck:
+        """Check the consistency of the index with the DB.
+
+        The number of annotated logos is compared, and the labels of a random
+        sample of logos of the index are compared with the labels in DB.
+
+        :param sample_size: number of logos to compare
+        :return: the result of the check
+        """
+        db_count = (
+            LogoAnnotation.select().where(_get_annotated_logo_where_clause()).count()
+        )
+        index_count = self.connection.hlen(LOGO_ANNOTATION_INDEX_KEY)
+        sample_ids = [
+            int(logo_id)
+            for logo_id in self.connection.hrandfield(
+                LOGO_ANNOTATION_INDEX_KEY, sample_size
+            )
+            or []
+        ]
+        mismatched_ids = []
+        if sample_ids:
+            index_labels = {
+                logo_id: _deserialize_label(value)
+                for logo_id, value in zip(
+                    sample_ids,
+                    self.connection.hmget(LOGO_ANNOTATION_INDEX_KEY, sample_ids),
+                )
+                if value is not None
+            }
+            db_labels = dict(iter_logo_labels(sample_ids))
+            mismatched_ids = sorted(
+                logo_id
+                for logo_id in sample_ids
+                if index_labels.get(logo_id) != db_labels.get(logo_id)
+            )
+        return LogoAnnotationIndexCheck(
+            db_count=db_count, index_count=index_count, mismatched_ids=mismatched_ids
+        )
+
+
+@functools.cache
+def get_logo_annotation_index() -> LogoAnnotationIndex:
+    """Return the logo annotation index of this process."""
+    return LogoAnnotationIndex(redis_conn)
+
+
+def update_logo_annotation_index(logos: Iterable[LogoAnnotation]) -> None:
+    """Update the logo annotation index after logos were annotated (or their
+    annotation was removed).
+
+    Errors are logged but not raised, as the DB is the source of truth: the
+    index is fixed during the next consistency check.
+
+    :param logos: the updated logos
+    """
+    labels = {
+        logo.id: get_logo_label(
+            logo.annotation_type, logo.annotation_value, logo.taxonomy_value
+        )
+        for logo in logos
+    }
+    try:
+        get_logo_annotation_index().update(labels)
+    except RedisError as e:
+        logger.warning("Error during logo annotation index update", exc_info=e)
+
+
+def check_logo_annotation_index(rebuild: bool = True) -> LogoAnnotationIndexCheck:
+    """Check the consistency of the logo annotation index with the DB, and
+    rebuild it if it's not consistent.
+
+    :param rebuild: if True, rebuild the index if it's not consistent
+    :return: the result of the check
+    """
+    index = get_logo_annotation_index()
+    check = index.check()
+    if check.is_consistent:
+        logger.info("Logo annotation index is consistent with the DB: %s", check)
+    else:
+        logger.warning("Logo annotation index is not consistent: %s", check)
+        if rebuild:
+            index.build()
+    return check
+
+
+function_cache_register.register(get_logo_annotation_index)
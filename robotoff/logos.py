@@ -1,20 +1,31 @@
+import dataclasses
 import datetime
 import functools
 import itertools
 import logging
 import operator
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator
 
 import elasticsearch
 import numpy as np
-from cachetools.func import ttl_cache
 from elasticsearch.helpers import bulk as elasticsearch_bulk
 from elasticsearch.helpers import scan as elasticsearch_scan
 from more_itertools import chunked
+from peewee import fn
+from playhouse.postgres_ext import ServerSide
 
 from robotoff import settings
-from robotoff.elasticsearch import get_es_client
+from robotoff.elasticsearch import (
+    ElasticsearchExporter,
+    estimate_vector_index_memory,
+    get_es_client,
+)
 from robotoff.insights.annotate import UPDATED_ANNOTATION_RESULT, annotate
 from robotoff.insights.importer import import_insights
+from robotoff.logo_annotations import get_logo_annotation_index
 from robotoff.models import (
     ImagePrediction,
     LogoAnnotation,
@@ -77,6 +88,34 @@ def compute_iou(box_1: BoundingBoxType, box_2: BoundingBoxType) -> float:
     return area_inter / union_area
 
 
+def compute_iou_matrix(boxes: np.ndarray) -> np.ndarray:
+    """Compute the pairwise IoU (intersection over union) of bounding boxes.
+
+    :param boxes: an array of shape (N, 4), with boxes in the following
+        format: (y_min, x_min, y_max, x_max)
+    :return: an array of shape (N, N), where item (i, j) is the IoU of boxes i
+        and j
+    """
+    y_min, x_min, y_max, x_max = (boxes[:, i] for i in range(4))
+    width_inter = np.clip(
+        np.minimum(x_max[:, None], x_max[None, :])
+        - np.maximum(x_min[:, None], x_min[None, :]),
+        0,
+        None,
+    )
+    height_inter = np.clip(
+        np.minimum(y_max[:, None], y_max[None, :])
+        - np.maximum(y_min[:, None], y_min[None, :]),
+        0,
+        None,
+    )
+    area_inter = width_inter * height_inter
+    areas = (x_max - x_min) * (y_max - y_min)
+    union_area = areas[:, None] + areas[None, :] - area_inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union_area > 0, area_inter / union_area, 0.0)
+
+
 def filter_logos(
     logos: list[JSONType], score_threshold: float, iou_threshold: float = 0.95
 ) -> list[tuple[int, JSONType]]:
@@ -84,26 +123,32 @@ def filter_logos(
     (IoU < `iou_threshold`) and that have a confidence score above
     `score_threshold`.
 
+    Logos are expected to be sorted by descending confidence score: when two
+    logos intersect, the one with the lowest score is ignored.
+
     Return a list of (original_idx, logo) tuples.
     """
-    filtered = []
-    skip_indexes = set()
-    for i in range(len(logos)):
-        logo = logos[i]
-        if i not in skip_indexes:
-            for j in range(i + 1, len(logos)):
-                if (
-                    compute_iou(logo["bounding_box"], logos[j]["bounding_box"])
-                    >= iou_threshold
-                ):
-                    # logos are sorted by descending confidence score, so we
-                    # ignore j logo (logo with lower confidence score)
-                    skip_indexes.add(j)
-
-        if logo["score"] >= score_threshold:
-            filtered.append((i, logo))
-
-    return filtered
+    if not logos:
+        return []
+
+    iou = compute_iou_matrix(
+        np.array([logo["bounding_box"] for logo in logos], dtype=np.float64)
+    )
+    # Only compare each logo with the following ones (lower confidence score)
+    overlaps = np.triu(iou >= iou_threshold, k=1)
+    suppressed = np.zeros(len(logos), dtype=bool)
+    # A logo hides the following logos it intersects with, unless it's hidden
+    # itself: only logos that intersect with at least another one need to be
+    # visited
+    for i in np.flatnonzero(overlaps.any(axis=1)):
+        if not suppressed[i]:
+            suppressed |= overlaps[i]
+
+    scores = np.array([logo["score"] for logo in logos])
+    return [
+        (int(i), logos[i])
+        for i in np.flatnonzero((scores >= score_threshold) & ~suppressed)
+    ]
 
 
 @functools.cache
@@ -213,6 +258,8 @@ def knn_search(
     embedding_bytes: bytes,
     k: int = settings.K_NEAREST_NEIGHBORS,
     server_type: ServerType | None = None,
+    index: str = ElasticSearchIndex.logo,
+    num_candidates: int | None = None,
 ) -> list[tuple[int, float]]:
     """Search for k approximate nearest neighbors of `embedding_bytes` in the
     Elasticsearch logos index.
@@ -224,49 +271,317 @@ def knn_search(
         `settings.K_NEAREST_NEIGHBORS`
     :param server_type: the server type (project) associated with the logos
         to be returned. If not provided, logos from all projects are returned.
+    :param index: the name of the index (or alias) to search in, defaults to
+        the logo index
+    :param num_candidates: number of candidates considered on each shard,
+        defaults to `k + 1`. Higher values improve recall at the cost of
+        latency, which is useful with quantized indices.
     """
     embedding = np.frombuffer(embedding_bytes, dtype=np.float32)
     knn_body = {
         "field": "embedding",
         "query_vector": embedding / np.linalg.norm(embedding),
         "k": k + 1,
-        "num_candidates": k + 1,
+        "num_candidates": max(num_candidates or 0, k + 1),
     }
 
     if server_type is not None:
         knn_body["filter"] = {"term": {"server_type": server_type.name}}
 
-    results = client.search(
-        index=ElasticSearchIndex.logo, knn=knn_body, source=False, size=k + 1
-    )
+    results = client.search(index=index, knn=knn_body, source=False, size=k + 1)
     if hits := results["hits"]["hits"]:
         return [(int(hit["_id"]), 1.0 - hit["_score"]) for hit in hits]
 
     return []
 
 
-# ttl: 1h
-@ttl_cache(maxsize=1, ttl=3600)
-def get_logo_annotations() -> dict[int, LogoLabelType]:
-    logger.debug("Loading logo annotations from DB...")
-    annotations: dict[int, LogoLabelType] = {}
-
-    for logo in (
-        LogoAnnotation.select(
-            LogoAnnotation.id,
-            LogoAnnotation.annotation_type,
-            LogoAnnotation.annotation_value,
-            LogoAnnotation.taxonomy_value,
+def iter_logo_embeddings(
+    min_logo_id: int | None = None, max_logo_id: int | None = None
+) -> Iterator[tuple[int, np.ndarray, str | None]]:
+    """Iterate over all logo embeddings stored in DB, using a server-side
+    cursor.
+
+    :param min_logo_id: only return logos with an ID strictly greater than
+        this value, optional
+    :param max_logo_id: only return logos with an ID lower or equal to this
+        value, optional
+    :return: an iterator of (logo ID, float32 embedding, server type) tuples
+    """
+    query = (
+        LogoEmbedding.select(
+            LogoEmbedding.logo_id, LogoEmbedding.embedding, LogoAnnotation.server_type
         )
-        .where(LogoAnnotation.annotation_type.is_null(False))
-        .iterator()
+        .join(LogoAnnotation)
+        .order_by(LogoEmbedding.logo_id)
+    )
+    if min_logo_id is not None:
+        query = query.where(LogoEmbedding.logo_id > min_logo_id)
+    if max_logo_id is not None:
+        query = query.where(LogoEmbedding.logo_id <= max_logo_id)
+
+    for logo_id, embedding, server_type in ServerSide(query.tuples()):
+        yield logo_id, np.frombuffer(embedding, dtype=np.float32), server_type
+
+
+def generate_logo_index_actions(
+    logo_embeddings: Iterable[tuple[int, np.ndarray, str | None]],
+    index_name: str,
+    default_server_type: ServerType = ServerType.off,
+) -> Iterator[JSONType]:
+    """Generate the Elasticsearch bulk actions to index logo embeddings.
+
+    :param logo_embeddings: (logo ID, embedding, server type) tuples, see
+        `iter_logo_embeddings`
+    :param index_name: the name of the index
+    :param default_server_type: the server type used for logos without
+        server type
+    """
+    for logo_id, embedding, server_type in logo_embeddings:
+        yield {
+            "_index": index_name,
+            "_id": logo_id,
+            "embedding": embedding / np.linalg.norm(embedding),
+            "server_type": server_type or default_server_type.name,
+        }
+
+
+def reindex_logos(
+    es_client: elasticsearch.Elasticsearch,
+    index_config: JSONType | None = None,
+    thread_count: int = 4,
+    chunk_size: int = 500,
+    swap: bool = True,
+) -> str:
+    """Rebuild the logo ANN index from the logo embeddings stored in DB.
+
+    A new index is created and populated with concurrent bulk requests while
+    searches keep being served by the current index. Once the new index is
+    complete, the `logo` alias is atomically switched to it, and the logos
+    added in DB during the rebuild are indexed.
+
+    :param es_client: Elasticsearch client
+    :param index_config: the configuration of the new index (see
+        `robotoff.elasticsearch.get_logo_index_config`), defaults to the
+        current configuration
+    :param thread_count: number of concurrent bulk requests
+    :param chunk_size: number of logos sent in each bulk request
+    :param swap: if False, the new index is populated but the alias is not
+        updated. This is useful to compare several index configurations with
+        `evaluate_logo_index`.
+    :return: the name of the new index
+    """
+    exporter = ElasticsearchExporter(es_client)
+    index_name = exporter.create_index_version(ElasticSearchIndex.logo, index_config)
+    # Logos created after this point are indexed after the alias swap
+    max_logo_id = LogoEmbedding.select(fn.MAX(LogoEmbedding.logo_id)).scalar()
+
+    indexed = failed = 0
+
+    def collect(future: Future) -> None:
+        nonlocal indexed, failed
+        success, errors = future.result()
+        indexed += success
+        failed += len(errors)
+        for error in errors[:1]:
+            logger.info("Error during logo indexing: %s", error)
+
+    # The DB cursor is consumed by this thread, bulk requests are sent
+    # concurrently by the executor
+    pending: deque[Future] = deque()
+    with db.atomic(), ThreadPoolExecutor(max_workers=thread_count) as executor:
+        for actions in chunked(
+            generate_logo_index_actions(
+                iter_logo_embeddings(max_logo_id=max_logo_id), index_name
+            ),
+            chunk_size,
+        ):
+            if len(pending) >= 2 * thread_count:
+                collect(pending.popleft())
+            pending.append(
+                executor.submit(
+                    elasticsearch_bulk,
+                    es_client,
+                    actions,
+                    chunk_size=chunk_size,
+                    raise_on_error=False,
+                )
+            )
+        while pending:
+            collect(pending.popleft())
+    logger.info("%d logos indexed in %s (%d errors)", indexed, index_name, failed)
+
+    if swap:
+        exporter.swap_alias(ElasticSearchIndex.logo, index_name)
+        with db.atomic():
+            success, _ = elasticsearch_bulk(
+                es_client,
+                generate_logo_index_actions(
+                    iter_logo_embeddings(min_logo_id=max_logo_id),
+                    ElasticSearchIndex.logo.name,
+                ),
+            )
+        logger.info("%d logos added during reindex were indexed", success)
+    return index_name
+
+
+def compute_exact_nearest_neighbors(
+    query_ids: np.ndarray,
+    query_embeddings: np.ndarray,
+    logo_embeddings: Iterable[tuple[int, np.ndarray, str | None]],
+    k: int,
+    chunk_size: int = 10_000,
+) -> np.ndarray:
+    """Compute the exact `k` nearest neighbors of the query embeddings (by
+    dot product of normalized embeddings, as in the ANN index).
+
+    The logo embeddings are consumed by chunks, so that they don't need to
+    fit in memory.
+
+    :param query_ids: the logo IDs of the queries, each query is excluded
+        from its own neighbors
+    :param query_embeddings: the query embeddings, of shape (num_queries, dim)
+    :param logo_embeddings: (logo ID, embedding, server type) tuples, see
+        `iter_logo_embeddings`
+    :param k: number of nearest neighbors to return
+    :param chunk_size: number of logo embeddings processed at once
+    :return: the logo IDs of the nearest neighbors, sorted by decreasing
+        similarity, as an array of shape (num_queries, k). If less than `k`
+        neighbors are available, the missing IDs are set to -1.
+    """
+    queries = query_embeddings / np.linalg.norm(query_embeddings, axis=1)[:, None]
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+
+    for chunk in chunked(logo_embeddings, chunk_size):
+        ids = np.array([logo_id for logo_id, _, _ in chunk], dtype=np.int64)
+        embeddings = np.stack([embedding for _, embedding, _ in chunk])
+        embeddings /= np.linalg.norm(embeddings, axis=1)[:, None]
+        scores = queries @ embeddings.T
+        # Exclude each query from its own neighbors
+        scores[query_ids[:, None] == ids[None, :]] = -np.inf
+
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        all_ids = np.concatenate([best_ids, np.broadcast_to(ids, scores.shape)], axis=1)
+        top_indices = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(all_scores, top_indices, axis=1)
+        best_ids = np.take_along_axis(all_ids, top_indices, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    best_ids = np.take_along_axis(best_ids, order, axis=1)
+    best_ids[np.take_along_axis(best_scores, order, axis=1) == -np.inf] = -1
+    return best_ids
+
+
+@dataclasses.dataclass
+class LogoIndexEvaluation:
+    #: name of the evaluated index
+    index_name: str
+    #: type of the vector index (hnsw, int8_hnsw,...)
+    index_type: str
+    #: mean recall@k, compared to exact nearest neighbors
+    recall: float
+    #: mean and 95th percentile search latency, in milliseconds
+    mean_latency: float
+    p95_latency: float
+    #: estimated memory required by the vector index, in bytes
+    estimated_memory: int
+
+
+def evaluate_logo_index(
+    es_client: elasticsearch.Elasticsearch,
+    index_names: list[str],
+    sample_size: int = 500,
+    k: int = settings.K_NEAREST_NEIGHBORS,
+    num_candidates: int | None = None,
+) -> list[LogoIndexEvaluation]:
+    """Compare the recall and the latency of ANN searches on several logo
+    indices (with different vector index configurations for example).
+
+    The queries are randomly sampled from the logo embeddings stored in DB,
+    and the exact nearest neighbors are computed from all logo embeddings
+    stored in DB.
+
+    :param es_client: Elasticsearch client
+    :param index_names: the names of the indices to evaluate
+    :param sample_size: number of queries
+    :param k: number of nearest neighbors to retrieve
+    :param num_candidates: number of candidates considered on each shard,
+        see `knn_search`
+    :return: the evaluation of each index
+    """
+    query_ids, query_embeddings = [], []
+    for logo_id, embedding in (
+        LogoEmbedding.select(LogoEmbedding.logo_id, LogoEmbedding.embedding)
+        .order_by(fn.Random())
+        .limit(sample_size)
+        .tuples()
     ):
-        if logo.annotation_value is None:
-            annotations[logo.id] = (logo.annotation_type, None)
-        elif logo.taxonomy_value is not None:
-            annotations[logo.id] = (logo.annotation_type, logo.taxonomy_value)
+        query_ids.append(logo_id)
+        query_embeddings.append(np.frombuffer(embedding, dtype=np.float32))
+
+    if not query_ids:
+        return []
+
+    logger.info("Computing exact nearest neighbors of %d logos", len(query_ids))
+    with db.atomic():
+        exact_ids = compute_exact_nearest_neighbors(
+            np.array(query_ids, dtype=np.int64),
+            np.stack(query_embeddings),
+            iter_logo_embeddings(),
+            k,
+        )
+
+    results = []
+    for index_name in index_names:
+        recalls, latencies = [], []
+        for logo_id, embedding, expected_ids in zip(
+            query_ids, query_embeddings, exact_ids
+        ):
+            start_time = time.perf_counter()
+            neighbors = knn_search(
+                es_client,
+                embedding.tobytes(),
+                k,
+                index=index_name,
+                num_candidates=num_candidates,
+            )
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            neighbor_ids = [
+                neighbor_id for neighbor_id, _ in neighbors if neighbor_id != logo_id
+            ][:k]
+            expected = set(int(id_) for id_ in expected_ids if id_ != -1)
+            if expected:
+                recalls.append(len(expected.intersection(neighbor_ids)) / len(expected))
+
+        index_info = next(iter(es_client.indices.get(index=index_name).values()))
+        vector_options = index_info["mappings"]["properties"]["embedding"][
+            "index_options"
+        ]
+        num_vectors = es_client.count(index=index_name)["count"]
+        results.append(
+            LogoIndexEvaluation(
+                index_name=index_name,
+                index_type=vector_options["type"],
+                recall=float(np.mean(recalls)) if recalls else 0.0,
+                mean_latency=float(np.mean(latencies)),
+                p95_latency=float(np.percentile(latencies, 95)),
+                estimated_memory=estimate_vector_index_memory(
+                    vector_options["type"], num_vectors, m=vector_options.get("m", 16)
+                ),
+            )
+        )
+    return results
 
-    return annotations
+
+def get_logo_annotations() -> dict[int, LogoLabelType]:
+    """Return the labels of all annotated logos, as a dict mapping logo IDs
+    to labels.
+
+    The annotations are fetched from the logo annotation index, that is
+    updated incrementally when logos are annotated (see
+    `robotoff.logo_annotations`).
+    """
+    return get_logo_annotation_index().get()
 
 
 def predict_label(logo: LogoAnnotation) -> LogoLabelType | None:
@@ -281,45 +596,84 @@ def predict_label(logo: LogoAnnotation) -> LogoLabelType | None:
 def predict_proba(
     logo: LogoAnnotation, weights: str = "distance"
 ) -> dict[LogoLabelType, float] | None:
-    if logo.nearest_neighbors is None:
-        return None
-
-    nn_distances = logo.nearest_neighbors["distances"]
-    nn_logo_ids = logo.nearest_neighbors["logo_ids"]
+    return predict_proba_batch([logo], weights)[0]
 
-    logo_annotations = get_logo_annotations()
 
-    nn_labels: list[LogoLabelType] = []
-    for nn_logo_id in nn_logo_ids:
-        nn_labels.append(logo_annotations.get(nn_logo_id, UNKNOWN_LABEL))
+def predict_proba_batch(
+    logos: list[LogoAnnotation], weights: str = "distance"
+) -> list[dict[LogoLabelType, float] | None]:
+    """Predict the label probabilities of logos, using a weighted vote of
+    their nearest neighbors.
 
-    return _predict_proba(nn_logo_ids, nn_labels, nn_distances, weights)
+    Unannotated neighbors are considered instances of label "UNKNOWN". The
+    votes of all logos are computed at once.
 
+    :param logos: the logos to classify
+    :param weights: the kind of weighting used, see `get_weights`
+    :return: for each logo, a dict mapping labels to probabilities, or None
+        if the logo has no nearest neighbors
+    """
+    logo_annotations = get_logo_annotations()
+    # Labels are mapped to integer IDs, "UNKNOWN" is always 0
+    label_to_id: dict[LogoLabelType, int] = {UNKNOWN_LABEL: 0}
+    rows: list[int] = []
+    label_ids: list[int] = []
+    distances: list[float] = []
+    for row, logo in enumerate(logos):
+        if logo.nearest_neighbors is None:
+            continue
+        nn_distances = logo.nearest_neighbors["distances"]
+        rows.extend(itertools.repeat(row, len(nn_distances)))
+        distances.extend(nn_distances)
+        for nn_logo_id in logo.nearest_neighbors["logo_ids"]:
+            label = logo_annotations.get(nn_logo_id, UNKNOWN_LABEL)
+            label_ids.append(label_to_id.setdefault(label, len(label_to_id)))
+
+    rows_arr = np.array(rows, dtype=np.int64)
+    label_ids_arr = np.array(label_ids, dtype=np.int64)
+    weights_arr = _get_batch_weights(
+        np.array(distances, dtype=np.float64), rows_arr, len(logos), weights
+    )
 
-def _predict_proba(
-    logo_ids: list[int],
-    nn_labels: list[LogoLabelType],
-    nn_distances: list[float],
-    weights: str,
-) -> dict[LogoLabelType, float]:
-    weights = get_weights(np.array(nn_distances), weights)
-    labels: list[LogoLabelType] = [UNKNOWN_LABEL] + [
-        x for x in set(nn_labels) if x != UNKNOWN_LABEL
+    # Sum the weights of each (logo, label) pair
+    num_labels = len(label_to_id)
+    keys, inverse = np.unique(
+        rows_arr * num_labels + label_ids_arr, return_inverse=True
+    )
+    label_weights = np.bincount(inverse, weights=weights_arr, minlength=len(keys))
+    total_weights = np.bincount(rows_arr, weights=weights_arr, minlength=len(logos))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        label_probs = label_weights / total_weights[keys // num_labels]
+
+    id_to_label = list(label_to_id)
+    results: list[dict[LogoLabelType, float] | None] = [
+        None if logo.nearest_neighbors is None else {UNKNOWN_LABEL: 0.0}
+        for logo in logos
     ]
-    label_to_id = {label: i for i, label in enumerate(labels)}
-    proba_k = np.zeros(len(labels))
-    pred_labels = np.array([label_to_id[x] for x in nn_labels])
+    for key, prob in zip(keys.tolist(), label_probs.tolist()):
+        row, label_id = divmod(key, num_labels)
+        results[row][id_to_label[label_id]] = prob  # type: ignore
+    return results
 
-    for i, idx in enumerate(pred_labels.T):
-        proba_k[idx] += weights[i]
 
-    proba_k /= proba_k.sum()
+def _get_batch_weights(
+    distances: np.ndarray, rows: np.ndarray, num_rows: int, weights: str
+) -> np.ndarray:
+    """Get the weights of the neighbors of several logos.
 
-    prediction: dict[LogoLabelType, float] = {}
-    for i in range(len(proba_k)):
-        prediction[labels[i]] = float(proba_k[i])
+    Same as `get_weights`, but `distances` contains the neighbor distances of
+    all logos (`rows` gives the logo index of each distance).
+    """
+    if weights != "distance":
+        return get_weights(distances, weights)
 
-    return prediction
+    # If a logo has neighbors at zero distance, only those neighbors are
+    # taken into account (with a weight of 1.0)
+    zero_mask = distances == 0
+    has_zero = np.bincount(rows[zero_mask], minlength=num_rows) > 0
+    with np.errstate(divide="ignore"):
+        inverse_distances = 1.0 / distances
+    return np.where(has_zero[rows], zero_mask.astype(np.float64), inverse_distances)
 
 
 def get_weights(dist: np.ndarray, weights: str = "uniform"):
@@ -379,9 +733,7 @@ def import_logo_insights(
     """
     selected_logos = []
     logo_probs = []
-    for logo in logos:
-        probs = predict_proba(logo)
-
+    for logo, probs in zip(logos, predict_proba_batch(logos)):
         if not probs:
             continue
 
@@ -631,4 +983,3 @@ def refresh_nearest_neighbors(
 
 
 function_cache_register.register(get_logo_confidence_thresholds)
-function_cache_register.register(get_logo_annotations)
@@ -1,5 +1,6 @@
 import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Iterable, Iterator
 from urllib.parse import urlparse
 
@@ -11,8 +12,11 @@ from requests.exceptions import JSONDecodeError, SSLError, Timeout
 
 from robotoff import settings
 from robotoff.models import ProductInsight, with_db
+from robotoff.redis import redis_conn
 from robotoff.types import ServerType
 from robotoff.utils import http_session
+from robotoff.utils.rate_limit import RateLimiter
+from robotoff.workers.scheduling import AdmissionController, JobClass
 
 logger = logging.getLogger(__name__)
 
@@ -98,63 +102,138 @@ def ensure_influx_database():
             logger.exception("Error on ensure_influx_database")
 
 
-def get_product_count(server_type: ServerType, country_tag: str) -> int:
+def get_product_count(
+    server_type: ServerType,
+    country_tag: str,
+    timeout: float | None = None,
+    rate_limiter: RateLimiter | None = None,
+) -> int:
     """Return the number of products in Product Opener for a specific country.
 
     :param country_tag: ISO 2-letter country code
+    :param timeout: the request timeout in seconds, defaults to
+        `settings.METRICS_REQUEST_TIMEOUT`
+    :param rate_limiter: the rate limiter to use (per host), optional
     :return: the number of products currently in Product Opener
     """
+    url = settings.BaseURLProvider.country(server_type, country_tag) + "/3.json"
+    if rate_limiter is not None:
+        rate_limiter.acquire(urlparse(url).netloc)
     r = http_session.get(
-        settings.BaseURLProvider.country(server_type, country_tag)
-        + "/3.json?fields=null",
+        url,
+        params={"fields": "null"},
         auth=settings._off_request_auth,
+        timeout=settings.METRICS_REQUEST_TIMEOUT if timeout is None else timeout,
     ).json()
     return int(r["count"])
 
 
-def save_facet_metrics():
-    # Only support for off for now
-    server_type = ServerType.off
-    inserts = []
-    target_datetime = datetime.datetime.now()
-
-    for country_tag in COUNTRY_TAGS:
-        try:
-            count = get_product_count(server_type, country_tag)
-        except Exception:
-            logger.exception("Error during product count retrieval for %s", country_tag)
-            count = None
+def get_facet_metric_paths(
+    target_datetime: datetime.datetime,
+) -> list[tuple[str, str, str | None]]:
+    """Return the (country tag, URL path, facet name) of all facet pages to
+    fetch. If the facet name is None, it's deduced from the URL.
 
+    :param target_datetime: the datetime of the metrics
+    """
+    paths: list[tuple[str, str, str | None]] = []
+    # get contribution metrics for the previous day
+    contributors_path = "/entry-date/{}/contributors?json=1".format(
+        (target_datetime - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    )
+    for country_tag in dict.fromkeys(COUNTRY_TAGS):
         for url_path in URL_PATHS:
+            paths.append((country_tag, url_path, None))
+        paths.append((country_tag, contributors_path, "contributors"))
+    paths.append(("world", "/countries?json=1", None))
+    return paths
+
+
+def collect_facet_metrics(
+    server_type: ServerType,
+    target_datetime: datetime.datetime,
+    max_workers: int | None = None,
+    rate_limit: float | None = None,
+    timeout: float | None = None,
+) -> list[dict]:
+    """Fetch facet metrics of all countries from Product Opener.
+
+    Product counts are fetched first (they are needed to compute the
+    percentage of products for facets that don't provide it), then all facet
+    pages. Requests are sent concurrently, and rate limited per host. A
+    request that fails or times out only skips the corresponding metrics.
+
+    :param server_type: the server type (project) to use
+    :param target_datetime: the datetime of the metrics
+    :param max_workers: the number of concurrent requests, defaults to
+        `settings.METRICS_MAX_WORKERS`
+    :param rate_limit: the maximum number of requests per second sent to each
+        host, defaults to `settings.METRICS_RATE_LIMIT`
+    :param timeout: the timeout of each request in seconds, defaults to
+        `settings.METRICS_REQUEST_TIMEOUT`
+    :return: the InfluxDB points
+    """
+    max_workers = settings.METRICS_MAX_WORKERS if max_workers is None else max_workers
+    rate_limiter = RateLimiter(
+        settings.METRICS_RATE_LIMIT if rate_limit is None else rate_limit
+    )
+    timeout = settings.METRICS_REQUEST_TIMEOUT if timeout is None else timeout
+    country_tags = list(dict.fromkeys(COUNTRY_TAGS))
+    counts: dict[str, int | None] = {}
+    inserts: list[dict] = []
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        count_futures = {
+            executor.submit(
+                get_product_count, server_type, country_tag, timeout, rate_limiter
+            ): country_tag
+            for country_tag in country_tags
+        }
+        for future in as_completed(count_futures):
+            country_tag = count_futures[future]
             try:
-                inserts += generate_metrics_from_path(
-                    server_type, country_tag, url_path, target_datetime, count
-                )
+                counts[country_tag] = future.result()
             except Exception:
-                logger.exception()
+                logger.exception(
+                    "Error during product count retrieval for %s", country_tag
+                )
+                counts[country_tag] = None
 
-        try:
-            inserts += generate_metrics_from_path(
+        futures = {
+            executor.submit(
+                generate_metrics_from_path,
                 server_type,
                 country_tag,
-                "/entry-date/{}/contributors?json=1".format(
-                    # get contribution metrics for the previous day
-                    (target_datetime - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
-                ),
+                path,
                 target_datetime,
-                facet="contributors",
-            )
-        except Exception:
-            logger.exception()
+                # only the URL_PATHS facets are relative to the country
+                # product count
+                counts.get(country_tag) if path in URL_PATHS else None,
+                facet,
+                timeout,
+                rate_limiter,
+            ): (country_tag, path)
+            for country_tag, path, facet in get_facet_metric_paths(target_datetime)
+        }
+        for future in as_completed(futures):
+            try:
+                inserts += future.result()
+            except Exception:
+                logger.exception(
+                    "Error during metrics retrieval for %s (%s)", *futures[future]
+                )
+    return inserts
 
-    try:
-        inserts += generate_metrics_from_path(
-            server_type, "world", "/countries?json=1", target_datetime
-        )
-    except Exception:
-        logger.exception()
+
+def save_facet_metrics():
+    # Only support for off for now
+    server_type = ServerType.off
+    target_datetime = datetime.datetime.now()
+    inserts = collect_facet_metrics(server_type, target_datetime)
+    logger.info("%d facet metrics collected", len(inserts))
     client = get_influx_client()
     if client is not None:
+        # All points are sent in a single batched write
         write_client = client.write_api(write_options=SYNCHRONOUS)
         write_client.write(bucket=settings.INFLUXDB_BUCKET, record=inserts)
 
@@ -170,6 +249,8 @@ def generate_metrics_from_path(
     target_datetime: datetime.datetime,
     count: int | None = None,
     facet: str | None = None,
+    timeout: float | None = None,
+    rate_limiter: RateLimiter | None = None,
 ) -> list[dict]:
     inserts: list[dict] = []
     url = settings.BaseURLProvider.country(server_type, country_tag + "-en") + path
@@ -177,8 +258,15 @@ def generate_metrics_from_path(
     if facet is None:
         facet = get_facet_name(url)
 
+    if rate_limiter is not None:
+        rate_limiter.acquire(urlparse(url).netloc)
+
     try:
-        r = http_session.get(url, timeout=60, auth=settings._off_request_auth)
+        r = http_session.get(
+            url,
+            timeout=settings.METRICS_REQUEST_TIMEOUT if timeout is None else timeout,
+            auth=settings._off_request_auth,
+        )
     except (RequestConnectionError, SSLError, Timeout) as e:
         logger.info("Error during metrics retrieval: url=%s", url, exc_info=e)
         return inserts
@@ -278,6 +366,38 @@ def generate_insight_metrics(target_datetime: datetime.datetime) -> list[dict]:
     return inserts
 
 
+def save_job_metrics():
+    """Save the last lag (time spent in queue, in seconds) and the number of
+    running jobs of each job class, see `robotoff.workers.scheduling`."""
+    target_datetime = datetime.datetime.now()
+
+    if (client := get_influx_client()) is not None:
+        write_client = client.write_api(write_options=SYNCHRONOUS)
+        inserts = generate_job_metrics(AdmissionController(redis_conn), target_datetime)
+        write_client.write(bucket=settings.INFLUXDB_BUCKET, record=inserts)
+
+
+def generate_job_metrics(
+    admission_controller: AdmissionController, target_datetime: datetime.datetime
+) -> list[dict]:
+    lags = admission_controller.get_lags()
+    running_counts = admission_controller.get_running_counts()
+    inserts = []
+    for job_class in JobClass:
+        fields: dict[str, int | float] = {"running": running_counts[job_class]}
+        if job_class in lags:
+            fields["lag"] = lags[job_class]
+        inserts.append(
+            {
+                "measurement": "jobs",
+                "tags": {"job_class": job_class.value},
+                "time": target_datetime.isoformat(),
+                "fields": fields,
+            }
+        )
+    return inserts
+
+
 def generate_recent_changes_metrics(items: Iterable[dict]) -> Iterator[dict]:
     for item in items:
         comment: str = item["comment"]
@@ -13,8 +13,19 @@ from playhouse.shortcuts import model_to_dict
 from robotoff import settings
 from robotoff.off import generate_image_url
 from robotoff.types import ProductIdentifier, ServerType
+from robotoff.utils.tracing import span
 
-db = PostgresqlExtDatabase(
+
+class TracedPostgresqlExtDatabase(PostgresqlExtDatabase):
+    """PostgreSQL database that records a span for every SQL query when
+    tracing is enabled."""
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        with span(sql.split(" ", 1)[0], "sql", sql=sql[:200]):
+            return super().execute_sql(sql, params, *args, **kwargs)
+
+
+db = TracedPostgresqlExtDatabase(
     settings.POSTGRES_DB,
     user=settings.POSTGRES_USER,
     password=settings.POSTGRES_PASSWORD,
@@ -423,6 +434,259 @@ class LogoConfidenceThreshold(BaseModel):
     threshold = peewee.FloatField(null=False)
 
 
+class PendingInsightCount(BaseModel):
+    """Number of insights that were not annotated yet, for every combination
+    of the fields the question endpoints filter on.
+
+    Triggers on `product_insight` record count changes in
+    `PendingInsightCountDelta`, which are periodically folded into this
+    table (see `fold_insight_count_deltas`). The current count is the sum of
+    both tables.
+    """
+
+    server_type = peewee.CharField(null=False, max_length=10)
+    type = peewee.CharField(null=False, max_length=256)
+    # Empty string if the insights have no value_tag
+    value_tag = peewee.TextField(null=False)
+    countries = BinaryJSONField(null=False)
+    campaign = BinaryJSONField(null=False)
+    # Empty string if the insights have no predictor
+    predictor = peewee.CharField(null=False, max_length=100)
+    reserved_barcode = peewee.BooleanField(null=False)
+    automatic_processing = peewee.BooleanField(null=False)
+    count = peewee.IntegerField(null=False)
+
+    class Meta:
+        indexes = (
+            (
+                (
+                    "server_type",
+                    "type",
+                    "value_tag",
+                    "countries",
+                    "campaign",
+                    "predictor",
+                    "reserved_barcode",
+                    "automatic_processing",
+                ),
+                True,
+            ),
+        )
+
+
+class PendingInsightCountDelta(BaseModel):
+    """Changes of `PendingInsightCount` that were not folded into it yet.
+
+    This table is append-only for the triggers, so that concurrent insight
+    writers never wait on each other's count updates.
+    """
+
+    id = peewee.BigAutoField()
+    server_type = peewee.CharField(null=False, max_length=10)
+    type = peewee.CharField(null=False, max_length=256)
+    value_tag = peewee.TextField(null=False)
+    countries = BinaryJSONField(null=False)
+    campaign = BinaryJSONField(null=False)
+    predictor = peewee.CharField(null=False, max_length=100)
+    reserved_barcode = peewee.BooleanField(null=False)
+    automatic_processing = peewee.BooleanField(null=False)
+    delta = peewee.IntegerField(null=False)
+
+
+class UserAnnotationCount(BaseModel):
+    """Number of insights annotated by each user.
+
+    As for `PendingInsightCount`, the current count is the sum of this table
+    and of the changes recorded in `UserAnnotationCountDelta`.
+    """
+
+    username = peewee.TextField(primary_key=True)
+    count = peewee.IntegerField(null=False)
+
+
+class UserAnnotationCountDelta(BaseModel):
+    """Changes of `UserAnnotationCount` that were not folded into it yet."""
+
+    id = peewee.BigAutoField()
+    username = peewee.TextField(null=False, index=True)
+    delta = peewee.IntegerField(null=False)
+
+
+# Key of `PendingInsightCount`, computed from `product_insight` columns
+_PENDING_INSIGHT_COUNT_KEY = (
+    "coalesce(server_type, ''), type, coalesce(value_tag, ''), "
+    "coalesce(countries, '[]'), coalesce(campaign, '[]'), "
+    "coalesce(predictor, ''), reserved_barcode, automatic_processing"
+)
+_PENDING_INSIGHT_COUNT_COLUMNS = (
+    "server_type, type, value_tag, countries, campaign, predictor, "
+    "reserved_barcode, automatic_processing"
+)
+
+# The trigger function receives the rows modified by the statement as
+# transition tables, and appends the resulting count changes to the delta
+# tables. It never updates existing rows, so it doesn't take any lock that
+# other insight writers could wait on. Changes that cancel out (updates that
+# don't change the key) are skipped. `%` is not used on purpose: the SQL is
+# sent without parameters.
+_INSIGHT_COUNT_TRIGGER_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION record_insight_count_deltas() RETURNS trigger
+LANGUAGE plpgsql AS $function$
+DECLARE
+    changes text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := 'SELECT *, 1 AS delta FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := 'SELECT *, -1 AS delta FROM old_rows';
+    ELSE
+        changes := 'SELECT *, 1 AS delta FROM new_rows '
+            'UNION ALL SELECT *, -1 AS delta FROM old_rows';
+    END IF;
+
+    EXECUTE 'INSERT INTO pending_insight_count_delta '
+        '({_PENDING_INSIGHT_COUNT_COLUMNS}, delta) '
+        'SELECT {_PENDING_INSIGHT_COUNT_KEY.replace("'", "''")}, sum(delta) '
+        'FROM (' || changes || ') AS changes '
+        'WHERE annotation IS NULL '
+        'GROUP BY 1, 2, 3, 4, 5, 6, 7, 8 HAVING sum(delta) <> 0';
+
+    EXECUTE 'INSERT INTO user_annotation_count_delta (username, delta) '
+        'SELECT username, sum(delta) '
+        'FROM (' || changes || ') AS changes '
+        'WHERE username IS NOT NULL '
+        'GROUP BY 1 HAVING sum(delta) <> 0';
+
+    RETURN NULL;
+END;
+$function$
+"""
+
+# Transition tables can't be shared by triggers on several events, hence one
+# trigger per event
+_INSIGHT_COUNT_TRIGGERS_SQL = [
+    "CREATE OR REPLACE TRIGGER product_insight_insert_counts "
+    "AFTER INSERT ON product_insight REFERENCING NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION record_insight_count_deltas()",
+    "CREATE OR REPLACE TRIGGER product_insight_update_counts "
+    "AFTER UPDATE ON product_insight "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION record_insight_count_deltas()",
+    "CREATE OR REPLACE TRIGGER product_insight_delete_counts "
+    "AFTER DELETE ON product_insight REFERENCING OLD TABLE AS old_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION record_insight_count_deltas()",
+]
+
+# Folding deltas consumes them with `DELETE ... RETURNING` and applies them
+# with one upsert per table, in key order. Empty aggregates are removed.
+_FOLD_PENDING_INSIGHT_COUNT_DELTAS_SQL = (
+    "WITH deltas AS ("
+    "DELETE FROM pending_insight_count_delta "
+    f"RETURNING {_PENDING_INSIGHT_COUNT_COLUMNS}, delta"
+    "), updated AS ("
+    "INSERT INTO pending_insight_count AS c "
+    f"({_PENDING_INSIGHT_COUNT_COLUMNS}, count) "
+    f"SELECT {_PENDING_INSIGHT_COUNT_COLUMNS}, sum(delta) FROM deltas "
+    "GROUP BY 1, 2, 3, 4, 5, 6, 7, 8 HAVING sum(delta) <> 0 "
+    "ORDER BY 1, 2, 3, 4, 5, 6, 7, 8 "
+    f"ON CONFLICT ({_PENDING_INSIGHT_COUNT_COLUMNS}) "
+    "DO UPDATE SET count = c.count + excluded.count "
+    "RETURNING c.id, c.count"
+    ") SELECT id FROM updated WHERE count = 0"
+)
+_FOLD_USER_ANNOTATION_COUNT_DELTAS_SQL = (
+    "WITH deltas AS ("
+    "DELETE FROM user_annotation_count_delta RETURNING username, delta"
+    "), updated AS ("
+    "INSERT INTO user_annotation_count AS c (username, count) "
+    "SELECT username, sum(delta) FROM deltas "
+    "GROUP BY 1 HAVING sum(delta) <> 0 ORDER BY 1 "
+    "ON CONFLICT (username) DO UPDATE SET count = c.count + excluded.count "
+    "RETURNING c.username, c.count"
+    ") SELECT username FROM updated WHERE count = 0"
+)
+# Key of the Postgres advisory lock that serializes folds and rebuilds
+_INSIGHT_COUNT_LOCK_KEY = 4_050_001
+
+
+def install_insight_count_triggers() -> None:
+    """Create (or replace) the triggers that record count changes in
+    `PendingInsightCountDelta` and `UserAnnotationCountDelta` when insights
+    are imported, annotated or deleted.
+
+    Migrations install the triggers in production, this is used when the
+    tables are created directly from the models (tests).
+    """
+    db.execute_sql(_INSIGHT_COUNT_TRIGGER_FUNCTION_SQL)
+    for sql in _INSIGHT_COUNT_TRIGGERS_SQL:
+        db.execute_sql(sql)
+
+
+def fold_insight_count_deltas() -> bool:
+    """Apply the changes recorded in the delta tables to
+    `PendingInsightCount` and `UserAnnotationCount`, and remove them.
+
+    Only one fold runs at a time: if another fold or a rebuild is running,
+    nothing is done.
+
+    :return: True if the deltas were folded, False if another fold or
+        rebuild was running
+    """
+    with db.atomic():
+        locked = db.execute_sql(
+            "SELECT pg_try_advisory_xact_lock(%s)", (_INSIGHT_COUNT_LOCK_KEY,)
+        ).fetchone()[0]
+        if not locked:
+            return False
+
+        empty_ids = [
+            row[0] for row in db.execute_sql(_FOLD_PENDING_INSIGHT_COUNT_DELTAS_SQL)
+        ]
+        if empty_ids:
+            PendingInsightCount.delete().where(
+                PendingInsightCount.id.in_(empty_ids),
+                PendingInsightCount.count == 0,
+            ).execute()
+
+        empty_usernames = [
+            row[0] for row in db.execute_sql(_FOLD_USER_ANNOTATION_COUNT_DELTAS_SQL)
+        ]
+        if empty_usernames:
+            UserAnnotationCount.delete().where(
+                UserAnnotationCount.username.in_(empty_usernames),
+                UserAnnotationCount.count == 0,
+            ).execute()
+    return True
+
+
+def rebuild_insight_counts() -> None:
+    """Recompute `PendingInsightCount` and `UserAnnotationCount` from
+    `product_insight`, and clear the delta tables.
+
+    The triggers keep the counts consistent, this is only needed to recover
+    from a manual edit of the tables. Writes on `product_insight` are
+    blocked during the rebuild.
+    """
+    with db.atomic():
+        db.execute_sql("SELECT pg_advisory_xact_lock(%s)", (_INSIGHT_COUNT_LOCK_KEY,))
+        db.execute_sql("LOCK TABLE product_insight IN SHARE MODE")
+        db.execute_sql("DELETE FROM pending_insight_count_delta")
+        db.execute_sql("DELETE FROM pending_insight_count")
+        db.execute_sql(
+            f"INSERT INTO pending_insight_count "
+            f"({_PENDING_INSIGHT_COUNT_COLUMNS}, count) "
+            f"SELECT {_PENDING_INSIGHT_COUNT_KEY}, count(*) FROM product_insight "
+            "WHERE annotation IS NULL GROUP BY 1, 2, 3, 4, 5, 6, 7, 8"
+        )
+        db.execute_sql("DELETE FROM user_annotation_count_delta")
+        db.execute_sql("DELETE FROM user_annotation_count")
+        db.execute_sql(
+            "INSERT INTO user_annotation_count (username, count) "
+            "SELECT username, count(*) FROM product_insight "
+            "WHERE username IS NOT NULL GROUP BY 1"
+        )
+
+
 MODELS = [
     Prediction,
     ProductInsight,
@@ -433,4 +697,8 @@ MODELS = [
     ImageEmbedding,
     LogoConfidenceThreshold,
     AnnotationVote,
+    PendingInsightCount,
+    PendingInsightCountDelta,
+    UserAnnotationCount,
+    UserAnnotationCountDelta,
 ]
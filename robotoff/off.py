@@ -1,9 +1,12 @@
 """Interacting with OFF server to eg. update products or get infos"""
 
+import contextlib
+import contextvars
+import hashlib
 import logging
 import re
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 from urllib.parse import urlparse
 
 import requests
@@ -19,6 +22,8 @@ from robotoff.types import (
     ServerType,
 )
 from robotoff.utils import http_session
+from robotoff.utils.cache import ingredient_parsing_cache
+from robotoff.utils.ingredient_parser import parse_ingredients_locally
 
 logger = logging.getLogger(__name__)
 
@@ -244,7 +249,9 @@ def add_category(
         "add_categories": category,
         "comment": comment,
     }
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
 
 
 def update_quantity(
@@ -266,7 +273,9 @@ def update_quantity(
         "quantity": quantity,
         "comment": comment,
     }
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
 
 
 def update_emb_codes(
@@ -289,7 +298,9 @@ def update_emb_codes(
         "emb_codes": emb_codes_str,
         "comment": comment,
     }
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
 
 
 def update_expiration_date(
@@ -311,7 +322,9 @@ def update_expiration_date(
         "expiration_date": expiration_date,
         "comment": comment,
     }
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
 
 
 def add_label_tag(
@@ -333,7 +346,9 @@ def add_label_tag(
         "add_labels": label_tag,
         "comment": comment,
     }
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
 
 
 def add_brand(
@@ -355,7 +370,9 @@ def add_brand(
         "add_brands": brand,
         "comment": comment,
     }
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
 
 
 def add_store(
@@ -377,7 +394,9 @@ def add_store(
         "add_stores": store,
         "comment": comment,
     }
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
 
 
 def add_packaging(
@@ -458,7 +477,9 @@ def save_ingredients(
         "comment": comment,
         ingredient_key: ingredient_text,
     }
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
 
 
 def save_nutrients(
@@ -486,7 +507,129 @@ def save_nutrients(
             params[f"nutriment_{nutrient_name}"] = nutrient_value.value
             params[f"nutriment_{nutrient_name}_unit"] = nutrient_value.unit
 
-    update_product(params, server_type=product_id.server_type, auth=auth, **kwargs)
+    submit_product_update(
+        params, server_type=product_id.server_type, auth=auth, **kwargs
+    )
+
+
+class ProductUpdateBatch:
+    """Product updates collected while a batch is active, see
+    `batch_product_updates`.
+
+    Updates that only add values to taxonomized fields (`add_categories`,
+    `add_labels`,...) to the same product are merged into a single request.
+    Other updates are kept as separate requests, in call order.
+
+    Each request is stored as a `(params, server_type, auth, kwargs)` tuple,
+    `kwargs` being the additional `update_product` parameters (`timeout`,...)
+    of the call.
+    """
+
+    def __init__(self) -> None:
+        self.requests: list[tuple[dict, ServerType, OFFAuthentication | None, dict]] = (
+            []
+        )
+
+    def add(
+        self,
+        params: dict,
+        server_type: ServerType,
+        auth: OFFAuthentication | None = None,
+        **kwargs,
+    ) -> None:
+        """Add an update to the batch, merging it with a pending update if
+        possible.
+
+        Updates are only merged if they have the same additional parameters.
+
+        :param params: the `update_product` parameters
+        :param server_type: the server type of the product
+        :param auth: the user authentication data, None for automatic edits
+        :param kwargs: additional parameters passed to `update_product`
+        """
+        for (
+            pending_params,
+            pending_server_type,
+            pending_auth,
+            pending_kwargs,
+        ) in self.requests:
+            if (
+                pending_server_type == server_type
+                and _same_auth(pending_auth, auth)
+                and pending_kwargs == kwargs
+                and _can_merge_params(pending_params, params)
+            ):
+                for key, value in params.items():
+                    if key == "comment" and pending_params.get("comment"):
+                        pending_params[key] = f"{pending_params[key]} ; {value}"
+                    elif key.startswith("add_") and key in pending_params:
+                        pending_params[key] = f"{pending_params[key]},{value}"
+                    else:
+                        pending_params[key] = value
+                return
+        self.requests.append((dict(params), server_type, auth, dict(kwargs)))
+
+    def __len__(self) -> int:
+        return len(self.requests)
+
+
+def _same_auth(auth: OFFAuthentication | None, other: OFFAuthentication | None):
+    if auth is None or other is None:
+        return auth is other
+    return auth == other
+
+
+def _can_merge_params(params: dict, other: dict) -> bool:
+    """Return True if two `update_product` parameter dicts can be sent in a
+    single request: they must target the same product and the only fields
+    they both set must be `add_*` fields (or the edit comment)."""
+    if params.get("code") != other.get("code"):
+        return False
+    common_keys = (params.keys() & other.keys()) - {"code", "comment"}
+    return all(key.startswith("add_") for key in common_keys)
+
+
+# The batch collecting product updates in the current context, if any
+_product_update_batch: contextvars.ContextVar[ProductUpdateBatch | None] = (
+    contextvars.ContextVar("robotoff_product_update_batch", default=None)
+)
+
+
+@contextlib.contextmanager
+def batch_product_updates() -> Iterator[ProductUpdateBatch]:
+    """Collect the product updates submitted with `submit_product_update`
+    inside the `with` block instead of sending them to Product Opener.
+
+    The caller is responsible for sending the collected updates (see
+    `ProductUpdateBatch.requests`) once the block exits.
+    """
+    batch = ProductUpdateBatch()
+    token = _product_update_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _product_update_batch.reset(token)
+
+
+def submit_product_update(
+    params: dict,
+    server_type: ServerType,
+    auth: OFFAuthentication | None = None,
+    **kwargs,
+) -> None:
+    """Send a product update to Product Opener, or add it to the current
+    batch if a batch is active (see `batch_product_updates`).
+
+    :param params: the `update_product` parameters
+    :param server_type: the server type of the product
+    :param auth: the user authentication data, None for automatic edits
+    :param kwargs: additional parameters passed to `update_product`
+    """
+    batch = _product_update_batch.get()
+    if batch is not None:
+        batch.add(params, server_type, auth, **kwargs)
+    else:
+        update_product(params, server_type=server_type, auth=auth, **kwargs)
 
 
 def update_product(
@@ -876,21 +1019,72 @@ def parse_ingredients(text: str, lang: str, timeout: int = 10) -> list[JSONType]
         vegetarian
 
 
-    :param server_type: the server type (project) to use
+    Results are cached on disk by normalized text and language (see
+    `normalize_ingredients_text`) for `INGREDIENT_PARSING_CACHE_TTL` seconds.
+    If `INGREDIENT_PARSER=local`, the local stand-in parser
+    (`robotoff.utils.ingredient_parser`) is used instead of Product Opener.
+
     :param text: the ingredients text to parse
     :param lang: the language of the text (used for parsing) as a 2-letter code
     :param timeout: the request timeout in seconds, defaults to 10s
     :raises RuntimeError: a RuntimeError is raised if the parsing fails
     :return: the list of parsed ingredients
     """
+    if len(text) == 0:
+        raise ValueError("text must be a non-empty string")
+
+    text = normalize_ingredients_text(text)
+    use_cache = settings.INGREDIENT_PARSING_CACHE_TTL > 0
+    cache_key = get_ingredient_parsing_cache_key(text, lang)
+    if use_cache:
+        # diskcache returns a new object for each call, so the cached value
+        # can't be altered by the caller
+        cached_ingredients = ingredient_parsing_cache.get(cache_key)
+        if cached_ingredients is not None:
+            return cached_ingredients
+
+    if settings.INGREDIENT_PARSER == "local":
+        ingredients = parse_ingredients_locally(text, lang)
+    else:
+        ingredients = _parse_ingredients_product_opener(text, lang, timeout)
+
+    if use_cache:
+        ingredient_parsing_cache.set(
+            cache_key, ingredients, expire=settings.INGREDIENT_PARSING_CACHE_TTL
+        )
+    return ingredients
+
+
+def normalize_ingredients_text(text: str) -> str:
+    """Normalize an ingredient list before parsing: leading and trailing
+    whitespaces are removed from each line, and consecutive whitespaces are
+    collapsed into a single space.
+
+    This doesn't change the parsing result, but makes OCR outputs that only
+    differ by their spacing share the same cache entry.
+    """
+    return "\n".join(" ".join(line.split()) for line in text.strip().splitlines())
+
+
+def get_ingredient_parsing_cache_key(text: str, lang: str) -> str:
+    """Return the key of the ingredient parsing cache for a normalized text
+    and a language."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"ingredients:{settings.INGREDIENT_PARSER}:{lang}:{text_hash}"
+
+
+def _parse_ingredients_product_opener(
+    text: str, lang: str, timeout: int
+) -> list[JSONType]:
+    """Parse ingredients text using Product Opener API, without caching.
+
+    See `parse_ingredients` for a description of the parameters.
+    """
     base_url = settings.BaseURLProvider.world(ServerType.off)
     # by using "test" as code, we don't save any information to database
     # This endpoint is specifically designed for testing purposes
     url = f"{base_url}/api/v3/product/test"
 
-    if len(text) == 0:
-        raise ValueError("text must be a non-empty string")
-
     try:
         r = http_session.patch(
             url,
@@ -0,0 +1,238 @@
+"""Offline category prediction over the whole product dataset.
+
+Products are streamed from the dataset dump, the model inputs (OCR texts and
+image embeddings) are fetched concurrently by a pool of threads, and
+products are sent to the category classifier by large batches. Predictions
+are imported one batch at a time, and the position in the dataset is saved
+in a checkpoint file after each batch, so that an interrupted run can be
+resumed.
+"""
+
+import dataclasses
+import itertools
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import orjson
+from more_itertools import chunked
+
+from robotoff.insights.importer import import_insights
+from robotoff.models import db
+from robotoff.types import JSONType, Prediction, ProductIdentifier, ServerType
+
+from .category_classifier import CategoryClassifier, CategoryPredictionInput
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class BulkCategoryPredictionResult:
+    #: number of products sent to the model
+    processed: int = 0
+    #: number of products for which inputs could not be fetched or the model
+    #: request failed
+    failed: int = 0
+    #: number of predictions imported
+    predictions: int = 0
+    #: index in the dataset of the next product to process
+    offset: int = 0
+
+
+def iter_candidate_products(
+    products: Iterable[JSONType],
+    server_type: ServerType,
+    skip_barcodes: set[str] | None = None,
+    start: int = 0,
+) -> Iterator[tuple[int, ProductIdentifier, JSONType]]:
+    """Iterate over the products of the dataset for which categories should
+    be predicted.
+
+    Products without barcode, duplicated products and products whose barcode
+    is in `skip_barcodes` are ignored.
+
+    :param products: the products of the dataset
+    :param server_type: the server type of the products
+    :param skip_barcodes: barcodes of the products to ignore, optional
+    :param start: index of the first product to consider, used to resume a
+        run
+    :return: an iterator of (dataset index, product ID, product) tuples
+    """
+    seen: set[str] = set()
+    for index, product in itertools.islice(enumerate(products), start, None):
+        barcode = product.get("code")
+        if (
+            not barcode
+            or barcode in seen
+            or (skip_barcodes is not None and barcode in skip_barcodes)
+        ):
+            continue
+        seen.add(barcode)
+        yield index, ProductIdentifier(barcode, server_type), product
+
+
+def prefetch_inputs(
+    candidates: Iterable[tuple[int, ProductIdentifier, JSONType]],
+    prepare_fn: Callable[[JSONType, ProductIdentifier], CategoryPredictionInput],
+    num_workers: int,
+    max_pending: int,
+) -> Iterator[tuple[int, CategoryPredictionInput | None]]:
+    """Prepare model inputs concurrently, while keeping the dataset order.
+
+    At most `max_pending` products are being prepared (or waiting to be
+    consumed) at any time, so that memory usage stays bounded.
+
+    :param candidates: (dataset index, product ID, product) tuples
+    :param prepare_fn: the function used to prepare the inputs of a product
+    :param num_workers: number of threads used to prepare inputs
+    :param max_pending: maximum number of products prepared in advance
+    :return: an iterator of (dataset index, inputs) tuples, inputs is None
+        if an error occurred during preparation
+    """
+    pending: deque[tuple[int, ProductIdentifier, Future]] = deque()
+    candidates_iter = iter(candidates)
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+
+        def fill() -> None:
+            while len(pending) < max_pending:
+                try:
+                    index, product_id, product = next(candidates_iter)
+                except StopIteration:
+                    return
+                pending.append(
+                    (
+                        index,
+                        product_id,
+                        executor.submit(prepare_fn, product, product_id),
+                    )
+                )
+
+        fill()
+        while pending:
+            index, product_id, future = pending.popleft()
+            fill()
+            try:
+                yield index, future.result()
+            except Exception as e:
+                logger.info(
+                    "Error while preparing inputs of %s", product_id, exc_info=e
+                )
+                yield index, None
+
+
+def run_bulk_category_prediction(
+    products: Iterable[JSONType],
+    classifier: CategoryClassifier,
+    server_type: ServerType = ServerType.off,
+    skip_barcodes: set[str] | None = None,
+    batch_size: int = 256,
+    num_workers: int = 16,
+    triton_uri: str | None = None,
+    checkpoint_path: Path | None = None,
+    dataset_id: str | None = None,
+    limit: int | None = None,
+    import_fn: Callable[[list[Prediction], ServerType], None] | None = None,
+) -> BulkCategoryPredictionResult:
+    """Predict categories for all products of the dataset, by batches.
+
+    If `checkpoint_path` is provided, the index in the dataset of the next
+    product to process is saved in this file after each imported batch, and
+    the run starts from this index if the file exists. The checkpoint file is
+    deleted once all products are processed (it's kept if `limit` is
+    provided, so that the next run starts where this one stopped).
+
+    :param products: the products of the dataset, in a deterministic order
+    :param classifier: the category classifier
+    :param server_type: the server type of the products
+    :param skip_barcodes: barcodes of the products to ignore, optional
+    :param batch_size: number of products sent in each model request
+    :param num_workers: number of threads used to fetch OCR texts and
+        generate image embeddings
+    :param triton_uri: URI of the Triton Inference Server, defaults to
+        None. If not provided, the default value from settings is used.
+    :param checkpoint_path: path of the checkpoint file, optional
+    :param dataset_id: identifier of the dataset (ex: its path and size),
+        saved in the checkpoint to make sure we resume on the same dataset
+    :param limit: maximum number of products to process, optional
+    :param import_fn: function used to import the predictions of a batch,
+        by default predictions are imported in DB and insights are generated
+    :return: the result of the run
+    """
+    start = 0
+    if checkpoint_path is not None and checkpoint_path.exists():
+        checkpoint = orjson.loads(checkpoint_path.read_bytes())
+        if checkpoint["dataset_id"] != dataset_id:
+            raise ValueError(
+                f"checkpoint {checkpoint_path} was created for another dataset: "
+                f"{checkpoint['dataset_id']}"
+            )
+        start = checkpoint["offset"]
+        logger.info("Resuming category prediction from product %d", start)
+
+    if import_fn is None:
+        import_fn = _import_predictions
+
+    def prepare_fn(
+        product: JSONType, product_id: ProductIdentifier
+    ) -> CategoryPredictionInput:
+        ocr_texts, image_embeddings = classifier.prepare_inputs(
+            product, product_id, triton_uri=triton_uri
+        )
+        return CategoryPredictionInput(
+            product_id=product_id,
+            product=product,
+            ocr_texts=ocr_texts,
+            image_embeddings=image_embeddings,
+        )
+
+    candidates: Iterable = iter_candidate_products(
+        products, server_type, skip_barcodes, start
+    )
+    if limit is not None:
+        candidates = itertools.islice(candidates, limit)
+
+    result = BulkCategoryPredictionResult(offset=start)
+    for batch in chunked(
+        prefetch_inputs(
+            candidates, prepare_fn, num_workers, max_pending=2 * batch_size
+        ),
+        batch_size,
+    ):
+        items = [item for _, item in batch if item is not None]
+        result.failed += len(batch) - len(items)
+
+        if items:
+            try:
+                batch_predictions = classifier.predict_batch(
+                    items, triton_uri=triton_uri
+                )
+            except Exception as e:
+                logger.warning("Error during batch category prediction", exc_info=e)
+                result.failed += len(items)
+            else:
+                predictions = list(itertools.chain.from_iterable(batch_predictions))
+                if predictions:
+                    import_fn(predictions, server_type)
+                result.processed += len(items)
+                result.predictions += len(predictions)
+
+        result.offset = batch[-1][0] + 1
+        if checkpoint_path is not None:
+            checkpoint_path.write_bytes(
+                orjson.dumps({"dataset_id": dataset_id, "offset": result.offset})
+            )
+        logger.info("Batch category prediction progress: %s", result)
+
+    if checkpoint_path is not None and limit is None:
+        # All products were processed
+        checkpoint_path.unlink(missing_ok=True)
+    return result
+
+
+def _import_predictions(predictions: list[Prediction], server_type: ServerType):
+    with db:
+        import_result = import_insights(predictions, server_type)
+    logger.debug(import_result)
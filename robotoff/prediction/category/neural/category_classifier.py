@@ -1,3 +1,4 @@
+import dataclasses
 import logging
 from typing import Any
 
@@ -50,6 +51,17 @@ def create_prediction(
     )
 
 
+@dataclasses.dataclass
+class CategoryPredictionInput:
+    """All inputs required to predict the categories of a product, used for
+    batch predictions."""
+
+    product_id: ProductIdentifier
+    product: JSONType
+    ocr_texts: list[str]
+    image_embeddings: np.ndarray | None
+
+
 class CategoryClassifier:
     """CategoryClassifier is responsible for generating predictions for a
     given product.
@@ -138,6 +150,49 @@ class CategoryClassifier:
         if model_name is None:
             model_name = NeuralCategoryClassifierModel.keras_image_embeddings_3_0
 
+        ocr_texts, image_embeddings = self.prepare_inputs(
+            product, product_id, triton_uri=triton_uri
+        )
+
+        triton_stub = get_triton_inference_stub(
+            triton_uri or settings.TRITON_URI_CATEGORY_CLASSIFIER
+        )
+        raw_predictions, debug = keras_category_classifier_3_0.predict(
+            product,
+            ocr_texts,
+            model_name,
+            stub=triton_stub,
+            threshold=threshold,
+            image_embeddings=image_embeddings,
+            category_taxonomy=self.taxonomy,
+            clear_cache=clear_cache,
+        )
+        predictions = self.build_predictions(
+            raw_predictions, model_name, product_id, deepest_only=deepest_only
+        )
+        return predictions, debug
+
+    def prepare_inputs(
+        self,
+        product: dict,
+        product_id: ProductIdentifier,
+        triton_uri: str | None = None,
+    ) -> tuple[list[str], np.ndarray | None]:
+        """Return the OCR texts and the image embeddings of the product, used
+        as model inputs.
+
+        The OCR texts and image embeddings provided in `product` (`ocr` and
+        `image_embeddings` fields) are used if available, otherwise they are
+        fetched from Product Opener or generated, see `predict` for more
+        information.
+
+        :param product: the product to predict the categories from
+        :param product_id: identifier of the product
+        :param triton_uri: URI of the Triton Inference Server used to
+            generate image embeddings, defaults to None
+        :return: a (ocr_texts, image_embeddings) tuple, `image_embeddings`
+            is None if no image is available
+        """
         if "ocr" in product:
             # We check that the OCR text list was not provided manually in
             # `product` dict
@@ -149,6 +204,7 @@ class CategoryClassifier:
             )
 
         # We check whether image embeddings were provided as input
+        image_embeddings: np.ndarray | None
         if "image_embeddings" in product:
             if product["image_embeddings"]:
                 image_embeddings = np.array(
@@ -171,20 +227,64 @@ class CategoryClassifier:
             image_embeddings = keras_category_classifier_3_0.generate_image_embeddings(
                 product, product_id, triton_stub_clip
             )
+        return ocr_texts, image_embeddings
+
+    def predict_batch(
+        self,
+        items: list[CategoryPredictionInput],
+        deepest_only: bool = False,
+        threshold: float | None = None,
+        model_name: NeuralCategoryClassifierModel | None = None,
+        triton_uri: str | None = None,
+    ) -> list[list[Prediction]]:
+        """Predict categories for a batch of products with a single model
+        request.
+
+        Contrary to `predict`, the OCR texts and image embeddings must be
+        provided (see `prepare_inputs`), so that they can be fetched
+        concurrently beforehand.
+
+        :param items: the inputs of each product of the batch
+        :param deepest_only: see `predict`
+        :param threshold: see `predict`
+        :param model_name: see `predict`
+        :param triton_uri: see `predict`
+        :return: the category predictions of each product, in the same order
+            as `items`
+        """
+        if model_name is None:
+            model_name = NeuralCategoryClassifierModel.keras_image_embeddings_3_0
 
         triton_stub = get_triton_inference_stub(
             triton_uri or settings.TRITON_URI_CATEGORY_CLASSIFIER
         )
-        raw_predictions, debug = keras_category_classifier_3_0.predict(
-            product,
-            ocr_texts,
+        results = keras_category_classifier_3_0.predict_batch(
+            [item.product for item in items],
+            [item.ocr_texts for item in items],
             model_name,
             stub=triton_stub,
             threshold=threshold,
-            image_embeddings=image_embeddings,
+            image_embeddings=[item.image_embeddings for item in items],
             category_taxonomy=self.taxonomy,
-            clear_cache=clear_cache,
         )
+        return [
+            self.build_predictions(
+                raw_predictions, model_name, item.product_id, deepest_only
+            )
+            for item, (raw_predictions, _) in zip(items, results)
+        ]
+
+    def build_predictions(
+        self,
+        raw_predictions: list[
+            tuple[str, float, keras_category_classifier_3_0.NeighborPredictionType]
+        ],
+        model_name: NeuralCategoryClassifierModel,
+        product_id: ProductIdentifier,
+        deepest_only: bool = False,
+    ) -> list[Prediction]:
+        """Convert raw model predictions into `Prediction`s, ignoring
+        categories that no longer exist in the taxonomy."""
         predictions = []
 
         for category_id, score, neighbor_predictions in raw_predictions:
@@ -214,5 +314,4 @@ class CategoryClassifier:
                 predicted_dict[x.id]
                 for x in self.taxonomy.find_deepest_nodes(taxonomy_nodes)
             ]
-
-        return predictions, debug
+        return predictions
@@ -8,14 +8,15 @@ from openfoodfacts.ocr import OCRResult
 from PIL import Image
 from tritonclient.grpc import service_pb2
 
+from robotoff.embeddings import save_embedding_batch
 from robotoff.images import refresh_images_in_db
-from robotoff.models import ImageEmbedding, ImageModel, with_db
+from robotoff.models import ImageEmbedding, ImageModel, db, with_db
 from robotoff.off import generate_image_url, generate_json_ocr_url
 from robotoff.taxonomy import Taxonomy
 from robotoff.triton import (
     GRPCInferenceServiceStub,
     deserialize_byte_tensor,
-    generate_clip_embedding_request,
+    generate_clip_embedding,
     serialize_byte_tensor,
 )
 from robotoff.types import JSONType, NeuralCategoryClassifierModel, ProductIdentifier
@@ -98,12 +99,13 @@ def save_image_embeddings(
         logger.info("%d images were not found in image table", num_missing_images)
 
     rows = [
-        {"image_id": image_id_to_model_id[image_id], "embedding": embedding.tobytes()}
+        (image_id_to_model_id[image_id], embedding)
         for image_id, embedding in embeddings.items()
         if image_id in image_id_to_model_id
     ]
-    ImageEmbedding.insert_many(rows).execute()
-    logger.info("%d image embeddings created in db", len(rows))
+    with db.atomic():
+        result = save_embedding_batch(ImageEmbedding, rows)
+    logger.info("%d image embeddings created in db", result.created)
 
 
 @with_db
@@ -206,20 +208,19 @@ def _generate_image_embeddings(
 ) -> dict[str, np.ndarray]:
     """Generate CLIP image embeddings by sending a request to Triton.
 
+    Embeddings already present in the CLIP embedding cache (shared with the
+    logo workflow) are not computed again, see
+    `robotoff.triton.generate_clip_embedding`.
+
     :param images_by_id: a dict mapping image ID to PIL Image
     :param stub: the triton inference stub to use
     :return: a dict mapping image ID to CLIP embedding
     """
-    request = generate_clip_embedding_request(list(images_by_id.values()))
     start_time = time.monotonic()
-    response = stub.ModelInfer(request)
+    computed_embeddings = generate_clip_embedding(list(images_by_id.values()), stub)
     ml_metrics_logger.info(
         "Inference time for CLIP: %ss", time.monotonic() - start_time
     )
-    computed_embeddings = np.frombuffer(
-        response.raw_output_contents[0],
-        dtype=np.float32,
-    ).reshape((len(images_by_id), -1))
     return dict(zip(images_by_id.keys(), computed_embeddings))
 
 
@@ -289,6 +290,93 @@ def predict(
     start_time = time.monotonic()
     scores, labels = _predict(inputs, model_name, stub)
     logger.debug("Predicted categories in %.2f seconds", time.monotonic() - start_time)
+    category_predictions = postprocess_predictions(
+        scores, labels, threshold, category_taxonomy
+    )
+
+    if clear_cache:
+        function_cache_register.clear("get_ingredient_taxonomy")
+        function_cache_register.clear("get_ingredient_processor")
+
+    return category_predictions, debug
+
+
+def predict_batch(
+    products: list[JSONType],
+    ocr_texts: list[list[str]],
+    model_name: NeuralCategoryClassifierModel,
+    stub,
+    threshold: float | None = None,
+    image_embeddings: list[np.ndarray | None] | None = None,
+    category_taxonomy: Taxonomy | None = None,
+) -> list[tuple[list[tuple[str, float, NeighborPredictionType | None]], JSONType]]:
+    """Predict categories for several products at once, with a single Triton
+    request.
+
+    This is the batched version of `predict`, used for bulk predictions.
+
+    :param products: the products for which we want to predict categories
+    :param ocr_texts: a list of OCR texts for each product
+    :param model_name: the name of the model to use
+    :param stub: the triton inference stub to use
+    :param threshold: the detection threshold, default is 0.5
+    :param image_embeddings: the image embeddings of each product (or None if
+        no image was available), optional
+    :param category_taxonomy: the category Taxonomy (optional), if provided
+        the predicted scores of parents, children and siblings will be returned
+    :return: a (predictions, debug) tuple for each product, see `predict`
+    """
+    if threshold is None:
+        threshold = 0.5
+
+    if not products:
+        return []
+
+    if image_embeddings is None:
+        image_embeddings = [None] * len(products)
+
+    inputs_list = [
+        generate_inputs_dict(product, product_ocr_texts, product_image_embeddings)
+        for product, product_ocr_texts, product_image_embeddings in zip(
+            products, ocr_texts, image_embeddings
+        )
+    ]
+    start_time = time.monotonic()
+    scores, labels = _predict_batch(inputs_list, model_name, stub)
+    logger.debug(
+        "Predicted categories for %d products in %.2f seconds",
+        len(products),
+        time.monotonic() - start_time,
+    )
+    return [
+        (
+            postprocess_predictions(
+                product_scores, labels, threshold, category_taxonomy
+            ),
+            generate_debug_dict(model_name, threshold, inputs),
+        )
+        for product_scores, inputs in zip(scores, inputs_list)
+    ]
+
+
+def postprocess_predictions(
+    scores: np.ndarray,
+    labels: list[str],
+    threshold: float,
+    category_taxonomy: Taxonomy | None = None,
+) -> list[tuple[str, float, NeighborPredictionType | None]]:
+    """Convert the scores returned by the model for a single product into
+    category predictions.
+
+    :param scores: the predicted scores, one per label
+    :param labels: the category ID of each score
+    :param threshold: the detection threshold
+    :param category_taxonomy: the category Taxonomy (optional), if provided
+        the predicted scores of parents, children and siblings will be returned
+    :return: the predicted categories as a list of
+        (category_tag, confidence, neighbor_predictions) tuples, sorted by
+        decreasing confidence
+    """
     indices = np.argsort(-scores)
 
     category_predictions: list[tuple[str, float, NeighborPredictionType | None]] = []
@@ -336,11 +424,7 @@ def predict(
         else:
             break
 
-    if clear_cache:
-        function_cache_register.clear("get_ingredient_taxonomy")
-        function_cache_register.clear("get_ingredient_processor")
-
-    return category_predictions, debug
+    return category_predictions
 
 
 def generate_debug_dict(
@@ -385,8 +469,22 @@ def _predict(
     inputs: JSONType, model_name: NeuralCategoryClassifierModel, stub
 ) -> tuple[np.ndarray, list[str]]:
     """Internal method to prepare and run triton request."""
+    scores, labels = _predict_batch([inputs], model_name, stub)
+    return scores[0], labels
+
+
+def _predict_batch(
+    inputs_list: list[JSONType], model_name: NeuralCategoryClassifierModel, stub
+) -> tuple[np.ndarray, list[str]]:
+    """Internal method to prepare and run a batched triton request.
+
+    :return: a (scores, labels) tuple, `scores` is an array of shape
+        (len(inputs_list), num_labels)
+    """
     start_time = time.monotonic()
-    request = build_triton_request(inputs, model_name=triton_model_names[model_name])
+    request = build_batch_triton_request(
+        inputs_list, model_name=triton_model_names[model_name]
+    )
     ml_metrics_logger.info(
         "Preprocessing time for %s: %ss",
         model_name.value,
@@ -401,9 +499,11 @@ def _predict(
 
     start_time = time.monotonic()
     scores = np.frombuffer(response.raw_output_contents[0], dtype=np.float32).reshape(
-        (1, -1)
-    )[0]
-    labels = deserialize_byte_tensor(response.raw_output_contents[1])
+        (len(inputs_list), -1)
+    )
+    # The label tensor may be repeated for each item of the batch, all
+    # repetitions are identical
+    labels = deserialize_byte_tensor(response.raw_output_contents[1])[: scores.shape[1]]
     ml_metrics_logger.info(
         "Post-processing time for %s: %ss",
         model_name.value,
@@ -439,9 +539,44 @@ def build_triton_request(
         defaults to True
     :return: the gRPC ModelInferRequest
     """
-    product_name = inputs["product_name"]
-    ingredients_tags = inputs["ingredients_tags"]
-    ingredients_ocr_tags = inputs["ingredients_ocr_tags"]
+    return build_batch_triton_request(
+        [inputs],
+        model_name,
+        add_product_name=add_product_name,
+        add_ingredient_tags=add_ingredient_tags,
+        add_nutriments=add_nutriments,
+        add_ingredients_ocr_tags=add_ingredients_ocr_tags,
+        add_image_embeddings=add_image_embeddings,
+    )
+
+
+def _pad_tags(tags_list: list[list[str]]) -> np.ndarray:
+    """Stack lists of tags of different lengths into a 2D string array, using
+    the empty string (already used when there is no tag) as padding."""
+    max_length = max(len(tags) for tags in tags_list)
+    return np.array(
+        [tags + [""] * (max_length - len(tags)) for tags in tags_list], dtype=object
+    )
+
+
+def build_batch_triton_request(
+    inputs_list: list[JSONType],
+    model_name: str,
+    add_product_name: bool = True,
+    add_ingredient_tags: bool = True,
+    add_nutriments: bool = True,
+    add_ingredients_ocr_tags: bool = True,
+    add_image_embeddings: bool = True,
+):
+    """Build a Triton ModelInferRequest gRPC request for a batch of products.
+
+    The parameters are the same as `build_triton_request`, except that
+    `inputs_list` contains the input dict of each product of the batch.
+    Variable-length inputs (ingredient tags) are padded with empty strings.
+
+    :return: the gRPC ModelInferRequest
+    """
+    batch_size = len(inputs_list)
     request = service_pb2.ModelInferRequest()
     request.model_name = model_name
 
@@ -453,63 +588,80 @@ def build_triton_request(
         # String must be provided as bytes
         product_name_input.datatype = "BYTES"
         # First dimension is batch size
-        product_name_input.shape.extend([1, 1])
+        product_name_input.shape.extend([batch_size, 1])
         # We must use extend method with protobuf to add an item to a list
         request.inputs.extend([product_name_input])
         # String must be provided as byte-serialized object numpy arrays
         request.raw_input_contents.extend(
-            [serialize_byte_tensor(np.array([[product_name]], dtype=object))]
+            [
+                serialize_byte_tensor(
+                    np.array(
+                        [[inputs["product_name"]] for inputs in inputs_list],
+                        dtype=object,
+                    )
+                )
+            ]
         )
 
     if add_ingredient_tags:
+        ingredients_tags = _pad_tags(
+            [inputs["ingredients_tags"] for inputs in inputs_list]
+        )
         ingredients_tags_input = service_pb2.ModelInferRequest().InferInputTensor()
         ingredients_tags_input.name = "ingredients_tags"
         ingredients_tags_input.datatype = "BYTES"
-        ingredients_tags_input.shape.extend([1, len(ingredients_tags)])
+        ingredients_tags_input.shape.extend(ingredients_tags.shape)
         request.inputs.extend([ingredients_tags_input])
-        request.raw_input_contents.extend(
-            [serialize_byte_tensor(np.array([ingredients_tags], dtype=object))]
-        )
+        request.raw_input_contents.extend([serialize_byte_tensor(ingredients_tags)])
 
     if add_nutriments:
         for nutriment_name in NUTRIMENT_NAMES:
             nutriment_input = service_pb2.ModelInferRequest().InferInputTensor()
             nutriment_input.name = nutriment_name
             nutriment_input.datatype = "FP32"
-            nutriment_input.shape.extend([1, 1])
+            nutriment_input.shape.extend([batch_size, 1])
             request.inputs.extend([nutriment_input])
-            value = inputs[nutriment_name]
             request.raw_input_contents.extend(
-                [np.array([[value]], dtype=np.float32).tobytes()]
+                [
+                    np.array(
+                        [[inputs[nutriment_name]] for inputs in inputs_list],
+                        dtype=np.float32,
+                    ).tobytes()
+                ]
             )
 
     if add_ingredients_ocr_tags:
+        ingredients_ocr_tags = _pad_tags(
+            [inputs["ingredients_ocr_tags"] for inputs in inputs_list]
+        )
         ingredients_ocr_tags_input = service_pb2.ModelInferRequest().InferInputTensor()
         ingredients_ocr_tags_input.name = "ingredients_ocr_tags"
         ingredients_ocr_tags_input.datatype = "BYTES"
-        ingredients_ocr_tags_input.shape.extend([1, len(ingredients_ocr_tags)])
+        ingredients_ocr_tags_input.shape.extend(ingredients_ocr_tags.shape)
         request.inputs.extend([ingredients_ocr_tags_input])
-        request.raw_input_contents.extend(
-            [serialize_byte_tensor(np.array([ingredients_ocr_tags], dtype=object))]
-        )
+        request.raw_input_contents.extend([serialize_byte_tensor(ingredients_ocr_tags)])
 
     if add_image_embeddings:
         image_embeddings_input = service_pb2.ModelInferRequest().InferInputTensor()
         image_embeddings_input.name = "image_embeddings"
         image_embeddings_input.datatype = "FP32"
         image_embeddings_input.shape.extend(
-            [1, MAX_IMAGE_EMBEDDING, IMAGE_EMBEDDING_DIM]
+            [batch_size, MAX_IMAGE_EMBEDDING, IMAGE_EMBEDDING_DIM]
         )
         request.inputs.extend([image_embeddings_input])
-        value = inputs["image_embeddings"]
+        value = np.stack(
+            [inputs["image_embeddings"] for inputs in inputs_list], axis=0
+        ).astype(np.float32, copy=False)
         request.raw_input_contents.extend([value.tobytes()])
 
         image_embeddings_mask_input = service_pb2.ModelInferRequest().InferInputTensor()
         image_embeddings_mask_input.name = "image_embeddings_mask"
         image_embeddings_mask_input.datatype = "FP32"
-        image_embeddings_mask_input.shape.extend([1, MAX_IMAGE_EMBEDDING])
+        image_embeddings_mask_input.shape.extend([batch_size, MAX_IMAGE_EMBEDDING])
         request.inputs.extend([image_embeddings_mask_input])
-        value = inputs["image_embeddings_mask"]
+        value = np.stack(
+            [inputs["image_embeddings_mask"] for inputs in inputs_list], axis=0
+        ).astype(np.float32, copy=False)
         request.raw_input_contents.extend([value.tobytes()])
 
     return request
@@ -4,7 +4,6 @@ import time
 import typing
 from typing import Callable
 
-import albumentations as A
 import numpy as np
 from PIL import Image, ImageOps
 from pydantic import BaseModel, Field
@@ -12,6 +11,7 @@ from tritonclient.grpc import service_pb2
 
 from robotoff.triton import get_triton_inference_stub
 from robotoff.types import ImageClassificationModel
+from robotoff.utils.startup import lazy_import
 
 ml_metrics_logger = logging.getLogger("robotoff.ml_metrics")
 
@@ -62,23 +62,45 @@ DEFAULT_MEAN = (0.0, 0.0, 0.0)
 DEFAULT_STD = (1.0, 1.0, 1.0)
 
 
-def classify_transforms_pad(max_size: int):
-    return A.Compose(
-        [
-            A.LongestMaxSize(max_size=max_size, p=1.0),
-            A.PadIfNeeded(min_height=max_size, min_width=max_size, p=1.0),
-            A.Normalize(mean=DEFAULT_MEAN, std=DEFAULT_STD, p=1.0),
-        ]
+def _lazy_albumentations_transform(build: Callable[[typing.Any], Callable]) -> Callable:
+    """Return a transform that builds the albumentations pipeline on first
+    call, so that albumentations (and OpenCV) are only imported when an image
+    is classified, not when the model configurations are defined.
+
+    :param build: a function that takes the `albumentations` module and
+        returns the transform pipeline.
+    """
+    pipeline: list[Callable] = []
+
+    def transform(**kwargs):
+        if not pipeline:
+            pipeline.append(build(lazy_import("albumentations")))
+        return pipeline[0](**kwargs)
+
+    return transform
+
+
+def classify_transforms_pad(max_size: int) -> Callable:
+    return _lazy_albumentations_transform(
+        lambda A: A.Compose(
+            [
+                A.LongestMaxSize(max_size=max_size, p=1.0),
+                A.PadIfNeeded(min_height=max_size, min_width=max_size, p=1.0),
+                A.Normalize(mean=DEFAULT_MEAN, std=DEFAULT_STD, p=1.0),
+            ]
+        )
     )
 
 
-def classify_transforms_crop_center_albumentations(max_size: int):
-    return A.Compose(
-        [
-            A.SmallestMaxSize(max_size=max_size, p=1.0),
-            A.CenterCrop(height=max_size, width=max_size, p=1.0),
-            A.Normalize(mean=DEFAULT_MEAN, std=DEFAULT_STD, p=1.0),
-        ]
+def classify_transforms_crop_center_albumentations(max_size: int) -> Callable:
+    return _lazy_albumentations_transform(
+        lambda A: A.Compose(
+            [
+                A.SmallestMaxSize(max_size=max_size, p=1.0),
+                A.CenterCrop(height=max_size, width=max_size, p=1.0),
+                A.Normalize(mean=DEFAULT_MEAN, std=DEFAULT_STD, p=1.0),
+            ]
+        )
     )
 
 
@@ -3,22 +3,29 @@ import functools
 import logging
 import time
 from pathlib import Path
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
 import numpy as np
 from openfoodfacts.ocr import OCRResult
-from transformers import AutoTokenizer, PreTrainedTokenizerBase
 from tritonclient.grpc import service_pb2
 
 from robotoff import settings
 from robotoff.prediction.ingredient_list.postprocess import detect_additional_mentions
 from robotoff.prediction.langid import LanguagePrediction, predict_lang_batch
-from robotoff.triton import GRPCInferenceServiceStub, get_triton_inference_stub
+from robotoff.triton import (
+    GRPCInferenceServiceStub,
+    create_batches,
+    get_triton_inference_stub,
+)
 from robotoff.utils import http_session
 from robotoff.utils.cache import function_cache_register
+from robotoff.utils.startup import lazy_import
 
 from .transformers_pipeline import AggregationStrategy, TokenClassificationPipeline
 
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizerBase
+
 ml_metrics_logger = logging.getLogger("robotoff.ml_metrics")
 
 # The tokenizer assets are stored in the model directory
@@ -118,7 +125,90 @@ def predict_from_ocr(
         [text], triton_stub, aggregation_strategy, predict_lang, model_version
     )
     prediction = predictions[0]
+    add_bounding_boxes(prediction, ocr_result)
+    return prediction
+
+
+def predict_from_ocr_batch(
+    ocr_results: list[OCRResult],
+    aggregation_strategy: AggregationStrategy = AggregationStrategy.FIRST,
+    predict_lang: bool = True,
+    model_version: str = "1",
+    triton_uri: str | None = None,
+    batch_size: int = 32,
+    max_padding_ratio: float = 0.25,
+) -> list[IngredientPredictionOutput]:
+    """Predict ingredient lists from a list of OCRs.
+
+    All texts are first tokenized at once (the tokenizer processes them in
+    parallel) to get their length. Texts of similar length are then grouped
+    into batches of at most `batch_size` texts (see
+    `robotoff.triton.create_batches`), and each batch is sent to the model
+    with `predict_batch`.
 
+    :param ocr_results: the OCR results to use
+    :param aggregation_strategy: the aggregation strategy to use, defaults to
+        AggregationStrategy.FIRST.
+    :param predict_lang: if True, populate the `lang` field in
+        `IngredientPredictionAggregatedEntity`. This flag is ignored if
+        `aggregation_strategy` is `NONE`.
+    :param model_version: version of the model model to use, defaults to "1"
+    :param triton_uri: URI of the Triton Inference Server, defaults to None. If
+        not provided, the default value from settings is used
+        (settings.TRITON_URI_INGREDIENT_NER).
+    :param batch_size: the maximum number of texts sent to the model in a
+        single inference request
+    :param max_padding_ratio: the maximum fraction of padding tokens in a
+        batch
+    :return: a list with the `IngredientPredictionOutput` of each OCR result
+        (in the same order)
+    """
+    texts = [ocr_result.get_full_text_contiguous() for ocr_result in ocr_results]
+    outputs = [
+        IngredientPredictionOutput(entities=[], text=text)  # type: ignore
+        for text in texts
+    ]
+    indices = [i for i, text in enumerate(texts) if text]
+    if not indices:
+        return outputs
+
+    start_time = time.monotonic()
+    tokenizer = get_tokenizer(INGREDIENT_NER_MODEL_DIR)
+    lengths = [
+        len(input_ids)
+        for input_ids in tokenizer([texts[i] for i in indices], truncation=True)[
+            "input_ids"
+        ]
+    ]
+    ml_metrics_logger.info(
+        "Batching time for %s: %ss (%d texts)",
+        MODEL_NAME,
+        time.monotonic() - start_time,
+        len(indices),
+    )
+
+    triton_stub = get_triton_inference_stub(
+        triton_uri or settings.TRITON_URI_INGREDIENT_NER
+    )
+    for batch in create_batches(lengths, batch_size, max_padding_ratio):
+        predictions = predict_batch(
+            [texts[indices[i]] for i in batch],
+            triton_stub,
+            aggregation_strategy,
+            predict_lang,
+            model_version,
+        )
+        for i, prediction in zip(batch, predictions):
+            add_bounding_boxes(prediction, ocr_results[indices[i]])
+            outputs[indices[i]] = prediction
+    return outputs
+
+
+def add_bounding_boxes(
+    prediction: IngredientPredictionOutput, ocr_result: OCRResult
+) -> None:
+    """Add the bounding box of each aggregated entity of the prediction,
+    using the OCR result the prediction was generated from."""
     for entity in prediction.entities:
         if isinstance(entity, IngredientPredictionAggregatedEntity):
             # Add the bounding box to the entity
@@ -126,11 +216,9 @@ def predict_from_ocr(
                 entity.start, entity.end
             )
 
-    return prediction
-
 
 @functools.cache
-def get_tokenizer(model_dir: Path) -> PreTrainedTokenizerBase:
+def get_tokenizer(model_dir: Path) -> "PreTrainedTokenizerBase":
     """Return the tokenizer located in `model_dir`.
 
     The tokenizer is only loaded once and then cached in memory.
@@ -138,7 +226,7 @@ def get_tokenizer(model_dir: Path) -> PreTrainedTokenizerBase:
     :param model_dir: the model directory
     :return: the tokenizer
     """
-    return AutoTokenizer.from_pretrained(model_dir)
+    return lazy_import("transformers").AutoTokenizer.from_pretrained(model_dir)
 
 
 def predict_batch(
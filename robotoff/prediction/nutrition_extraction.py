@@ -5,23 +5,28 @@ import re
 import time
 import typing
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import numpy as np
 from openfoodfacts.ocr import OCRResult
 from openfoodfacts.utils import load_json
 from PIL import Image
-from transformers import AutoProcessor, BatchEncoding, PreTrainedTokenizerBase
 from tritonclient.grpc import service_pb2
 
 from robotoff import settings
 from robotoff.triton import (
     GRPCInferenceServiceStub,
     add_triton_infer_input_tensor,
+    create_batches,
     get_triton_inference_stub,
 )
 from robotoff.types import JSONType
 from robotoff.utils.cache import function_cache_register
+from robotoff.utils.startup import lazy_import
+
+if typing.TYPE_CHECKING:
+    from transformers import BatchEncoding, PreTrainedTokenizerBase
 
 logger = logging.getLogger(__name__)
 ml_metrics_logger = logging.getLogger("robotoff.ml_metrics")
@@ -32,6 +37,11 @@ MODEL_VERSION = f"{MODEL_NAME}-2.0"
 # The tokenizer assets are stored in the model directory
 MODEL_DIR = settings.TRITON_MODELS_DIR / f"{MODEL_NAME}/2/model.onnx"
 
+# Maximum number of images sent to the model in a single inference request
+DEFAULT_BATCH_SIZE = 8
+# Maximum fraction of padding tokens in a batch, see `create_batches`
+DEFAULT_MAX_PADDING_RATIO = 0.25
+
 
 @dataclasses.dataclass
 class NutrientPrediction:
@@ -77,6 +87,8 @@ def predict(
     If the OCR result does not contain any text annotation, the function returns
     `None`.
 
+    To run the prediction on many images, use `predict_batch`.
+
     :param image: the *original* image (not resized)
     :param ocr_result: the OCR result
     :param model_version: the version of the model to use, defaults to None (latest)
@@ -84,52 +96,145 @@ def predict(
         default value from settings is used (settings.TRITON_URI_NUTRITION_EXTRACTOR).
     :return: a `NutritionExtractionPrediction` object
     """
-    start_time = time.monotonic()
-    id2label = get_id2label(MODEL_DIR)
-    processor = get_processor(MODEL_DIR)
-
-    preprocess_result = preprocess(image, ocr_result, processor)
+    return predict_batch(
+        [(image, ocr_result)], model_version=model_version, triton_uri=triton_uri
+    )[0]
 
-    if preprocess_result is None:
-        return None
 
-    words, char_offsets, _, batch_encoding = preprocess_result
-    ml_metrics_logger.info(
-        "Preprocessing time for %s: %ss", MODEL_NAME, time.monotonic() - start_time
-    )
+def predict_batch(
+    inputs: list[tuple[Image.Image, OCRResult]],
+    model_version: str | None = None,
+    triton_uri: str | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_padding_ratio: float = DEFAULT_MAX_PADDING_RATIO,
+    num_workers: int = 4,
+) -> list[NutritionExtractionPrediction | None]:
+    """Predict the nutrient values from a list of (image, OCR result) pairs.
+
+    Images are preprocessed in parallel (see `preprocess_batch`). Inputs are
+    then sorted by length and packed into model batches of at most
+    `batch_size` inputs, so that inputs of similar length are sent together
+    and the padding added to each batch stays bounded (see `create_batches`).
+
+    :param inputs: a list of (*original* image, OCR result) pairs
+    :param model_version: the version of the model to use, defaults to None (latest)
+    :param triton_uri: the URI of the Triton Inference Server, if not provided, the
+        default value from settings is used (settings.TRITON_URI_NUTRITION_EXTRACTOR).
+    :param batch_size: the maximum number of inputs sent to the model in a
+        single inference request
+    :param max_padding_ratio: the maximum fraction of padding tokens in a
+        batch
+    :param num_workers: the number of threads used for preprocessing
+    :return: a list with a `NutritionExtractionPrediction` for each input (in
+        the same order), or None if the OCR result of the input does not
+        contain any text annotation
+    """
+    if not inputs:
+        return []
 
     start_time = time.monotonic()
-    triton_stub = get_triton_inference_stub(
-        triton_uri or settings.TRITON_URI_NUTRITION_EXTRACTOR
-    )
-    logits = send_infer_request(
-        input_ids=batch_encoding.input_ids,
-        attention_mask=batch_encoding.attention_mask,
-        bbox=batch_encoding.bbox,
-        pixel_values=batch_encoding.pixel_values,
-        model_name=MODEL_NAME,
-        triton_stub=triton_stub,
-        model_version=model_version,
-    )
+    id2label = get_id2label(MODEL_DIR)
+    processor = get_processor(MODEL_DIR)
+    preprocess_results = preprocess_batch(inputs, processor, num_workers=num_workers)
     ml_metrics_logger.info(
-        "Inference time for %s: %ss",
+        "Preprocessing time for %s: %ss (%d images)",
         MODEL_NAME,
         time.monotonic() - start_time,
+        len(inputs),
     )
 
-    start_time = time.monotonic()
-    results = postprocess(logits[0], words, char_offsets, batch_encoding, id2label)
-    ml_metrics_logger.info(
-        "Post-processing time for %s: %ss", MODEL_NAME, time.monotonic() - start_time
+    predictions: list[NutritionExtractionPrediction | None] = [None] * len(inputs)
+    indices = [i for i, result in enumerate(preprocess_results) if result is not None]
+    if not indices:
+        return predictions
+
+    lengths = [
+        preprocess_results[i][3].input_ids.shape[1] for i in indices  # type: ignore
+    ]
+    triton_stub = get_triton_inference_stub(
+        triton_uri or settings.TRITON_URI_NUTRITION_EXTRACTOR
     )
-    return results
+    for batch in create_batches(lengths, batch_size, max_padding_ratio):
+        batch_results = [preprocess_results[indices[i]] for i in batch]
+        start_time = time.monotonic()
+        model_inputs = pad_batch(
+            [result[3] for result in batch_results],  # type: ignore
+            pad_token_id=processor.tokenizer.pad_token_id,
+        )
+        logits = send_infer_request(
+            **model_inputs,
+            model_name=MODEL_NAME,
+            triton_stub=triton_stub,
+            model_version=model_version,
+        )
+        ml_metrics_logger.info(
+            "Inference time for %s: %ss (batch of %d, %d tokens)",
+            MODEL_NAME,
+            time.monotonic() - start_time,
+            len(batch),
+            model_inputs["input_ids"].shape[1],
+        )
+
+        start_time = time.monotonic()
+        for batch_idx, (i, result) in enumerate(zip(batch, batch_results)):
+            words, char_offsets, _, batch_encoding = result  # type: ignore
+            # Remove the logits of the padding tokens
+            predictions[indices[i]] = postprocess(
+                logits[batch_idx, : lengths[i]],
+                words,
+                char_offsets,
+                batch_encoding,
+                id2label,
+            )
+        ml_metrics_logger.info(
+            "Post-processing time for %s: %ss",
+            MODEL_NAME,
+            time.monotonic() - start_time,
+        )
+    return predictions
+
+
+def pad_batch(
+    batch_encodings: list["BatchEncoding"], pad_token_id: int
+) -> dict[str, np.ndarray]:
+    """Pad and concatenate the (single item) BatchEncodings returned by
+    `preprocess_batch`, to send them to the model in a single request.
+
+    Sequences are padded on the right, padding tokens are masked with the
+    attention mask and have an empty bounding box.
+
+    :param batch_encodings: the BatchEncodings to concatenate
+    :param pad_token_id: the ID of the padding token
+    :return: a dict containing the `input_ids`, `attention_mask`, `bbox` and
+        `pixel_values` arrays
+    """
+    max_length = max(encoding.input_ids.shape[1] for encoding in batch_encodings)
+    input_ids = np.full(
+        (len(batch_encodings), max_length), pad_token_id, dtype=np.int64
+    )
+    attention_mask = np.zeros((len(batch_encodings), max_length), dtype=np.int64)
+    bbox = np.zeros((len(batch_encodings), max_length, 4), dtype=np.int64)
+    for i, encoding in enumerate(batch_encodings):
+        length = encoding.input_ids.shape[1]
+        input_ids[i, :length] = encoding.input_ids[0]
+        attention_mask[i, :length] = encoding.attention_mask[0]
+        bbox[i, :length] = encoding.bbox[0]
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "bbox": bbox,
+        "pixel_values": np.concatenate(
+            [encoding.pixel_values for encoding in batch_encodings]
+        ),
+    }
 
 
-def preprocess(
-    image: Image.Image, ocr_result: OCRResult, processor
-) -> (
+def preprocess(image: Image.Image, ocr_result: OCRResult, processor) -> (
     tuple[
-        list[str], list[tuple[int, int]], list[tuple[int, int, int, int]], BatchEncoding
+        list[str],
+        list[tuple[int, int]],
+        list[tuple[int, int, int, int]],
+        "BatchEncoding",
     ]
     | None
 ):
@@ -154,6 +259,85 @@ def preprocess(
     :return: a tuple containing the words, character offsets, bounding boxes and
         BatchEncoding
     """
+    return preprocess_batch([(image, ocr_result)], processor, num_workers=1)[0]
+
+
+def preprocess_batch(
+    inputs: list[tuple[Image.Image, OCRResult]], processor, num_workers: int = 4
+) -> list[
+    tuple[
+        list[str],
+        list[tuple[int, int]],
+        list[tuple[int, int, int, int]],
+        "BatchEncoding",
+    ]
+    | None
+]:
+    """Preprocess a list of (image, OCR result) pairs for the LayoutLMv3 model.
+
+    Word extraction and image processing are performed in parallel (using
+    `num_workers` threads), and all inputs are then tokenized with a single
+    tokenizer call.
+
+    The function returns, for each input, the same tuple as `preprocess`, or
+    None if the OCR result does not contain any text annotation. Each
+    BatchEncoding contains a single (non-padded) item.
+
+    :param inputs: a list of (*original* image, OCR result) pairs
+    :param processor: the LaymoutLM processor
+    :param num_workers: the number of threads to use
+    :return: a list with the preprocessing result of each input
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(num_workers, len(inputs)))) as pool:
+        items = list(
+            pool.map(
+                lambda input_: _preprocess_image(*input_, processor=processor),
+                inputs,
+            )
+        )
+
+    indices = [i for i, item in enumerate(items) if item is not None]
+    results: list = [None] * len(inputs)
+    if not indices:
+        return results
+
+    # The tokenizer tokenizes all inputs in parallel (in Rust)
+    encoding = processor.tokenizer(
+        [items[i][0] for i in indices],  # type: ignore
+        boxes=[items[i][2] for i in indices],  # type: ignore
+        truncation=True,
+        padding=False,
+        return_offsets_mapping=True,
+        return_special_tokens_mask=True,
+    )
+    BatchEncoding = lazy_import("transformers").BatchEncoding
+    for batch_idx, i in enumerate(indices):
+        words, char_offsets, bboxes, pixel_values = items[i]  # type: ignore
+        batch_encoding = BatchEncoding(
+            {key: np.array([value[batch_idx]]) for key, value in encoding.items()},
+            encoding=[encoding.encodings[batch_idx]],
+        )
+        batch_encoding["pixel_values"] = pixel_values
+        results[i] = (words, char_offsets, bboxes, batch_encoding)
+    return results
+
+
+def _preprocess_image(image: Image.Image, ocr_result: OCRResult, processor) -> (
+    tuple[
+        list[str],
+        list[tuple[int, int]],
+        list[tuple[int, int, int, int]],
+        np.ndarray,
+    ]
+    | None
+):
+    """Extract the words and their bounding boxes from the OCR result, and
+    compute the pixel values of the image.
+
+    :return: a tuple containing the words, character offsets, bounding boxes
+        and pixel values, or None if the OCR result does not contain any text
+        annotation
+    """
     if not ocr_result.full_text_annotation:
         return None
 
@@ -187,24 +371,15 @@ def preprocess(
                         )
                     )
 
-    batch_encoding = processor(
-        [image],
-        [words],
-        boxes=[bboxes],
-        truncation=True,
-        padding=False,
-        return_tensors="np",
-        return_offsets_mapping=True,
-        return_special_tokens_mask=True,
-    )
-    return words, char_offsets, bboxes, batch_encoding
+    pixel_values = processor.image_processor([image], return_tensors="np").pixel_values
+    return words, char_offsets, bboxes, pixel_values
 
 
 def postprocess(
     logits: np.ndarray,
     words: list[str],
     char_offsets: list[tuple[int, int]],
-    batch_encoding: BatchEncoding,
+    batch_encoding: "BatchEncoding",
     id2label: dict[int, str],
 ) -> NutritionExtractionPrediction:
     """Postprocess the model output to extract the nutrient predictions.
@@ -248,7 +423,7 @@ def gather_pre_entities(
     logits: np.ndarray,
     words: list[str],
     char_offsets: list[tuple[int, int]],
-    batch_encoding: BatchEncoding,
+    batch_encoding: "BatchEncoding",
     id2label: dict[int, str],
 ) -> list[JSONType]:
     """Gather the pre-entities extracted by the model.
@@ -620,7 +795,7 @@ def match_nutrient_value(
 
 
 @functools.cache
-def get_processor(model_dir: Path) -> PreTrainedTokenizerBase:
+def get_processor(model_dir: Path) -> "PreTrainedTokenizerBase":
     """Return the processor located in `model_dir`.
 
     The processor is only loaded once and then cached in memory.
@@ -628,7 +803,7 @@ def get_processor(model_dir: Path) -> PreTrainedTokenizerBase:
     :param model_dir: the model directory
     :return: the processor
     """
-    return AutoProcessor.from_pretrained(model_dir)
+    return lazy_import("transformers").AutoProcessor.from_pretrained(model_dir)
 
 
 @functools.cache
@@ -1,6 +1,7 @@
 import functools
 import logging
-from typing import Union
+import re
+from typing import Iterator, Literal, Union
 
 from lark import Discard, Lark, Transformer
 from openfoodfacts.ocr import OCRResult, get_text
@@ -12,7 +13,7 @@ from robotoff.prediction.ocr.grammar import (
 )
 from robotoff.taxonomy import TaxonomyType
 from robotoff.types import PackagingElementProperty, Prediction, PredictionType
-from robotoff.utils import load_json
+from robotoff.utils import dump_json, load_json
 from robotoff.utils.cache import function_cache_register
 from robotoff.utils.text import strip_consecutive_spaces
 
@@ -69,6 +70,24 @@ def generate_packaging_lark_file(lang: str):
         terminal_priority=1,
         ignore_ids={"en:unknown"},
     )
+    generate_packaging_matcher_file(lang)
+
+
+def generate_packaging_matcher_file(lang: str):
+    """Generate the file containing the terminal symbols of the packaging
+    grammar, as compiled by lark.
+
+    This file is used by `PackagingMatcher`, so that we don't have to load
+    the lark grammar to match packaging elements. It must be regenerated each
+    time the grammar or the terminal symbol files are updated.
+    """
+    grammar = Lark.open(
+        str(settings.GRAMMARS_DIR / f"packaging_{lang}.lark"), start="value"
+    )
+    dump_json(
+        settings.GRAMMARS_DIR / f"packaging_{lang}_terminals.json",
+        {terminal.name: terminal.pattern.to_regexp() for terminal in grammar.terminals},
+    )
 
 
 @functools.cache
@@ -179,10 +198,214 @@ def load_taxonomy_map(lang: str) -> dict[str, dict[str, list[str]]]:
     }
 
 
-def match_packaging(text: str) -> list[dict]:
-    """Find packaging elements in the text using Lark parser.
+class PackagingMatcher:
+    """Find packaging elements in a text, in linear time.
+
+    This matcher recognizes the same language as the lark packaging grammar
+    (`packaging_{lang}.lark`) and returns the same results as the lark Earley
+    parser, without building the Earley parse forest, which was very slow on
+    long OCR texts.
+
+    The grammar is ambiguous (any word can be parsed as junk), and the Earley
+    parser selects the parse that contains the largest number of packaging
+    terminals (shapes, materials and recycling instructions have priority 1,
+    all other terminals priority 0). With lark dynamic lexer, each terminal
+    has a single match at a given position, so the best parse of every
+    prefix of the text can be computed from left to right in a single pass,
+    with dynamic programming.
+
+    Ties are broken the way lark does:
+
+    - a parse ending with a packaging element is preferred over a parse
+      ending with junk, which is preferred over a parse ending with
+      whitespaces (this is the order of the alternatives in the `value`
+      rule), and a parse made of a single element is always preferred
+    - if two parses end with a packaging element, the shortest element is
+      preferred, except if the elements end with a recycling instruction: the
+      longest element is then preferred
+
+    Contrary to the transformer used with the Earley parser, terminal matches
+    that are not in the taxonomy maps (this can happen as some taxonomy
+    synonyms contain regex special characters) are ignored instead of
+    raising an error, and whitespace characters that are not matched by the
+    grammar are considered as junk instead of making the parsing fail.
+    """
+
+    # Order of the alternatives of the `value` rule, used to break ties
+    PACKAGING, JUNK, WS = 0, 1, 2
+
+    def __init__(
+        self,
+        terminals: dict[str, str],
+        taxonomy_maps: dict[str, dict[str, list[str]]],
+    ) -> None:
+        """Create the matcher.
+
+        :param terminals: the regex of each terminal symbol of the grammar,
+            see `generate_packaging_matcher_file`
+        :param taxonomy_maps: the taxonomy maps, see `load_taxonomy_map`
+        """
+        self.shape_regex = re.compile(terminals["PACKAGING_SHAPES"])
+        self.material_regex = re.compile(terminals["PACKAGING_MATERIALS"])
+        self.recycling_regex = re.compile(terminals["PACKAGING_RECYCLING"])
+        self.en_regex = re.compile(terminals["EN"])
+        self.a_regex = re.compile(terminals["A"])
+        self.ws_regex = re.compile(terminals["WS"])
+        # Fallback on a single character (a whitespace that is not matched by
+        # WS)
+        self.other_regex = re.compile(f"{terminals['OTHER']}|.", re.DOTALL)
+        self.taxonomy_maps = taxonomy_maps
+
+    def match(self, text: str) -> list[dict]:
+        """Find packaging elements in the text.
+
+        :param text: the normalized text (see `match_packaging`)
+        :return: the detected packaging elements, see `match_packaging`
+        """
+        # For each position in the text reachable by the parser, the
+        # (score, tie-breaking key, start of the last element, last element)
+        # of the best parse of the text up to this position
+        best: list[tuple[int, tuple[int, int], int, dict | None] | None] = [None] * (
+            len(text) + 1
+        )
+        best[0] = (0, (0, 0), 0, None)
+
+        for start in range(len(text)):
+            if best[start] is None:
+                continue
+            score = best[start][0]  # type: ignore
+            # Rule order is higher when the element is not the first one
+            rule_order_offset = 3 if start else 0
+
+            candidates = [
+                (end, element_score, self.PACKAGING, element)
+                for end, element_score, element in self._iter_packaging(text, start)
+            ]
+            if (match := self.ws_regex.match(text, start)) is not None:
+                candidates.append((match.end(), 0, self.WS, None))
+            else:
+                match = self.other_regex.match(text, start)
+                candidates.append((match.end(), 0, self.JUNK, None))  # type: ignore
+
+            for end, element_score, rule_order, element in candidates:
+                if element is not None and "recycling" in element:
+                    tie_break = (-(rule_order + rule_order_offset), -start)
+                else:
+                    tie_break = (-(rule_order + rule_order_offset), start)
+                current = best[end]
+                candidate = (score + element_score, tie_break, start, element)
+                if current is None or candidate[:2] > current[:2]:
+                    best[end] = candidate
+
+        elements = []
+        end = len(text)
+        while end:
+            _, _, end, element = best[end]  # type: ignore
+            if element is not None:
+                elements.append(element)
+        return elements[::-1]
+
+    def _iter_packaging(self, text: str, start: int) -> Iterator[tuple[int, int, dict]]:
+        """Iterate over all packaging elements (see `packaging` rule) starting
+        at `start`.
+
+        :return: an iterator of (end, score, element) tuples, where score is
+            the number of packaging terminals in the element
+        """
+        shape = self._match_terminal(
+            self.shape_regex, TaxonomyType.packaging_shape, text, start
+        )
+        if shape is None:
+            return
+
+        shape_element = {"shape": shape[1]}
+        elements = [(shape[0], 1, shape_element)]
+        if (ws := self.ws_regex.match(text, shape[0])) is not None:
+            material_starts = [ws.end()]
+            if (en := self.en_regex.match(text, ws.end())) is not None and (
+                ws := self.ws_regex.match(text, en.end())
+            ) is not None:
+                material_starts.append(ws.end())
+            for material_start in material_starts:
+                material = self._match_terminal(
+                    self.material_regex,
+                    TaxonomyType.packaging_material,
+                    text,
+                    material_start,
+                )
+                if material is None:
+                    continue
+                elements.append(
+                    (material[0], 2, {**shape_element, "material": material[1]})
+                )
+                # 2 materials, "plastique PET", only keep the last one
+                if (ws := self.ws_regex.match(text, material[0])) is not None and (
+                    material := self._match_terminal(
+                        self.material_regex,
+                        TaxonomyType.packaging_material,
+                        text,
+                        ws.end(),
+                    )
+                ) is not None:
+                    elements.append(
+                        (material[0], 3, {**shape_element, "material": material[1]})
+                    )
+
+        for end, score, element in elements:
+            yield end, score, element
+            if (
+                (ws := self.ws_regex.match(text, end)) is not None
+                and (a := self.a_regex.match(text, ws.end())) is not None
+                and (ws := self.ws_regex.match(text, a.end())) is not None
+                and (
+                    recycling := self._match_terminal(
+                        self.recycling_regex,
+                        TaxonomyType.packaging_recycling,
+                        text,
+                        ws.end(),
+                    )
+                )
+                is not None
+            ):
+                yield recycling[0], score + 1, {**element, "recycling": recycling[1]}
+
+    def _match_terminal(
+        self, regex: re.Pattern, taxonomy_type: TaxonomyType, text: str, start: int
+    ) -> tuple[int, dict] | None:
+        """Match a packaging terminal at `start`.
+
+        :return: None if there is no match or if the matched value is not in
+            the taxonomy map, otherwise a (end, field value) tuple
+        """
+        if (match := regex.match(text, start)) is None:
+            return None
+        value = match.group()
+        value_tags = self.taxonomy_maps[taxonomy_type.name].get(value)
+        if not value_tags:
+            return None
+        # Return first match
+        return match.end(), {"value": value, "value_tag": value_tags[0]}
+
+
+@functools.cache
+def load_packaging_matcher(lang: str) -> PackagingMatcher:
+    return PackagingMatcher(
+        load_json(  # type: ignore
+            settings.GRAMMARS_DIR / f"packaging_{lang}_terminals.json"
+        ),
+        load_taxonomy_map(lang),
+    )
+
+
+def match_packaging(
+    text: str, parser: Literal["linear", "earley"] = "linear"
+) -> list[dict]:
+    """Find packaging elements in the text.
 
     :param text: the input text
+    :param parser: the parser to use, either the linear-time
+      `PackagingMatcher` (default) or the Lark Earley parser. Both return the
+      same results.
     :return: a list of detected packaging with up to 3 fields: `shape`,
       `material` and `recycling`. Each field has a `value` and a `value_tag`
       field. `value_tag` is None if the detected string could not be mapped
@@ -191,7 +414,6 @@ def match_packaging(text: str) -> list[dict]:
     """
     # Only fr is supported currently
     lang = "fr"
-    grammar = load_grammar(lang)
     processed_text = normalize_string(text, lowercase=True, strip_accent=True)
     processed_text = strip_consecutive_spaces(processed_text)
 
@@ -199,7 +421,10 @@ def match_packaging(text: str) -> list[dict]:
         # don't parse if text is empty after preprocessing
         return []
 
-    t = grammar.parse(processed_text)
+    if parser == "linear":
+        return load_packaging_matcher(lang).match(processed_text)
+
+    t = load_grammar(lang).parse(processed_text)
     return PackagingFRTransformer(load_taxonomy_map(lang)).transform(t)
 
 
@@ -243,3 +468,5 @@ def find_packaging(content: Union[OCRResult, str]) -> list[Prediction]:
 
 function_cache_register.register(load_grammar)
 function_cache_register.register(load_taxonomy_map)
+# `load_packaging_matcher` is not registered: it only depends on files
+# shipped with Robotoff, there is no need to reload it after every request
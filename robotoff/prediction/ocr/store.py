@@ -1,14 +1,10 @@
 import functools
+import itertools
+import math
 import re
-from typing import Union
-
-from openfoodfacts.ocr import (
-    OCRField,
-    OCRRegex,
-    OCRResult,
-    get_match_bounding_box,
-    get_text,
-)
+from typing import Iterator, Union
+
+from openfoodfacts.ocr import OCRResult, get_match_bounding_box
 
 from robotoff import settings
 from robotoff.types import Prediction, PredictionType
@@ -50,54 +46,235 @@ def get_sorted_stores() -> list[tuple[str, str]]:
     return sorted(sorted_stores.items(), key=store_sort_key)
 
 
+# Characters that the `re` module considers equal to another lowercase
+# character in case-insensitive mode (e.g. "ı" and "i"), mapped to this
+# character
+RE_CASE_EQUIVALENCES = str.maketrans(
+    "µıſͅςϐϑϕϖϰϱϵᲀᲁᲂᲃᲄᲅᲆᲇᲈẛιΐΰﬆ", "μisισβθφπκρεвдосттъѣꙋṡιΐΰﬅ"
+)
+
+
+def fold_case(text: str) -> str:
+    """Lowercase the text, so that two strings are equal after folding if
+    they are equal according to the `re` module in case-insensitive mode.
+
+    Contrary to `str.lower`, the length of the string is preserved.
+    """
+    # LATIN CAPITAL LETTER I WITH DOT ABOVE is the only letter that changes
+    # length when lowercased
+    return text.replace("İ", "i").lower().translate(RE_CASE_EQUIVALENCES)
+
+
+def expand_store_pattern(pattern: str, max_expansions: int = 100) -> list[str] | None:
+    """Expand a store regex into the list of strings it matches, in the
+    order in which the regex engine tries them.
+
+    Only literal (or escaped) characters, character sets without ranges,
+    non-capturing groups containing alternatives and the greedy `?`
+    quantifier are supported, None is returned for any other regex. None is
+    also returned if the regex matches more than `max_expansions` strings.
+
+    :param pattern: the store regex
+    :param max_expansions: the maximum number of strings to return
+    :return: the list of strings matched by the regex or None
+    """
+    # List of alternatives for each part of the pattern
+    parts: list[list[str]] = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if i + 1 == len(pattern):
+                return None
+            escaped = pattern[i + 1]
+            if escaped in "nt":
+                parts.append(["\n" if escaped == "n" else "\t"])
+            elif escaped.isalnum() or escaped == "_":
+                # character classes (\w, \d,...), anchors or backreferences
+                return None
+            else:
+                parts.append([escaped])
+            i += 2
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            content = pattern[i + 1 : end]
+            # Negated sets, ranges and nested sets are not supported
+            if (
+                end == -1
+                or not content
+                or content.startswith("^")
+                or "[" in content
+                or "-" in content[1:-1]
+            ):
+                return None
+            chars = expand_store_pattern(content)
+            if chars is None or len(chars) != 1:
+                return None
+            parts.append(list(dict.fromkeys(chars[0])))
+            i = end + 1
+        elif pattern.startswith("(?:", i):
+            end = pattern.find(")", i)
+            if end == -1 or "(" in pattern[i + 3 : end]:
+                return None
+            alternatives = []
+            for alternative in pattern[i + 3 : end].split("|"):
+                if (
+                    expanded := expand_store_pattern(alternative, max_expansions)
+                ) is None:
+                    return None
+                alternatives += expanded
+            parts.append(alternatives)
+            i = end + 1
+        elif char == "?":
+            if not parts or pattern.startswith("?", i + 1) or "" in parts[-1]:
+                return None
+            # Greedy quantifier: the regex engine tries to match the optional
+            # part first
+            parts[-1].append("")
+            i += 1
+        elif char in ".^$*+{}()|]":
+            return None
+        else:
+            parts.append([char])
+            i += 1
+
+    if math.prod(len(part) for part in parts) > max_expansions:
+        return None
+    return ["".join(strings) for strings in itertools.product(*parts)]
+
+
+class StoreMatcher:
+    r"""Find store names in a text.
+
+    The matches are the same as the ones of the case-insensitive regex
+    `(?<!\w)pattern_1(?!\w)|(?<!\w)pattern_2(?!\w)|...` built from all
+    store patterns (see `get_sorted_stores`): at the leftmost position where
+    a store matches, the first store in the sorted store list is selected,
+    and the search resumes after the match.
+
+    Checking all alternatives of a single regex at every text position is
+    slow with hundreds of stores. Instead, the store patterns are expanded
+    into the literal strings they match (see `expand_store_pattern`), which
+    are stored in a trie and looked up in a single pass over the text. Only
+    the patterns that cannot be expanded are searched as regexes.
+    """
+
+    def __init__(self, patterns: list[str]) -> None:
+        """Create the matcher.
+
+        :param patterns: the store patterns, by decreasing priority
+        """
+        # Nested dict, the None key of a node contains the
+        # (pattern index, expansion rank) tuple of the string ending at this
+        # node
+        self.trie: dict = {}
+        self.regexes: list[tuple[int, re.Pattern]] = []
+
+        for idx, pattern in enumerate(patterns):
+            expansions = expand_store_pattern(pattern)
+            if expansions is None:
+                self.regexes.append(
+                    (idx, re.compile(r"(?<!\w){}(?!\w)".format(pattern), re.I))
+                )
+                continue
+            for rank, expansion in enumerate(expansions):
+                node = self.trie
+                for char in fold_case(expansion):
+                    node = node.setdefault(char, {})
+                # Keep the pattern with the highest priority if a string
+                # matches several patterns
+                node.setdefault(None, (idx, rank))
+
+    def finditer(self, text: str) -> Iterator[tuple[int, int, int]]:
+        """Find store names in the text.
+
+        :param text: the text
+        :return: an iterator of (pattern index, match start, match end)
+          tuples, sorted by match start
+        """
+        folded_text = fold_case(text)
+        # Next match of each regex, from the current position
+        regex_matches = [
+            (idx, regex, regex.search(text)) for idx, regex in self.regexes
+        ]
+        start = 0
+        while start < len(text):
+            # (pattern index, expansion rank, end) of the best match
+            best: tuple[int, int, int] | None = None
+
+            if start == 0 or not _is_word_char(text[start - 1]):
+                node = self.trie
+                for end in range(start + 1, len(text) + 1):
+                    node = node.get(folded_text[end - 1])
+                    if node is None:
+                        break
+                    if (
+                        None in node
+                        and (end == len(text) or not _is_word_char(text[end]))
+                        and (best is None or node[None] < best[:2])
+                    ):
+                        best = (*node[None], end)
+
+            for i, (idx, regex, match) in enumerate(regex_matches):
+                if match is not None and match.start() < start:
+                    match = regex.search(text, start)
+                    regex_matches[i] = (idx, regex, match)
+                if (
+                    match is not None
+                    and match.start() == start
+                    and (best is None or idx < best[0])
+                ):
+                    best = (idx, 0, match.end())
+
+            if best is None:
+                start += 1
+            else:
+                yield best[0], start, best[2]
+                start = best[2]
+
+
+def _is_word_char(char: str) -> bool:
+    r"""Return True if the character is matched by `\w` in a regex."""
+    return char.isalnum() or char == "_"
+
+
 @functools.cache
-def get_store_ocr_regex() -> OCRRegex:
-    sorted_stores = get_sorted_stores()
-    store_regex_str = "|".join(
-        r"((?<!\w){}(?!\w))".format(pattern) for _, pattern in sorted_stores
-    )
-    return OCRRegex(
-        re.compile(store_regex_str, re.I), field=OCRField.full_text_contiguous
-    )
+def get_store_matcher() -> StoreMatcher:
+    return StoreMatcher([pattern for _, pattern in get_sorted_stores()])
 
 
 def find_stores(content: Union[OCRResult, str]) -> list[Prediction]:
     results = []
-    store_ocr_regex = get_store_ocr_regex()
+    store_matcher = get_store_matcher()
     sorted_stores = get_sorted_stores()
-    text = get_text(content, store_ocr_regex)
+    text = (
+        content.get_full_text_contiguous()
+        if isinstance(content, OCRResult)
+        else content
+    )
 
     if not text:
         return []
 
-    for match in store_ocr_regex.regex.finditer(text):
-        groups = match.groups()
+    for idx, start, end in store_matcher.finditer(text):
+        store, _ = sorted_stores[idx]
+        data = {"text": text[start:end]}
+        if (bounding_box := get_match_bounding_box(content, start, end)) is not None:
+            data["bounding_box_absolute"] = bounding_box
 
-        for idx, match_str in enumerate(groups):
-            if match_str is not None:
-                store, _ = sorted_stores[idx]
-                data = {"text": match_str}
-                if (
-                    bounding_box := get_match_bounding_box(
-                        content, match.start(), match.end()
-                    )
-                ) is not None:
-                    data["bounding_box_absolute"] = bounding_box
-
-                results.append(
-                    Prediction(
-                        type=PredictionType.store,
-                        value=store,
-                        value_tag=get_store_tag(store),
-                        data=data,
-                        predictor="regex",
-                        predictor_version=PREDICTOR_VERSION,
-                    )
-                )
-                break
+        results.append(
+            Prediction(
+                type=PredictionType.store,
+                value=store,
+                value_tag=get_store_tag(store),
+                data=data,
+                predictor="regex",
+                predictor_version=PREDICTOR_VERSION,
+            )
+        )
 
     return results
 
 
 function_cache_register.register(get_sorted_stores)
-function_cache_register.register(get_store_ocr_regex)
+function_cache_register.register(get_store_matcher)
@@ -2,9 +2,10 @@ import logging
 import typing
 from enum import Enum
 
-import cv2
 import numpy as np
 
+from robotoff.utils.startup import lazy_import
+
 logger = logging.getLogger(__name__)
 
 
@@ -58,7 +59,7 @@ def get_is_upc_image_from_image(
     # greater area in the image means it is a "UPC_Image"
 
     # use built in barcode model from opencvcontrib
-    bd = cv2.barcode.BarcodeDetector()
+    bd = lazy_import("cv2").barcode.BarcodeDetector()
 
     # returns a tuple of the barcode data ending in the points of the bounding
     # box other return values in order are a bool of whether the barcode was
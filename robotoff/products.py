@@ -15,21 +15,48 @@ from typing import Iterable, Iterator, Union
 import requests
 from huggingface_hub import snapshot_download
 from openfoodfacts.images import convert_to_legacy_schema
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 
 from robotoff import settings
 from robotoff.types import JSONType, ProductIdentifier, ServerType
 from robotoff.utils import gzip_jsonl_iter, http_session, jsonl_iter
+from robotoff.utils.tracing import add_span
 
 logger = logging.getLogger(__name__)
 
 MONGO_SELECTION_TIMEOUT_MS = 10_0000
 
 
+class TracingCommandListener(monitoring.CommandListener):
+    """MongoDB command listener that records a span for every command when
+    tracing is enabled."""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        add_span(
+            event.command_name,
+            "mongodb",
+            event.duration_micros * 1000,
+            {"database": event.database_name},
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        add_span(
+            event.command_name,
+            "mongodb",
+            event.duration_micros * 1000,
+            {"database": event.database_name, "error": str(event.failure)},
+        )
+
+
 @functools.cache
 def get_mongo_client() -> MongoClient:
     return MongoClient(
-        settings.MONGO_URI, serverSelectionTimeoutMS=MONGO_SELECTION_TIMEOUT_MS
+        settings.MONGO_URI,
+        serverSelectionTimeoutMS=MONGO_SELECTION_TIMEOUT_MS,
+        event_listeners=[TracingCommandListener()],
     )
 
 
@@ -1,4 +1,6 @@
+import csv
 import datetime
+import io
 import logging
 import os
 import shutil
@@ -6,26 +8,31 @@ import uuid
 from pathlib import Path
 from typing import Iterable
 
+import orjson
 import pytz
 import requests.exceptions
 from apscheduler.events import EVENT_JOB_ERROR
 from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.schedulers.blocking import BlockingScheduler
+from more_itertools import chunked
 from playhouse.postgres_ext import ServerSide
 from sentry_sdk import capture_exception
 
 from robotoff import settings
-from robotoff.insights.annotate import annotate
+from robotoff.insights.annotation_runner import AnnotationRunner
 from robotoff.insights.importer import BrandInsightImporter, is_valid_insight_image
+from robotoff.logo_annotations import check_logo_annotation_index
 from robotoff.metrics import (
     ensure_influx_database,
     save_facet_metrics,
     save_insight_metrics,
+    save_job_metrics,
 )
-from robotoff.models import Prediction, ProductInsight, db
+from robotoff.models import Prediction, ProductInsight, db, fold_insight_count_deltas
 from robotoff.products import (
     Product,
+    ProductDataset,
     fetch_jsonl_dataset,
     fetch_parquet_datasets,
     get_min_product_store,
@@ -43,33 +50,56 @@ logger = logging.getLogger(__name__)
 # Note: we do not use with_db, for atomicity is handled in annotator
 def process_insights() -> None:
     with db.connection_context():
-        processed = 0
-        insight: ProductInsight
-        for insight in (
-            ProductInsight.select()
-            .where(
+        insights = list(
+            ProductInsight.select().where(
                 ProductInsight.annotation.is_null(),
                 ProductInsight.process_after.is_null(False),
                 ProductInsight.process_after
                 <= datetime.datetime.now(datetime.timezone.utc),
             )
-            .iterator()
-        ):
-            try:
-                logger.info(
-                    "Annotating insight %s (%s)", insight.id, insight.get_product_id()
-                )
-                annotate(insight, 1, update=True)
-                processed += 1
-            except Exception as e:
-                # continue to the next one
-                # Note: annotator already rolled-back the transaction
-                logger.exception(
-                    f"exception {e} while handling annotation of insight %s (%s)",
-                    insight.id,
-                    insight.get_product_id(),
-                )
-    logger.info("%d insights processed", processed)
+        )
+    logger.info("%d insights to process", len(insights))
+    stats = AnnotationRunner().run(insights)
+    logger.info(
+        "%d insights processed, %d failed, %d product updates sent",
+        stats["processed"],
+        stats["failed"],
+        stats["product_updates"],
+    )
+
+
+# Product fields needed to refresh predictions and insights
+REFRESH_PRODUCT_PROJECTION = [
+    "code",
+    "brands_tags",
+    "countries_tags",
+    "unique_scans_n",
+    "image_ids",
+]
+
+
+def get_refresh_datetime_threshold() -> datetime.datetime | None:
+    """Return the datetime threshold used to refresh predictions and insights
+    (today at midnight UTC): only items older than this threshold are
+    checked.
+
+    Return None if the minified JSONL dump was not generated today, as
+    predictions and insights must not be refreshed using an outdated
+    dump.
+    """
+    datetime_threshold = datetime.datetime.now(datetime.timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    dataset_datetime = datetime.datetime.fromtimestamp(
+        os.path.getmtime(settings.JSONL_MIN_DATASET_PATH)
+    )
+
+    if dataset_datetime.date() != datetime_threshold.date():
+        logger.warning(
+            "Dataset version is not up to date, aborting insight removal job"
+        )
+        return None
+    return datetime_threshold
 
 
 def refresh_insights(with_deletion: bool = True) -> None:
@@ -90,23 +120,12 @@ def refresh_insights(with_deletion: bool = True) -> None:
     :param with_deletion: if True perform delete operation on
         insights/predictions, defaults to True
     """
-    product_store = get_min_product_store(
-        ["code", "brands_tags", "countries_tags", "unique_scans_n", "image_ids"]
-    )
+    product_store = get_min_product_store(REFRESH_PRODUCT_PROJECTION)
     # Only OFF is currently supported
     server_type = ServerType.off
 
-    datetime_threshold = datetime.datetime.now(datetime.timezone.utc).replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-    dataset_datetime = datetime.datetime.fromtimestamp(
-        os.path.getmtime(settings.JSONL_MIN_DATASET_PATH)
-    )
-
-    if dataset_datetime.date() != datetime_threshold.date():
-        logger.warning(
-            "Dataset version is not up to date, aborting insight removal job"
-        )
+    datetime_threshold = get_refresh_datetime_threshold()
+    if datetime_threshold is None:
         return
 
     # Managing the connection here allows us to have one transaction for
@@ -285,6 +304,220 @@ def update_insight_attributes(product: Product, insight: ProductInsight) -> bool
     return bool(updated_fields)
 
 
+# Temporary table used by `bulk_refresh_insights` to store the barcode and the
+# attributes of all products of the dump
+LIVE_PRODUCT_TABLE = "refresh_live_product"
+
+# Regex used to extract the image ID from `source_image` (ex: "2" from
+# "/322/247/762/7888/2.jpg"), the result is NULL if the image ID is not a digit.
+# This is the SQL equivalent of `is_valid_insight_image`.
+_SOURCE_IMAGE_ID_REGEX = r"(?:^|/)([0-9]+)(?:\.[^./]*)?$"
+
+# Delete all non-annotated insights (or predictions) of a project that are
+# older than the threshold, for which the product no longer exists or the
+# source image is invalid.
+_DELETE_STALE_ROWS_QUERY = """
+    DELETE FROM {table} AS t
+    WHERE t.server_type = %s
+    AND t.timestamp <= %s
+    {extra_condition}
+    AND NOT EXISTS (
+        SELECT 1 FROM {live_product_table} AS lp
+        WHERE lp.barcode = t.barcode
+        AND (
+            t.source_image IS NULL
+            OR substring(t.source_image FROM '{image_id_regex}') = ANY(lp.image_ids)
+        )
+    );"""
+
+# Refresh `brands`, `countries` and `unique_scans_n` attributes of
+# non-annotated insights from the product attributes, when they differ.
+_UPDATE_INSIGHT_ATTRIBUTES_QUERY = f"""
+    UPDATE product_insight AS t
+    SET
+        brands = lp.brands,
+        countries = lp.countries,
+        unique_scans_n = lp.unique_scans_n
+    FROM {LIVE_PRODUCT_TABLE} AS lp
+    WHERE lp.barcode = t.barcode
+    AND t.server_type = %s
+    AND t.timestamp <= %s
+    AND t.annotation IS NULL
+    AND (
+        t.brands IS DISTINCT FROM lp.brands
+        OR t.countries IS DISTINCT FROM lp.countries
+        OR t.unique_scans_n IS DISTINCT FROM lp.unique_scans_n
+    );"""
+
+
+def load_live_products(products: Iterable[Product], batch_size: int = 10_000) -> int:
+    """Load the barcode, `brands_tags`, `countries_tags`, `unique_scans_n`
+    and raw image IDs of all `products` in a temporary table
+    (`LIVE_PRODUCT_TABLE`), using PostgreSQL `COPY`.
+
+    The table is only visible to the current DB connection, and is dropped
+    when the connection is closed.
+
+    :param products: the products to load
+    :param batch_size: the number of rows sent in each `COPY` statement
+    :return: the number of products loaded
+    """
+    db.execute_sql(f"DROP TABLE IF EXISTS {LIVE_PRODUCT_TABLE};")
+    db.execute_sql(
+        f"""CREATE TEMPORARY TABLE {LIVE_PRODUCT_TABLE} (
+            barcode TEXT NOT NULL,
+            brands JSONB NOT NULL,
+            countries JSONB NOT NULL,
+            unique_scans_n INTEGER NOT NULL,
+            image_ids TEXT[] NOT NULL
+        );"""
+    )
+    count = 0
+    for product_batch in chunked(
+        (product for product in products if product.barcode), batch_size
+    ):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for product in product_batch:
+            writer.writerow(
+                (
+                    product.barcode,
+                    orjson.dumps(product.brands_tags).decode("utf-8"),
+                    orjson.dumps(product.countries_tags).decode("utf-8"),
+                    # products without scans may have a null scan count
+                    int(product.unique_scans_n or 0),
+                    # raw image IDs are digits, no escaping needed
+                    "{%s}" % ",".join(product.image_ids),
+                )
+            )
+        buffer.seek(0)
+        with db.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {LIVE_PRODUCT_TABLE} FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        count += len(product_batch)
+
+    # Barcodes are not guaranteed to be unique in the dump, so we don't use a
+    # unique index
+    db.execute_sql(
+        f"CREATE INDEX ON {LIVE_PRODUCT_TABLE} (barcode);"
+        f"ANALYZE {LIVE_PRODUCT_TABLE};"
+    )
+    return count
+
+
+def bulk_refresh_insights(with_deletion: bool = True) -> dict[str, int]:
+    """Refresh predictions and insights using data from the OFF JSONL dump,
+    with set-based SQL statements.
+
+    This performs the same operations as `refresh_insights`, but instead of
+    loading all products in memory and checking predictions and insights one
+    by one, the barcode and the attributes of all products are loaded in a
+    temporary table, and stale rows are deleted or updated with a single
+    statement each (see `refresh_insights` for the list of operations).
+
+    :param with_deletion: if True perform delete operation on
+        insights/predictions, defaults to True
+    :return: the number of rows affected by each operation
+        (`prediction_deleted`, `insight_deleted`, `insight_updated` and
+        `brand_insight_deleted`)
+    """
+    # Only OFF is currently supported
+    server_type = ServerType.off
+    datetime_threshold = get_refresh_datetime_threshold()
+    if datetime_threshold is None:
+        return {}
+
+    results = {
+        "prediction_deleted": 0,
+        "insight_deleted": 0,
+        "insight_updated": 0,
+        "brand_insight_deleted": 0,
+    }
+    params = (server_type.name, datetime_threshold)
+    with db.connection_context():
+        with db.atomic():
+            products = (
+                ProductDataset(settings.JSONL_MIN_DATASET_PATH)
+                .stream()
+                .iter_product(REFRESH_PRODUCT_PROJECTION)
+            )
+            count = load_live_products(products)
+        logger.info("%d products loaded in %s", count, LIVE_PRODUCT_TABLE)
+
+        if with_deletion:
+            # Check predictions first, as insights are computed from
+            # predictions
+            for table, key, extra_condition in (
+                ("prediction", "prediction_deleted", ""),
+                ("product_insight", "insight_deleted", "AND t.annotation IS NULL"),
+            ):
+                query = _DELETE_STALE_ROWS_QUERY.format(
+                    table=table,
+                    extra_condition=extra_condition,
+                    live_product_table=LIVE_PRODUCT_TABLE,
+                    image_id_regex=_SOURCE_IMAGE_ID_REGEX,
+                )
+                with db.atomic():
+                    results[key] = db.execute_sql(query, params).rowcount
+                logger.info("%d rows deleted from %s", results[key], table)
+
+        with db.atomic():
+            results["insight_updated"] = db.execute_sql(
+                _UPDATE_INSIGHT_ATTRIBUTES_QUERY, params
+            ).rowcount
+        logger.info("%d insights updated", results["insight_updated"])
+
+        if with_deletion:
+            results["brand_insight_deleted"] = delete_invalid_brand_insights(
+                server_type
+            )
+        db.execute_sql(f"DROP TABLE IF EXISTS {LIVE_PRODUCT_TABLE};")
+
+    return results
+
+
+def delete_invalid_brand_insights(
+    server_type: ServerType, batch_size: int = 1_000
+) -> int:
+    """Delete non-annotated brand insights that are no longer valid.
+
+    It can happen if the brand was added to exclude list after insight
+    creation. Invalid insights are deleted by batches of `batch_size`.
+
+    :param server_type: the server type (project) of the insights
+    :param batch_size: the number of insights deleted with a single statement
+    :return: the number of deleted insights
+    """
+    invalid_ids = [
+        insight.id
+        for insight in ServerSide(
+            ProductInsight.select(
+                ProductInsight.id,
+                # predictor, data, value_tag and barcode are needed for
+                # BrandInsightImporter.is_prediction_valid()
+                ProductInsight.barcode,
+                ProductInsight.predictor,
+                ProductInsight.data,
+                ProductInsight.value_tag,
+            ).where(
+                ProductInsight.annotation.is_null(),
+                ProductInsight.server_type == server_type.name,
+                ProductInsight.type == InsightType.brand.value,
+            )
+        )
+        if not BrandInsightImporter.is_prediction_valid(insight)
+    ]
+    deleted = 0
+    for id_batch in chunked(invalid_ids, batch_size):
+        with db.atomic():
+            deleted += (
+                ProductInsight.delete().where(ProductInsight.id.in_(id_batch)).execute()
+            )
+    logger.info("%d invalid brand insights deleted", deleted)
+    return deleted
+
+
 # this job does no use database
 def _update_data() -> None:
     """Download the latest version of the Product Opener product JSONL dump."""
@@ -303,6 +536,17 @@ def _update_data() -> None:
         return
 
 
+def check_logo_annotations() -> None:
+    with db.connection_context():
+        check_logo_annotation_index()
+
+
+def fold_insight_counts() -> None:
+    with db.connection_context():
+        if not fold_insight_count_deltas():
+            logger.info("Insight counts are already being folded, skipping")
+
+
 def clean_tmp_files() -> None:
     """Remove temporary files that are no longer needed."""
     logger.info("Cleaning temporary files in /tmp older than 2 days")
@@ -363,10 +607,20 @@ def run():
         process_insights, "interval", minutes=2, max_instances=1, jitter=20
     )
 
+    # This job folds the pending insight and user annotation count changes
+    # recorded by DB triggers into the count tables, to keep the number of
+    # changes to sum at read time small.
+    scheduler.add_job(
+        fold_insight_counts, "interval", minutes=1, max_instances=1, jitter=10
+    )
+
     scheduler.add_job(clean_tmp_files, "cron", day="*", hour=0, max_instances=1)
     # This job exports daily product metrics for monitoring.
     scheduler.add_job(save_facet_metrics, "cron", day="*", hour=1, max_instances=1)
     scheduler.add_job(save_insight_metrics, "cron", day="*", hour=1, max_instances=1)
+    # This job exports the lag and the number of running jobs of each job
+    # class, to monitor the fair scheduling of rq jobs.
+    scheduler.add_job(save_job_metrics, "interval", minutes=1, max_instances=1)
 
     # This job refreshes data needed to generate insights.
     scheduler.add_job(_update_data, "cron", day="*", hour=15, max_instances=1)
@@ -377,13 +631,23 @@ def run():
     #   are no longer applicable.
     # - Updating insight attributes.
     scheduler.add_job(
-        refresh_insights,
+        bulk_refresh_insights,
         "cron",
         day="*",
         hour=19,
         max_instances=1,
     )
 
+    # This job checks that the logo annotation index (used for logo label
+    # prediction) is consistent with the DB, and rebuilds it otherwise.
+    scheduler.add_job(
+        check_logo_annotations,
+        "cron",
+        day="*",
+        hour=4,
+        max_instances=1,
+    )
+
     scheduler.add_job(
         generate_quality_facets,
         "cron",
@@ -189,6 +189,11 @@ TAXONOMY_PATHS = {
     "packaging_recycling": TAXONOMY_DIR / "packaging_recycling.full.json.gz",
 }
 
+# If enabled, taxonomies are compiled into compact binary snapshots that are
+# memory-mapped and shared between all processes of the host, instead of
+# being parsed in every process (see robotoff.taxonomy_snapshot)
+ENABLE_TAXONOMY_SNAPSHOTS = bool(int(os.environ.get("ENABLE_TAXONOMY_SNAPSHOTS", 0)))
+
 # Credentials for the Robotoff insights database
 
 POSTGRES_HOST = os.environ.get("POSTGRES_HOST", "localhost")
@@ -213,15 +218,54 @@ REDIS_LATEST_ID_KEY = os.environ.get(
     "REDIS_LATEST_ID_KEY", "robotoff:product_updates:latest_id"
 )
 
+# Consumer group mode of the update listener, see
+# robotoff.workers.update_listener.ConsumerGroupUpdateListener
+# If enabled, product updates are read through Redis consumer groups, with
+# acknowledgement, instead of using the latest processed ID
+UPDATE_LISTENER_CONSUMER_GROUP = bool(
+    int(os.environ.get("UPDATE_LISTENER_CONSUMER_GROUP", 0))
+)
+REDIS_STREAM_CONSUMER_GROUP = os.environ.get("REDIS_STREAM_CONSUMER_GROUP", "robotoff")
+# Number of update listener processes: products are split between listeners
+# based on their barcode, each listener handles a single partition
+UPDATE_LISTENER_NUM_PARTITIONS = int(
+    os.environ.get("UPDATE_LISTENER_NUM_PARTITIONS", 1)
+)
+# Updates delivered to a listener that have not been acknowledged after this
+# delay (in ms) are reclaimed by the next listener that starts on the same
+# partition
+UPDATE_LISTENER_CLAIM_MIN_IDLE_TIME = int(
+    os.environ.get("UPDATE_LISTENER_CLAIM_MIN_IDLE_TIME", 60_000)
+)
+
 # how many seconds should we wait to compute insight on product updated
 UPDATED_PRODUCT_WAIT = float(os.environ.get("ROBOTOFF_UPDATED_PRODUCT_WAIT", 10))
 
+# Automatic processing of insights, see robotoff.insights.annotation_runner
+# Number of products processed concurrently
+ANNOTATION_MAX_WORKERS = int(os.environ.get("ANNOTATION_MAX_WORKERS", 4))
+# Maximum number of write requests per second sent to each Product Opener
+# server (0 to disable rate limiting)
+ANNOTATION_RATE_LIMIT = float(os.environ.get("ANNOTATION_RATE_LIMIT", 5))
+# Maximum number of attempts for a product update that failed with a transient
+# error (5XX, timeout, connection error)
+ANNOTATION_MAX_TRIES = int(os.environ.get("ANNOTATION_MAX_TRIES", 3))
+
 # Elastic Search is used for logo classification.
 
 ELASTIC_HOST = os.environ.get("ELASTIC_HOST", "localhost")
 ELASTIC_USER = os.environ.get("ELASTIC_USER", "elastic")
 ELASTIC_PASSWORD = os.environ.get("ELASTIC_PASSWORD", "elastic")
 ELASTICSEARCH_TYPE = "document"
+# Type of the vector index used for logo embeddings, one of `hnsw` (float
+# vectors), `int8_hnsw`, `int4_hnsw` or `bbq_hnsw` (quantized vectors, that use
+# 4x, 8x and 32x less memory than float vectors respectively, see
+# `robotoff.elasticsearch.estimate_vector_index_memory`). Quantized types
+# require Elasticsearch >= 8.12 (int8_hnsw), 8.15 (int4_hnsw) or 8.16
+# (bbq_hnsw): the Elasticsearch version of docker-compose.yml only supports hnsw.
+ELASTIC_LOGO_VECTOR_INDEX_TYPE = os.environ.get(
+    "ELASTIC_LOGO_VECTOR_INDEX_TYPE", "hnsw"
+)
 
 
 # ANN index parameters
@@ -331,6 +375,30 @@ INFLUXDB_BUCKET = os.environ.get("INFLUXDB_BUCKET", "off_metrics")
 INFLUXDB_AUTH_TOKEN = os.environ.get("INFLUXDB_AUTH_TOKEN")
 INFLUXDB_ORG = os.environ.get("INFLUXDB_ORG", "off")
 
+# Facet metrics collection, see robotoff.metrics.collect_facet_metrics
+# Number of concurrent requests sent to Product Opener
+METRICS_MAX_WORKERS = int(os.environ.get("METRICS_MAX_WORKERS", 8))
+# Maximum number of requests per second sent to each host (0 to disable rate
+# limiting)
+METRICS_RATE_LIMIT = float(os.environ.get("METRICS_RATE_LIMIT", 2))
+# Timeout of each request, in seconds
+METRICS_REQUEST_TIMEOUT = float(os.environ.get("METRICS_REQUEST_TIMEOUT", 60))
+
+# Analytics event delivery, see robotoff.app.events
+# Maximum number of events sent in a single flush
+EVENTS_BATCH_SIZE = int(os.environ.get("EVENTS_BATCH_SIZE", 50))
+# Maximum time (in seconds) an event is buffered before being sent
+EVENTS_FLUSH_INTERVAL = float(os.environ.get("EVENTS_FLUSH_INTERVAL", 0.5))
+# Maximum number of events waiting to be delivered
+EVENTS_QUEUE_MAX_SIZE = int(os.environ.get("EVENTS_QUEUE_MAX_SIZE", 10_000))
+# Time (in seconds) to wait for a free slot when the queue is full before
+# dropping the event. With 0, events are dropped immediately.
+EVENTS_QUEUE_PUT_TIMEOUT = float(os.environ.get("EVENTS_QUEUE_PUT_TIMEOUT", 0))
+# Timeout of each request sent to the event API, in seconds
+EVENTS_REQUEST_TIMEOUT = float(os.environ.get("EVENTS_REQUEST_TIMEOUT", 10))
+# Minimum interval (in seconds) between two logs of the event delivery stats
+EVENTS_STATS_LOG_INTERVAL = float(os.environ.get("EVENTS_STATS_LOG_INTERVAL", 300))
+
 TEST_DIR = PROJECT_DIR / "tests"
 TEST_DATA_DIR = TEST_DIR / "unit/data"
 
@@ -353,6 +421,24 @@ ENABLE_MONGODB_ACCESS = bool(int(os.environ.get("ENABLE_MONGODB_ACCESS", 1)))
 # priority queues that exist
 NUM_RQ_WORKERS = int(os.environ.get("NUM_RQ_WORKERS", 4))
 
+# Admission control of rq jobs, see robotoff.workers.scheduling
+# Maximum share of the workers that can run jobs of each class (interactive,
+# upload, update, backfill) at the same time, as a comma-separated list of
+# `class=share` items. A share >= 1 means the class is not limited.
+RQ_JOB_CLASS_SHARES = os.environ.get(
+    "RQ_JOB_CLASS_SHARES", "interactive=1,upload=1,update=1,backfill=0.5"
+)
+# Interval (in seconds) at which workers check again the queues when a job
+# class has reached its share
+RQ_ADMISSION_POLL_INTERVAL = float(os.environ.get("RQ_ADMISSION_POLL_INTERVAL", 1))
+# Number of jobs at the head of each queue considered by workers when a job
+# class has reached its share: jobs of other classes queued behind them can
+# be dequeued first
+RQ_ADMISSION_LOOKAHEAD = int(os.environ.get("RQ_ADMISSION_LOOKAHEAD", 100))
+# Bulk producers (full image reprocessing,...) wait until the number of jobs
+# in the target queues goes below this value before enqueuing more jobs
+RQ_BACKFILL_MAX_QUEUE_DEPTH = int(os.environ.get("RQ_BACKFILL_MAX_QUEUE_DEPTH", 10_000))
+
 # Directory where all DB migration files are located
 # We use peewee_migrate to perform the migrations
 # (https://github.com/klen/peewee_migrate)
@@ -366,9 +452,80 @@ DISKCACHE_DIR = CACHE_DIR / "diskcache"
 # Path of the local disk cache used for tests
 TESTS_DISKCACHE_DIR = CACHE_DIR / "diskcache_tests_assets"
 
+# Ingredient parsing, see robotoff.off.parse_ingredients
+# Either `product_opener` (Product Opener API) or `local` (local stand-in
+# parser, useful for offline testing)
+INGREDIENT_PARSER = os.environ.get("INGREDIENT_PARSER", "product_opener")
+# Parsing results are cached on disk (by normalized text and language), as the
+# same ingredient lists are found in many images
+INGREDIENT_PARSING_CACHE_DIR = CACHE_DIR / "ingredient_parsing"
+# Expiration time of cached parsing results, in seconds (0 to disable caching)
+INGREDIENT_PARSING_CACHE_TTL = int(
+    os.environ.get("INGREDIENT_PARSING_CACHE_TTL", 24 * 3600)
+)
+# Maximum size of the cache on disk, in bytes
+INGREDIENT_PARSING_CACHE_SIZE_LIMIT = int(
+    os.environ.get("INGREDIENT_PARSING_CACHE_SIZE_LIMIT", 2**28)
+)
+# Maximum number of concurrent parsing requests for a single image
+INGREDIENT_PARSING_MAX_WORKERS = int(
+    os.environ.get("INGREDIENT_PARSING_MAX_WORKERS", 4)
+)
+
+# CLIP embeddings, see robotoff.triton.generate_clip_embedding
+# Version of the CLIP model served by Triton, it's part of the embedding cache
+# key: change it when the model is updated
+CLIP_MODEL_VERSION = os.environ.get("CLIP_MODEL_VERSION", "clip-vit-base-patch32")
+# Embeddings are cached on disk, by content hash of the preprocessed image and
+# model version, and shared by the logo and category workflows
+ENABLE_CLIP_EMBEDDING_CACHE = bool(
+    int(os.environ.get("ENABLE_CLIP_EMBEDDING_CACHE", 1))
+)
+CLIP_EMBEDDING_CACHE_DIR = CACHE_DIR / "clip_embedding"
+# Maximum size of the cache on disk, in bytes
+CLIP_EMBEDDING_CACHE_SIZE_LIMIT = int(
+    os.environ.get("CLIP_EMBEDDING_CACHE_SIZE_LIMIT", 2**30)
+)
+# Precision of the cached embeddings, either `float32` or `float16`
+CLIP_EMBEDDING_CACHE_DTYPE = os.environ.get("CLIP_EMBEDDING_CACHE_DTYPE", "float32")
+# With `float16`, an embedding is stored in full precision if the cosine
+# similarity between the original and the reduced-precision embedding is
+# lower than this bound
+CLIP_EMBEDDING_CACHE_MIN_COSINE_SIMILARITY = float(
+    os.environ.get("CLIP_EMBEDDING_CACHE_MIN_COSINE_SIMILARITY", 0.9999)
+)
+
 
 # Domains allowed to be used as image sources while cropping
 CROP_ALLOWED_DOMAINS = os.environ.get("CROP_ALLOWED_DOMAINS", "").split(",")
 
 # Batch jobs
 GOOGLE_PROJECT_NAME = "robotoff"
+
+# Tracing and profiling, see robotoff.utils.tracing for more information
+# If enabled, a trace with the time spent in every outbound call (HTTP, Triton,
+# PostgreSQL, MongoDB, Elasticsearch) is saved for each rq job and API request
+ENABLE_TRACING = bool(int(os.environ.get("ENABLE_TRACING", 0)))
+TRACING_DIR = Path(os.environ.get("TRACING_DIR", CACHE_DIR / "traces"))
+# Comma-separated list of job names (ex: `run_import_image_job`) and endpoints
+# (ex: `GET /api/v1/questions/{barcode}`) to profile with cProfile
+PROFILING_TARGETS = {
+    target.strip()
+    for target in os.environ.get("PROFILING_TARGETS", "").split(",")
+    if target.strip()
+}
+# Fraction of the runs of the profiling targets that are profiled
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0.1))
+
+# Startup, see robotoff.utils.startup for more information
+# If enabled, rq workers don't load resources (taxonomies, logo annotations,
+# brand prefixes,...) at startup: they are loaded on first use
+LAZY_RESOURCE_LOADING = bool(int(os.environ.get("LAZY_RESOURCE_LOADING", 0)))
+# Comma-separated list of resources to load at startup (API and workers), each
+# item is either the name of a function registered in `function_cache_register`
+# (ex: `get_brand_processor`) or a module name (ex: `transformers`)
+WARMUP_MANIFEST = [
+    item.strip()
+    for item in os.environ.get("WARMUP_MANIFEST", "").split(",")
+    if item.strip()
+]
@@ -11,6 +11,7 @@ from openfoodfacts.taxonomy import get_taxonomy as _get_taxonomy
 from openfoodfacts.types import TaxonomyType
 
 from robotoff import settings
+from robotoff.taxonomy_snapshot import get_taxonomy_snapshot
 from robotoff.utils.cache import function_cache_register
 
 logger = logging.getLogger(__name__)
@@ -43,7 +44,10 @@ def generate_category_hierarchy(
 
 
 # ttl: 12h
-@ttl_cache(maxsize=100, ttl=12 * 60 * 60)
+TAXONOMY_TTL = 12 * 60 * 60
+
+
+@ttl_cache(maxsize=100, ttl=TAXONOMY_TTL)
 def get_taxonomy(taxonomy_type: TaxonomyType | str, offline: bool = False) -> Taxonomy:
     """Return the taxonomy of type `taxonomy_type`.
 
@@ -53,6 +57,9 @@ def get_taxonomy(taxonomy_type: TaxonomyType | str, offline: bool = False) -> Ta
     A local static version can also be fetched (for unit tests for example)
     with `offline=True`.
 
+    If `settings.ENABLE_TAXONOMY_SNAPSHOTS` is True, a memory-mapped
+    `TaxonomySnapshot` is returned instead (see `robotoff.taxonomy_snapshot`).
+
     :param taxonomy_type: the taxonomy type
     :param offline: if True, return a local static version of the taxonomy,
       defaults to False. It's not available for all taxonomy types.
@@ -64,6 +71,13 @@ def get_taxonomy(taxonomy_type: TaxonomyType | str, offline: bool = False) -> Ta
     taxonomy_type_enum = (
         TaxonomyType[taxonomy_type] if isinstance(taxonomy_type, str) else taxonomy_type
     )
+    if settings.ENABLE_TAXONOMY_SNAPSHOTS:
+        return get_taxonomy_snapshot(
+            taxonomy_type_enum,
+            cache_dir=settings.DATA_DIR / "taxonomies",
+            max_age=TAXONOMY_TTL,
+        )
+
     return _get_taxonomy(
         taxonomy_type_enum,
         force_download=False,
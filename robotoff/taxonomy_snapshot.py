@@ -0,0 +1,403 @@
+"""Compact binary taxonomy snapshots.
+
+Parsing a full taxonomy JSON file into `TaxonomyNode` objects is slow and
+memory-hungry, and it's done separately in every API worker, rq worker and
+scheduler process. A taxonomy snapshot is a compiled version of the
+taxonomy, stored in a single file that is memory-mapped (read-only): the
+pages of the file are shared between all processes of the host through the
+OS page cache, and opening a snapshot is almost instantaneous.
+
+File layout (all integers are little-endian uint32):
+
+- header: magic (`RTXS`), format version, number of nodes (N), number of
+  parent edges (P), number of child edges (C)
+- `id_offsets` (N + 1): offsets of the node IDs in the ID blob. Nodes are
+  sorted by ID, so that a node can be found with a binary search.
+- `parent_offsets` (N + 1) and `parent_indices` (P): parent node indices,
+  in CSR format
+- `child_offsets` (N + 1) and `child_indices` (C): child node indices, in
+  CSR format
+- `data_offsets` (N + 1): offsets of the node data (names, synonyms and
+  properties, JSON-encoded) in the data blob
+- the ID blob (UTF-8) and the data blob
+
+`TaxonomySnapshot` and `SnapshotTaxonomyNode` are subclasses of `Taxonomy`
+and `TaxonomyNode`, so that snapshots can be used everywhere a `Taxonomy` is
+expected. Node data is only decoded when accessed.
+"""
+
+import bisect
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import orjson
+from openfoodfacts.taxonomy import TAXONOMY_URLS, Taxonomy, TaxonomyNode
+from openfoodfacts.types import TaxonomyType
+from openfoodfacts.utils import download_file, should_download_file
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"RTXS"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<4sIIII")
+_UINT32 = np.dtype("<u4")
+
+
+class SnapshotTaxonomyNode(TaxonomyNode):
+    """A node of a `TaxonomySnapshot`.
+
+    Names, synonyms and properties are decoded from the snapshot on first
+    access, parents and children are created on access.
+    """
+
+    __slots__ = ("_snapshot", "_index", "_id", "_data")
+
+    def __init__(self, snapshot: "TaxonomySnapshot", index: int):
+        self._snapshot = snapshot
+        self._index = index
+        self._id: str | None = None
+        self._data: dict | None = None
+
+    def _get_data(self) -> dict:
+        if self._data is None:
+            self._data = self._snapshot._get_node_data(self._index)
+        return self._data
+
+    @property  # type: ignore[override]
+    def id(self) -> str:
+        if self._id is None:
+            self._id = self._snapshot._get_id(self._index)
+        return self._id
+
+    @property  # type: ignore[override]
+    def names(self) -> dict[str, str]:
+        return self._get_data()["name"]
+
+    @property  # type: ignore[override]
+    def synonyms(self) -> dict[str, list[str]]:
+        return self._get_data()["synonyms"]
+
+    @property  # type: ignore[override]
+    def properties(self) -> dict:
+        return self._get_data()["properties"]
+
+    @property  # type: ignore[override]
+    def parents(self) -> list["SnapshotTaxonomyNode"]:
+        return self._snapshot._get_parents(self._index)
+
+    @property  # type: ignore[override]
+    def children(self) -> list["SnapshotTaxonomyNode"]:
+        return self._snapshot._get_children(self._index)
+
+    def is_child_of(self, item: TaxonomyNode) -> bool:
+        if (
+            not isinstance(item, SnapshotTaxonomyNode)
+            or item._snapshot is not self._snapshot
+        ):
+            return False
+        return item._index in self._snapshot._get_ancestor_indices(self._index)
+
+    def get_parents_hierarchy(self) -> list[TaxonomyNode]:
+        return [
+            SnapshotTaxonomyNode(self._snapshot, index)
+            for index in self._snapshot._get_ancestor_indices(self._index)
+        ]
+
+    def add_parents(self, parents):
+        raise TypeError("taxonomy snapshots are read-only")
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, SnapshotTaxonomyNode)
+            and other._snapshot is self._snapshot
+            and other._index == self._index
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self._snapshot), self._index))
+
+
+class _SnapshotIds(Sequence):
+    """Sorted sequence of the node IDs of a snapshot, used for binary
+    search."""
+
+    def __init__(self, snapshot: "TaxonomySnapshot"):
+        self._snapshot = snapshot
+
+    def __getitem__(self, index):  # type: ignore[override]
+        return self._snapshot._get_id(index)
+
+    def __len__(self) -> int:
+        return self._snapshot.node_count
+
+
+class _SnapshotNodes(Mapping):
+    """Read-only mapping of node ID to `SnapshotTaxonomyNode`, used as the
+    `nodes` attribute of `TaxonomySnapshot`."""
+
+    def __init__(self, snapshot: "TaxonomySnapshot"):
+        self._snapshot = snapshot
+        self._ids = _SnapshotIds(snapshot)
+
+    def __getitem__(self, key: str) -> SnapshotTaxonomyNode:
+        index = bisect.bisect_left(self._ids, key)
+        if index < len(self._ids) and self._ids[index] == key:
+            return SnapshotTaxonomyNode(self._snapshot, index)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def values(self):  # type: ignore[override]
+        return (
+            SnapshotTaxonomyNode(self._snapshot, index)
+            for index in range(len(self._ids))
+        )
+
+
+class TaxonomySnapshot(Taxonomy):
+    """A read-only taxonomy backed by a memory-mapped snapshot file.
+
+    See the module docstring for the file layout.
+    """
+
+    def __init__(self, buffer):
+        magic, version, node_count, parent_count, child_count = _HEADER.unpack_from(
+            buffer, 0
+        )
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"invalid taxonomy snapshot (magic: {magic!r}, version: {version})"
+            )
+        if sys.byteorder != "little":
+            raise RuntimeError("taxonomy snapshots require a little-endian host")
+        self._buffer = buffer
+        self.node_count = node_count
+        view = memoryview(buffer)
+        offset = _HEADER.size
+        arrays = []
+        for count in (
+            node_count + 1,  # id_offsets
+            node_count + 1,  # parent_offsets
+            parent_count,  # parent_indices
+            node_count + 1,  # child_offsets
+            child_count,  # child_indices
+            node_count + 1,  # data_offsets
+        ):
+            end = offset + count * _UINT32.itemsize
+            # Indexing a memoryview returns Python ints, it's much faster than
+            # indexing a numpy array
+            arrays.append(view[offset:end].cast("I"))
+            offset = end
+        (
+            self._id_offsets,
+            self._parent_offsets,
+            self._parent_indices,
+            self._child_offsets,
+            self._child_indices,
+            self._data_offsets,
+        ) = arrays
+        self._id_blob_offset = offset
+        self._data_blob_offset = offset + self._id_offsets[-1]
+        self._nodes = _SnapshotNodes(self)
+
+    @property  # type: ignore[override]
+    def nodes(self) -> _SnapshotNodes:
+        return self._nodes
+
+    def add(self, key: str, node: TaxonomyNode) -> None:
+        raise TypeError("taxonomy snapshots are read-only")
+
+    @classmethod
+    def from_path(  # type: ignore[override]
+        cls, file_path: str | Path
+    ) -> "TaxonomySnapshot":
+        """Open (memory-map) a taxonomy snapshot file.
+
+        :param file_path: the path of the snapshot file
+        :return: the TaxonomySnapshot
+        """
+        with open(file_path, "rb") as f:
+            # The mapping stays valid after the file is closed (or replaced)
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer)
+
+    def _get_id(self, index: int) -> str:
+        start = self._id_blob_offset + self._id_offsets[index]
+        end = self._id_blob_offset + self._id_offsets[index + 1]
+        return self._buffer[start:end].decode("utf-8")
+
+    def _get_node_data(self, index: int) -> dict:
+        start = self._data_blob_offset + self._data_offsets[index]
+        end = self._data_blob_offset + self._data_offsets[index + 1]
+        return orjson.loads(self._buffer[start:end])
+
+    def _get_parent_indices(self, index: int) -> list[int]:
+        start = self._parent_offsets[index]
+        end = self._parent_offsets[index + 1]
+        return self._parent_indices[start:end].tolist()
+
+    def _get_parents(self, index: int) -> list[SnapshotTaxonomyNode]:
+        return [SnapshotTaxonomyNode(self, i) for i in self._get_parent_indices(index)]
+
+    def _get_children(self, index: int) -> list[SnapshotTaxonomyNode]:
+        start = self._child_offsets[index]
+        end = self._child_offsets[index + 1]
+        return [
+            SnapshotTaxonomyNode(self, i)
+            for i in self._child_indices[start:end].tolist()
+        ]
+
+    def _get_ancestor_indices(self, index: int) -> dict[int, None]:
+        """Return the indices of all parents (direct and indirect) of a node,
+        in the same order as `TaxonomyNode.get_parents_hierarchy`."""
+        ancestors: dict[int, None] = {}
+
+        def visit(node_index: int):
+            for parent_index in self._get_parent_indices(node_index):
+                if parent_index not in ancestors:
+                    ancestors[parent_index] = None
+                    visit(parent_index)
+
+        visit(index)
+        return ancestors
+
+
+def _to_csr(edges: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(edges) + 1, dtype=_UINT32)
+    offsets[1:] = np.cumsum([len(items) for items in edges], dtype=np.uint64)
+    indices = np.fromiter(
+        (i for items in edges for i in items), dtype=_UINT32, count=int(offsets[-1])
+    )
+    return offsets, indices
+
+
+def _concat_blob(items: list[bytes]) -> tuple[np.ndarray, bytes]:
+    offsets = np.zeros(len(items) + 1, dtype=_UINT32)
+    offsets[1:] = np.cumsum([len(item) for item in items], dtype=np.uint64)
+    return offsets, b"".join(items)
+
+
+def dump_taxonomy_snapshot(taxonomy: Taxonomy, file_path: str | Path) -> None:
+    """Compile a taxonomy into a snapshot file.
+
+    The snapshot is first written in a temporary file that then replaces
+    `file_path`, so that processes reading the snapshot concurrently never
+    see a partially written file.
+
+    :param taxonomy: the taxonomy to compile
+    :param file_path: the path of the snapshot file
+    """
+    file_path = Path(file_path)
+    node_ids = sorted(taxonomy.keys())
+    id_to_index = {node_id: index for index, node_id in enumerate(node_ids)}
+    nodes = [taxonomy[node_id] for node_id in node_ids]
+
+    parent_offsets, parent_indices = _to_csr(
+        [[id_to_index[parent.id] for parent in node.parents] for node in nodes]
+    )
+    child_offsets, child_indices = _to_csr(
+        [[id_to_index[child.id] for child in node.children] for node in nodes]
+    )
+    id_offsets, id_blob = _concat_blob(
+        [node_id.encode("utf-8") for node_id in node_ids]
+    )
+    data_offsets, data_blob = _concat_blob(
+        [
+            orjson.dumps(
+                {
+                    "name": node.names,
+                    "synonyms": node.synonyms,
+                    "properties": node.properties,
+                }
+            )
+            for node in nodes
+        ]
+    )
+
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "wb", dir=file_path.parent, prefix=f".{file_path.name}.", delete=False
+    ) as f:
+        try:
+            f.write(
+                _HEADER.pack(
+                    SNAPSHOT_MAGIC,
+                    SNAPSHOT_VERSION,
+                    len(node_ids),
+                    len(parent_indices),
+                    len(child_indices),
+                )
+            )
+            for array in (
+                id_offsets,
+                parent_offsets,
+                parent_indices,
+                child_offsets,
+                child_indices,
+                data_offsets,
+            ):
+                f.write(array.tobytes())
+            f.write(id_blob)
+            f.write(data_blob)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, file_path)
+
+
+def get_taxonomy_snapshot(
+    taxonomy_type: TaxonomyType, cache_dir: Path, max_age: int
+) -> TaxonomySnapshot:
+    """Return the snapshot of the taxonomy of type `taxonomy_type`.
+
+    The taxonomy JSON file and its snapshot are cached in `cache_dir`. If the
+    snapshot was checked less than `max_age` seconds ago, it's returned
+    directly. Otherwise we download the taxonomy if a new version is
+    available, and we compile a new snapshot if the JSON file is more recent
+    than the snapshot.
+
+    :param taxonomy_type: the taxonomy type
+    :param cache_dir: the directory where the taxonomy JSON files and
+        snapshots are stored
+    :param max_age: the delay (in seconds) after which we check whether a
+        new version of the taxonomy is available
+    :return: the TaxonomySnapshot
+    """
+    json_path = cache_dir / f"{taxonomy_type.name}.json"
+    snapshot_path = cache_dir / f"{taxonomy_type.name}.snapshot"
+
+    if (
+        not snapshot_path.is_file()
+        or time.time() - snapshot_path.stat().st_mtime > max_age
+    ):
+        url = TAXONOMY_URLS[taxonomy_type]
+        if should_download_file(url, json_path, False, True):
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            logger.info("Downloading taxonomy, saving it in %s", json_path)
+            download_file(url, json_path)
+
+        if (
+            not snapshot_path.is_file()
+            or snapshot_path.stat().st_mtime < json_path.stat().st_mtime
+        ):
+            logger.info("Compiling taxonomy snapshot %s", snapshot_path)
+            dump_taxonomy_snapshot(Taxonomy.from_path(json_path), snapshot_path)
+        else:
+            # The snapshot is up-to-date, update its mtime so that we don't
+            # check again before `max_age` seconds
+            snapshot_path.touch()
+
+    return TaxonomySnapshot.from_path(snapshot_path)
@@ -1,10 +1,12 @@
 import functools
+import hashlib
 import json
 import logging
 import shutil
 import struct
 import tempfile
 import time
+import typing
 from pathlib import Path
 
 import grpc
@@ -15,11 +17,13 @@ from more_itertools import chunked
 from openfoodfacts.types import JSONType
 from PIL import Image
 from pydantic import BaseModel
-from transformers import CLIPImageProcessor
 from tritonclient.grpc import service_pb2, service_pb2_grpc
 from tritonclient.grpc.service_pb2_grpc import GRPCInferenceServiceStub
 
 from robotoff import settings
+from robotoff.utils.cache import clip_embedding_cache, function_cache_register
+from robotoff.utils.startup import lazy_import
+from robotoff.utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +60,22 @@ HUGGINGFACE_MODELS = [
 ]
 
 
+class TracingClientInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """gRPC interceptor that records a span for every Triton call when tracing
+    is enabled."""
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        method = client_call_details.method.rsplit("/", 1)[-1]
+        with span(
+            f"{method} {getattr(request, 'model_name', '')}".strip(), "triton"
+        ) as span_args:
+            response = continuation(client_call_details, request)
+            # Wait for the call to complete, so that the span covers the
+            # full call duration
+            span_args["code"] = response.code().name
+            return response
+
+
 @functools.cache
 def get_triton_inference_stub(
     triton_uri: str | None = None,
@@ -68,13 +88,44 @@ def get_triton_inference_stub(
     :return: gRPC stub for Triton Inference Server
     """
     triton_uri = triton_uri or settings.DEFAULT_TRITON_URI
-    channel = grpc.insecure_channel(triton_uri)
+    channel = grpc.intercept_channel(
+        grpc.insecure_channel(triton_uri), TracingClientInterceptor()
+    )
     return service_pb2_grpc.GRPCInferenceServiceStub(channel)
 
 
+@functools.cache
+def get_clip_image_processor():
+    """Return the CLIP image processor.
+
+    transformers is only imported when the processor is first requested, as
+    it's very slow to import.
+    """
+    return lazy_import("transformers").CLIPImageProcessor()
+
+
+def preprocess_clip_images(images: list[Image.Image]) -> np.ndarray:
+    """Preprocess images for the CLIP model.
+
+    :param images: the images to preprocess
+    :return: the pixel values, as a float32 array of shape
+        (num_images, 3, 224, 224)
+    """
+    processor = get_clip_image_processor()
+    return processor(images=images, return_tensors="np").pixel_values
+
+
 def generate_clip_embedding_request(images: list[Image.Image]):
-    processor = CLIPImageProcessor()
-    inputs = processor(images=images, return_tensors="np").pixel_values
+    return build_clip_embedding_request(preprocess_clip_images(images))
+
+
+def build_clip_embedding_request(inputs: np.ndarray):
+    """Build the Triton request to compute the CLIP embeddings of
+    preprocessed images.
+
+    :param inputs: the pixel values, as returned by `preprocess_clip_images`
+    """
+    num_images = len(inputs)
     request = service_pb2.ModelInferRequest()
     request.model_name = "clip"
 
@@ -88,14 +139,14 @@ def generate_clip_embedding_request(images: list[Image.Image]):
     attention_mask_input = service_pb2.ModelInferRequest().InferInputTensor()
     attention_mask_input.name = "attention_mask"
     attention_mask_input.datatype = "INT64"
-    attention_mask_input.shape.extend([len(images), 2])
+    attention_mask_input.shape.extend([num_images, 2])
     request.inputs.extend([attention_mask_input])
 
     # input_ids
     input_id_input = service_pb2.ModelInferRequest().InferInputTensor()
     input_id_input.name = "input_ids"
     input_id_input.datatype = "INT64"
-    input_id_input.shape.extend([len(images), 2])
+    input_id_input.shape.extend([num_images, 2])
     request.inputs.extend([input_id_input])
 
     output = service_pb2.ModelInferRequest().InferRequestedOutputTensor()
@@ -106,9 +157,9 @@ def generate_clip_embedding_request(images: list[Image.Image]):
     # We're not interested in text embedding generation but we must provide
     # attention_mask and input_ids anyway, so we provide an empty text
     # ([BOS, EOS] input_ids) with [1, 1] attention mask
-    request.raw_input_contents.extend([np.ones((len(images), 2), dtype=int).tobytes()])
+    request.raw_input_contents.extend([np.ones((num_images, 2), dtype=int).tobytes()])
     request.raw_input_contents.extend(
-        [(np.ones((len(images), 2), dtype=int) * [49406, 49407]).tobytes()]
+        [(np.ones((num_images, 2), dtype=int) * [49406, 49407]).tobytes()]
     )
     return request
 
@@ -116,21 +167,99 @@ def generate_clip_embedding_request(images: list[Image.Image]):
 def generate_clip_embedding(
     images: list[Image.Image], triton_stub: GRPCInferenceServiceStub
 ) -> np.ndarray:
-    embedding_batches = []
-    for image_batch in chunked(images, CLIP_MAX_BATCH_SIZE):
-        start_time = time.monotonic()
-        request = generate_clip_embedding_request(image_batch)
-        logger.info("Preprocessing time for CLIP: %ss", time.monotonic() - start_time)
+    """Generate the CLIP embeddings of images.
+
+    If `settings.ENABLE_CLIP_EMBEDDING_CACHE` is True, embeddings are first
+    looked up in the CLIP embedding cache (by content hash of the
+    preprocessed image and model version), and only the embeddings of the
+    images that are not in cache are computed by Triton.
+
+    :param images: the images, usually already resized to 224x224
+    :param triton_stub: the triton inference stub to use
+    :return: the embeddings, as a float32 array of shape (num_images, dim)
+    """
+    start_time = time.monotonic()
+    inputs = preprocess_clip_images(images)
+    logger.info("Preprocessing time for CLIP: %ss", time.monotonic() - start_time)
+
+    use_cache = settings.ENABLE_CLIP_EMBEDDING_CACHE
+    cache_keys = [get_clip_embedding_cache_key(pixel_values) for pixel_values in inputs]
+    embeddings: list[np.ndarray | None] = [
+        get_cached_clip_embedding(cache_key) if use_cache else None
+        for cache_key in cache_keys
+    ]
+    missing_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if use_cache:
+        logger.info(
+            "%d/%d CLIP embeddings found in cache",
+            len(images) - len(missing_indices),
+            len(images),
+        )
+
+    for index_batch in chunked(missing_indices, CLIP_MAX_BATCH_SIZE):
+        request = build_clip_embedding_request(inputs[index_batch])
         start_time = time.monotonic()
         response = triton_stub.ModelInfer(request)
         logger.info("Inference time for CLIP: %ss", time.monotonic() - start_time)
         embedding_batch = np.frombuffer(
             response.raw_output_contents[0],
             dtype=np.float32,
-        ).reshape((len(image_batch), -1))
-        embedding_batches.append(embedding_batch)
+        ).reshape((len(index_batch), -1))
+        for index, embedding in zip(index_batch, embedding_batch):
+            embeddings[index] = embedding
+            if use_cache:
+                cache_clip_embedding(cache_keys[index], embedding)
+
+    return np.stack(typing.cast(list[np.ndarray], embeddings))
+
+
+def get_clip_embedding_cache_key(pixel_values: np.ndarray) -> str:
+    """Return the key of the CLIP embedding cache for a preprocessed image
+    (see `preprocess_clip_images`)."""
+    content_hash = hashlib.sha256(
+        np.ascontiguousarray(pixel_values, dtype=np.float32).tobytes()
+    ).hexdigest()
+    return f"clip:{settings.CLIP_MODEL_VERSION}:{content_hash}"
+
+
+def get_cached_clip_embedding(cache_key: str) -> np.ndarray | None:
+    """Return the cached CLIP embedding (as float32) or None if the embedding
+    is not in cache."""
+    embedding = clip_embedding_cache.get(cache_key)
+    if embedding is None:
+        return None
+    return embedding.astype(np.float32)
+
+
+def cache_clip_embedding(cache_key: str, embedding: np.ndarray) -> None:
+    """Save a CLIP embedding in cache.
+
+    If `settings.CLIP_EMBEDDING_CACHE_DTYPE` is `float16`, the embedding is
+    stored with reduced precision, unless the cosine similarity between the
+    original and the float16 embedding is lower than
+    `settings.CLIP_EMBEDDING_CACHE_MIN_COSINE_SIMILARITY` (or if some values
+    are out of the float16 range).
+    """
+    if settings.CLIP_EMBEDDING_CACHE_DTYPE == "float16":
+        with np.errstate(over="ignore"):
+            reduced_embedding = embedding.astype(np.float16)
+        if (
+            np.isfinite(reduced_embedding).all()
+            and cosine_similarity(embedding, reduced_embedding.astype(np.float32))
+            >= settings.CLIP_EMBEDDING_CACHE_MIN_COSINE_SIMILARITY
+        ):
+            embedding = reduced_embedding
+        else:
+            logger.debug("float16 precision too low for %s", cache_key)
+    clip_embedding_cache.set(cache_key, embedding)
+
 
-    return np.concatenate(embedding_batches)
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Return the cosine similarity between two vectors."""
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if norm == 0:
+        return 1.0 if not a.any() and not b.any() else 0.0
+    return float(np.dot(a, b)) / norm
 
 
 def deserialize_byte_tensor(data: bytes) -> list[str]:
@@ -216,6 +345,47 @@ def add_triton_infer_input_tensor(request, name: str, data: np.ndarray, datatype
     request.raw_input_contents.extend([data.tobytes()])
 
 
+def create_batches(
+    lengths: list[int], batch_size: int, max_padding_ratio: float
+) -> list[list[int]]:
+    """Pack inputs into batches of at most `batch_size` inputs.
+
+    Inputs are sorted by length, so that inputs of similar length end up in
+    the same batch. A new batch is started if adding the next input to the
+    current batch would make the fraction of padding tokens in the batch
+    higher than `max_padding_ratio`.
+
+    :param lengths: the number of tokens of each input
+    :param batch_size: the maximum number of inputs in a batch
+    :param max_padding_ratio: the maximum fraction of padding tokens in a
+        batch
+    :return: a list of batches, each batch being a list of input indices
+    """
+    batches = []
+    batch: list[int] = []
+    num_tokens = 0
+    for idx in sorted(range(len(lengths)), key=lengths.__getitem__):
+        length = lengths[idx]
+        if batch:
+            # As inputs are sorted, the current input is the longest of the
+            # batch
+            padded_num_tokens = length * (len(batch) + 1)
+            if (
+                len(batch) >= batch_size
+                or (padded_num_tokens - num_tokens - length) / padded_num_tokens
+                > max_padding_ratio
+            ):
+                batches.append(batch)
+                batch = []
+                num_tokens = 0
+        batch.append(idx)
+        num_tokens += length
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
 def load_model(
     triton_stub: GRPCInferenceServiceStub,
     model_name: str,
@@ -331,3 +501,6 @@ def download_models():
             model_with_version_dir.parent.mkdir(parents=True, exist_ok=True)
             logger.info(f"Copying model files to {model_with_version_dir}")
             shutil.move(temp_dir / model.subfolder, model_with_version_dir)
+
+
+function_cache_register.register(get_clip_image_processor)
@@ -0,0 +1,809 @@
+"""A stand-in for Triton Inference Server, for load and performance testing.
+
+The stand-in server speaks the same gRPC protocol as Triton (see
+`robotoff.triton.get_triton_inference_stub`) and serves the models used by
+Robotoff, with the same model names, input and output signatures and
+maximum batch sizes. Inputs are validated like Triton would do, so that
+client-side regressions (wrong tensor name, data type or shape) are caught.
+
+Outputs are synthetic but deterministic: the output of an item only depends
+on the model name and on the item inputs (and not on the other items of the
+batch). The inference latency is simulated with a configurable fixed and
+per-item delay, and the number of requests processed concurrently by each
+model is bounded, as with Triton model instances.
+
+To use it, start the server (`robotoff-cli triton serve-stand-in`) and point
+`DEFAULT_TRITON_URI` (or any `TRITON_URI_*` setting) to it.
+"""
+
+import dataclasses
+import hashlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import grpc
+import numpy as np
+from tritonclient.grpc import model_config_pb2, service_pb2, service_pb2_grpc
+
+from robotoff.triton import (
+    CLIP_MAX_BATCH_SIZE,
+    deserialize_byte_tensor,
+    serialize_byte_tensor,
+)
+
+logger = logging.getLogger(__name__)
+
+# numpy dtype of each Triton data type, BYTES tensors are deserialized as
+# object arrays
+DATATYPES: dict[str, type] = {
+    "FP32": np.float32,
+    "INT64": np.int64,
+    "UINT8": np.uint8,
+    "BYTES": np.object_,
+}
+
+CONFIG_DATATYPES = {
+    "FP32": model_config_pb2.TYPE_FP32,
+    "INT64": model_config_pb2.TYPE_INT64,
+    "UINT8": model_config_pb2.TYPE_UINT8,
+    "BYTES": model_config_pb2.TYPE_STRING,
+}
+
+# Category labels returned by the category classifier if no label is
+# provided
+DEFAULT_CATEGORY_LABELS = [
+    "en:plant-based-foods-and-beverages",
+    "en:beverages",
+    "en:snacks",
+    "en:dairies",
+    "en:meats-and-their-products",
+    "en:cheeses",
+    "en:sweet-snacks",
+    "en:biscuits",
+    "en:breakfast-cereals",
+    "en:fruit-juices",
+]
+
+# Number of detections returned by Tensorflow Object Detection API models
+TF_NUM_DETECTIONS = 100
+
+# Default number of labels of the nutrition extractor model, used if the
+# model configuration is not available locally
+DEFAULT_NUTRITION_EXTRACTOR_NUM_LABELS = 1
+
+
+class StandInError(Exception):
+    """Error returned to the client, with the gRPC status code Triton would
+    use."""
+
+    def __init__(self, code: grpc.StatusCode, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+@dataclasses.dataclass
+class TensorSpec:
+    name: str
+    #: Triton data type (FP32, INT64, UINT8 or BYTES)
+    datatype: str
+    #: expected shape, including the batch dimension, -1 for variable
+    #: dimensions
+    dims: list[int]
+    #: whether the input can be omitted (used for inputs only)
+    optional: bool = False
+
+
+# An output generator takes the batch inputs and one random generator per
+# batch item, and returns a {output name: output array} dict
+OutputGenerator = Callable[
+    [dict[str, np.ndarray], list[np.random.Generator]], dict[str, np.ndarray]
+]
+
+
+@dataclasses.dataclass
+class StandInModel:
+    name: str
+    inputs: list[TensorSpec]
+    outputs: list[TensorSpec]
+    generate: OutputGenerator
+    #: maximum batch size, 0 if the batch dimension is part of the fixed
+    #: shape of the inputs (same meaning as in Triton model configuration)
+    max_batch_size: int = 0
+    versions: tuple[str, ...] = ("1",)
+    backend: str = "onnxruntime"
+    #: function returning the bytes used to seed the random generator of a
+    #: batch item, by default all inputs of the item are used
+    item_key: Callable[[dict[str, np.ndarray], int], bytes] | None = None
+
+    def get_config(self) -> model_config_pb2.ModelConfig:
+        def strip_batch_dim(dims: list[int]) -> list[int]:
+            return dims[1:] if self.max_batch_size > 0 else dims
+
+        return model_config_pb2.ModelConfig(
+            name=self.name,
+            backend=self.backend,
+            max_batch_size=self.max_batch_size,
+            input=[
+                model_config_pb2.ModelInput(
+                    name=spec.name,
+                    data_type=CONFIG_DATATYPES[spec.datatype],
+                    dims=strip_batch_dim(spec.dims),
+                    optional=spec.optional,
+                )
+                for spec in self.inputs
+            ],
+            output=[
+                model_config_pb2.ModelOutput(
+                    name=spec.name,
+                    data_type=CONFIG_DATATYPES[spec.datatype],
+                    dims=strip_batch_dim(spec.dims),
+                )
+                for spec in self.outputs
+            ],
+        )
+
+
+@dataclasses.dataclass
+class LatencyConfig:
+    """Simulated inference latency, in seconds.
+
+    The latency of a request is `base + per_item * batch_size`, multiplied by
+    a random factor between `1 - jitter` and `1 + jitter`.
+    """
+
+    base: float = 0.0
+    per_item: float = 0.0
+    jitter: float = 0.0
+
+    def get_delay(self, batch_size: int) -> float:
+        delay = self.base + self.per_item * batch_size
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.0, delay)
+
+
+def default_item_key(inputs: dict[str, np.ndarray], index: int) -> bytes:
+    """Return the bytes of all inputs of the `index`-th batch item.
+
+    Empty strings are ignored in BYTES inputs, as they are used as padding.
+    """
+    parts = []
+    for name in sorted(inputs):
+        item = inputs[name][index]
+        if item.dtype == np.object_:
+            parts.extend(value for value in item.ravel() if value)
+        else:
+            parts.append(np.ascontiguousarray(item).tobytes())
+    return b"\0".join(parts)
+
+
+def token_item_key(inputs: dict[str, np.ndarray], index: int) -> bytes:
+    """Return the bytes of the non-padding input IDs of the `index`-th batch
+    item, so that the output doesn't depend on the padding length."""
+    mask = inputs["attention_mask"][index].astype(bool)
+    return inputs["input_ids"][index][mask].tobytes()
+
+
+def generate_clip_outputs(
+    inputs: dict[str, np.ndarray], rngs: list[np.random.Generator]
+) -> dict[str, np.ndarray]:
+    embeddings = np.stack([rng.standard_normal(512) for rng in rngs])
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return {"image_embeds": embeddings.astype(np.float32)}
+
+
+def get_yolo_num_anchors(image_size: int) -> int:
+    """Return the number of candidate detections of a YOLOv8 model (one per
+    cell of the 3 detection grids, with strides 8, 16 and 32)."""
+    return sum((image_size // stride) ** 2 for stride in (8, 16, 32))
+
+
+def yolo_output_generator(image_size: int, num_labels: int) -> OutputGenerator:
+    num_anchors = get_yolo_num_anchors(image_size)
+
+    def generate(
+        inputs: dict[str, np.ndarray], rngs: list[np.random.Generator]
+    ) -> dict[str, np.ndarray]:
+        (rng,) = rngs
+        # (center x, center y, width, height) in pixels, followed by the
+        # score of each label
+        output = np.empty((4 + num_labels, num_anchors), dtype=np.float32)
+        output[:2] = rng.uniform(0, image_size, (2, num_anchors))
+        output[2:4] = rng.uniform(0.02 * image_size, 0.3 * image_size, (2, num_anchors))
+        output[4:] = rng.uniform(0, 0.05, (num_labels, num_anchors))
+        num_objects = rng.integers(0, 4)
+        anchors = rng.choice(num_anchors, size=num_objects, replace=False)
+        output[4 + rng.integers(0, num_labels, num_objects), anchors] = rng.uniform(
+            0.5, 0.99, num_objects
+        )
+        return {"output0": output[np.newaxis]}
+
+    return generate
+
+
+def tf_detection_output_generator(num_labels: int) -> OutputGenerator:
+    def generate(
+        inputs: dict[str, np.ndarray], rngs: list[np.random.Generator]
+    ) -> dict[str, np.ndarray]:
+        (rng,) = rngs
+        scores = np.sort(rng.uniform(0, 0.3, TF_NUM_DETECTIONS))[::-1]
+        num_objects = rng.integers(0, 4)
+        scores[:num_objects] = np.sort(rng.uniform(0.5, 0.99, num_objects))[::-1]
+        # classes start at 1, 0 is the background (NULL) class
+        classes = rng.integers(1, num_labels, TF_NUM_DETECTIONS)
+        # (y_min, x_min, y_max, x_max) in relative coordinates
+        corners = np.sort(rng.uniform(0, 1, (TF_NUM_DETECTIONS, 2, 2)), axis=1)
+        boxes = corners.reshape(TF_NUM_DETECTIONS, 4)
+        return {
+            "num_detections": np.array([TF_NUM_DETECTIONS], dtype=np.float32),
+            "detection_classes": classes.astype(np.float32)[np.newaxis],
+            "detection_scores": scores.astype(np.float32)[np.newaxis],
+            "detection_boxes": boxes.astype(np.float32)[np.newaxis],
+        }
+
+    return generate
+
+
+def classification_output_generator(num_labels: int) -> OutputGenerator:
+    def generate(
+        inputs: dict[str, np.ndarray], rngs: list[np.random.Generator]
+    ) -> dict[str, np.ndarray]:
+        (rng,) = rngs
+        logits = 2 * rng.standard_normal(num_labels)
+        probs = np.exp(logits - logits.max())
+        return {"output0": (probs / probs.sum()).astype(np.float32)[np.newaxis]}
+
+    return generate
+
+
+def category_output_generator(labels: list[str]) -> OutputGenerator:
+    def generate(
+        inputs: dict[str, np.ndarray], rngs: list[np.random.Generator]
+    ) -> dict[str, np.ndarray]:
+        # Most scores are low, a few are above the usual thresholds
+        scores = np.stack([rng.random(len(labels)) ** 4 for rng in rngs])
+        # The label tensor is repeated for each item of the batch
+        label_tensor = np.empty((len(rngs), len(labels)), dtype=np.object_)
+        label_tensor[:] = [label.encode("utf-8") for label in labels]
+        return {
+            "output_mapper_layer": scores.astype(np.float32),
+            "output_mapper_layer_1": label_tensor,
+        }
+
+    return generate
+
+
+def token_classification_output_generator(
+    num_labels: int, output_name: str
+) -> OutputGenerator:
+    def generate(
+        inputs: dict[str, np.ndarray], rngs: list[np.random.Generator]
+    ) -> dict[str, np.ndarray]:
+        num_tokens = inputs["input_ids"].shape[1]
+        # Logits are generated token by token, so that the logits of the
+        # first tokens don't depend on the padding length. The first label
+        # (`O`) is favored, as most tokens are outside of any entity.
+        logits = np.stack(
+            [rng.standard_normal((num_tokens, num_labels)) for rng in rngs]
+        )
+        logits[..., 0] += 2.0
+        return {output_name: logits.astype(np.float32)}
+
+    return generate
+
+
+def get_nutrition_extractor_num_labels() -> int:
+    """Return the number of labels of the nutrition extractor model, from the
+    model configuration if it's available locally."""
+    from robotoff.prediction.nutrition_extraction import MODEL_DIR, get_id2label
+
+    try:
+        return len(get_id2label(MODEL_DIR))
+    except ValueError:
+        return DEFAULT_NUTRITION_EXTRACTOR_NUM_LABELS
+
+
+def get_default_models(
+    category_labels: list[str] | None = None,
+    nutrition_extractor_num_labels: int | None = None,
+) -> dict[str, StandInModel]:
+    """Return the stand-in version of all models served by Triton in
+    production.
+
+    Model names, label names and image sizes are read from the client model
+    configurations, so that they stay in sync.
+
+    :param category_labels: labels returned by the category classifier,
+        defaults to `DEFAULT_CATEGORY_LABELS`
+    :param nutrition_extractor_num_labels: number of labels of the nutrition
+        extractor model, by default it's read from the model configuration
+    :return: a {model name: model} dict
+    """
+    from robotoff.prediction import image_classifier
+    from robotoff.prediction.category.neural import keras_category_classifier_3_0
+    from robotoff.prediction.category.neural.keras_category_classifier_3_0.preprocessing import (
+        IMAGE_EMBEDDING_DIM,
+        MAX_IMAGE_EMBEDDING,
+        NUTRIMENT_NAMES,
+    )
+    from robotoff.prediction.ingredient_list import INGREDIENT_ID2LABEL
+    from robotoff.prediction.nutrition_extraction import (
+        MODEL_NAME as NUTRITION_EXTRACTOR_MODEL_NAME,
+    )
+    from robotoff.prediction.object_detection import core as object_detection
+    from robotoff.types import NeuralCategoryClassifierModel
+
+    if category_labels is None:
+        category_labels = DEFAULT_CATEGORY_LABELS
+    if nutrition_extractor_num_labels is None:
+        nutrition_extractor_num_labels = get_nutrition_extractor_num_labels()
+
+    models = [
+        StandInModel(
+            name="clip",
+            inputs=[
+                TensorSpec("pixel_values", "FP32", [-1, 3, 224, 224]),
+                TensorSpec("attention_mask", "INT64", [-1, -1]),
+                TensorSpec("input_ids", "INT64", [-1, -1]),
+            ],
+            outputs=[TensorSpec("image_embeds", "FP32", [-1, 512])],
+            generate=generate_clip_outputs,
+            max_batch_size=CLIP_MAX_BATCH_SIZE,
+        ),
+        StandInModel(
+            name="ingredient-ner",
+            inputs=[
+                TensorSpec("input_ids", "INT64", [-1, -1]),
+                TensorSpec("attention_mask", "INT64", [-1, -1]),
+            ],
+            outputs=[TensorSpec("logits", "FP32", [-1, -1, len(INGREDIENT_ID2LABEL)])],
+            generate=token_classification_output_generator(
+                len(INGREDIENT_ID2LABEL), "logits"
+            ),
+            max_batch_size=32,
+            item_key=token_item_key,
+        ),
+        StandInModel(
+            name=NUTRITION_EXTRACTOR_MODEL_NAME,
+            inputs=[
+                TensorSpec("input_ids", "INT64", [-1, -1]),
+                TensorSpec("attention_mask", "INT64", [-1, -1]),
+                TensorSpec("bbox", "INT64", [-1, -1, 4]),
+                TensorSpec("pixel_values", "FP32", [-1, 3, 224, 224]),
+            ],
+            outputs=[
+                TensorSpec("logits", "FP32", [-1, -1, nutrition_extractor_num_labels])
+            ],
+            generate=token_classification_output_generator(
+                nutrition_extractor_num_labels, "logits"
+            ),
+            versions=("1", "2"),
+            item_key=token_item_key,
+        ),
+        StandInModel(
+            name=keras_category_classifier_3_0.triton_model_names[
+                NeuralCategoryClassifierModel.keras_image_embeddings_3_0
+            ],
+            inputs=[
+                TensorSpec("product_name", "BYTES", [-1, 1], optional=True),
+                TensorSpec("ingredients_tags", "BYTES", [-1, -1], optional=True),
+                *(
+                    TensorSpec(name, "FP32", [-1, 1], optional=True)
+                    for name in NUTRIMENT_NAMES
+                ),
+                TensorSpec("ingredients_ocr_tags", "BYTES", [-1, -1], optional=True),
+                TensorSpec(
+                    "image_embeddings",
+                    "FP32",
+                    [-1, MAX_IMAGE_EMBEDDING, IMAGE_EMBEDDING_DIM],
+                    optional=True,
+                ),
+                TensorSpec(
+                    "image_embeddings_mask",
+                    "FP32",
+                    [-1, MAX_IMAGE_EMBEDDING],
+                    optional=True,
+                ),
+            ],
+            outputs=[
+                TensorSpec("output_mapper_layer", "FP32", [-1, len(category_labels)]),
+                TensorSpec(
+                    "output_mapper_layer_1", "BYTES", [-1, len(category_labels)]
+                ),
+            ],
+            generate=category_output_generator(category_labels),
+            backend="tensorflow",
+        ),
+    ]
+
+    for config in object_detection.MODELS_CONFIG.values():
+        num_labels = len(config.label_names)
+        if config.backend == "yolo":
+            models.append(
+                StandInModel(
+                    name=config.triton_model_name,
+                    inputs=[
+                        TensorSpec(
+                            "images",
+                            "FP32",
+                            [1, 3, config.image_size, config.image_size],
+                        )
+                    ],
+                    outputs=[
+                        TensorSpec(
+                            "output0",
+                            "FP32",
+                            [
+                                1,
+                                4 + num_labels,
+                                get_yolo_num_anchors(config.image_size),
+                            ],
+                        )
+                    ],
+                    generate=yolo_output_generator(config.image_size, num_labels),
+                    versions=(config.triton_version,),
+                )
+            )
+        else:
+            models.append(
+                StandInModel(
+                    name=config.triton_model_name,
+                    inputs=[TensorSpec("inputs", "UINT8", [1, -1, -1, 3])],
+                    outputs=[
+                        TensorSpec("num_detections", "FP32", [1]),
+                        TensorSpec("detection_classes", "FP32", [1, TF_NUM_DETECTIONS]),
+                        TensorSpec("detection_scores", "FP32", [1, TF_NUM_DETECTIONS]),
+                        TensorSpec(
+                            "detection_boxes", "FP32", [1, TF_NUM_DETECTIONS, 4]
+                        ),
+                    ],
+                    generate=tf_detection_output_generator(num_labels),
+                    versions=(config.triton_version,),
+                    backend="tensorflow",
+                )
+            )
+
+    for config in image_classifier.MODELS_CONFIG.values():
+        models.append(
+            StandInModel(
+                name=config.triton_model_name,
+                inputs=[
+                    TensorSpec(
+                        "images", "FP32", [1, 3, config.image_size, config.image_size]
+                    )
+                ],
+                outputs=[TensorSpec("output0", "FP32", [1, len(config.label_names)])],
+                generate=classification_output_generator(len(config.label_names)),
+                versions=(config.triton_version,),
+            )
+        )
+
+    return {model.name: model for model in models}
+
+
+def _match_dims(dims: list[int], shape: list[int]) -> bool:
+    return len(dims) == len(shape) and all(
+        dim == -1 or dim == value for dim, value in zip(dims, shape)
+    )
+
+
+def parse_inputs(
+    model: StandInModel, request: service_pb2.ModelInferRequest
+) -> dict[str, np.ndarray]:
+    """Validate the request inputs against the model signature, and return
+    them as numpy arrays.
+
+    :raises StandInError: if the inputs don't match the model signature
+    """
+    specs = {spec.name: spec for spec in model.inputs}
+    if len(request.raw_input_contents) != len(request.inputs):
+        raise StandInError(
+            grpc.StatusCode.INVALID_ARGUMENT,
+            f"expected {len(request.inputs)} raw input contents, "
+            f"got {len(request.raw_input_contents)}",
+        )
+
+    inputs: dict[str, np.ndarray] = {}
+    for input_tensor, raw in zip(request.inputs, request.raw_input_contents):
+        spec = specs.get(input_tensor.name)
+        if spec is None:
+            raise StandInError(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"unexpected inference input '{input_tensor.name}' for model "
+                f"'{model.name}'",
+            )
+        if input_tensor.datatype != spec.datatype:
+            raise StandInError(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"inference input '{spec.name}' data-type is "
+                f"'{input_tensor.datatype}', but model '{model.name}' expects "
+                f"'{spec.datatype}'",
+            )
+        shape = list(input_tensor.shape)
+        if not _match_dims(spec.dims, shape):
+            raise StandInError(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"unexpected shape for input '{spec.name}' for model "
+                f"'{model.name}'. Expected {spec.dims}, got {shape}",
+            )
+        if spec.datatype == "BYTES":
+            values = [value.encode("utf-8") for value in deserialize_byte_tensor(raw)]
+            array = np.empty(len(values), dtype=np.object_)
+            array[:] = values
+        else:
+            array = np.frombuffer(raw, dtype=DATATYPES[spec.datatype])
+        if array.size != int(np.prod(shape)):
+            raise StandInError(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"input '{spec.name}' has {array.size} elements, expected "
+                f"{int(np.prod(shape))} for shape {shape}",
+            )
+        inputs[spec.name] = array.reshape(shape)
+
+    missing = [
+        spec.name
+        for spec in model.inputs
+        if not spec.optional and spec.name not in inputs
+    ]
+    if missing:
+        raise StandInError(
+            grpc.StatusCode.INVALID_ARGUMENT,
+            f"expected {len(model.inputs)} inputs but got {len(inputs)} inputs "
+            f"for model '{model.name}', missing: {', '.join(missing)}",
+        )
+    if not inputs:
+        raise StandInError(
+            grpc.StatusCode.INVALID_ARGUMENT, f"no input for model '{model.name}'"
+        )
+
+    batch_sizes = {array.shape[0] for array in inputs.values()}
+    if len(batch_sizes) != 1:
+        raise StandInError(
+            grpc.StatusCode.INVALID_ARGUMENT,
+            f"inputs have different batch sizes: {sorted(batch_sizes)}",
+        )
+    (batch_size,) = batch_sizes
+    if model.max_batch_size > 0 and batch_size > model.max_batch_size:
+        raise StandInError(
+            grpc.StatusCode.INVALID_ARGUMENT,
+            f"inference request batch-size must be <= {model.max_batch_size} "
+            f"for '{model.name}'",
+        )
+    return inputs
+
+
+def get_item_rng(model: StandInModel, key: bytes) -> np.random.Generator:
+    digest = hashlib.sha256(model.name.encode("utf-8") + b"\0" + key).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little"))
+
+
+@dataclasses.dataclass
+class ModelStats:
+    requests: int = 0
+    items: int = 0
+    failures: int = 0
+    #: total time spent in inference (simulated latency included), in
+    #: seconds
+    inference_time: float = 0.0
+
+
+class StandInInferenceServicer(service_pb2_grpc.GRPCInferenceServiceServicer):
+    """gRPC servicer implementing the subset of the Triton API used by
+    Robotoff."""
+
+    def __init__(
+        self,
+        models: dict[str, StandInModel],
+        latency: LatencyConfig | None = None,
+        instance_count: int = 1,
+    ):
+        """
+        :param models: the models to serve, as a {model name: model} dict
+        :param latency: the simulated inference latency, no latency by
+            default
+        :param instance_count: number of requests processed concurrently by
+            each model
+        """
+        self.models = models
+        self.latency = latency or LatencyConfig()
+        self.loaded = set(models)
+        self.stats = {name: ModelStats() for name in models}
+        self._instances = {
+            name: threading.BoundedSemaphore(instance_count) for name in models
+        }
+        self._lock = threading.Lock()
+
+    def get_model(self, name: str, version: str = "") -> StandInModel:
+        model = self.models.get(name)
+        if model is None or (version and version not in model.versions):
+            raise StandInError(
+                grpc.StatusCode.NOT_FOUND,
+                f"Request for unknown model: '{name}' version {version or 'latest'} "
+                "is not found",
+            )
+        return model
+
+    def infer(self, request: service_pb2.ModelInferRequest):
+        model = self.get_model(request.model_name, request.model_version)
+        if model.name not in self.loaded:
+            raise StandInError(
+                grpc.StatusCode.UNAVAILABLE,
+                f"Request for unknown model: '{model.name}' is not ready",
+            )
+        inputs = parse_inputs(model, request)
+        batch_size = next(iter(inputs.values())).shape[0]
+
+        output_specs = {spec.name: spec for spec in model.outputs}
+        requested = [output.name for output in request.outputs] or list(output_specs)
+        for name in requested:
+            if name not in output_specs:
+                raise StandInError(
+                    grpc.StatusCode.INVALID_ARGUMENT,
+                    f"unexpected inference output '{name}' for model "
+                    f"'{model.name}'",
+                )
+
+        start_time = time.perf_counter()
+        with self._instances[model.name]:
+            item_key = model.item_key or default_item_key
+            rngs = [get_item_rng(model, item_key(inputs, i)) for i in range(batch_size)]
+            outputs = model.generate(inputs, rngs)
+            remaining = self.latency.get_delay(batch_size) - (
+                time.perf_counter() - start_time
+            )
+            if remaining > 0:
+                time.sleep(remaining)
+
+        response = service_pb2.ModelInferResponse(
+            model_name=model.name,
+            model_version=request.model_version or model.versions[-1],
+            id=request.id,
+        )
+        for name in requested:
+            spec = output_specs[name]
+            array = outputs[name]
+            response.outputs.append(
+                service_pb2.ModelInferResponse.InferOutputTensor(
+                    name=name, datatype=spec.datatype, shape=array.shape
+                )
+            )
+            response.raw_output_contents.append(
+                serialize_byte_tensor(array)
+                if spec.datatype == "BYTES"
+                else np.ascontiguousarray(array).tobytes()
+            )
+
+        with self._lock:
+            stats = self.stats[model.name]
+            stats.requests += 1
+            stats.items += batch_size
+            stats.inference_time += time.perf_counter() - start_time
+        return response
+
+    def ModelInfer(self, request, context):
+        try:
+            return self.infer(request)
+        except StandInError as e:
+            if request.model_name in self.stats:
+                with self._lock:
+                    self.stats[request.model_name].failures += 1
+            context.abort(e.code, str(e))
+
+    def ServerLive(self, request, context):
+        return service_pb2.ServerLiveResponse(live=True)
+
+    def ServerReady(self, request, context):
+        return service_pb2.ServerReadyResponse(ready=True)
+
+    def ServerMetadata(self, request, context):
+        return service_pb2.ServerMetadataResponse(
+            name="triton-stand-in", version="0.0.0"
+        )
+
+    def ModelReady(self, request, context):
+        model = self.models.get(request.name)
+        return service_pb2.ModelReadyResponse(
+            ready=model is not None
+            and model.name in self.loaded
+            and (not request.version or request.version in model.versions)
+        )
+
+    def ModelMetadata(self, request, context):
+        try:
+            model = self.get_model(request.name, request.version)
+        except StandInError as e:
+            context.abort(e.code, str(e))
+        return service_pb2.ModelMetadataResponse(
+            name=model.name,
+            versions=list(model.versions),
+            platform=model.backend,
+            inputs=[
+                service_pb2.ModelMetadataResponse.TensorMetadata(
+                    name=spec.name, datatype=spec.datatype, shape=spec.dims
+                )
+                for spec in model.inputs
+            ],
+            outputs=[
+                service_pb2.ModelMetadataResponse.TensorMetadata(
+                    name=spec.name, datatype=spec.datatype, shape=spec.dims
+                )
+                for spec in model.outputs
+            ],
+        )
+
+    def ModelConfig(self, request, context):
+        try:
+            model = self.get_model(request.name, request.version)
+        except StandInError as e:
+            context.abort(e.code, str(e))
+        return service_pb2.ModelConfigResponse(config=model.get_config())
+
+    def RepositoryIndex(self, request, context):
+        return service_pb2.RepositoryIndexResponse(
+            models=[
+                service_pb2.RepositoryIndexResponse.ModelIndex(
+                    name=model.name,
+                    version=version,
+                    state="READY" if model.name in self.loaded else "UNAVAILABLE",
+                )
+                for model in self.models.values()
+                for version in model.versions
+                if model.name in self.loaded or not request.ready
+            ]
+        )
+
+    def RepositoryModelLoad(self, request, context):
+        try:
+            self.get_model(request.model_name)
+        except StandInError as e:
+            context.abort(e.code, str(e))
+        self.loaded.add(request.model_name)
+        return service_pb2.RepositoryModelLoadResponse()
+
+    def RepositoryModelUnload(self, request, context):
+        self.loaded.discard(request.model_name)
+        return service_pb2.RepositoryModelUnloadResponse()
+
+
+def start_stand_in_server(
+    address: str = "[::]:8001",
+    models: dict[str, StandInModel] | None = None,
+    latency: LatencyConfig | None = None,
+    instance_count: int = 1,
+    max_workers: int = 16,
+) -> tuple[grpc.Server, StandInInferenceServicer, int]:
+    """Start the stand-in server in background threads.
+
+    :param address: the address to listen on, use port 0 to pick a free port
+    :param models: the models to serve, defaults to `get_default_models()`
+    :param latency: the simulated inference latency, no latency by default
+    :param instance_count: number of requests processed concurrently by each
+        model
+    :param max_workers: number of threads handling gRPC requests
+    :return: a (server, servicer, port) tuple, call `server.stop(None)` to
+        stop the server
+    """
+    if models is None:
+        models = get_default_models()
+    servicer = StandInInferenceServicer(models, latency, instance_count)
+    server = grpc.server(
+        ThreadPoolExecutor(max_workers=max_workers),
+        # Triton doesn't limit the message size
+        options=[
+            ("grpc.max_receive_message_length", -1),
+            ("grpc.max_send_message_length", -1),
+        ],
+    )
+    service_pb2_grpc.add_GRPCInferenceServiceServicer_to_server(servicer, server)
+    port = server.add_insecure_port(address)
+    server.start()
+    logger.info(
+        "Triton stand-in server listening on port %d, serving %d models",
+        port,
+        len(models),
+    )
+    return server, servicer, port
@@ -4,7 +4,6 @@ import pathlib
 from typing import Any, Callable, Iterable, Union
 
 import orjson
-import requests
 from requests.adapters import HTTPAdapter
 
 from robotoff import settings
@@ -12,6 +11,7 @@ from robotoff.types import JSONType
 
 from .image import get_image_from_url  # noqa: F401
 from .logger import get_logger  # noqa: F401
+from .tracing import TracedSession
 
 logger = logging.getLogger(__name__)
 
@@ -120,7 +120,9 @@ def dump_text(filepath: Union[str, pathlib.Path], text_iter: Iterable[str]):
             f.write(item + "\n")
 
 
-http_session = requests.Session()
+# All outbound HTTP calls performed with this session are recorded as spans
+# when tracing is enabled
+http_session = TracedSession()
 USER_AGENT_HEADERS = {
     "User-Agent": settings.ROBOTOFF_USER_AGENT,
 }
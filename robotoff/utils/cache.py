@@ -13,6 +13,26 @@ from robotoff import settings
 # project.
 disk_cache = Cache(settings.DISKCACHE_DIR)
 
+# Disk-cache storing ingredient parsing results (see
+# `robotoff.off.parse_ingredients`). It's shared between all rq workers, and
+# bounded both in size and in time (each item expires after
+# `INGREDIENT_PARSING_CACHE_TTL` seconds), so that taxonomy updates on Product
+# Opener side are taken into account.
+ingredient_parsing_cache = Cache(
+    settings.INGREDIENT_PARSING_CACHE_DIR,
+    size_limit=settings.INGREDIENT_PARSING_CACHE_SIZE_LIMIT,
+)
+
+# Disk-cache storing CLIP embeddings (see
+# `robotoff.triton.generate_clip_embedding`), by content hash of the
+# preprocessed image and model version. Least recently used embeddings are
+# evicted first when the size limit is reached.
+clip_embedding_cache = Cache(
+    settings.CLIP_EMBEDDING_CACHE_DIR,
+    size_limit=settings.CLIP_EMBEDDING_CACHE_SIZE_LIMIT,
+    eviction_policy="least-recently-used",
+)
+
 
 def cache_http_request(
     key: str,
@@ -3,7 +3,6 @@ from io import BytesIO
 from pathlib import Path
 from typing import Literal
 
-import cv2
 import numpy as np
 import PIL
 import requests
@@ -15,6 +14,7 @@ from robotoff.utils.download import (
     cache_asset_from_url,
     get_asset_from_url,
 )
+from robotoff.utils.startup import lazy_import
 
 logger = logging.getLogger(__name__)
 
@@ -95,6 +95,7 @@ def get_image_from_url(
 
     elif return_type == "np":
         try:
+            cv2 = lazy_import("cv2")
             image = cv2.imdecode(
                 np.frombuffer(content_bytes, dtype=np.uint8), cv2.IMREAD_COLOR_RGB
             )
@@ -0,0 +1,108 @@
+"""A local stand-in for the Product Opener ingredient parser.
+
+It only handles the most common ingredient list structure (ingredients
+separated by commas or semicolons, sub-ingredients between parentheses or
+brackets, and percentages), and doesn't perform any taxonomy lookup: the
+ingredient IDs are the tags of the ingredient names, prefixed by the language.
+
+It is used when `INGREDIENT_PARSER=local`, so that ingredient extraction can
+be run and tested without access to Product Opener. It is not a substitute
+for the real parser in production.
+"""
+
+import re
+
+from robotoff.types import JSONType
+from robotoff.utils.text import get_tag
+
+PERCENT_REGEX = re.compile(r"(\d+(?:[.,]\d+)?)\s*%")
+SEPARATORS = {",", ";"}
+OPENING_BRACKETS = {"(": ")", "[": "]"}
+
+
+def split_top_level(text: str) -> list[str]:
+    """Split an ingredient list on the separators that are not between
+    parentheses or brackets (or between two digits, as in `12,5%`)."""
+    parts = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(text):
+        if char in OPENING_BRACKETS:
+            depth += 1
+        elif char in OPENING_BRACKETS.values():
+            depth = max(0, depth - 1)
+        elif (
+            char in SEPARATORS
+            and depth == 0
+            and not (0 < i < len(text) - 1 and text[i - 1 : i + 2 : 2].isdigit())
+        ):
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def parse_ingredient(text: str, lang: str) -> JSONType | None:
+    """Parse a single ingredient (with its sub-ingredients, if any).
+
+    :param text: the ingredient text, ex: `chocolate 20% (sugar, cocoa)`
+    :param lang: the language of the text, as a 2-letter code
+    :return: the parsed ingredient, in Product Opener format, or None if the
+        text doesn't contain any ingredient
+    """
+    name = text
+    sub_ingredients_text = None
+
+    bracket_start = min(
+        (i for i in (text.find(b) for b in OPENING_BRACKETS) if i != -1),
+        default=-1,
+    )
+    if bracket_start != -1:
+        closing_bracket = OPENING_BRACKETS[text[bracket_start]]
+        bracket_end = text.rfind(closing_bracket)
+        if bracket_end == -1:
+            bracket_end = len(text)
+        sub_ingredients_text = text[bracket_start + 1 : bracket_end]
+        name = f"{text[:bracket_start]} {text[bracket_end + 1 :]}"
+
+    percent = None
+    if (match := PERCENT_REGEX.search(name)) is not None:
+        percent = float(match.group(1).replace(",", "."))
+        name = name[: match.start()] + name[match.end() :]
+
+    if (
+        sub_ingredients_text is not None
+        and (match := PERCENT_REGEX.fullmatch(sub_ingredients_text.strip())) is not None
+    ):
+        # ex: `sugar (10%)`
+        percent = float(match.group(1).replace(",", "."))
+        sub_ingredients_text = None
+
+    name = " ".join(name.split()).strip(" .:-")
+    if not name:
+        return None
+
+    ingredient: JSONType = {"id": f"{lang}:{get_tag(name)}", "text": name}
+    if percent is not None:
+        ingredient["percent"] = percent
+    if sub_ingredients_text:
+        sub_ingredients = parse_ingredients_locally(sub_ingredients_text, lang)
+        if sub_ingredients:
+            ingredient["ingredients"] = sub_ingredients
+    return ingredient
+
+
+def parse_ingredients_locally(text: str, lang: str) -> list[JSONType]:
+    """Parse an ingredient list, the output follows the format of
+    `robotoff.off.parse_ingredients`.
+
+    :param text: the ingredients text to parse
+    :param lang: the language of the text, as a 2-letter code
+    :return: the list of parsed ingredients
+    """
+    ingredients = []
+    for part in split_top_level(text.strip().rstrip(".")):
+        ingredient = parse_ingredient(part, lang)
+        if ingredient is not None:
+            ingredients.append(ingredient)
+    return ingredients
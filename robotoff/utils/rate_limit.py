@@ -0,0 +1,38 @@
+import threading
+import time
+from collections import defaultdict
+
+
+class RateLimiter:
+    """A thread-safe rate limiter, that spaces out calls sharing the same key
+    (ex: the server the requests are sent to) so that at most `rate` calls
+    per second are performed for each key.
+
+    :param rate: the maximum number of calls per second for each key, rate
+        limiting is disabled if `rate <= 0`
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        # monotonic time at which the next call is allowed, for each key
+        self._next_call: dict[str, float] = defaultdict(float)
+
+    def acquire(self, key: str = "") -> float:
+        """Block until a call for `key` is allowed.
+
+        :param key: the rate limiting key
+        :return: the time spent waiting, in seconds
+        """
+        if self.interval == 0.0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            call_at = max(now, self._next_call[key])
+            self._next_call[key] = call_at + self.interval
+
+        wait = call_at - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,124 @@
+"""Deferred loading of heavy dependencies and resources.
+
+Heavy third-party modules (transformers, OpenCV, pint,...) and data
+resources (taxonomies, keyword processors, grammars,...) are loaded on first
+use, so that CLI commands, workers and the API start fast. Every load
+performed through this module is timed and added to the startup report.
+
+Resources can also be loaded eagerly through a warm-up manifest (see
+`settings.WARMUP_MANIFEST`): a list of names of functions registered in
+`function_cache_register` (called without argument) or of modules to import.
+"""
+
+import dataclasses
+import importlib
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Iterable, Iterator
+
+from robotoff.utils.cache import function_cache_register
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class LoadRecord:
+    #: the name of the module or resource
+    name: str
+    #: either "module" or "resource"
+    kind: str
+    #: load duration, in seconds
+    duration: float
+    #: True if the item was loaded through the warm-up manifest
+    warm_up: bool = False
+
+
+_load_records: list[LoadRecord] = []
+_lock = threading.Lock()
+_warming_up = threading.local()
+
+
+@contextmanager
+def record_load(name: str, kind: str = "resource") -> Iterator[None]:
+    """Time the loading of a module or resource and add it to the startup
+    report."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = LoadRecord(
+            name=name,
+            kind=kind,
+            duration=time.perf_counter() - start_time,
+            warm_up=getattr(_warming_up, "value", False),
+        )
+        with _lock:
+            _load_records.append(record)
+        logger.debug("Loaded %s %s in %.3fs", kind, name, record.duration)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import a module on first use, and time the import if the module was
+    not imported yet.
+
+    :param name: the full name of the module (ex: `transformers`)
+    :return: the imported module
+    """
+    if (module := sys.modules.get(name)) is not None:
+        return module
+
+    with record_load(name, kind="module"):
+        return importlib.import_module(name)
+
+
+def warm_up(manifest: Iterable[str]) -> None:
+    """Load eagerly all items of the warm-up manifest.
+
+    Each item is either the name of a function registered in
+    `function_cache_register` (it's called without argument, so that the
+    result is cached) or the name of a module. Errors are logged and don't
+    prevent the following items from being loaded.
+
+    :param manifest: the names of the items to load
+    """
+    _warming_up.value = True
+    try:
+        for name in manifest:
+            try:
+                if name in function_cache_register.cache:
+                    with record_load(name):
+                        function_cache_register.cache[name]()
+                else:
+                    lazy_import(name)
+            except Exception:
+                logger.exception("Error during warm-up of %s", name)
+    finally:
+        _warming_up.value = False
+
+
+def get_startup_report() -> list[LoadRecord]:
+    """Return all modules and resources loaded so far, in load order."""
+    with _lock:
+        return list(_load_records)
+
+
+def log_startup_report(title: str = "Startup report") -> None:
+    """Log all modules and resources loaded so far, with their load
+    duration."""
+    records = get_startup_report()
+    lines = [
+        f"  {record.kind:<8} {record.name:<45} {record.duration:8.3f}s"
+        + (" (warm-up)" if record.warm_up else "")
+        for record in records
+    ]
+    logger.info(
+        "%s: %d items loaded in %.3fs\n%s",
+        title,
+        len(records),
+        sum(record.duration for record in records),
+        "\n".join(lines),
+    )
@@ -0,0 +1,297 @@
+"""Opt-in tracing and sampled CPU profiling of rq jobs and API requests.
+
+When tracing is enabled (`ENABLE_TRACING=1`), every rq job and every API
+request records a trace: one span for the job/request itself and one span
+for each outbound operation performed while it runs (HTTP calls through
+`http_session`, Triton inference, SQL queries, MongoDB commands and
+Elasticsearch requests). Each trace is written to `TRACING_DIR` in the
+Chrome Trace Event format, it can be opened with https://ui.perfetto.dev or
+chrome://tracing.
+
+Jobs (function name) and endpoints (`{METHOD} {route}`) listed in
+`PROFILING_TARGETS` are also profiled with cProfile for a fraction
+(`PROFILING_SAMPLE_RATE`) of their runs. The profile is saved in pstats format
+(`.prof`), it can be inspected with `python -m pstats` or snakeviz.
+
+Outbound clients are always instrumented: when no trace is being recorded,
+`span` is a no-op.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import datetime
+import itertools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator
+from urllib.parse import urlparse
+
+import orjson
+import requests
+
+from robotoff import settings
+from robotoff.types import JSONType
+
+logger = logging.getLogger(__name__)
+
+# The trace being recorded in the current context, if any
+_current_trace: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar(
+    "robotoff_current_trace", default=None
+)
+# Used to generate unique trace file names within a process
+_trace_counter = itertools.count()
+
+
+class Trace:
+    """A collection of spans recorded while running a single job or API
+    request."""
+
+    def __init__(self, name: str, category: str):
+        self.name = name
+        self.category = category
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.start_ns = time.perf_counter_ns()
+        self.events: list[JSONType] = []
+
+    def add_span(
+        self,
+        name: str,
+        category: str,
+        start_ns: int,
+        duration_ns: int,
+        args: dict[str, Any] | None = None,
+    ) -> None:
+        """Add a span to the trace.
+
+        :param name: the name of the span (ex: `GET images.openfoodfacts.org`)
+        :param category: the category of the span (ex: `http`, `sql`)
+        :param start_ns: the start time of the span, as returned by
+            `time.perf_counter_ns()`
+        :param duration_ns: the duration of the span, in nanoseconds
+        :param args: additional data to attach to the span, optional
+        """
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                # complete event (with a duration)
+                "ph": "X",
+                # timestamps and durations are in microseconds
+                "ts": (start_ns - self.start_ns) / 1000,
+                "dur": duration_ns / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args or {},
+            }
+        )
+
+    def to_json(self) -> JSONType:
+        return {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "name": self.name,
+                "category": self.category,
+                "started_at": self.started_at.isoformat(),
+                "version": settings.get_package_version(),
+            },
+        }
+
+
+def get_current_trace() -> Trace | None:
+    """Return the trace being recorded in the current context, or None if
+    no trace is being recorded."""
+    return _current_trace.get()
+
+
+@contextlib.contextmanager
+def span(name: str, category: str, **kwargs) -> Iterator[dict[str, Any]]:
+    """Record a span in the current trace.
+
+    This is a no-op if no trace is being recorded. The context manager yields
+    the span arguments, so that the caller can add data that is only known
+    once the operation completed (ex: the HTTP status code).
+
+    :param name: the name of the span
+    :param category: the category of the span
+    :param kwargs: additional data to attach to the span
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield kwargs
+        return
+
+    start_ns = time.perf_counter_ns()
+    try:
+        yield kwargs
+    except BaseException as e:
+        kwargs["error"] = type(e).__name__
+        raise
+    finally:
+        trace.add_span(
+            name, category, start_ns, time.perf_counter_ns() - start_ns, kwargs
+        )
+
+
+def add_span(
+    name: str, category: str, duration_ns: int, args: dict[str, Any] | None = None
+) -> None:
+    """Add a span ending now to the current trace.
+
+    This is useful for clients that only report the duration of an operation
+    after it completed (ex: pymongo command listeners). This is a no-op if no
+    trace is being recorded.
+
+    :param name: the name of the span
+    :param category: the category of the span
+    :param duration_ns: the duration of the span, in nanoseconds
+    :param args: additional data to attach to the span, optional
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(
+            name, category, time.perf_counter_ns() - duration_ns, duration_ns, args
+        )
+
+
+def is_profiling_target(name: str) -> bool:
+    """Return True if the job or endpoint `name` is selected for CPU
+    profiling.
+
+    Job names can be provided either as fully qualified names
+    (`robotoff.workers.tasks.import_image.run_import_image_job`) or as
+    function names (`run_import_image_job`).
+    """
+    targets = settings.PROFILING_TARGETS
+    return bool(targets) and (name in targets or name.rsplit(".", 1)[-1] in targets)
+
+
+class TraceRecorder:
+    """Record the trace and optionally the CPU profile of a job or an API
+    request.
+
+    Use `record_trace` when the recorded code can be wrapped in a `with`
+    block, and `TraceRecorder.start`/`TraceRecorder.stop` otherwise (ex: in
+    Falcon middlewares).
+    """
+
+    def __init__(self, name: str, category: str, profile: bool = False):
+        self.trace = Trace(name, category)
+        self.profiler = cProfile.Profile() if profile else None
+        self._token: contextvars.Token | None = None
+
+    @classmethod
+    def create(cls, name: str, category: str) -> "TraceRecorder | None":
+        """Create a recorder for a job or a request, or return None if
+        neither tracing nor profiling is enabled for it.
+
+        :param name: the job or endpoint name
+        :param category: either `job` or `request`
+        """
+        profile = (
+            is_profiling_target(name)
+            and random.random() < settings.PROFILING_SAMPLE_RATE
+        )
+        if not settings.ENABLE_TRACING and not profile:
+            return None
+        return cls(name, category, profile=profile)
+
+    def start(self) -> None:
+        self._token = _current_trace.set(self.trace)
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def stop(self, error: str | None = None) -> None:
+        """Stop recording and save the trace (and profile) on disk.
+
+        :param error: the error that interrupted the job or the request, if
+            any
+        """
+        end_ns = time.perf_counter_ns()
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self._token is not None:
+            _current_trace.reset(self._token)
+            self._token = None
+
+        args = {"error": error} if error else None
+        self.trace.add_span(
+            self.trace.name,
+            self.trace.category,
+            self.trace.start_ns,
+            end_ns - self.trace.start_ns,
+            args,
+        )
+        try:
+            self.save(settings.TRACING_DIR)
+        except Exception:
+            # Tracing must never make a job or a request fail
+            logger.exception("Error while saving trace %s", self.trace.name)
+
+    def save(self, output_dir: Path) -> Path:
+        """Save the trace (`.trace.json`) and the profile (`.prof`) if any in
+        `output_dir`.
+
+        :return: the path of the trace file
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.trace.name).strip("_")
+        stem = "{}-{}-{}-{}".format(
+            self.trace.started_at.strftime("%Y%m%dT%H%M%S"),
+            safe_name,
+            os.getpid(),
+            next(_trace_counter),
+        )
+        trace_path = output_dir / f"{stem}.trace.json"
+        trace_path.write_bytes(orjson.dumps(self.trace.to_json()))
+        if self.profiler is not None:
+            self.profiler.dump_stats(output_dir / f"{stem}.prof")
+        return trace_path
+
+
+@contextlib.contextmanager
+def record_trace(name: str, category: str) -> Iterator[Trace | None]:
+    """Record the trace of the code run inside the `with` block.
+
+    If neither tracing nor profiling is enabled for `name`, nothing is
+    recorded and None is yielded.
+
+    :param name: the job or endpoint name
+    :param category: either `job` or `request`
+    """
+    recorder = TraceRecorder.create(name, category)
+    if recorder is None:
+        yield None
+        return
+
+    recorder.start()
+    error = None
+    try:
+        yield recorder.trace
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        recorder.stop(error=error)
+
+
+class TracedSession(requests.Session):
+    """A requests Session that records a span for every HTTP request."""
+
+    def request(self, method, url, *args, **kwargs):
+        parsed_url = urlparse(url)
+        with span(
+            f"{method.upper()} {parsed_url.netloc}",
+            "http",
+            # don't keep query parameters, they may contain credentials
+            url=parsed_url._replace(query="").geturl(),
+        ) as args_:
+            r = super().request(method, url, *args, **kwargs)
+            args_["status_code"] = r.status_code
+            return r
@@ -1,13 +1,13 @@
 import functools
 import math
 
-import pint
+from robotoff.utils.startup import lazy_import
 
 
 @functools.cache
 def get_unit_registry():
     # We initialize UnitRegistry here to prevent
-    return pint.UnitRegistry()
+    return lazy_import("pint").UnitRegistry()
 
 
 def normalize_weight(value: str, unit: str) -> tuple[float, str]:
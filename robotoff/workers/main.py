@@ -1,11 +1,22 @@
 import sys
+import time
 
+import redis
 from rq import Connection, Worker
+from rq.exceptions import DequeueTimeout
+from rq.worker import WorkerStatus
 
 from robotoff import settings
 from robotoff.models import with_db
-from robotoff.utils import get_logger
+from robotoff.utils import get_logger, startup
+from robotoff.utils.startup import record_load
+from robotoff.utils.tracing import record_trace
 from robotoff.workers.queues import redis_conn
+from robotoff.workers.scheduling import (
+    AdmissionController,
+    get_job_class,
+    set_current_job_class,
+)
 
 logger = get_logger()
 settings.init_sentry()
@@ -16,29 +27,134 @@ def load_resources(refresh: bool = False):
     """Load cacheable resources in memory.
 
     This way, all resources are available in memory before the worker forks.
+    If `settings.LAZY_RESOURCE_LOADING` is enabled, resources are only loaded
+    on first use, or at startup if they are listed in
+    `settings.WARMUP_MANIFEST`.
     """
     if refresh:
-        logger.info("Refreshing worker resource caches...")
-    else:
+        if not settings.LAZY_RESOURCE_LOADING:
+            logger.info("Refreshing worker resource caches...")
+            _load_resources()
+        return
+
+    if not settings.LAZY_RESOURCE_LOADING:
         logger.info("Loading resources in memory...")
+        with record_load("resources"):
+            _load_resources()
+        logger.info("Loading object detection model labels...")
+        from robotoff.prediction.object_detection import ObjectDetectionModelRegistry
+
+        with record_load("object detection models"):
+            ObjectDetectionModelRegistry.load_all()
+
+    startup.warm_up(settings.WARMUP_MANIFEST)
+    startup.log_startup_report("Worker startup report")
 
+
+def _load_resources():
     from robotoff import brands, logos, taxonomy
-    from robotoff.prediction.object_detection import ObjectDetectionModelRegistry
 
     taxonomy.load_resources()
     logos.load_resources()
     brands.load_resources()
 
-    if not refresh:
-        logger.info("Loading object detection model labels...")
-        ObjectDetectionModelRegistry.load_all()
-
 
 class CustomWorker(Worker):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.admission_controller = AdmissionController(self.connection)
+
     def run_maintenance_tasks(self):
         super().run_maintenance_tasks()
+        prefix = self.redis_worker_namespace_prefix
+        try:
+            self.admission_controller.prune(
+                key[len(prefix) :]
+                for key in Worker.all_keys(connection=self.connection)
+            )
+        except redis.exceptions.RedisError as e:
+            logger.warning("Could not prune running jobs", exc_info=e)
         load_resources(refresh=True)
 
+    def dequeue_job_and_maintain_ttl(self, timeout):
+        """Dequeue the first job that doesn't belong to a job class that
+        reached its share of workers (see `robotoff.workers.scheduling`).
+
+        If all queued jobs belong to limited classes, queues are checked
+        again every `settings.RQ_ADMISSION_POLL_INTERVAL` seconds. If all
+        queues are empty, we wait for the next job. If no job class is
+        limited, we use the default rq implementation.
+        """
+        if not self.admission_controller.is_throttled():
+            return super().dequeue_job_and_maintain_ttl(timeout)
+
+        self.set_state(WorkerStatus.IDLE)
+        self.procline("Listening on " + ",".join(self.queue_names()))
+        # In burst mode (timeout is None), we only try once
+        poll_timeout = (
+            None
+            if timeout is None
+            else max(1, int(min(timeout, settings.RQ_ADMISSION_POLL_INTERVAL)))
+        )
+        result = None
+        while True:
+            try:
+                self.heartbeat()
+                if self.should_run_maintenance_tasks:
+                    self.run_maintenance_tasks()
+
+                result = self.admission_controller.dequeue_admitted_job(
+                    self._ordered_queues
+                )
+                if result is None and not any(
+                    queue.count for queue in self._ordered_queues
+                ):
+                    result = self.queue_class.dequeue_any(
+                        self._ordered_queues,
+                        poll_timeout,
+                        connection=self.connection,
+                        job_class=self.job_class,
+                        serializer=self.serializer,
+                    )
+                elif result is None and poll_timeout is not None:
+                    time.sleep(poll_timeout)
+            except DequeueTimeout:
+                pass
+            except redis.exceptions.ConnectionError as e:
+                logger.error("Could not connect to Redis instance: %s", e)
+                time.sleep(settings.RQ_ADMISSION_POLL_INTERVAL)
+
+            if result is not None:
+                job, queue = result
+                job.redis_server_version = self.get_redis_server_version()
+                logger.info("%s: %s", queue.name, job.id)
+                break
+            if poll_timeout is None:
+                break
+
+        self.heartbeat()
+        return result
+
+    def execute_job(self, job, queue):
+        # Run in the main worker process (and not in the work horse), so
+        # that running jobs are tracked even if the work horse is killed
+        job_class = get_job_class(job, queue.name)
+        self.admission_controller.start_job(self.name, job, job_class)
+        try:
+            return super().execute_job(job, queue)
+        finally:
+            self.admission_controller.finish_job(self.name)
+
+    def perform_job(self, job, queue):
+        # Jobs enqueued by this job inherit its job class
+        set_current_job_class(get_job_class(job, queue.name))
+        try:
+            # Opt-in tracing/profiling of jobs, see robotoff.utils.tracing
+            with record_trace(job.func_name, "job"):
+                return super().perform_job(job, queue)
+        finally:
+            set_current_job_class(None)
+
 
 def run(queues: list[str], burst: bool = False):
     load_resources()
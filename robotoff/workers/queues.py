@@ -1,17 +1,21 @@
+import dataclasses
+import functools
 import hashlib
 import logging
 import random
 import struct
 import threading
 import time
-from typing import Callable
+from typing import Callable, Iterable
 
+from more_itertools import chunked
 from rq import Queue
 from rq.job import Job
 
 from robotoff import settings
 from robotoff.redis import redis_conn
 from robotoff.types import ProductIdentifier
+from robotoff.workers.scheduling import JobClass, get_job_meta
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +45,13 @@ def get_high_queue(product_id: ProductIdentifier | None = None) -> Queue:
     if product_id is None:
         return random.choice(high_queues)
 
+    queue_idx = _get_high_queue_index(product_id.barcode)
+    logger.debug("Selecting queue idx %s for product %s", queue_idx, product_id)
+    return high_queues[queue_idx]
+
+
+@functools.lru_cache(maxsize=65_536)
+def _get_high_queue_index(barcode: str) -> int:
     # We compute a md5 hash of the barcode and convert the 4 last bytes to an
     # int (long)
     # This way, we make sure the distribution of `barcode_hash` is
@@ -48,13 +59,9 @@ def get_high_queue(product_id: ProductIdentifier | None = None) -> Queue:
     # barcode_hash % len(high_queues)`
     barcode_hash: int = struct.unpack(
         "<l",
-        hashlib.md5(product_id.barcode.encode("utf-8"), usedforsecurity=False).digest()[
-            -4:
-        ],
+        hashlib.md5(barcode.encode("utf-8"), usedforsecurity=False).digest()[-4:],
     )[0]
-    queue_idx = barcode_hash % len(high_queues)
-    logger.debug("Selecting queue idx %s for product %s", queue_idx, product_id)
-    return high_queues[queue_idx]
+    return barcode_hash % len(high_queues)
 
 
 def get_low_queue() -> Queue:
@@ -67,6 +74,7 @@ def enqueue_in_job(
     queue: Queue,
     job_delay: float,
     job_kwargs: dict | None = None,
+    job_class: JobClass | None = None,
     **kwargs,
 ):
     """Enqueue a job in `job_delay` seconds.
@@ -79,7 +87,7 @@ def enqueue_in_job(
     """
     threading.Thread(
         target=_enqueue_in_job,
-        args=(func, queue, job_delay, job_kwargs, kwargs),
+        args=(func, queue, job_delay, job_kwargs, job_class, kwargs),
     ).start()
 
 
@@ -88,13 +96,20 @@ def _enqueue_in_job(
     queue: Queue,
     job_delay: float,
     job_kwargs: dict | None,
+    job_class: JobClass | None,
     kwargs,
 ):
     time.sleep(job_delay)
-    enqueue_job(func, queue, job_kwargs, **kwargs)
+    enqueue_job(func, queue, job_kwargs, job_class=job_class, **kwargs)
 
 
-def enqueue_job(func: Callable, queue: Queue, job_kwargs: dict | None = None, **kwargs):
+def enqueue_job(
+    func: Callable,
+    queue: Queue,
+    job_kwargs: dict | None = None,
+    job_class: JobClass | None = None,
+    **kwargs,
+):
     """Create a new job from the function and kwargs and enqueue it in the
     queue.
 
@@ -104,7 +119,138 @@ def enqueue_job(func: Callable, queue: Queue, job_kwargs: dict | None = None, **
     :param func: the function to use
     :param queue: the queue to use
     :param job_kwargs: optional kwargs parameters to provide to `Job.create`
+    :param job_class: the class of the job, used for admission control (see
+        `robotoff.workers.scheduling`). If not provided, the class of the
+        current job is used, or a default class based on the queue.
     """
-    job_kwargs = job_kwargs or {}
-    job = Job.create(func=func, kwargs=kwargs, connection=redis_conn, **job_kwargs)
+    job = _create_job(func, kwargs, job_kwargs, job_class)
     return queue.enqueue_job(job=job)
+
+
+def _create_job(
+    func: Callable,
+    kwargs: dict,
+    job_kwargs: dict | None,
+    job_class: JobClass | None,
+) -> Job:
+    job_kwargs = job_kwargs or {}
+    if meta := get_job_meta(job_class):
+        job_kwargs = {**job_kwargs, "meta": {**job_kwargs.get("meta", {}), **meta}}
+    return Job.create(func=func, kwargs=kwargs, connection=redis_conn, **job_kwargs)
+
+
+@dataclasses.dataclass
+class JobSpec:
+    """Specification of a job to enqueue with `enqueue_jobs`."""
+
+    #: the function to call
+    func: Callable
+    #: the keyword parameters to provide to the function
+    kwargs: dict = dataclasses.field(default_factory=dict)
+    #: the queue to use, if None the high-priority queue of `product_id` is
+    #: used (see `get_high_queue`)
+    queue: Queue | None = None
+    #: the product the job is about, used to select the queue
+    product_id: ProductIdentifier | None = None
+    #: optional kwargs parameters to provide to `Job.create`
+    job_kwargs: dict | None = None
+    #: the class of the job, defaults to the `job_class` provided to
+    #: `enqueue_jobs`
+    job_class: JobClass | None = None
+
+    def get_queue(self) -> Queue:
+        return self.queue if self.queue is not None else get_high_queue(self.product_id)
+
+
+def enqueue_jobs(
+    job_specs: Iterable[JobSpec],
+    batch_size: int = 500,
+    max_rate: float | None = None,
+    on_progress: Callable[[int], None] | None = None,
+    job_class: JobClass | None = None,
+    max_queue_depth: int | None = None,
+) -> int:
+    """Create and enqueue jobs in bulk.
+
+    Jobs are registered in Redis by batches of `batch_size`, using a single
+    pipeline (and thus a single round trip) per batch, whatever the queues
+    the jobs are sent to. It's meant to be used when launching a large number
+    of jobs (full database reprocessing,...), `job_specs` can be a lazy
+    iterable.
+
+    :param job_specs: the specifications of the jobs to enqueue
+    :param batch_size: number of jobs registered in each Redis pipeline
+    :param max_rate: maximum number of jobs enqueued per second, optional.
+        It can be used to avoid overloading Redis and the workers.
+    :param on_progress: function called after each batch with the number of
+        jobs enqueued in the batch, it can be used to report progress
+    :param job_class: the class of the jobs without explicit class (see
+        `enqueue_job`)
+    :param max_queue_depth: if provided, wait before each batch until the
+        number of jobs in all target queues is below this value, so that
+        bulk producers don't flood the queues (backpressure)
+    :return: the number of enqueued jobs
+    """
+    start_time = time.monotonic()
+    count = 0
+    for batch in chunked(job_specs, batch_size):
+        queues = [job_spec.get_queue() for job_spec in batch]
+        if max_queue_depth is not None:
+            wait_for_queue_depth(queues, max_queue_depth)
+
+        # Jobs are independent, we don't need a transaction
+        with redis_conn.pipeline(transaction=False) as pipeline:
+            for job_spec, queue in zip(batch, queues):
+                job = _create_job(
+                    job_spec.func,
+                    job_spec.kwargs,
+                    job_spec.job_kwargs,
+                    job_spec.job_class or job_class,
+                )
+                queue.enqueue_job(job=job, pipeline=pipeline)
+            pipeline.execute()
+
+        count += len(batch)
+        if on_progress is not None:
+            on_progress(len(batch))
+
+        if max_rate is not None:
+            delay = count / max_rate - (time.monotonic() - start_time)
+            if delay > 0:
+                time.sleep(delay)
+
+    # Only log bulk enqueues at INFO level, this function is also called for
+    # every uploaded image
+    logger.log(
+        logging.INFO if count >= batch_size else logging.DEBUG,
+        "%d jobs enqueued in %.2fs",
+        count,
+        time.monotonic() - start_time,
+    )
+    return count
+
+
+def wait_for_queue_depth(
+    queues: Iterable[Queue], max_queue_depth: int, poll_interval: float | None = None
+) -> None:
+    """Wait until the number of jobs in each queue is below
+    `max_queue_depth`.
+
+    :param queues: the queues to check
+    :param max_queue_depth: the maximum number of jobs in each queue
+    :param poll_interval: number of seconds to wait between two checks,
+        defaults to `settings.RQ_ADMISSION_POLL_INTERVAL`
+    """
+    if poll_interval is None:
+        poll_interval = settings.RQ_ADMISSION_POLL_INTERVAL
+    queues_by_name = {queue.name: queue for queue in queues}
+    while True:
+        full_queues = [
+            name
+            for name, queue in queues_by_name.items()
+            if queue.count >= max_queue_depth
+        ]
+        if not full_queues:
+            return
+        logger.debug("Waiting for queues to be processed: %s", full_queues)
+        time.sleep(poll_interval)
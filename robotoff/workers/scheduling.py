@@ -0,0 +1,289 @@
+"""Admission control and fair scheduling of rq jobs.
+
+Every job belongs to a job class (see `JobClass`), saved in the job
+metadata when the job is enqueued. Jobs enqueued from a running job
+inherit the class of the parent job, so that all the jobs triggered by an
+image upload belong to the `upload` class, and all jobs triggered by a
+backfill belong to the `backfill` class, whatever the queue they are sent
+to.
+
+Workers still pick up jobs from the existing rq queues, but they dequeue
+the first job whose class is admitted: if the number of workers already
+running jobs of a class has reached the share allocated to the class (see
+`settings.RQ_JOB_CLASS_SHARES`), jobs of this class are left in queue until
+a worker becomes available, and the jobs queued behind them can be
+dequeued. This way, bulk jobs can never use all workers, and real-time jobs
+are always processed quickly, even when they're sent to the same queue as
+bulk jobs. This is a soft limit: when all queues are empty, workers wait
+for the next job and process it whatever its class.
+
+The time spent by jobs in queue (lag) is recorded for each class in Redis,
+and exported to InfluxDB by the scheduler (see
+`robotoff.metrics.save_job_metrics`).
+"""
+
+import datetime
+import enum
+import logging
+import math
+from collections import Counter
+from typing import Iterable
+
+from redis import Redis
+from redis.exceptions import RedisError
+from rq import Queue
+from rq.job import Job
+from rq.utils import utcnow
+
+from robotoff import settings
+
+logger = logging.getLogger(__name__)
+
+#: key of the job class in the job metadata
+JOB_CLASS_META_KEY = "job_class"
+#: Redis hash storing the class of the job currently run by each worker
+RUNNING_JOBS_KEY = "robotoff:running-jobs"
+#: Redis hash storing the last lag of each job class
+JOB_LAG_KEY = "robotoff:job-lag"
+
+
+class JobClass(str, enum.Enum):
+    #: jobs triggered by a user action through the API
+    interactive = "interactive"
+    #: jobs triggered by an image upload
+    upload = "upload"
+    #: jobs triggered by a product update
+    update = "update"
+    #: bulk jobs (full reprocessing, backfills, dataset imports,...)
+    backfill = "backfill"
+
+
+# Class of the job currently being performed in this process, set by the
+# worker, see `current_job_class`
+_current_job_class: JobClass | None = None
+
+
+def parse_job_class_shares(value: str) -> dict[JobClass, float]:
+    """Parse job class shares, formatted as a comma-separated list of
+    `class=share` items (ex: "interactive=1,backfill=0.5").
+
+    :param value: the string to parse
+    :return: a dict mapping each job class to its share
+    """
+    shares = {}
+    for item in value.split(","):
+        if not (item := item.strip()):
+            continue
+        name, sep, share = item.partition("=")
+        if not sep:
+            raise ValueError(f"invalid job class share: {item!r}")
+        try:
+            job_class = JobClass(name.strip())
+        except ValueError:
+            raise ValueError(f"unknown job class: {name.strip()!r}")
+        shares[job_class] = float(share)
+    return shares
+
+
+def get_default_job_class(queue_name: str) -> JobClass:
+    """Return the class of jobs without explicit class, based on the queue
+    they were sent to."""
+    if queue_name.startswith("robotoff-high-"):
+        return JobClass.update
+    return JobClass.backfill
+
+
+def get_job_class(job: Job, queue_name: str | None = None) -> JobClass:
+    """Return the class of a job.
+
+    :param job: the rq job
+    :param queue_name: the name of the queue the job is in, defaults to
+        the job origin
+    :return: the job class
+    """
+    if (value := job.meta.get(JOB_CLASS_META_KEY)) is not None:
+        try:
+            return JobClass(value)
+        except ValueError:
+            logger.warning("Unknown job class for job %s: %s", job.id, value)
+    return get_default_job_class(queue_name or job.origin)
+
+
+def get_current_job_class() -> JobClass | None:
+    """Return the class of the job currently being performed in this
+    process, or None if we're not in a job."""
+    return _current_job_class
+
+
+def set_current_job_class(job_class: JobClass | None) -> None:
+    global _current_job_class
+    _current_job_class = job_class
+
+
+def get_job_meta(job_class: JobClass | None) -> dict:
+    """Return the metadata to save in a job of class `job_class`.
+
+    If `job_class` is None, the class of the current job is used (if
+    any).
+    """
+    if job_class is None:
+        job_class = get_current_job_class()
+    return {} if job_class is None else {JOB_CLASS_META_KEY: job_class.value}
+
+
+class AdmissionController:
+    """Limit the number of workers running jobs of each class at the same
+    time.
+
+    :param connection: the Redis connection
+    :param shares: the maximum share of the workers allocated to each job
+        class, defaults to `settings.RQ_JOB_CLASS_SHARES`. Classes that are
+        not provided are not limited.
+    :param num_workers: the total number of workers, defaults to
+        `settings.NUM_RQ_WORKERS`
+    :param lookahead: the number of jobs of each queue considered when
+        dequeuing, defaults to `settings.RQ_ADMISSION_LOOKAHEAD`
+    """
+
+    def __init__(
+        self,
+        connection: Redis,
+        shares: dict[JobClass, float] | None = None,
+        num_workers: int | None = None,
+        lookahead: int | None = None,
+    ):
+        self.connection = connection
+        self.shares = (
+            parse_job_class_shares(settings.RQ_JOB_CLASS_SHARES)
+            if shares is None
+            else shares
+        )
+        self.num_workers = (
+            settings.NUM_RQ_WORKERS if num_workers is None else num_workers
+        )
+        self.lookahead = (
+            settings.RQ_ADMISSION_LOOKAHEAD if lookahead is None else lookahead
+        )
+
+    def get_capacity(self, job_class: JobClass) -> int | None:
+        """Return the maximum number of jobs of class `job_class` that can
+        run at the same time, or None if the class is not limited.
+
+        A class with a non-zero share can always use at least one worker.
+        """
+        share = self.shares.get(job_class, 1.0)
+        if share >= 1.0:
+            return None
+        return max(1, math.floor(share * self.num_workers))
+
+    def is_throttled(self) -> bool:
+        """Return True if at least one job class is limited."""
+        return any(self.get_capacity(job_class) is not None for job_class in JobClass)
+
+    def get_running_counts(self) -> Counter[JobClass]:
+        """Return the number of running jobs for each job class."""
+        counts: Counter[JobClass] = Counter()
+        for value in self.connection.hvals(RUNNING_JOBS_KEY):
+            try:
+                counts[JobClass(value.decode("utf-8"))] += 1
+            except ValueError:
+                continue
+        return counts
+
+    def dequeue_admitted_job(self, queues: list[Queue]) -> tuple[Job, Queue] | None:
+        """Dequeue the first job whose class has not reached its capacity.
+
+        Queues are checked in order. Unlike rq, which only pops the job at
+        the head of the queues, a job queued behind jobs of a limited class
+        can be dequeued: jobs of a limited class (ex: jobs enqueued by a
+        backfill job in a high priority queue) are left in queue, but don't
+        block the jobs behind them. Only the first `lookahead` jobs of each
+        queue are considered.
+
+        If the running jobs can't be fetched from Redis, all jobs are
+        admitted.
+
+        :param queues: the queues to dequeue from, by order of priority
+        :return: the (job, queue) pair, or None if no job can be dequeued
+        """
+        try:
+            running = self.get_running_counts()
+        except RedisError as e:
+            logger.warning("Error during admission control", exc_info=e)
+            running = Counter()
+
+        for queue in queues:
+            job_ids = queue.get_job_ids(0, self.lookahead)
+            if not job_ids:
+                continue
+            jobs = queue.job_class.fetch_many(
+                job_ids, connection=self.connection, serializer=queue.serializer
+            )
+            for job in jobs:
+                # the job was deleted
+                if job is None:
+                    continue
+                job_class = get_job_class(job, queue.name)
+                capacity = self.get_capacity(job_class)
+                # The job may have been dequeued by another worker in the
+                # meantime, LREM is atomic
+                if (
+                    capacity is None or running[job_class] < capacity
+                ) and self.connection.lrem(queue.key, 1, job.id):
+                    return job, queue
+        return None
+
+    def start_job(self, worker_name: str, job: Job, job_class: JobClass) -> None:
+        """Record that a worker started running a job, with the time the
+        job spent in queue."""
+        lag = None
+        if job.enqueued_at is not None:
+            lag = (utcnow() - job.enqueued_at).total_seconds()
+            logger.info("Job %s (%s) lag: %.1fs", job.id, job_class.value, lag)
+        try:
+            with self.connection.pipeline(transaction=False) as pipeline:
+                pipeline.hset(RUNNING_JOBS_KEY, worker_name, job_class.value)
+                if lag is not None:
+                    pipeline.hset(JOB_LAG_KEY, job_class.value, lag)
+                    pipeline.hset(
+                        JOB_LAG_KEY,
+                        f"{job_class.value}:updated_at",
+                        datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    )
+                pipeline.execute()
+        except RedisError as e:
+            logger.warning("Could not record job start", exc_info=e)
+
+    def finish_job(self, worker_name: str) -> None:
+        """Record that a worker finished running a job."""
+        try:
+            self.connection.hdel(RUNNING_JOBS_KEY, worker_name)
+        except RedisError as e:
+            logger.warning("Could not record job end", exc_info=e)
+
+    def prune(self, worker_names: Iterable[str]) -> None:
+        """Remove running jobs of workers that are not alive anymore (ex:
+        after a crash).
+
+        :param worker_names: names of the workers that are alive
+        """
+        alive = set(worker_names)
+        if stale := [
+            name.decode("utf-8")
+            for name in self.connection.hkeys(RUNNING_JOBS_KEY)
+            if name.decode("utf-8") not in alive
+        ]:
+            logger.info("Removing running jobs of dead workers: %s", stale)
+            self.connection.hdel(RUNNING_JOBS_KEY, *stale)
+
+    def get_lags(self) -> dict[JobClass, float]:
+        """Return the last lag (time spent in queue, in seconds) of each job
+        class."""
+        lags = {}
+        for key, value in self.connection.hgetall(JOB_LAG_KEY).items():
+            try:
+                lags[JobClass(key.decode("utf-8"))] = float(value)
+            except ValueError:
+                # `updated_at` fields
+                continue
+        return lags
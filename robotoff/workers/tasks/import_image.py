@@ -1,20 +1,27 @@
 import copy
 import dataclasses
 import datetime
+import itertools
 import logging
 import typing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Callable, Iterator
 
 import elasticsearch
 import numpy as np
+import orjson
 from elasticsearch.helpers import BulkIndexError
+from more_itertools import chunked
 from openfoodfacts import OCRResult
+from openfoodfacts.ocr import OCRParsingException
 from openfoodfacts.taxonomy import Taxonomy
 from openfoodfacts.types import TaxonomyType
 from PIL import Image
 
 from robotoff import settings
 from robotoff.elasticsearch import get_es_client
+from robotoff.embeddings import save_embedding_batch
 from robotoff.images import add_image_fingerprint, save_image
 from robotoff.insights.extraction import (
     DEFAULT_OCR_PREDICTION_TYPES,
@@ -45,6 +52,7 @@ from robotoff.off import (
     parse_ingredients,
 )
 from robotoff.prediction import ingredient_list, nutrition_extraction
+from robotoff.prediction.ocr.core import ocr_content_iter
 from robotoff.prediction.upc_image import UPCImageType, find_image_is_upc
 from robotoff.products import get_product_store
 from robotoff.taxonomy import get_taxonomy
@@ -62,12 +70,19 @@ from robotoff.types import (
     ProductIdentifier,
     ServerType,
 )
-from robotoff.utils import get_image_from_url, http_session
+from robotoff.utils import get_image_from_url, http_session, jsonl_iter
 from robotoff.utils.image import (
     convert_bounding_box_absolute_to_relative,
     convert_image_to_array,
 )
-from robotoff.workers.queues import enqueue_job, get_high_queue, low_queue
+from robotoff.workers.queues import (
+    JobSpec,
+    enqueue_job,
+    enqueue_jobs,
+    get_high_queue,
+    low_queue,
+)
+from robotoff.workers.scheduling import JobClass
 from robotoff.workers.tasks.common import add_category_insight_job
 
 logger = logging.getLogger(__name__)
@@ -79,6 +94,8 @@ def rerun_import_all_images(
     server_type: ServerType | None = None,
     return_count: bool = False,
     flags: list[ImportImageFlag] | None = None,
+    max_rate: float | None = None,
+    on_progress: Callable[[int], None] | None = None,
 ) -> None | int:
     """Rerun full image import on all images in DB.
 
@@ -91,6 +108,10 @@ def rerun_import_all_images(
     :param return_count: if True, return the number of images to process, without
         processing them, defaults to False
     :param flags: the list of flags to rerun, defaults to None (all)
+    :param max_rate: maximum number of jobs enqueued per second, defaults to
+        None (no limit)
+    :param on_progress: function called with the number of enqueued jobs
+        after each batch of jobs is enqueued, optional
     :return: the number of images to process, or None if return_count is False
     """
     where_clauses = [ImageModel.deleted == False]  # noqa: E712
@@ -114,23 +135,117 @@ def rerun_import_all_images(
     if return_count:
         return query.count()
 
-    for image_model_id, barcode, image_id, server_type_str in query:
-        if not isinstance(barcode, str) and not barcode.isdigit():
-            raise ValueError("Invalid barcode: %s" % barcode)
+    def iter_job_specs() -> Iterator[JobSpec]:
+        for image_model_id, barcode, image_id, server_type_str in query.iterator():
+            if not isinstance(barcode, str) and not barcode.isdigit():
+                raise ValueError("Invalid barcode: %s" % barcode)
 
-        product_id = ProductIdentifier(barcode, ServerType[server_type_str])
-        image_url = generate_image_url(product_id, image_id)
-        ocr_url = generate_json_ocr_url(product_id, image_id)
-        run_import_image(
-            product_id=product_id,
-            image_model_id=image_model_id,
-            image_url=image_url,
-            ocr_url=ocr_url,
-            flags=flags,
-            # Use the low queue for rerun, as it's not as important as the
-            # real-time updates from Redis
-            use_high_queue=False,
+            product_id = ProductIdentifier(barcode, ServerType[server_type_str])
+            yield from generate_import_image_job_specs(
+                product_id=product_id,
+                image_model_id=image_model_id,
+                image_url=generate_image_url(product_id, image_id),
+                ocr_url=generate_json_ocr_url(product_id, image_id),
+                flags=flags,
+                # Use the low queue for rerun, as it's not as important as the
+                # real-time updates from Redis
+                use_high_queue=False,
+            )
+
+    # Jobs are registered in Redis by batches, with a single round trip per
+    # batch. We wait for the queues to be processed when they're too long, so
+    # that real-time jobs sent to the same queues are not delayed too much.
+    enqueue_jobs(
+        iter_job_specs(),
+        max_rate=max_rate,
+        on_progress=on_progress,
+        job_class=JobClass.backfill,
+        max_queue_depth=settings.RQ_BACKFILL_MAX_QUEUE_DEPTH,
+    )
+    return None
+
+
+@with_db
+def rerun_nutrition_extraction(
+    limit: int | None = None,
+    server_type: ServerType | None = None,
+    return_count: bool = False,
+    batch_size: int = 32,
+    max_rate: float | None = None,
+    on_progress: Callable[[int], None] | None = None,
+) -> None | int:
+    """Run nutrition extraction on all images in DB that were not processed by
+    the nutrition extraction model yet.
+
+    Images are sent by batches of `batch_size` images to
+    `extract_nutrition_batch_job` jobs, so that they can be sent to the model
+    in batches.
+
+    :param limit: the maximum number of images to process, defaults to None (all)
+    :param server_type: the server type (project) of the products, defaults to None
+        (all food server types)
+    :param return_count: if True, return the number of images to process, without
+        processing them, defaults to False
+    :param batch_size: number of images processed in each job
+    :param max_rate: maximum number of jobs enqueued per second, defaults to
+        None (no limit)
+    :param on_progress: function called with the number of enqueued jobs
+        after each batch of jobs is enqueued, optional
+    :return: the number of images to process, or None if return_count is False
+    """
+    server_types = (
+        [server_type]
+        if server_type is not None
+        else [server_type for server_type in ServerType if server_type.is_food()]
+    )
+    query = (
+        ImageModel.select(
+            ImageModel.barcode, ImageModel.image_id, ImageModel.server_type
+        )
+        .where(
+            ImageModel.deleted == False,  # noqa: E712
+            ImageModel.server_type.in_(
+                [server_type.name for server_type in server_types]
+            ),
+            ImageModel.id.not_in(
+                ImagePrediction.select(ImagePrediction.image).where(
+                    ImagePrediction.model_name == nutrition_extraction.MODEL_NAME
+                )
+            ),
         )
+        .order_by(ImageModel.uploaded_at.desc())
+        .tuples()
+    )
+    if limit:
+        query = query.limit(limit)
+
+    if return_count:
+        return query.count()
+
+    def iter_items() -> Iterator[tuple[ProductIdentifier, str, str]]:
+        for barcode, image_id, server_type_str in query.iterator():
+            product_id = ProductIdentifier(barcode, ServerType[server_type_str])
+            yield (
+                product_id,
+                generate_image_url(product_id, image_id),
+                generate_json_ocr_url(product_id, image_id),
+            )
+
+    enqueue_jobs(
+        (
+            JobSpec(
+                extract_nutrition_batch_job,
+                queue=low_queue,
+                job_kwargs={"result_ttl": 0, "timeout": "30m"},
+                kwargs={"items": batch},
+            )
+            for batch in chunked(iter_items(), batch_size)
+        ),
+        max_rate=max_rate,
+        on_progress=on_progress,
+        job_class=JobClass.backfill,
+        max_queue_depth=settings.RQ_BACKFILL_MAX_QUEUE_DEPTH,
+    )
     return None
 
 
@@ -228,55 +343,94 @@ def run_import_image(
     param use_high_queue: if True, use the high priority queue for most important
         tasks. If False, always use the low priority queue. Defaults to True.
     """
+    enqueue_jobs(
+        generate_import_image_job_specs(
+            product_id=product_id,
+            image_model_id=image_model_id,
+            image_url=image_url,
+            ocr_url=ocr_url,
+            flags=flags,
+            use_high_queue=use_high_queue,
+        )
+    )
+
+
+def generate_import_image_job_specs(
+    product_id: ProductIdentifier,
+    image_model_id: int,
+    image_url: str,
+    ocr_url: str,
+    flags: list[ImportImageFlag] | None = None,
+    use_high_queue: bool = True,
+) -> list[JobSpec]:
+    """Return the specifications of the jobs to launch to perform all
+    extraction tasks on an image.
+
+    See `run_import_image` for a description of the parameters.
+
+    :return: the job specifications, to be enqueued with `enqueue_jobs`
+    """
     if flags is None:
         flags = [flag for flag in ImportImageFlag]
 
     high_queue = get_high_queue(product_id) if use_high_queue else low_queue
+    job_specs = []
 
     if ImportImageFlag.add_image_fingerprint in flags:
         # Compute image fingerprint, this job is low priority
-        enqueue_job(
-            add_image_fingerprint_job,
-            low_queue,
-            job_kwargs={"result_ttl": 0},
-            image_model_id=image_model_id,
+        job_specs.append(
+            JobSpec(
+                add_image_fingerprint_job,
+                queue=low_queue,
+                job_kwargs={"result_ttl": 0},
+                kwargs={"image_model_id": image_model_id},
+            )
         )
 
     if product_id.server_type.is_food():
         if ImportImageFlag.import_insights_from_image in flags:
             # Currently we don't support insight generation for projects other
             # than OFF (OBF, OPF,...)
-            enqueue_job(
-                import_insights_from_image,
-                high_queue,
-                job_kwargs={"result_ttl": 0},
-                product_id=product_id,
-                image_url=image_url,
-                ocr_url=ocr_url,
+            job_specs.append(
+                JobSpec(
+                    import_insights_from_image,
+                    queue=high_queue,
+                    job_kwargs={"result_ttl": 0},
+                    kwargs={
+                        "product_id": product_id,
+                        "image_url": image_url,
+                        "ocr_url": ocr_url,
+                    },
+                )
             )
 
         if ImportImageFlag.extract_ingredients in flags:
             # Only extract ingredient lists for food products, as the model was not
             # trained on non-food products
-            enqueue_job(
-                extract_ingredients_job,
-                high_queue,
-                # We add a higher timeout, as we request Product Opener to
-                # parse ingredient list, which may take a while depending on
-                # the number of ingredient list (~1s per ingredient list)
-                job_kwargs={"result_ttl": 0, "timeout": "2m"},
-                product_id=product_id,
-                ocr_url=ocr_url,
+            job_specs.append(
+                JobSpec(
+                    extract_ingredients_job,
+                    queue=high_queue,
+                    # We add a higher timeout, as we request Product Opener to
+                    # parse ingredient list, which may take a while depending on
+                    # the number of ingredient list (~1s per ingredient list)
+                    job_kwargs={"result_ttl": 0, "timeout": "2m"},
+                    kwargs={"product_id": product_id, "ocr_url": ocr_url},
+                )
             )
 
         if ImportImageFlag.extract_nutrition in flags:
-            enqueue_job(
-                extract_nutrition_job,
-                high_queue,
-                job_kwargs={"result_ttl": 0, "timeout": "2m"},
-                product_id=product_id,
-                image_url=image_url,
-                ocr_url=ocr_url,
+            job_specs.append(
+                JobSpec(
+                    extract_nutrition_job,
+                    queue=high_queue,
+                    job_kwargs={"result_ttl": 0, "timeout": "2m"},
+                    kwargs={
+                        "product_id": product_id,
+                        "image_url": image_url,
+                        "ocr_url": ocr_url,
+                    },
+                )
             )
 
         if ImportImageFlag.predict_category in flags:
@@ -284,48 +438,57 @@ def run_import_image(
             # Contrary to a product update, we always run the category
             # prediction job when an image is uploaded, as we use the
             # last 10 images to predict the category
-            enqueue_job(
-                add_category_insight_job,
-                high_queue,
-                job_kwargs={"result_ttl": 0, "timeout": "2m"},
-                product_id=product_id,
+            job_specs.append(
+                JobSpec(
+                    add_category_insight_job,
+                    queue=high_queue,
+                    job_kwargs={"result_ttl": 0, "timeout": "2m"},
+                    kwargs={"product_id": product_id},
+                )
             )
 
     if ImportImageFlag.run_logo_object_detection in flags:
         # We make sure there are no concurrent insight processing by sending
         # the job to the same queue. The queue is selected based on the product
         # barcode. See `get_high_queue` documentation for more details.
-        enqueue_job(
-            run_logo_object_detection,
-            high_queue,
-            job_kwargs={"result_ttl": 0},
-            product_id=product_id,
-            image_url=image_url,
-            ocr_url=ocr_url,
+        job_specs.append(
+            JobSpec(
+                run_logo_object_detection,
+                queue=high_queue,
+                job_kwargs={"result_ttl": 0},
+                kwargs={
+                    "product_id": product_id,
+                    "image_url": image_url,
+                    "ocr_url": ocr_url,
+                },
+            )
         )
 
     if product_id.server_type.is_food():
         if ImportImageFlag.run_nutrition_table_object_detection in flags:
             # Run object detection model that detects nutrition tables
-            enqueue_job(
-                run_nutrition_table_object_detection,
-                high_queue,
-                job_kwargs={"result_ttl": 0},
-                product_id=product_id,
-                image_url=image_url,
+            job_specs.append(
+                JobSpec(
+                    run_nutrition_table_object_detection,
+                    queue=high_queue,
+                    job_kwargs={"result_ttl": 0},
+                    kwargs={"product_id": product_id, "image_url": image_url},
+                )
             )
 
     # Run UPC detection to detect if the image is dominated by a UPC (and thus
     # should not be a product selected image)
     # UPC detection is buggy since the upgrade to OpenCV 4.10
     # Unit tests are failing, we need to fix them before re-enabling this task
-    # enqueue_job(
-    #     run_upc_detection,
-    #     high_queue,
-    #     job_kwargs={"result_ttl": 0},
-    #     product_id=product_id,
-    #     image_url=image_url,
+    # job_specs.append(
+    #     JobSpec(
+    #         run_upc_detection,
+    #         queue=high_queue,
+    #         job_kwargs={"result_ttl": 0},
+    #         kwargs={"product_id": product_id, "image_url": image_url},
+    #     )
     # )
+    return job_specs
 
 
 def import_insights_from_image(
@@ -758,10 +921,13 @@ def save_logo_embeddings(
     embeddings = generate_clip_embedding(resized_cropped_images, triton_stub)
 
     with db.atomic():
-        for i in range(len(logos)):
-            logo_id = logos[i].id
-            logo_embedding = embeddings[i]
-            LogoEmbedding.create(logo_id=logo_id, embedding=logo_embedding.tobytes())
+        save_embedding_batch(
+            LogoEmbedding,
+            [
+                (logo.id, logo_embedding)
+                for logo, logo_embedding in zip(logos, embeddings)
+            ],
+        )
 
 
 @with_db
@@ -890,34 +1056,251 @@ def extract_ingredients_job(
             )
 
         if image_prediction.max_confidence is not None:
-            predictions = []
-            for entity in ingredient_prediction_data["entities"]:
-                if "ingredients_n" not in entity:
-                    logger.info("Parsing information not present in entity, skipping")
-                    continue
-                entity = copy.deepcopy(entity)
-                value_tag = entity["lang"]["lang"]
-                prediction = Prediction(
-                    barcode=product_id.barcode,
-                    type=PredictionType.ingredient_detection,
-                    # We save the language code in the value_tag field
-                    value_tag=value_tag,
-                    value=None,
-                    automatic_processing=False,
-                    predictor=ingredient_list.MODEL_NAME,
-                    predictor_version=ingredient_list.MODEL_VERSION,
-                    data=entity,
-                    # Use the % of recognized ingredients as the confidence score
-                    confidence=entity["fraction_known_ingredients"],
-                    server_type=product_id.server_type,
-                    source_image=source_image,
-                )
-                predictions.append(prediction)
-
+            predictions = generate_ingredient_predictions(
+                product_id, source_image, ingredient_prediction_data
+            )
             imported = import_insights(predictions, server_type=product_id.server_type)
             logger.info(imported)
 
 
+def generate_ingredient_predictions(
+    product_id: ProductIdentifier,
+    source_image: str,
+    ingredient_prediction_data: JSONType,
+) -> list[Prediction]:
+    """Generate the `ingredient_detection` predictions from the data of an
+    ingredient detection image prediction (one prediction per parsed
+    ingredient list).
+
+    :param product_id: the identifier of the product
+    :param source_image: the source image of the image prediction
+    :param ingredient_prediction_data: the data of the image prediction, see
+        `generate_ingredient_prediction_data`
+    :return: the generated predictions
+    """
+    predictions = []
+    for entity in ingredient_prediction_data["entities"]:
+        if "ingredients_n" not in entity:
+            logger.info("Parsing information not present in entity, skipping")
+            continue
+        entity = copy.deepcopy(entity)
+        value_tag = entity["lang"]["lang"]
+        prediction = Prediction(
+            barcode=product_id.barcode,
+            type=PredictionType.ingredient_detection,
+            # We save the language code in the value_tag field
+            value_tag=value_tag,
+            value=None,
+            automatic_processing=False,
+            predictor=ingredient_list.MODEL_NAME,
+            predictor_version=ingredient_list.MODEL_VERSION,
+            data=entity,
+            # Use the % of recognized ingredients as the confidence score
+            confidence=entity["fraction_known_ingredients"],
+            server_type=product_id.server_type,
+            source_image=source_image,
+        )
+        predictions.append(prediction)
+    return predictions
+
+
+@dataclasses.dataclass
+class IngredientDetectionBackfillResult:
+    #: number of images whose ingredient detection was saved
+    processed: int = 0
+    #: number of archive items skipped (image missing in DB or already
+    #: processed, invalid OCR)
+    skipped: int = 0
+    #: number of images whose ingredient lists could not be parsed
+    failed: int = 0
+    #: number of archive items read, the next run starts after them
+    offset: int = 0
+
+
+def backfill_ingredient_detection(
+    input_path: Path,
+    server_type: ServerType = ServerType.off,
+    batch_size: int = 256,
+    num_workers: int = 4,
+    checkpoint_path: Path | None = None,
+    limit: int | None = None,
+    triton_uri: str | None = None,
+    on_batch_saved: Callable[[IngredientDetectionBackfillResult], None] | None = None,
+) -> IngredientDetectionBackfillResult:
+    """Run ingredient detection on the OCR results of a local OCR archive
+    (JSONL file, optionally gzipped), and save the predictions in DB.
+
+    The archive is streamed by batches of `batch_size` OCR results. For each
+    batch, images that are missing in DB or that were already processed are
+    skipped, ingredient lists are detected on all remaining OCR results at
+    once (see `ingredient_list.predict_from_ocr_batch`), detected ingredient
+    lists are parsed by a pool of `num_workers` threads, and the image
+    predictions of the batch are saved with a single bulk insert.
+
+    If `checkpoint_path` is provided, the number of archive items read is
+    written in this file after each batch, and the backfill resumes after
+    these items if the file exists. The checkpoint file is deleted once the
+    whole archive is processed (it's kept if `limit` is provided).
+
+    :param input_path: path of the OCR archive
+    :param server_type: the server type (project) of the archive
+    :param batch_size: number of OCR results processed and saved together
+    :param num_workers: number of images whose ingredient lists are parsed
+        concurrently
+    :param checkpoint_path: path of the checkpoint file, optional
+    :param limit: maximum number of archive items to read, optional
+    :param triton_uri: URI of the Triton Inference Server, defaults to None. If
+        not provided, the default value from settings is used.
+    :param on_batch_saved: function called with the current result after
+        each saved batch, it can be used to report progress
+    :return: the backfill result
+    """
+    start = 0
+    if checkpoint_path is not None and checkpoint_path.exists():
+        checkpoint = orjson.loads(checkpoint_path.read_bytes())
+        if checkpoint["input_path"] != str(input_path):
+            raise ValueError(
+                f"checkpoint {checkpoint_path} was created for another archive: "
+                f"{checkpoint['input_path']}"
+            )
+        start = checkpoint["offset"]
+        logger.info("Resuming ingredient detection backfill after item %d", start)
+
+    result = IngredientDetectionBackfillResult(offset=start)
+    items = itertools.islice(
+        jsonl_iter(input_path), start, None if limit is None else start + limit
+    )
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for batch in chunked(items, batch_size):
+            _backfill_ingredient_detection_batch(
+                batch, server_type, executor, result, triton_uri
+            )
+            result.offset += len(batch)
+
+            if checkpoint_path is not None:
+                checkpoint_path.write_bytes(
+                    orjson.dumps(
+                        {"input_path": str(input_path), "offset": result.offset}
+                    )
+                )
+            if on_batch_saved is not None:
+                on_batch_saved(result)
+
+    if checkpoint_path is not None and limit is None:
+        # The whole archive was processed
+        checkpoint_path.unlink(missing_ok=True)
+    return result
+
+
+def _backfill_ingredient_detection_batch(
+    items: list[JSONType],
+    server_type: ServerType,
+    executor: ThreadPoolExecutor,
+    result: IngredientDetectionBackfillResult,
+    triton_uri: str | None = None,
+) -> None:
+    ocr_jsons = {
+        source_image: ocr_json
+        for source_image, ocr_json in ocr_content_iter(items)
+        if source_image is not None
+    }
+    image_models = {
+        image_model.source_image: image_model
+        for image_model in ImageModel.select().where(
+            ImageModel.server_type == server_type.name,
+            ImageModel.source_image.in_(list(ocr_jsons)),
+        )
+    }
+    processed_image_ids = set(
+        image_id
+        for (image_id,) in ImagePrediction.select(ImagePrediction.image)
+        .where(
+            ImagePrediction.image.in_(
+                [image_model.id for image_model in image_models.values()]
+            ),
+            ImagePrediction.model_name == ingredient_list.MODEL_NAME,
+        )
+        .tuples()
+    )
+
+    to_process = []
+    for source_image, ocr_json in ocr_jsons.items():
+        image_model = image_models.get(source_image)
+        if image_model is None or image_model.id in processed_image_ids:
+            continue
+        try:
+            ocr_result = OCRResult.from_json(ocr_json)
+        except OCRParsingException as e:
+            logger.info("Invalid OCR for image %s", source_image, exc_info=e)
+            continue
+        if ocr_result is not None:
+            to_process.append((image_model, ocr_result))
+
+    result.skipped += len(items) - len(to_process)
+    if not to_process:
+        return
+
+    outputs = ingredient_list.predict_from_ocr_batch(
+        [ocr_result for _, ocr_result in to_process], triton_uri=triton_uri
+    )
+    prediction_data_list = executor.map(
+        _generate_ingredient_prediction_data,
+        [image_model for image_model, _ in to_process],
+        outputs,
+    )
+    image_predictions = []
+    predictions = []
+    timestamp = datetime.datetime.now(datetime.timezone.utc)
+    for (image_model, _), output, data in zip(
+        to_process, outputs, prediction_data_list
+    ):
+        if data is None:
+            result.failed += 1
+            continue
+        max_confidence = (
+            max(entity.score for entity in output.entities) if output.entities else None
+        )
+        image_predictions.append(
+            ImagePrediction(
+                image=image_model,
+                type="ner",
+                model_name=ingredient_list.MODEL_NAME,
+                model_version=ingredient_list.MODEL_VERSION,
+                data=data,
+                timestamp=timestamp,
+                max_confidence=max_confidence,
+            )
+        )
+        if max_confidence is not None:
+            predictions += generate_ingredient_predictions(
+                ProductIdentifier(image_model.barcode, server_type),
+                image_model.source_image,
+                data,
+            )
+
+    with db.atomic():
+        ImagePrediction.bulk_create(image_predictions, batch_size=100)
+    if predictions:
+        import_insights(predictions, server_type=server_type)
+    result.processed += len(image_predictions)
+
+
+def _generate_ingredient_prediction_data(
+    image_model: ImageModel, output: ingredient_list.IngredientPredictionOutput
+) -> JSONType | None:
+    try:
+        return generate_ingredient_prediction_data(
+            output, image_model.width, image_model.height
+        )
+    except RuntimeError as e:
+        logger.info(
+            "Error while parsing ingredients of image %s",
+            image_model.source_image,
+            exc_info=e,
+        )
+        return None
+
+
 def is_valid_language_code(lang_id: str) -> bool:
     """Check if the language code is a valid 2-letter ISO-639-1 code.
 
@@ -927,6 +1310,70 @@ def is_valid_language_code(lang_id: str) -> bool:
     return len(lang_id) == 2 and lang_id.isalpha()
 
 
+def get_ingredient_list_key(entity: JSONType) -> tuple[str, str] | None:
+    """Return the (text, lang) pair to send to the ingredient parser for an
+    ingredient list entity, or None if the entity can't be parsed.
+
+    :param entity: an ingredient list entity, as returned by
+        `ingredient_list.predict_from_ocr`
+    """
+    # This is just an extra check, we should have lang information
+    # available
+    if not entity["lang"]:
+        return None
+    lang_id = entity["lang"]["lang"]
+    # Skip if the language code is not a valid 2-letter ISO-639-1 code.
+    # Product Opener only supports ISO-639-1 codes, not ISO-639-3 codes.
+    if not is_valid_language_code(lang_id):
+        logger.info(f"Skipping ingredient parsing for invalid language code: {lang_id}")
+        return None
+    return entity["text"], lang_id
+
+
+def parse_ingredient_lists(
+    entities: list[JSONType],
+) -> dict[tuple[str, str], list[JSONType]]:
+    """Parse the ingredient lists detected in an image using Product Opener
+    ingredient parser.
+
+    Each distinct (text, lang) pair is parsed once, and the parsing requests
+    are sent concurrently (at most `INGREDIENT_PARSING_MAX_WORKERS` at a
+    time) when the image contains several ingredient lists.
+
+    :param entities: the ingredient list entities
+    :return: a dict mapping each (text, lang) pair to the parsed ingredients,
+        pairs whose parsing failed are missing
+    """
+    keys = list(
+        dict.fromkeys(
+            key
+            for key in (get_ingredient_list_key(entity) for entity in entities)
+            if key is not None
+        )
+    )
+    if not keys:
+        return {}
+
+    parsed_ingredients_by_key = {}
+    max_workers = min(len(keys), settings.INGREDIENT_PARSING_MAX_WORKERS)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(parse_ingredients, text, lang_id): (text, lang_id)
+            for text, lang_id in keys
+        }
+        for future in as_completed(futures):
+            try:
+                # Parse ingredients using Product Opener ingredient parser
+                parsed_ingredients_by_key[futures[future]] = future.result()
+            except RuntimeError as e:
+                logger.warning(
+                    "Error while parsing ingredients, skipping "
+                    "to the next ingredient list",
+                    exc_info=e,
+                )
+    return parsed_ingredients_by_key
+
+
 def generate_ingredient_prediction_data(
     ingredient_prediction_output: ingredient_list.IngredientPredictionOutput,
     image_width: int,
@@ -956,42 +1403,27 @@ def generate_ingredient_prediction_data(
     # Remove the full text, as it's usually very long
     ingredient_prediction_data.pop("text")
     ingredient_taxonomy = get_taxonomy(TaxonomyType.ingredient)
+    parsed_ingredients_by_key = parse_ingredient_lists(
+        ingredient_prediction_data["entities"]
+    )
 
     for entity in ingredient_prediction_data["entities"]:
-        # This is just an extra check, we should have lang information
-        # available
-        if entity["lang"]:
-            lang_id = entity["lang"]["lang"]
-            # Skip if the language code is not a valid 2-letter ISO-639-1 code.
-            # Product Opener only supports ISO-639-1 codes, not ISO-639-3 codes.
-            if not is_valid_language_code(lang_id):
-                logger.info(
-                    f"Skipping ingredient parsing for invalid language code: {lang_id}"
-                )
-                continue
-            try:
-                # Parse ingredients using Product Opener ingredient parser,
-                # and add it to the entity data
-                parsed_ingredients = parse_ingredients(entity["text"], lang_id)
-            except RuntimeError as e:
-                logger.warning(
-                    "Error while parsing ingredients, skipping "
-                    "to the next ingredient list",
-                    exc_info=e,
-                )
-            else:
-                ingredients_n, known_ingredients_n = add_ingredient_in_taxonomy_field(
-                    parsed_ingredients, ingredient_taxonomy
-                )
+        key = get_ingredient_list_key(entity)
+        if key is not None and key in parsed_ingredients_by_key:
+            # The same ingredient list may appear several times in the image
+            parsed_ingredients = copy.deepcopy(parsed_ingredients_by_key[key])
+            ingredients_n, known_ingredients_n = add_ingredient_in_taxonomy_field(
+                parsed_ingredients, ingredient_taxonomy
+            )
 
-                # We use the same terminology as Product Opener
-                entity["ingredients_n"] = ingredients_n
-                entity["known_ingredients_n"] = known_ingredients_n
-                entity["unknown_ingredients_n"] = ingredients_n - known_ingredients_n
-                entity["ingredients"] = parsed_ingredients
-                entity["fraction_known_ingredients"] = (
-                    known_ingredients_n / ingredients_n if ingredients_n > 0 else 0
-                )
+            # We use the same terminology as Product Opener
+            entity["ingredients_n"] = ingredients_n
+            entity["known_ingredients_n"] = known_ingredients_n
+            entity["unknown_ingredients_n"] = ingredients_n - known_ingredients_n
+            entity["ingredients"] = parsed_ingredients
+            entity["fraction_known_ingredients"] = (
+                known_ingredients_n / ingredients_n if ingredients_n > 0 else 0
+            )
 
         if entity["bounding_box"]:
             # Convert the bounding box to relative coordinates
@@ -1103,90 +1535,189 @@ def extract_nutrition_job(
         not provided, the default value from settings is used.
     """
     logger.info("Running nutrition extraction for %s, image %s", product_id, image_url)
-    source_image = get_source_from_url(image_url)
+    extract_nutrition([(product_id, image_url, ocr_url)], triton_uri=triton_uri)
 
-    with db:
-        image_model = ImageModel.get_or_none(
-            source_image=source_image, server_type=product_id.server_type.name
-        )
 
-        if not image_model:
-            logger.info("Missing image in DB for image %s", source_image)
-            return
+@with_db
+def extract_nutrition_batch_job(
+    items: list[tuple[ProductIdentifier, str, str]],
+    triton_uri: str | None = None,
+) -> None:
+    """Extract nutrition information from a batch of images, and save the
+    predictions in the DB.
 
-        # Stop the job here if the image has already been processed
-        if (
-            ImagePrediction.get_or_none(
-                image=image_model, model_name=nutrition_extraction.MODEL_NAME
-            )
-        ) is not None:
-            return
+    Images are sent to the model in batches, this job is used to run nutrition
+    extraction on a large number of images (see
+    `rerun_nutrition_extraction`).
+
+    :param items: a list of (product ID, image URL, OCR URL) tuples
+    :param triton_uri: URI of the Triton Inference Server, defaults to None. If
+        not provided, the default value from settings is used.
+    """
+    logger.info("Running nutrition extraction on %d images", len(items))
+    extract_nutrition(items, triton_uri=triton_uri)
+
+
+def extract_nutrition(
+    items: list[tuple[ProductIdentifier, str, str]],
+    triton_uri: str | None = None,
+    max_workers: int = 8,
+) -> None:
+    """Extract nutrition information from images, and save the predictions in
+    the DB.
 
-        image = typing.cast(
-            Image.Image | None,
-            get_image_from_url(
-                image_url, error_raise=False, session=http_session, use_cache=True
+    Images that are missing in DB or that were already processed are
+    skipped. Images and OCR results are downloaded concurrently (using
+    `max_workers` threads), and the prediction is run on all images at once
+    (see `nutrition_extraction.predict_batch`).
+
+    :param items: a list of (product ID, image URL, OCR URL) tuples
+    :param triton_uri: URI of the Triton Inference Server, defaults to None. If
+        not provided, the default value from settings is used.
+    :param max_workers: maximum number of concurrent downloads
+    """
+    source_images = [get_source_from_url(image_url) for _, image_url, _ in items]
+    image_models = {
+        (image_model.source_image, image_model.server_type): image_model
+        for image_model in ImageModel.select().where(
+            ImageModel.source_image.in_(list(set(source_images)))
+        )
+    }
+    # Skip images that have already been processed
+    processed_image_ids = set(
+        image_id
+        for (image_id,) in ImagePrediction.select(ImagePrediction.image)
+        .where(
+            ImagePrediction.image.in_(
+                [image_model.id for image_model in image_models.values()]
             ),
+            ImagePrediction.model_name == nutrition_extraction.MODEL_NAME,
         )
+        .tuples()
+    )
 
-        if image is None:
-            logger.info("Error while downloading image %s", image_url)
-            return
+    to_process = []
+    for (product_id, image_url, ocr_url), source_image in zip(items, source_images):
+        image_model = image_models.get((source_image, product_id.server_type.name))
+        if image_model is None:
+            logger.info("Missing image in DB for image %s", source_image)
+        elif image_model.id not in processed_image_ids:
+            to_process.append((product_id, image_model, image_url, ocr_url))
 
-        ocr_result = OCRResult.from_url(ocr_url, http_session, error_raise=False)
+    if not to_process:
+        return
 
-        if ocr_result is None:
-            logger.info("Error while downloading OCR JSON %s", ocr_url)
-            return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(to_process))) as executor:
+        inputs = list(
+            executor.map(
+                lambda item: get_nutrition_extraction_input(item[2], item[3]),
+                to_process,
+            )
+        )
 
-        output = nutrition_extraction.predict(image, ocr_result, triton_uri=triton_uri)
-        max_confidence = None
+    to_predict = [
+        (item, input_) for item, input_ in zip(to_process, inputs) if input_ is not None
+    ]
+    if not to_predict:
+        return
 
-        if output is None:
-            data: JSONType = {"error": "missing_text"}
-        else:
-            if output.entities.aggregated:
-                max_confidence = max(
-                    entity["score"] for entity in output.entities.aggregated
-                )
-            data = {
-                "nutrients": {
-                    entity: dataclasses.asdict(nutrient)
-                    for entity, nutrient in output.nutrients.items()
-                },
-                "entities": dataclasses.asdict(output.entities),
-            }
+    outputs = nutrition_extraction.predict_batch(
+        [input_ for _, input_ in to_predict], triton_uri=triton_uri
+    )
+    for ((product_id, image_model, _, ocr_url), _), output in zip(to_predict, outputs):
         logger.info("create image prediction (nutrition extraction) from %s", ocr_url)
-        ImagePrediction.create(
-            image=image_model,
-            type="nutrition_extraction",
-            model_name=nutrition_extraction.MODEL_NAME,
-            model_version=nutrition_extraction.MODEL_VERSION,
-            data=data,
-            timestamp=datetime.datetime.now(datetime.timezone.utc),
-            max_confidence=max_confidence,
-        )
+        save_nutrition_extraction(product_id, image_model, output)
+
 
-        if "nutrients" in data and len(data["nutrients"]) > 0:
-            # Only keep 'postprocessed' entities, as they are the most
-            # relevant for the user
-            prediction_data = {
-                "nutrients": data["nutrients"],
-                "entities": {"postprocessed": data["entities"]["postprocessed"]},
-            }
-            prediction = Prediction(
-                barcode=product_id.barcode,
-                type=PredictionType.nutrient_extraction,
-                # value and value_tag are None, all data is in data field
-                value_tag=None,
-                value=None,
-                automatic_processing=False,
-                predictor=nutrition_extraction.MODEL_NAME,
-                predictor_version=nutrition_extraction.MODEL_VERSION,
-                data=prediction_data,
-                confidence=None,
-                server_type=product_id.server_type,
-                source_image=source_image,
+def get_nutrition_extraction_input(
+    image_url: str, ocr_url: str
+) -> tuple[Image.Image, OCRResult] | None:
+    """Download the image and the OCR result used for nutrition extraction.
+
+    :param image_url: the URL of the image
+    :param ocr_url: the URL of the OCR JSON file
+    :return: the (image, OCR result) tuple, or None if the image or the OCR
+        result could not be downloaded
+    """
+    image = typing.cast(
+        Image.Image | None,
+        get_image_from_url(
+            image_url, error_raise=False, session=http_session, use_cache=True
+        ),
+    )
+
+    if image is None:
+        logger.info("Error while downloading image %s", image_url)
+        return None
+
+    ocr_result = OCRResult.from_url(ocr_url, http_session, error_raise=False)
+
+    if ocr_result is None:
+        logger.info("Error while downloading OCR JSON %s", ocr_url)
+        return None
+
+    return image, ocr_result
+
+
+def save_nutrition_extraction(
+    product_id: ProductIdentifier,
+    image_model: ImageModel,
+    output: nutrition_extraction.NutritionExtractionPrediction | None,
+) -> None:
+    """Save the nutrition extraction output of an image in DB, as an image
+    prediction, and import the nutrient prediction if nutrients were
+    detected.
+
+    :param product_id: the identifier of the product
+    :param image_model: the image the prediction was run on
+    :param output: the model output, or None if the OCR result has no text
+    """
+    max_confidence = None
+
+    if output is None:
+        data: JSONType = {"error": "missing_text"}
+    else:
+        if output.entities.aggregated:
+            max_confidence = max(
+                entity["score"] for entity in output.entities.aggregated
             )
-            imported = import_insights([prediction], server_type=product_id.server_type)
-            logger.info(imported)
+        data = {
+            "nutrients": {
+                entity: dataclasses.asdict(nutrient)
+                for entity, nutrient in output.nutrients.items()
+            },
+            "entities": dataclasses.asdict(output.entities),
+        }
+    ImagePrediction.create(
+        image=image_model,
+        type="nutrition_extraction",
+        model_name=nutrition_extraction.MODEL_NAME,
+        model_version=nutrition_extraction.MODEL_VERSION,
+        data=data,
+        timestamp=datetime.datetime.now(datetime.timezone.utc),
+        max_confidence=max_confidence,
+    )
+
+    if "nutrients" in data and len(data["nutrients"]) > 0:
+        # Only keep 'postprocessed' entities, as they are the most
+        # relevant for the user
+        prediction_data = {
+            "nutrients": data["nutrients"],
+            "entities": {"postprocessed": data["entities"]["postprocessed"]},
+        }
+        prediction = Prediction(
+            barcode=product_id.barcode,
+            type=PredictionType.nutrient_extraction,
+            # value and value_tag are None, all data is in data field
+            value_tag=None,
+            value=None,
+            automatic_processing=False,
+            predictor=nutrition_extraction.MODEL_NAME,
+            predictor_version=nutrition_extraction.MODEL_VERSION,
+            data=prediction_data,
+            confidence=None,
+            server_type=product_id.server_type,
+            source_image=image_model.source_image,
+        )
+        imported = import_insights([prediction], server_type=product_id.server_type)
+        logger.info(imported)
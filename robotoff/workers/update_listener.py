@@ -1,4 +1,9 @@
+import hashlib
 import logging
+import socket
+import struct
+import time
+from typing import Any
 
 import backoff
 from openfoodfacts import Environment, Flavor
@@ -6,9 +11,10 @@ from openfoodfacts.images import generate_image_url, generate_json_ocr_url
 from openfoodfacts.redis import RedisUpdate
 from openfoodfacts.redis import UpdateListener as BaseUpdateListener
 from redis import Redis
-from redis.exceptions import ConnectionError
+from redis.exceptions import ConnectionError, ResponseError
 
 from robotoff import settings
+from robotoff.redis import redis_conn
 from robotoff.types import ProductIdentifier, ServerType
 from robotoff.workers.queues import (
     enqueue_in_job,
@@ -16,6 +22,7 @@ from robotoff.workers.queues import (
     get_high_queue,
     get_low_queue,
 )
+from robotoff.workers.scheduling import JobClass
 from robotoff.workers.tasks import delete_product_insights_job
 from robotoff.workers.tasks.import_image import run_import_image_job
 from robotoff.workers.tasks.product_updated import (
@@ -26,6 +33,10 @@ from robotoff.workers.tasks.product_updated import (
 
 logger = logging.getLogger(__name__)
 
+#: Redis hash (in Robotoff Redis) storing the lag (in seconds) of each
+#: update listener partition
+UPDATE_LISTENER_LAG_KEY = "robotoff:update-listener-lag"
+
 
 def get_redis_client():
     """Get the Redis client where Product Opener publishes its product updates."""
@@ -110,6 +121,7 @@ class UpdateListener(BaseUpdateListener):
                     func=run_import_image_job,
                     queue=selected_queue,
                     job_kwargs={"result_ttl": 0},
+                    job_class=JobClass.upload,
                     product_id=product_id,
                     image_url=image_url,
                     ocr_url=ocr_url,
@@ -153,6 +165,271 @@ class UpdateListener(BaseUpdateListener):
                 )
 
 
+def get_partition(barcode: str, num_partitions: int) -> int:
+    """Return the partition a product belongs to, based on its barcode.
+
+    All updates of a product are handled by the same listener, in the order
+    they were published.
+    """
+    barcode_hash: int = struct.unpack(
+        "<L",
+        hashlib.md5(barcode.encode("utf-8"), usedforsecurity=False).digest()[-4:],
+    )[0]
+    return barcode_hash % num_partitions
+
+
+def parse_stream_id(entry_id: str) -> tuple[int, int]:
+    """Parse a Redis stream entry ID (`<timestamp ms>-<sequence>`) into a
+    tuple that can be compared."""
+    timestamp, sequence = entry_id.split("-")
+    return int(timestamp), int(sequence)
+
+
+def parse_redis_update(
+    stream_name: str, update_id: str, item: dict[str, Any]
+) -> RedisUpdate:
+    """Build a `RedisUpdate` from a Redis stream entry."""
+    return RedisUpdate(
+        id=update_id,
+        timestamp=int(update_id.split("-")[0]),  # type: ignore
+        stream=stream_name,
+        code=item["code"],
+        flavor=item["flavor"],
+        user_id=item["user_id"],
+        action=item["action"],
+        comment=item["comment"],
+        product_type=item["product_type"],
+        diffs=item.get("diffs"),
+    )
+
+
+class ConsumerGroupUpdateListener(UpdateListener):
+    """An update listener that reads the stream through a Redis consumer
+    group.
+
+    Products are split into `num_partitions` partitions based on their
+    barcode (see `get_partition`), each partition being handled by a single
+    listener process. Each partition has its own consumer group, so that every
+    listener reads the full stream but only processes the updates of its
+    partition: updates of a product are processed in order, by a single
+    process.
+
+    Updates are acknowledged once processed. When the listener starts, the
+    updates that were delivered but not acknowledged (after a crash) are
+    processed first, including updates delivered to other consumers of the
+    group for more than `claim_min_idle_time` ms.
+
+    The ID of the last acknowledged update is saved in `redis_latest_id_key`
+    (see `save_latest_id`), so that we can switch back to the single process
+    update listener.
+
+    :param group_name: the name of the consumer group, the partition index is
+        added as a suffix if `num_partitions > 1`
+    :param consumer_name: the name of the consumer in the group, defaults to
+        the hostname
+    :param partition: the index of the partition handled by this listener
+    :param num_partitions: the total number of partitions (listeners)
+    :param batch_size: maximum number of updates read at once
+    :param claim_min_idle_time: minimum idle time (in ms) of pending updates
+        of other consumers to reclaim them
+    :param block: maximum time (in ms) to wait for new updates, before
+        reporting lag metrics and waiting again
+    """
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        redis_stream_name: str,
+        redis_latest_id_key: str,
+        group_name: str,
+        consumer_name: str | None = None,
+        partition: int = 0,
+        num_partitions: int = 1,
+        batch_size: int = 100,
+        claim_min_idle_time: int = 60_000,
+        block: int = 5_000,
+    ):
+        super().__init__(redis_client, redis_stream_name, redis_latest_id_key)
+        if not 0 <= partition < num_partitions:
+            raise ValueError(
+                f"invalid partition: {partition} (num_partitions: {num_partitions})"
+            )
+        self.group_name = (
+            f"{group_name}-{partition}" if num_partitions > 1 else group_name
+        )
+        self.consumer_name = consumer_name or socket.gethostname()
+        self.partition = partition
+        self.num_partitions = num_partitions
+        self.batch_size = batch_size
+        self.claim_min_idle_time = claim_min_idle_time
+        self.block = block
+        self.last_id: str | None = None
+
+    def create_group(self) -> None:
+        """Create the consumer group if it doesn't exist.
+
+        The group starts after the latest update processed by the (single
+        process) update listener if any, so that switching to the consumer
+        group mode doesn't replay or lose updates.
+        """
+        start_id = self.redis_client.get(self.redis_latest_id_key) or "$"
+        try:
+            self.redis_client.xgroup_create(
+                self.redis_stream_name, self.group_name, id=start_id, mkstream=True
+            )
+            logger.info(
+                "Consumer group %s created (start ID: %s)", self.group_name, start_id
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def run(self):
+        logger.info(
+            "Starting update listener daemon (group: %s, consumer: %s, "
+            "partition: %d/%d)",
+            self.group_name,
+            self.consumer_name,
+            self.partition,
+            self.num_partitions,
+        )
+        self.redis_client.ping()
+        self.create_group()
+        self.process_pending()
+
+        while True:
+            response = self.redis_client.xreadgroup(
+                self.group_name,
+                self.consumer_name,
+                {self.redis_stream_name: ">"},
+                count=self.batch_size,
+                block=self.block,
+            )
+            for _, entries in response or []:
+                self.process_entries(entries)
+            # No new update: the listener is up to date
+            self.record_lag(0.0 if not response else self.get_lag())
+
+    def process_pending(self) -> int:
+        """Process updates that were delivered but not acknowledged.
+
+        Updates delivered to other consumers of the group (that may have
+        crashed) are claimed first, and then updates previously delivered to
+        this consumer are read again.
+
+        :return: the number of processed updates
+        """
+        count = 0
+        start_id = "0-0"
+        while True:
+            next_id, entries, *_ = self.redis_client.xautoclaim(
+                self.redis_stream_name,
+                self.group_name,
+                self.consumer_name,
+                self.claim_min_idle_time,
+                start_id=start_id,
+                count=self.batch_size,
+            )
+            # Claimed entries are now pending for this consumer, they're read
+            # below
+            if next_id in ("0-0", b"0-0"):
+                break
+            start_id = next_id
+
+        while True:
+            # ID "0" returns the updates pending for this consumer
+            response = self.redis_client.xreadgroup(
+                self.group_name,
+                self.consumer_name,
+                {self.redis_stream_name: "0"},
+                count=self.batch_size,
+            )
+            entries = response[0][1] if response else []
+            if not entries:
+                break
+            count += self.process_entries(entries)
+
+        if count:
+            logger.info("%d pending updates processed", count)
+        return count
+
+    def process_entries(self, entries: list[tuple[str, dict | None]]) -> int:
+        """Process the updates of this partition and acknowledge all
+        entries.
+
+        :param entries: the (ID, fields) stream entries
+        :return: the number of processed updates
+        """
+        count = 0
+        for entry_id, item in entries:
+            # item is empty if the entry was deleted from the stream
+            if not item or (
+                get_partition(item.get("code") or "", self.num_partitions)
+                != self.partition
+            ):
+                continue
+            try:
+                self.process_redis_update(
+                    parse_redis_update(self.redis_stream_name, entry_id, item)
+                )
+            except Exception as e:
+                logger.exception(e)
+            count += 1
+
+        if entries:
+            self.redis_client.xack(
+                self.redis_stream_name,
+                self.group_name,
+                *(entry_id for entry_id, _ in entries),
+            )
+            self.last_id = entries[-1][0]
+            self.save_latest_id(self.last_id)
+        return count
+
+    def save_latest_id(self, entry_id: str) -> None:
+        """Save the ID of the last acknowledged update in
+        `redis_latest_id_key`, where the single process update listener
+        resumes from.
+
+        With several partitions, each partition saves its own position, and
+        the latest ID is the oldest position of all partitions: after
+        switching back to the single process listener, updates already
+        processed by the most advanced partitions are processed again, but no
+        update is skipped.
+
+        :param entry_id: the ID of the last acknowledged stream entry
+        """
+        if self.num_partitions == 1:
+            self.redis_client.set(self.redis_latest_id_key, entry_id)
+            return
+
+        partitions_key = f"{self.redis_latest_id_key}:partitions"
+        self.redis_client.hset(partitions_key, str(self.partition), entry_id)
+        entry_ids = self.redis_client.hmget(
+            partitions_key, [str(i) for i in range(self.num_partitions)]
+        )
+        # Wait for all partitions to have processed an update
+        if None not in entry_ids:
+            self.redis_client.set(
+                self.redis_latest_id_key, min(entry_ids, key=parse_stream_id)
+            )
+
+    def get_lag(self) -> float | None:
+        """Return the time (in seconds) between the publication of the last
+        processed update and now, or None if no update was processed."""
+        if self.last_id is None:
+            return None
+        timestamp_ms = int(self.last_id.split("-")[0])
+        return time.time() - timestamp_ms / 1000
+
+    def record_lag(self, lag: float | None) -> None:
+        """Log and save in Robotoff Redis the lag of this partition."""
+        if lag is None:
+            return
+        logger.debug("Update listener lag (partition %d): %.1fs", self.partition, lag)
+        redis_conn.hset(UPDATE_LISTENER_LAG_KEY, str(self.partition), lag)
+
+
 @backoff.on_exception(
     backoff.expo,
     ConnectionError,
@@ -168,21 +445,47 @@ class UpdateListener(BaseUpdateListener):
         "Max retries (%d) reached. Update listener is terminating.", details["tries"]
     ),
 )
-def run_update_listener():
+def run_update_listener(
+    consumer_group: bool = False,
+    partition: int = 0,
+    num_partitions: int = 1,
+    consumer_name: str | None = None,
+):
     """Run the update import daemon.
 
     This daemon listens to the Redis stream containing information about
     product updates and triggers appropriate actions.
+
+    :param consumer_group: if True, read the stream through a consumer
+        group (see `ConsumerGroupUpdateListener`)
+    :param partition: the partition handled by this listener, only used in
+        consumer group mode
+    :param num_partitions: the total number of partitions (listeners), only
+        used in consumer group mode
+    :param consumer_name: the consumer name, defaults to the hostname
     """
     logger.info("Starting Redis update listener...")
     while True:
         try:
             redis_client = get_redis_client()
-            update_listener = UpdateListener(
-                redis_client=redis_client,
-                redis_stream_name=settings.REDIS_STREAM_NAME,
-                redis_latest_id_key=settings.REDIS_LATEST_ID_KEY,
-            )
+            update_listener: UpdateListener
+            if consumer_group:
+                update_listener = ConsumerGroupUpdateListener(
+                    redis_client=redis_client,
+                    redis_stream_name=settings.REDIS_STREAM_NAME,
+                    redis_latest_id_key=settings.REDIS_LATEST_ID_KEY,
+                    group_name=settings.REDIS_STREAM_CONSUMER_GROUP,
+                    consumer_name=consumer_name,
+                    partition=partition,
+                    num_partitions=num_partitions,
+                    claim_min_idle_time=settings.UPDATE_LISTENER_CLAIM_MIN_IDLE_TIME,
+                )
+            else:
+                update_listener = UpdateListener(
+                    redis_client=redis_client,
+                    redis_stream_name=settings.REDIS_STREAM_NAME,
+                    redis_latest_id_key=settings.REDIS_LATEST_ID_KEY,
+                )
             update_listener.run()
         except Exception as e:
             logger.critical(
@@ -30,6 +30,7 @@ def peewee_db_create():
     with models.db as db:
         models.db.execute_sql("CREATE SCHEMA IF NOT EXISTS embedding;")
         db.create_tables(models.MODELS, safe=True)
+        models.install_insight_count_triggers()
         print("DEBUG: models created ", db.get_tables())
     yield models.db
 
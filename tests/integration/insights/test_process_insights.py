@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 
 import pytest
+from requests.exceptions import Timeout
 
 from robotoff.models import ProductInsight
 from robotoff.scheduler import process_insights
@@ -220,3 +221,66 @@ def test_process_insight_same_product(mocker, peewee_db):
         server_type=DEFAULT_SERVER_TYPE,
         auth=None,
     )
+
+
+def test_process_insight_same_product_single_update(mocker, peewee_db):
+    mocker.patch(
+        "robotoff.insights.annotate.get_product",
+        return_value={"categories_tags": [], "labels_tags": []},
+    )
+    mock = mocker.patch("robotoff.off.update_product")
+
+    with peewee_db:
+        id1, _ = _create_insight(barcode="123", value_tag="en:Salmons")
+        id2, _ = _create_insight(barcode="123", value_tag="en:Smoked Salmon")
+        id3, _ = _create_insight(barcode="123", type="label", value_tag="en:organic")
+    process_insights()
+
+    with peewee_db:
+        for id_ in [id1, id2, id3]:
+            assert ProductInsight.get(id=id_).annotation == 1
+    # all the updates were sent in a single request
+    mock.assert_called_once()
+    params = mock.call_args.args[0]
+    assert params["code"] == "123"
+    assert params["add_categories"] == "en:Salmons,en:Smoked Salmon"
+    assert params["add_labels"] == "en:organic"
+    assert mock.call_args.kwargs == {"server_type": DEFAULT_SERVER_TYPE, "auth": None}
+
+
+def test_process_insight_transient_error_retried(mocker, peewee_db):
+    mocker.patch(
+        "robotoff.insights.annotate.get_product", return_value={"categories_tags": []}
+    )
+    mocker.patch("backoff._sync.time.sleep")
+    mock = mocker.patch(
+        "robotoff.off.update_product", side_effect=[Timeout(), Timeout(), None]
+    )
+
+    with peewee_db:
+        id1, _ = _create_insight(type="category")
+    process_insights()
+
+    assert mock.call_count == 3
+    with peewee_db:
+        assert ProductInsight.get(id=id1).annotation == 1
+
+
+def test_process_insight_transient_error_rolled_back(mocker, peewee_db):
+    mocker.patch(
+        "robotoff.insights.annotate.get_product", return_value={"categories_tags": []}
+    )
+    mocker.patch("backoff._sync.time.sleep")
+    mocker.patch("robotoff.settings.ANNOTATION_MAX_TRIES", 2)
+    mock = mocker.patch("robotoff.off.update_product", side_effect=Timeout())
+
+    with peewee_db:
+        id1, _ = _create_insight(type="category")
+    process_insights()
+
+    assert mock.call_count == 2
+    with peewee_db:
+        insight = ProductInsight.get(id=id1)
+    # the insight will be processed again during the next run
+    assert insight.annotation is None
+    assert insight.completed_at is None
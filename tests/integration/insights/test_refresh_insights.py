@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from robotoff.models import Prediction, ProductInsight
+from robotoff.scheduler import bulk_refresh_insights
+from robotoff.utils import dump_jsonl
+
+from ..models_utils import PredictionFactory, ProductInsightFactory, clean_db
+
+YESTERDAY = datetime.now() - timedelta(days=1)
+
+
+@pytest.fixture(autouse=True)
+def _set_up_and_tear_down(peewee_db):
+    with peewee_db:
+        clean_db()
+    # Run the test case.
+    yield
+    # Tear down.
+    with peewee_db:
+        clean_db()
+
+
+@pytest.fixture
+def min_dataset(mocker, tmp_path):
+    dataset_path = tmp_path / "products-min.jsonl.gz"
+    dump_jsonl(
+        dataset_path,
+        [
+            {
+                "code": "1",
+                "brands_tags": ["brand-1"],
+                "countries_tags": ["en:france"],
+                "unique_scans_n": 12,
+                "images": {"1": {}, "2": {}, "front_fr": {"imgid": "1"}},
+            },
+            {
+                "code": "2",
+                "brands_tags": [],
+                "countries_tags": ["en:france"],
+                "unique_scans_n": 10,
+                "images": {"1": {}},
+            },
+            {
+                # product without scans
+                "code": "4",
+                "brands_tags": [],
+                "countries_tags": [],
+                "unique_scans_n": None,
+                "images": {},
+            },
+        ],
+    )
+    mocker.patch("robotoff.settings.JSONL_MIN_DATASET_PATH", dataset_path)
+    return dataset_path
+
+
+def test_bulk_refresh_insights(peewee_db, min_dataset):
+    with peewee_db:
+        # product 3 doesn't exist anymore
+        PredictionFactory(barcode="3", timestamp=YESTERDAY)
+        # image 3 doesn't exist anymore
+        PredictionFactory(barcode="1", source_image="/1/3.jpg", timestamp=YESTERDAY)
+        prediction_kept = PredictionFactory(
+            barcode="1", source_image="/1/2.jpg", timestamp=YESTERDAY
+        )
+        # created after the dump generation, it should not be deleted
+        prediction_recent = PredictionFactory(barcode="3")
+        ProductInsightFactory(barcode="3", timestamp=YESTERDAY)
+        # not a raw image
+        ProductInsightFactory(
+            barcode="1", source_image="/1/front_fr.4.400.jpg", timestamp=YESTERDAY
+        )
+        insight_updated = ProductInsightFactory(
+            barcode="1",
+            source_image="/1/1.jpg",
+            timestamp=YESTERDAY,
+            brands=[],
+            countries=["en:france"],
+            unique_scans_n=2,
+        )
+        insight_unchanged = ProductInsightFactory(
+            barcode="2",
+            timestamp=YESTERDAY,
+            brands=[],
+            countries=["en:france"],
+            unique_scans_n=10,
+        )
+        # annotated insights are never deleted
+        insight_annotated = ProductInsightFactory(
+            barcode="3", timestamp=YESTERDAY, annotation=1
+        )
+
+    results = bulk_refresh_insights()
+
+    assert results == {
+        "prediction_deleted": 2,
+        "insight_deleted": 2,
+        "insight_updated": 1,
+        "brand_insight_deleted": 0,
+    }
+    with peewee_db:
+        assert set(p.id for p in Prediction.select()) == {
+            prediction_kept.id,
+            prediction_recent.id,
+        }
+        assert set(i.id for i in ProductInsight.select()) == {
+            insight_updated.id,
+            insight_unchanged.id,
+            insight_annotated.id,
+        }
+        updated = ProductInsight.get_by_id(insight_updated.id)
+        assert updated.brands == ["brand-1"]
+        assert updated.countries == ["en:france"]
+        assert updated.unique_scans_n == 12
+
+
+def test_bulk_refresh_insights_without_deletion(peewee_db, min_dataset):
+    with peewee_db:
+        PredictionFactory(barcode="3", timestamp=YESTERDAY)
+        ProductInsightFactory(barcode="3", timestamp=YESTERDAY)
+        insight = ProductInsightFactory(
+            barcode="2", timestamp=YESTERDAY, unique_scans_n=1
+        )
+
+    results = bulk_refresh_insights(with_deletion=False)
+
+    assert results == {
+        "prediction_deleted": 0,
+        "insight_deleted": 0,
+        "insight_updated": 1,
+        "brand_insight_deleted": 0,
+    }
+    with peewee_db:
+        assert Prediction.select().count() == 1
+        assert ProductInsight.select().count() == 2
+        assert ProductInsight.get_by_id(insight.id).unique_scans_n == 10
+
+
+def test_bulk_refresh_insights_outdated_dataset(peewee_db, min_dataset, mocker):
+    mocker.patch(
+        "robotoff.scheduler.os.path.getmtime",
+        return_value=YESTERDAY.timestamp(),
+    )
+    with peewee_db:
+        PredictionFactory(barcode="3", timestamp=YESTERDAY)
+
+    assert bulk_refresh_insights() == {}
+    with peewee_db:
+        assert Prediction.select().count() == 1
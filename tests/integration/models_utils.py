@@ -21,8 +21,12 @@ from robotoff.models import (
     LogoAnnotation,
     LogoConfidenceThreshold,
     LogoEmbedding,
+    PendingInsightCount,
+    PendingInsightCountDelta,
     Prediction,
     ProductInsight,
+    UserAnnotationCount,
+    UserAnnotationCountDelta,
 )
 from robotoff.off import generate_image_path
 from robotoff.types import ProductIdentifier, ServerType
@@ -173,6 +177,10 @@ def clean_db():
         LogoEmbedding,
         Prediction,
         ProductInsight,
+        PendingInsightCount,
+        PendingInsightCountDelta,
+        UserAnnotationCount,
+        UserAnnotationCountDelta,
     ):
         model.delete().execute()
     print("DEBUG: After cleaning: ", models.db.get_tables())
@@ -9,7 +9,12 @@ from falcon import testing
 
 from robotoff.app import events
 from robotoff.app.api import api
-from robotoff.models import AnnotationVote, LogoAnnotation, ProductInsight
+from robotoff.models import (
+    AnnotationVote,
+    LogoAnnotation,
+    ProductInsight,
+    fold_insight_count_deltas,
+)
 from robotoff.off import OFFAuthentication
 from robotoff.prediction.langid import LanguagePrediction
 from robotoff.prediction.nutrition_extraction import (
@@ -1002,6 +1007,45 @@ def test_get_unanswered_questions_pagination(client, peewee_db):
     ]
 
 
+def test_get_unanswered_questions_api_after_annotation(client, peewee_db):
+    with peewee_db:
+        ProductInsight.delete().execute()  # remove default sample
+        insight = ProductInsightFactory(type="label", value_tag="en:organic")
+        ProductInsightFactory(type="label", value_tag="en:organic")
+        # Counts are read both from the count table and from the deltas that
+        # were not folded yet
+        fold_insight_count_deltas()
+
+    result = client.simulate_get(
+        "/api/v1/questions/unanswered", params={"type": "label"}
+    )
+    assert result.json["questions"] == [["en:organic", 2]]
+
+    with peewee_db:
+        insight.annotation = 1
+        insight.save()
+
+    result = client.simulate_get(
+        "/api/v1/questions/unanswered", params={"type": "label"}
+    )
+    assert result.json["count"] == 1
+    assert result.json["questions"] == [["en:organic", 1]]
+
+
+def test_user_statistics(client, peewee_db):
+    with peewee_db:
+        ProductInsightFactory(annotation=1, username="alice")
+        ProductInsightFactory(annotation=0, username="alice")
+        ProductInsightFactory(annotation=1, username="bob")
+
+    result = client.simulate_get("/api/v1/users/statistics/alice")
+    assert result.status_code == 200
+    assert result.json == {"count": {"annotations": 2}}
+
+    result = client.simulate_get("/api/v1/users/statistics/unknown")
+    assert result.json == {"count": {"annotations": 0}}
+
+
 def test_image_prediction_collection_empty(client):
     result = client.simulate_get("/api/v1/image_predictions")
     assert result.status_code == 200
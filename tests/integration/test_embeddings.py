@@ -0,0 +1,159 @@
+import h5py
+import numpy as np
+import orjson
+import pytest
+
+from robotoff.embeddings import (
+    EmbeddingImportResult,
+    import_embeddings_from_file,
+    save_embeddings,
+)
+from robotoff.models import ImageEmbedding, LogoEmbedding
+
+from .models_utils import (
+    ImageModelFactory,
+    LogoAnnotationFactory,
+    LogoEmbeddingFactory,
+    clean_db,
+)
+
+
+@pytest.fixture(autouse=True)
+def _set_up_and_tear_down(peewee_db):
+    with peewee_db:
+        clean_db()
+    # Run the test case.
+    yield
+    # Tear down.
+    with peewee_db:
+        clean_db()
+
+
+def get_embedding(model, id_: int) -> np.ndarray:
+    return np.frombuffer(model.get_by_id(id_).embedding, dtype=np.float32)
+
+
+@pytest.mark.parametrize("update_if_exists", [False, True])
+def test_save_embeddings(peewee_db, update_if_exists):
+    with peewee_db:
+        logos = [LogoAnnotationFactory() for _ in range(3)]
+        existing_embedding = LogoEmbeddingFactory(
+            logo=logos[0],
+            embedding=np.zeros(512, dtype=np.float32).tobytes(),
+        )
+        embeddings = np.random.rand(4, 512).astype(np.float32)
+        missing_logo_id = max(logo.id for logo in logos) + 1
+        ids = [logos[0].id, logos[1].id, logos[2].id, missing_logo_id]
+        batch_results = []
+
+        result = save_embeddings(
+            LogoEmbedding,
+            zip(ids, embeddings),
+            update_if_exists=update_if_exists,
+            batch_size=2,
+            on_batch_saved=lambda consumed, r: batch_results.append((consumed, r)),
+        )
+
+        assert result == EmbeddingImportResult(
+            created=2,
+            updated=int(update_if_exists),
+            skipped=int(not update_if_exists),
+            not_found=1,
+        )
+        assert [consumed for consumed, _ in batch_results] == [2, 4]
+        assert LogoEmbedding.select().count() == 3
+        assert (get_embedding(LogoEmbedding, logos[1].id) == embeddings[1]).all()
+        assert (get_embedding(LogoEmbedding, logos[2].id) == embeddings[2]).all()
+        expected_embedding = (
+            embeddings[0]
+            if update_if_exists
+            else np.frombuffer(existing_embedding.embedding, dtype=np.float32)
+        )
+        assert (get_embedding(LogoEmbedding, logos[0].id) == expected_embedding).all()
+
+
+def test_save_image_embeddings(peewee_db):
+    with peewee_db:
+        image = ImageModelFactory()
+        embedding = np.random.rand(512).astype(np.float32)
+        # duplicate IDs in the same batch are only inserted once
+        result = save_embeddings(ImageEmbedding, [(image.id, embedding)] * 2)
+        assert result.created == 1
+        assert (get_embedding(ImageEmbedding, image.id) == embedding).all()
+
+
+def test_save_embeddings_null_embedding(peewee_db):
+    with peewee_db:
+        logos = [LogoAnnotationFactory() for _ in range(2)]
+        embedding = np.random.rand(512).astype(np.float32)
+        result = save_embeddings(
+            LogoEmbedding,
+            [(logos[0].id, embedding), (logos[1].id, np.zeros(512, np.float32))],
+        )
+        assert result == EmbeddingImportResult(created=1, null=1)
+        assert [e.logo_id for e in LogoEmbedding.select()] == [logos[0].id]
+
+
+@pytest.mark.parametrize(
+    "embedding,error",
+    [
+        (np.random.rand(256).astype(np.float32), "invalid embedding shape"),
+        (np.random.rand(1, 512).astype(np.float32), "invalid embedding shape"),
+        (np.random.rand(512), "invalid embedding dtype"),
+    ],
+)
+def test_save_embeddings_invalid_embedding(peewee_db, embedding, error):
+    with peewee_db:
+        logos = [LogoAnnotationFactory() for _ in range(2)]
+        valid_embedding = np.random.rand(512).astype(np.float32)
+        with pytest.raises(ValueError, match=error):
+            save_embeddings(
+                LogoEmbedding,
+                [(logos[0].id, valid_embedding), (logos[1].id, embedding)],
+            )
+        # nothing is saved from the invalid batch
+        assert LogoEmbedding.select().count() == 0
+
+
+def test_import_embeddings_from_hdf5_with_checkpoint(peewee_db, tmp_path):
+    input_path = tmp_path / "embeddings.hdf5"
+    checkpoint_path = tmp_path / "checkpoint.json"
+    with peewee_db:
+        logos = [LogoAnnotationFactory() for _ in range(4)]
+    embeddings = np.random.rand(6, 512).astype(np.float32)
+    with h5py.File(input_path, "w") as f:
+        f.create_dataset("embedding", data=embeddings)
+        # the dataset is preallocated, the last 2 rows are empty
+        f.create_dataset("logo_id", data=[logo.id for logo in logos] + [0, 0])
+
+    # the 2 first rows were imported during a previous (interrupted) run
+    checkpoint_path.write_bytes(
+        orjson.dumps({"input_path": str(input_path), "offset": 2})
+    )
+    with peewee_db:
+        result = import_embeddings_from_file(
+            LogoEmbedding, input_path, batch_size=2, checkpoint_path=checkpoint_path
+        )
+        assert result == EmbeddingImportResult(created=2)
+        assert set(e.logo_id for e in LogoEmbedding.select()) == {
+            logos[2].id,
+            logos[3].id,
+        }
+    # the checkpoint is removed once the import is complete
+    assert not checkpoint_path.exists()
+
+
+def test_import_embeddings_from_numpy(peewee_db, tmp_path):
+    input_path = tmp_path / "embeddings.npz"
+    with peewee_db:
+        images = [ImageModelFactory() for _ in range(2)]
+    embeddings = np.random.rand(2, 512).astype(np.float32)
+    np.savez(input_path, embedding=embeddings, image_id=[image.id for image in images])
+
+    with peewee_db:
+        result = import_embeddings_from_file(
+            ImageEmbedding, input_path, id_name="image_id"
+        )
+        assert result == EmbeddingImportResult(created=2)
+        for image, embedding in zip(images, embeddings):
+            assert (get_embedding(ImageEmbedding, image.id) == embedding).all()
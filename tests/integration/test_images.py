@@ -1,8 +1,9 @@
 from unittest.mock import MagicMock
 
+import orjson
 import pytest
 
-from robotoff.images import delete_images
+from robotoff.images import backfill_image_fingerprints, delete_images
 from robotoff.models import (
     ImageModel,
     ImagePrediction,
@@ -117,3 +118,62 @@ def test_delete_images(peewee_db, mocker):
     mock_delete_ann_logos.assert_called_once_with(
         mock_es_client, [logo_annotation_1.id]
     )
+
+
+def test_backfill_image_fingerprints(peewee_db, mocker, tmp_path):
+    # The fingerprint is derived from the image URL, images of barcode "3"
+    # can't be fetched
+    fetch_mock = mocker.patch(
+        "robotoff.images.fetch_image_fingerprint",
+        side_effect=lambda image_url, use_cache: (
+            None if "/000/000/000/0003/" in image_url else len(image_url)
+        ),
+    )
+    checkpoint_path = tmp_path / "checkpoint.json"
+    with peewee_db:
+        images = [
+            ImageModelFactory(barcode=f"{i:013}", image_id="1") for i in range(1, 6)
+        ]
+        already_fingerprinted = ImageModelFactory(fingerprint=42)
+        deleted = ImageModelFactory(deleted=True)
+
+        result = backfill_image_fingerprints(
+            batch_size=2, num_workers=2, checkpoint_path=checkpoint_path, limit=3
+        )
+        assert result.processed == 2
+        assert result.failed == 1
+        assert result.last_id == images[2].id
+        assert orjson.loads(checkpoint_path.read_bytes()) == {
+            "server_type": None,
+            "last_id": images[2].id,
+        }
+
+        # Resume: the image that could not be fetched is not retried
+        result = backfill_image_fingerprints(
+            batch_size=2, num_workers=2, checkpoint_path=checkpoint_path
+        )
+        assert result.processed == 2
+        assert result.failed == 0
+        assert not checkpoint_path.exists()
+
+        fingerprints = {
+            image.id: image.fingerprint
+            for image in ImageModel.select(ImageModel.id, ImageModel.fingerprint)
+        }
+    for image in images:
+        if image.barcode == "0000000000003":
+            assert fingerprints[image.id] is None
+        else:
+            assert fingerprints[image.id] == len(image.get_image_url())
+    assert fingerprints[already_fingerprinted.id] == 42
+    assert fingerprints[deleted.id] is None
+    assert fetch_mock.call_count == 5
+
+
+def test_backfill_image_fingerprints_checkpoint_other_server_type(peewee_db, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.json"
+    checkpoint_path.write_bytes(orjson.dumps({"server_type": "obf", "last_id": 3}))
+    with pytest.raises(ValueError, match="another server type"):
+        backfill_image_fingerprints(
+            server_type=ServerType.off, checkpoint_path=checkpoint_path
+        )
@@ -1,6 +1,15 @@
 import pytest
 
-from robotoff.models import AnnotationVote, ProductInsight
+from robotoff.models import (
+    AnnotationVote,
+    PendingInsightCount,
+    PendingInsightCountDelta,
+    ProductInsight,
+    UserAnnotationCount,
+    UserAnnotationCountDelta,
+    fold_insight_count_deltas,
+    rebuild_insight_counts,
+)
 
 from .models_utils import AnnotationVoteFactory, ProductInsightFactory, clean_db
 
@@ -33,3 +42,83 @@ def test_vote_cascade_on_insight_deletion(peewee_db):
 
     assert ProductInsight.select().count() == 0
     assert AnnotationVote.select().count() == 0
+
+
+def _get_pending_insight_counts() -> dict[tuple[str, str], int]:
+    assert fold_insight_count_deltas()
+    assert PendingInsightCountDelta.select().count() == 0
+    return {
+        (item.type, item.value_tag): item.count for item in PendingInsightCount.select()
+    }
+
+
+def _get_user_annotation_counts() -> dict[str, int]:
+    assert fold_insight_count_deltas()
+    assert UserAnnotationCountDelta.select().count() == 0
+    return {item.username: item.count for item in UserAnnotationCount.select()}
+
+
+def test_insight_counts_triggers(peewee_db):
+    with peewee_db.atomic():
+        insight1 = ProductInsightFactory(type="category", value_tag="en:soups")
+        insight2 = ProductInsightFactory(type="category", value_tag="en:soups")
+        insight3 = ProductInsightFactory(type="label", value_tag=None)
+        ProductInsightFactory(type="label", annotation=1, username="alice")
+    # Changes are recorded as deltas until they are folded
+    assert {
+        (item.type, item.value_tag): item.delta
+        for item in PendingInsightCountDelta.select()
+    } == {("category", "en:soups"): 2, ("label", ""): 1}
+    assert PendingInsightCount.select().count() == 0
+    assert _get_pending_insight_counts() == {
+        ("category", "en:soups"): 2,
+        ("label", ""): 1,
+    }
+    assert _get_user_annotation_counts() == {"alice": 1}
+
+    # Annotation
+    with peewee_db.atomic():
+        insight1.annotation = 1
+        insight1.username = "alice"
+        insight1.save()
+    assert _get_pending_insight_counts() == {
+        ("category", "en:soups"): 1,
+        ("label", ""): 1,
+    }
+    assert _get_user_annotation_counts() == {"alice": 2}
+
+    # Key update, empty aggregates are removed
+    with peewee_db.atomic():
+        ProductInsight.update(value_tag="en:salads").where(
+            ProductInsight.id == insight2.id
+        ).execute()
+    assert _get_pending_insight_counts() == {
+        ("category", "en:salads"): 1,
+        ("label", ""): 1,
+    }
+
+    # Deletion
+    with peewee_db.atomic():
+        ProductInsight.delete().where(
+            ProductInsight.id.in_([insight1.id, insight3.id])
+        ).execute()
+    assert _get_pending_insight_counts() == {("category", "en:salads"): 1}
+    assert _get_user_annotation_counts() == {"alice": 1}
+
+
+def test_rebuild_insight_counts(peewee_db):
+    with peewee_db.atomic():
+        ProductInsightFactory(type="category", value_tag="en:soups")
+        ProductInsightFactory(type="label", annotation=0, username="bob")
+        fold_insight_count_deltas()
+        PendingInsightCount.delete().execute()
+        UserAnnotationCount.update(count=5).execute()
+        ProductInsightFactory(type="category", value_tag="en:salads")
+
+    rebuild_insight_counts()
+    assert PendingInsightCountDelta.select().count() == 0
+    assert _get_pending_insight_counts() == {
+        ("category", "en:soups"): 1,
+        ("category", "en:salads"): 1,
+    }
+    assert _get_user_annotation_counts() == {"bob": 1}
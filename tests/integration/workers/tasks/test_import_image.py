@@ -1,3 +1,4 @@
+import orjson
 import pytest
 
 from robotoff.models import ImagePrediction, Prediction, ProductInsight
@@ -14,6 +15,7 @@ from robotoff.prediction.nutrition_extraction import (
 )
 from robotoff.types import PredictionType, ProductIdentifier, ServerType
 from robotoff.workers.tasks.import_image import (
+    backfill_ingredient_detection,
     extract_ingredients_job,
     extract_nutrition_job,
 )
@@ -168,6 +170,78 @@ def test_extract_ingredients_job(mocker, peewee_db):
         }
 
 
+def test_backfill_ingredient_detection(mocker, peewee_db, tmp_path):
+    ingredient_list_mocker = mocker.patch(
+        "robotoff.workers.tasks.import_image.ingredient_list"
+    )
+    ingredient_list_mocker.MODEL_NAME = "ingredient_detection"
+    ingredient_list_mocker.MODEL_VERSION = "ingredient-detection-1.1"
+    ingredient_list_mocker.predict_from_ocr_batch.side_effect = (
+        lambda ocr_results, triton_uri: [
+            IngredientPredictionOutput(entities=[], text="") for _ in ocr_results
+        ]
+    )
+    import_insights = mocker.patch(
+        "robotoff.workers.tasks.import_image.import_insights"
+    )
+    archive_path = tmp_path / "ocr.jsonl"
+    checkpoint_path = tmp_path / "checkpoint.json"
+
+    with peewee_db:
+        images = [
+            ImageModelFactory(barcode=f"{i:013}", image_id="1") for i in range(1, 5)
+        ]
+        # Already processed
+        ImagePredictionFactory(
+            image=images[1],
+            type="ner",
+            model_name="ingredient_detection",
+            model_version="ingredient-detection-1.1",
+        )
+        archive_path.write_bytes(
+            b"".join(
+                orjson.dumps(
+                    {
+                        "source": image.source_image.replace(".jpg", ".json"),
+                        "content": {"responses": [{}]},
+                    }
+                )
+                + b"\n"
+                for image in images[:3]
+            )
+            # image missing in DB
+            + orjson.dumps({"source": "/999/1.json", "content": {"responses": [{}]}})
+            + b"\n"
+        )
+        result = backfill_ingredient_detection(
+            archive_path, batch_size=2, checkpoint_path=checkpoint_path, limit=3
+        )
+        assert result.processed == 2
+        assert result.skipped == 1
+        assert result.offset == 3
+        assert orjson.loads(checkpoint_path.read_bytes()) == {
+            "input_path": str(archive_path),
+            "offset": 3,
+        }
+        assert (
+            ImagePrediction.select()
+            .where(ImagePrediction.model_name == "ingredient_detection")
+            .count()
+            == 3
+        )
+        # No ingredient list was detected
+        import_insights.assert_not_called()
+
+        # The backfill resumes after the checkpoint
+        result = backfill_ingredient_detection(
+            archive_path, batch_size=2, checkpoint_path=checkpoint_path
+        )
+        assert result.processed == 0
+        assert result.skipped == 1
+        assert result.offset == 4
+        assert not checkpoint_path.exists()
+
+
 def test_extract_ingredients_job_missing_image(mocker, peewee_db):
     ingredient_list_mocker = mocker.patch(
         "robotoff.workers.tasks.import_image.ingredient_list"
@@ -459,7 +533,7 @@ class TestExtractNutritionJob:
             product_id, DEFAULT_IMAGE_ID
         )
         assert OCRResult.from_url.call_count == 0
-        assert nutrition_extraction_mocker.predict.call_count == 0
+        assert nutrition_extraction_mocker.predict_batch.call_count == 0
 
     def test_extract_nutrition_job_error_json_ocr_download(self, mocker, peewee_db):
         get_image_from_url_mocker = mocker.patch(
@@ -488,7 +562,7 @@ class TestExtractNutritionJob:
         assert OCRResult.from_url.call_args.args[0] == generate_json_ocr_url(
             product_id, DEFAULT_IMAGE_ID
         )
-        assert nutrition_extraction_mocker.predict.call_count == 0
+        assert nutrition_extraction_mocker.predict_batch.call_count == 0
 
     def test_extract_nutrition_job_null_predict_output(self, mocker, peewee_db):
         get_image_from_url_mocker = mocker.patch(
@@ -496,8 +570,8 @@ class TestExtractNutritionJob:
         )
         nutrition_extraction_predict_mocker = mocker.patch.object(
             nutrition_extraction_module,
-            "predict",
-            return_value=None,
+            "predict_batch",
+            return_value=[None],
         )
         OCRResult = mocker.patch("robotoff.workers.tasks.import_image.OCRResult")
         product_id = ProductIdentifier(DEFAULT_BARCODE, ServerType.off)
@@ -538,8 +612,8 @@ class TestExtractNutritionJob:
         )
         nutrition_extraction_predict_mocker = mocker.patch.object(
             nutrition_extraction_module,
-            "predict",
-            return_value=nutrition_extraction_prediction,
+            "predict_batch",
+            return_value=[nutrition_extraction_prediction],
         )
         OCRResult = mocker.patch("robotoff.workers.tasks.import_image.OCRResult")
         import_insights_mocker = mocker.patch(
@@ -640,8 +714,8 @@ class TestExtractNutritionJob:
         nutrition_extraction_prediction.nutrients = {}
         nutrition_extraction_predict_mocker = mocker.patch.object(
             nutrition_extraction_module,
-            "predict",
-            return_value=nutrition_extraction_prediction,
+            "predict_batch",
+            return_value=[nutrition_extraction_prediction],
         )
         mocker.patch("robotoff.workers.tasks.import_image.OCRResult")
         import_insights_mocker = mocker.patch(
@@ -1,4 +1,6 @@
-from robotoff.cli.main import init_elasticsearch
+from typer.testing import CliRunner
+
+from robotoff.cli.main import app, init_elasticsearch
 
 
 def test_init_elasticsearch(mocker):
@@ -11,3 +13,10 @@ def test_init_elasticsearch(mocker):
 
     init_elasticsearch()
     fake_exporter.load_all_indices.assert_has_calls([])
+
+
+def test_backfill_image_fingerprints_invalid_limit(mocker):
+    backfill_mock = mocker.patch("robotoff.images.backfill_image_fingerprints")
+    result = CliRunner().invoke(app, ["backfill-image-fingerprints", "--limit", "0"])
+    assert result.exit_code == 2
+    backfill_mock.assert_not_called()
@@ -1,4 +1,13 @@
-from robotoff.elasticsearch import ElasticsearchExporter, get_es_client
+import pytest
+
+from robotoff.elasticsearch import (
+    ES_INDEX_CONFIGS,
+    ElasticsearchExporter,
+    check_vector_index_support,
+    estimate_vector_index_memory,
+    get_es_client,
+    get_logo_index_config,
+)
 from robotoff.types import ElasticSearchIndex
 
 
@@ -18,3 +27,125 @@ def test_load_index(mocker):
     exporter = ElasticsearchExporter(get_es_client())
     exporter.load_index(ElasticSearchIndex.logo)
     create_call.assert_called_once()
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "int8_hnsw", "int4_hnsw", "bbq_hnsw"])
+def test_get_logo_index_config(index_type):
+    config = get_logo_index_config(index_type, m=32, ef_construction=200)
+    assert config["mappings"]["properties"]["embedding"]["index_options"] == {
+        "type": index_type,
+        "m": 32,
+        "ef_construction": 200,
+    }
+
+
+def test_get_logo_index_config_invalid_type():
+    with pytest.raises(ValueError, match="unknown vector index type"):
+        get_logo_index_config("int2_hnsw")
+
+
+def test_estimate_vector_index_memory():
+    float_memory = estimate_vector_index_memory("hnsw", 1_000_000)
+    assert float_memory == 1_000_000 * (512 * 4 + 16 * 4)
+    assert estimate_vector_index_memory("int8_hnsw", 1_000_000) < float_memory / 3
+    assert estimate_vector_index_memory("bbq_hnsw", 1_000_000) < float_memory / 15
+
+
+def test_create_index_version(mocker):
+    create_call = mocker.patch("elasticsearch._sync.client.IndicesClient.create")
+
+    exporter = ElasticsearchExporter(get_es_client())
+    index_name = exporter.create_index_version(ElasticSearchIndex.logo)
+    assert index_name.startswith("logo-")
+    create_call.assert_called_once()
+    assert create_call.call_args.kwargs["index"] == index_name
+    assert create_call.call_args.kwargs["settings"]["refresh_interval"] == "-1"
+    # The global configuration is not modified
+    assert (
+        "refresh_interval" not in ES_INDEX_CONFIGS[ElasticSearchIndex.logo]["settings"]
+    )
+
+
+@pytest.mark.parametrize(
+    "index_type,version,supported",
+    [
+        ("hnsw", "8.5.3", True),
+        ("int8_hnsw", "8.5.3", False),
+        ("int8_hnsw", "8.12.0", True),
+        ("int4_hnsw", "8.14.1", False),
+        ("bbq_hnsw", "8.16.0-SNAPSHOT", True),
+        ("bbq_hnsw", "9.0.0", True),
+    ],
+)
+def test_check_vector_index_support(mocker, index_type, version, supported):
+    es_client = mocker.Mock()
+    es_client.info.return_value = {"version": {"number": version}}
+    index_config = get_logo_index_config(index_type)
+
+    if supported:
+        check_vector_index_support(es_client, index_config)
+    else:
+        with pytest.raises(RuntimeError, match=f"{index_type} requires"):
+            check_vector_index_support(es_client, index_config)
+
+
+def test_create_index_version_unsupported_index_type(mocker):
+    mocker.patch(
+        "elasticsearch.Elasticsearch.info",
+        return_value={"version": {"number": "8.5.3"}},
+    )
+    create_call = mocker.patch("elasticsearch._sync.client.IndicesClient.create")
+
+    exporter = ElasticsearchExporter(get_es_client())
+    with pytest.raises(RuntimeError, match="requires Elasticsearch >= 8.16"):
+        exporter.create_index_version(
+            ElasticSearchIndex.logo, get_logo_index_config("bbq_hnsw")
+        )
+    create_call.assert_not_called()
+
+
+def test_swap_alias_from_concrete_index(mocker):
+    mocker.patch("elasticsearch._sync.client.IndicesClient.put_settings")
+    mocker.patch("elasticsearch._sync.client.IndicesClient.refresh")
+    mocker.patch(
+        "elasticsearch._sync.client.IndicesClient.exists_alias", return_value=False
+    )
+    mocker.patch("elasticsearch._sync.client.IndicesClient.exists", return_value=True)
+    update_aliases_call = mocker.patch(
+        "elasticsearch._sync.client.IndicesClient.update_aliases"
+    )
+
+    exporter = ElasticsearchExporter(get_es_client())
+    assert exporter.swap_alias(ElasticSearchIndex.logo, "logo-2") == []
+    update_aliases_call.assert_called_once_with(
+        actions=[
+            {"remove_index": {"index": "logo"}},
+            {"add": {"index": "logo-2", "alias": "logo"}},
+        ]
+    )
+
+
+def test_swap_alias(mocker):
+    mocker.patch("elasticsearch._sync.client.IndicesClient.put_settings")
+    mocker.patch("elasticsearch._sync.client.IndicesClient.refresh")
+    mocker.patch(
+        "elasticsearch._sync.client.IndicesClient.exists_alias", return_value=True
+    )
+    mocker.patch(
+        "elasticsearch._sync.client.IndicesClient.get_alias",
+        return_value={"logo-1": {"aliases": {"logo": {}}}},
+    )
+    update_aliases_call = mocker.patch(
+        "elasticsearch._sync.client.IndicesClient.update_aliases"
+    )
+    delete_call = mocker.patch("elasticsearch._sync.client.IndicesClient.delete")
+
+    exporter = ElasticsearchExporter(get_es_client())
+    assert exporter.swap_alias(ElasticSearchIndex.logo, "logo-2") == ["logo-1"]
+    update_aliases_call.assert_called_once_with(
+        actions=[
+            {"remove": {"index": "logo-1", "alias": "logo"}},
+            {"add": {"index": "logo-2", "alias": "logo"}},
+        ]
+    )
+    delete_call.assert_called_once_with(index="logo-1")
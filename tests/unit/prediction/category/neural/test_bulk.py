@@ -0,0 +1,234 @@
+import numpy as np
+import orjson
+import pytest
+
+from robotoff.prediction.category.neural import keras_category_classifier_3_0
+from robotoff.prediction.category.neural.bulk import (
+    iter_candidate_products,
+    run_bulk_category_prediction,
+)
+from robotoff.prediction.category.neural.category_classifier import CategoryClassifier
+from robotoff.prediction.category.neural.keras_category_classifier_3_0.preprocessing import (
+    build_ingredient_processor,
+)
+from robotoff.taxonomy import Taxonomy
+from robotoff.triton import serialize_byte_tensor
+from robotoff.types import ServerType
+
+CATEGORY_TAXONOMY_DATA = {
+    "en:meats": {"name": {"en": "Meats"}, "parents": []},
+    "en:fishes": {"name": {"en": "Fishes"}, "parents": []},
+}
+INGREDIENT_TAXONOMY_DATA = {
+    "en:salt": {"name": {"en": "salt"}, "parents": []},
+}
+LABELS = ["en:meats", "en:fishes"]
+
+
+class BatchGRPCResponse:
+    def __init__(self, scores: np.ndarray, labels: list[str]):
+        self.raw_output_contents = [
+            scores.astype(np.float32).tobytes(),
+            serialize_byte_tensor(np.array(labels, dtype=np.object_)),
+        ]
+
+
+class BatchMockStub:
+    """Stub returning a score of 0.9 for `en:meats` if the product name
+    contains "meat", and 0.9 for `en:fishes` otherwise."""
+
+    def __init__(self):
+        self.batch_sizes: list[int] = []
+
+    def ModelInfer(self, request):
+        inputs = {
+            input_.name: (input_, raw)
+            for input_, raw in zip(request.inputs, request.raw_input_contents)
+        }
+        batch_size = inputs["product_name"][0].shape[0]
+        self.batch_sizes.append(batch_size)
+        names = [
+            name.decode("utf-8")
+            for name in _deserialize_bytes(inputs["product_name"][1])
+        ]
+        scores = np.array(
+            [[0.9, 0.1] if "meat" in name else [0.1, 0.9] for name in names]
+        )
+        return BatchGRPCResponse(scores, LABELS)
+
+
+def _deserialize_bytes(data: bytes) -> list[bytes]:
+    items = []
+    offset = 0
+    while offset < len(data):
+        length = int.from_bytes(data[offset : offset + 4], "little")
+        items.append(data[offset + 4 : offset + 4 + length])
+        offset += 4 + length
+    return items
+
+
+@pytest.fixture(autouse=True)
+def ingredient_taxonomy(mocker):
+    ingredient_taxonomy = Taxonomy.from_dict(INGREDIENT_TAXONOMY_DATA)
+    preprocessing = keras_category_classifier_3_0.preprocessing
+    mocker.patch.object(
+        preprocessing, "get_ingredient_taxonomy", return_value=ingredient_taxonomy
+    )
+    mocker.patch.object(
+        preprocessing,
+        "get_ingredient_processor",
+        return_value=build_ingredient_processor(ingredient_taxonomy),
+    )
+
+
+@pytest.fixture
+def classifier():
+    return CategoryClassifier(Taxonomy.from_dict(CATEGORY_TAXONOMY_DATA))
+
+
+@pytest.fixture
+def stub(mocker):
+    stub = BatchMockStub()
+    mocker.patch(
+        "robotoff.prediction.category.neural.category_classifier.get_triton_inference_stub",
+        return_value=stub,
+    )
+    return stub
+
+
+def generate_products(count: int) -> list[dict]:
+    return [
+        {
+            "code": str(i),
+            "product_name": "meat pie" if i % 2 == 0 else "fish stick",
+            "ocr": ["salt"],
+            "image_embeddings": [],
+        }
+        for i in range(count)
+    ]
+
+
+def test_build_batch_triton_request_padding():
+    inputs_list = [
+        keras_category_classifier_3_0.generate_inputs_dict(
+            {"product_name": name}, [], None
+        )
+        for name in ("a", "b")
+    ]
+    inputs_list[0]["ingredients_tags"] = ["en:salt", "en:sugar"]
+    request = keras_category_classifier_3_0.build_batch_triton_request(
+        inputs_list, "model"
+    )
+    shapes = {input_.name: list(input_.shape) for input_ in request.inputs}
+    assert shapes["product_name"] == [2, 1]
+    assert shapes["ingredients_tags"] == [2, 2]
+    assert shapes["ingredients_ocr_tags"] == [2, 1]
+    assert shapes["image_embeddings"] == [2, 10, 512]
+    assert shapes["image_embeddings_mask"] == [2, 10]
+    ingredients_tags_raw = request.raw_input_contents[
+        [input_.name for input_ in request.inputs].index("ingredients_tags")
+    ]
+    assert _deserialize_bytes(ingredients_tags_raw) == [
+        b"en:salt",
+        b"en:sugar",
+        b"",
+        b"",
+    ]
+
+
+def test_iter_candidate_products():
+    products = [{"code": "1"}, {}, {"code": "2"}, {"code": "1"}, {"code": "3"}]
+    assert [
+        (index, product_id.barcode)
+        for index, product_id, _ in iter_candidate_products(
+            products, ServerType.off, skip_barcodes={"2"}
+        )
+    ] == [(0, "1"), (4, "3")]
+    assert [
+        index
+        for index, _, _ in iter_candidate_products(products, ServerType.off, start=3)
+    ] == [3, 4]
+
+
+def test_run_bulk_category_prediction(classifier, stub):
+    imported = []
+    result = run_bulk_category_prediction(
+        generate_products(5),
+        classifier,
+        batch_size=2,
+        num_workers=2,
+        import_fn=lambda predictions, _: imported.extend(predictions),
+    )
+    assert stub.batch_sizes == [2, 2, 1]
+    assert result.processed == 5
+    assert result.failed == 0
+    assert result.predictions == 5
+    assert result.offset == 5
+    assert [(p.barcode, p.value_tag) for p in imported] == [
+        ("0", "en:meats"),
+        ("1", "en:fishes"),
+        ("2", "en:meats"),
+        ("3", "en:fishes"),
+        ("4", "en:meats"),
+    ]
+
+
+def test_run_bulk_category_prediction_checkpoint(classifier, stub, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.json"
+    imported = []
+
+    def run(limit=None):
+        return run_bulk_category_prediction(
+            generate_products(5),
+            classifier,
+            batch_size=2,
+            num_workers=2,
+            checkpoint_path=checkpoint_path,
+            dataset_id="products.jsonl.gz:1000",
+            limit=limit,
+            import_fn=lambda predictions, _: imported.extend(predictions),
+        )
+
+    result = run(limit=3)
+    assert result.offset == 3
+    assert orjson.loads(checkpoint_path.read_bytes()) == {
+        "dataset_id": "products.jsonl.gz:1000",
+        "offset": 3,
+    }
+
+    result = run()
+    assert result.processed == 2
+    assert [p.barcode for p in imported] == ["0", "1", "2", "3", "4"]
+    # The checkpoint is deleted once all products are processed
+    assert not checkpoint_path.exists()
+
+
+def test_run_bulk_category_prediction_checkpoint_other_dataset(classifier, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.json"
+    checkpoint_path.write_bytes(
+        orjson.dumps({"dataset_id": "other.jsonl.gz:10", "offset": 3})
+    )
+    with pytest.raises(ValueError, match="another dataset"):
+        run_bulk_category_prediction(
+            [],
+            classifier,
+            checkpoint_path=checkpoint_path,
+            dataset_id="products.jsonl.gz:1000",
+        )
+
+
+def test_run_bulk_category_prediction_input_error(classifier, stub):
+    products = generate_products(3)
+    # Invalid image embedding shape
+    products[1]["image_embeddings"] = [[0.0, 1.0]]
+    imported = []
+    result = run_bulk_category_prediction(
+        products,
+        classifier,
+        batch_size=10,
+        num_workers=2,
+        import_fn=lambda predictions, _: imported.extend(predictions),
+    )
+    assert result.processed == 2
+    assert result.failed == 1
+    assert [p.barcode for p in imported] == ["0", "2"]
@@ -0,0 +1,46 @@
+from robotoff.prediction import ingredient_list
+from robotoff.prediction.ingredient_list import (
+    IngredientPredictionAggregatedEntity,
+    IngredientPredictionOutput,
+    predict_from_ocr_batch,
+)
+
+
+def test_predict_from_ocr_batch(mocker):
+    texts = ["ingredients: water", "", "ingredients: water, salt, sugar", "water"]
+    ocr_results = [
+        mocker.Mock(**{"get_full_text_contiguous.return_value": text}) for text in texts
+    ]
+    for ocr_result in ocr_results:
+        ocr_result.get_match_bounding_box.return_value = (0, 0, 10, 10)
+    # One token per word
+    mocker.patch.object(ingredient_list, "get_tokenizer").return_value.side_effect = (
+        lambda texts, truncation: {"input_ids": [text.split() for text in texts]}
+    )
+    mocker.patch.object(ingredient_list, "get_triton_inference_stub")
+    predict_batch = mocker.patch.object(
+        ingredient_list,
+        "predict_batch",
+        side_effect=lambda texts, *args: [
+            IngredientPredictionOutput(
+                entities=[
+                    IngredientPredictionAggregatedEntity(
+                        start=0, end=len(text), raw_end=len(text), score=0.9, text=text
+                    )
+                ],
+                text=text,
+            )
+            for text in texts
+        ],
+    )
+
+    outputs = predict_from_ocr_batch(ocr_results, batch_size=2)
+    assert [output.text for output in outputs] == texts
+    # OCRs without text are not sent to the model
+    assert outputs[1].entities == []
+    assert outputs[0].entities[0].bounding_box == (0, 0, 10, 10)
+    # Texts are grouped by length
+    assert [call.args[0] for call in predict_batch.call_args_list] == [
+        ["water", "ingredients: water"],
+        ["ingredients: water, salt, sugar"],
+    ]
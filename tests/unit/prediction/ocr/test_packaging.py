@@ -1,7 +1,13 @@
 import pytest
 
-from robotoff.prediction.ocr.packaging import find_packaging, match_packaging
+from robotoff import settings
+from robotoff.prediction.ocr.packaging import (
+    find_packaging,
+    load_grammar,
+    match_packaging,
+)
 from robotoff.types import Prediction, PredictionType
+from robotoff.utils import load_json
 
 
 @pytest.mark.parametrize(
@@ -77,6 +83,43 @@ from robotoff.types import Prediction, PredictionType
 )
 def test_match_packaging(text: str, expected: list[dict]):
     assert match_packaging(text) == expected
+    assert match_packaging(text, parser="earley") == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Emballage : boîte de conserve en acier à recycler avec le verre",
+        "Bouteille, carton (bouteille) xx-bouteille bouteille-xx",
+        "bouteille en carton en\nbouteille plastique plastique plastique à jeter",
+        "bouteille carton, à recycler\nbouteille\nà recycler. À recycler bouteille",
+        # Overlapping shapes: "bouchons de bouteilles" and "bouteilles"
+        "bouchons de bouteilles\n- bouchons de bouteilles, verre",
+        "collerette) sans emballage\nbouchon de bouteille pet",
+        # The longest element is kept when it ends with a recycling instruction
+        "(capsules muselet et plaque à recycler dans le bac à papier)",
+        "boîte de conserve ou canette, à recycler dans le conteneur à papier",
+        "e-bec verseur\ncarton à pizza (à recycler avec le plastique",
+        "bouteille à recyclerxyz, boîte carton",
+    ],
+)
+def test_match_packaging_same_as_earley(text: str):
+    assert match_packaging(text) == match_packaging(text, parser="earley")
+
+
+def test_match_packaging_unknown_value():
+    # "81 c" is matched by the material terminal (the "81 c/*" synonym is
+    # not escaped) but is not in the taxonomy map
+    assert match_packaging("bouteilles 81 c") == [
+        {"shape": {"value": "bouteilles", "value_tag": "en:bottle"}}
+    ]
+
+
+def test_packaging_matcher_file_up_to_date():
+    assert load_json(settings.GRAMMARS_DIR / "packaging_fr_terminals.json") == {
+        terminal.name: terminal.pattern.to_regexp()
+        for terminal in load_grammar("fr").terminals
+    }
 
 
 @pytest.mark.parametrize(
@@ -1,6 +1,14 @@
 import re
 
+import pytest
+
 from robotoff import settings
+from robotoff.prediction.ocr.store import (
+    StoreMatcher,
+    expand_store_pattern,
+    find_stores,
+    get_sorted_stores,
+)
 from robotoff.utils import text_file_iter
 
 
@@ -21,3 +29,97 @@ def test_check_ocr_stores() -> None:
 
         re.compile(regex_str)
         stores.add(store)
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    [
+        ("carrefour", ["carrefour"]),
+        (r"marks\ \&\ spencer", ["marks & spencer"]),
+        ("gold[aä]hren", ["goldahren", "goldähren"]),
+        (
+            "gut[- \\n]g[uü]nstig",
+            [
+                "gut-gunstig",
+                "gut-günstig",
+                "gut gunstig",
+                "gut günstig",
+                "gut\ngunstig",
+                "gut\ngünstig",
+            ],
+        ),
+        ("woolworths?", ["woolworths", "woolworth"]),
+        ("new' ?r", ["new' r", "new'r"]),
+        ("(?:œ|oe)ufs", ["œufs", "oeufs"]),
+        # Not supported
+        ("e.leclerc", None),
+        (r"\w+mart", None),
+        ("[a-z]mart", None),
+        ("[^a]mart", None),
+        ("(lidl)", None),
+        ("lidl??", None),
+    ],
+)
+def test_expand_store_pattern(pattern: str, expected: list[str] | None) -> None:
+    assert expand_store_pattern(pattern) == expected
+
+
+def find_stores_regex(patterns: list[str], text: str) -> list[tuple[int, int, int]]:
+    """Find stores with the case-insensitive regex made of all store
+    patterns, as `StoreMatcher` is expected to."""
+    regex = re.compile(
+        "|".join(r"((?<!\w){}(?!\w))".format(pattern) for pattern in patterns), re.I
+    )
+    return [
+        (
+            next(idx for idx, group in enumerate(match.groups()) if group),
+            match.start(),
+            match.end(),
+        )
+        for match in regex.finditer(text)
+    ]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "Distribué par CARREFOUR, Lidl et Aldi. ALDI SÜD",
+        "xcarrefour carrefourx carrefour_ _carrefour carrefour1 Carrefour-Market",
+        "Fabriqué pour Marks & Spencer, Sainsbury's et 7-Eleven (Coop Obs!)",
+        "WOOLWORTH Woolworths woolworthsx GOLDÄHREN gut günstig gut\ngünstig",
+        "SÉLECTION DES MOUSQUETAIRES, Sélection Intermarché, LıDL",
+        "ΣΚΛΑΒΕΝΊΤΗΣ Σκλαβενίτης İntermarché",
+    ],
+)
+def test_store_matcher_same_as_regex(text: str) -> None:
+    patterns = [pattern for _, pattern in get_sorted_stores()]
+    assert list(StoreMatcher(patterns).finditer(text)) == find_stores_regex(
+        patterns, text
+    )
+
+
+def test_store_matcher_regex_patterns() -> None:
+    patterns = ["e.leclerc", r"\w+mart", "leclerc", "walmart"]
+    text = "E.Leclerc walmart leclerc e leclerc kmart xleclerc"
+    assert list(StoreMatcher(patterns).finditer(text)) == [
+        (0, 0, 9),
+        (1, 10, 17),
+        (2, 18, 25),
+        (0, 26, 35),
+        (1, 36, 41),
+    ]
+    assert list(StoreMatcher(patterns).finditer(text)) == find_stores_regex(
+        patterns, text
+    )
+
+
+def test_find_stores() -> None:
+    predictions = find_stores("Distribué par AUCHAN, Grand Jury")
+    assert [
+        (prediction.value, prediction.value_tag, prediction.data)
+        for prediction in predictions
+    ] == [
+        ("Auchan", "auchan", {"text": "AUCHAN"}),
+        ("Carrefour", "carrefour", {"text": "Grand Jury"}),
+    ]
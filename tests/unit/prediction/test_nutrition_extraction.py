@@ -1,8 +1,12 @@
+import numpy as np
 import pytest
+from transformers import BatchEncoding
 
+from robotoff.prediction import nutrition_extraction
 from robotoff.prediction.nutrition_extraction import (
     aggregate_entities,
     match_nutrient_value,
+    pad_batch,
     postprocess_aggregated_entities,
     postprocess_aggregated_entities_single,
 )
@@ -469,3 +473,59 @@ def test_match_nutrient_value(words_str: str, entity_label: str, expected_output
 )
 def test_postprocess_aggregated_entities_single(aggregated_entity, expected_output):
     assert postprocess_aggregated_entities_single(aggregated_entity) == expected_output
+
+
+def create_batch_encoding(length: int) -> BatchEncoding:
+    return BatchEncoding(
+        {
+            "input_ids": np.arange(2, length + 2)[None, :],
+            "attention_mask": np.ones((1, length), dtype=np.int64),
+            "bbox": np.full((1, length, 4), 5),
+            "pixel_values": np.zeros((1, 3, 224, 224), dtype=np.float32),
+        }
+    )
+
+
+def test_pad_batch():
+    model_inputs = pad_batch(
+        [create_batch_encoding(3), create_batch_encoding(2)], pad_token_id=1
+    )
+    assert model_inputs["input_ids"].tolist() == [[2, 3, 4], [2, 3, 1]]
+    assert model_inputs["attention_mask"].tolist() == [[1, 1, 1], [1, 1, 0]]
+    assert model_inputs["bbox"][1].tolist() == [[5, 5, 5, 5], [5, 5, 5, 5], [0] * 4]
+    assert model_inputs["pixel_values"].shape == (2, 3, 224, 224)
+
+
+def test_predict_batch(mocker):
+    lengths = {"a": 3, "b": None, "c": 2, "d": 3}
+    mocker.patch.object(nutrition_extraction, "get_id2label")
+    mocker.patch.object(
+        nutrition_extraction, "get_processor"
+    ).return_value.tokenizer.pad_token_id = 1
+    mocker.patch.object(nutrition_extraction, "get_triton_inference_stub")
+    mocker.patch.object(
+        nutrition_extraction,
+        "preprocess_batch",
+        return_value=[
+            None if length is None else ([key], [], [], create_batch_encoding(length))
+            for key, length in lengths.items()
+        ],
+    )
+    send_infer_request = mocker.patch.object(
+        nutrition_extraction,
+        "send_infer_request",
+        side_effect=lambda input_ids, **kwargs: np.zeros(input_ids.shape + (5,)),
+    )
+    postprocess = mocker.patch.object(
+        nutrition_extraction,
+        "postprocess",
+        side_effect=lambda logits, words, *args: (words[0], logits.shape[0]),
+    )
+    inputs = [(mocker.Mock(), mocker.Mock()) for _ in lengths]
+    predictions = nutrition_extraction.predict_batch(inputs, batch_size=2)
+    # Predictions are returned in the input order, and the logits of padding
+    # tokens are removed
+    assert predictions == [("a", 3), None, ("c", 2), ("d", 3)]
+    assert send_infer_request.call_count == 2
+    assert postprocess.call_count == 3
+    assert nutrition_extraction.predict_batch([]) == []
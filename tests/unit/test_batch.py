@@ -3,10 +3,19 @@ import tempfile
 from pathlib import Path
 
 import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 
 from robotoff import settings
-from robotoff.batch import GoogleBatchJobConfig, extract_from_dataset
+from robotoff.batch import (
+    GoogleBatchJobConfig,
+    extract_from_dataset,
+    generate_spellcheck_predictions,
+)
+from robotoff.batch.buckets import iter_parquet_file_batches
+from robotoff.prediction.langid import LanguagePrediction
+from robotoff.types import PredictionType
 from tests.unit.pytest_utils import get_asset
 
 DIR = Path(__file__).parent
@@ -52,3 +61,48 @@ def test_batch_extraction():
             "fr",
             0.375,
         )
+
+
+def test_iter_parquet_file_batches(tmp_path):
+    file_path = tmp_path / "data.parquet"
+    pq.write_table(
+        pa.table({"code": [str(i) for i in range(5)], "text": ["a"] * 5}),
+        file_path,
+    )
+    batches = list(
+        iter_parquet_file_batches(
+            pq.ParquetFile(file_path), batch_size=2, columns=["code"]
+        )
+    )
+    assert batches == [
+        [{"code": "0"}, {"code": "1"}],
+        [{"code": "2"}, {"code": "3"}],
+        [{"code": "4"}],
+    ]
+
+
+def test_generate_spellcheck_predictions(mocker):
+    predict_lang_batch_mock = mocker.patch(
+        "robotoff.batch.predict_lang_batch",
+        return_value=[[LanguagePrediction("fr", 0.9)], []],
+    )
+    rows = [
+        {"code": "1", "text": "farine de blé", "correction": "farine", "lang": "fr"},
+        {"code": "2", "text": "sugr", "correction": "sugar", "lang": "en"},
+    ]
+    predictions = generate_spellcheck_predictions(rows, "llm-v1-test")
+
+    # a single language identification request for the whole batch
+    predict_lang_batch_mock.assert_called_once_with(["farine de blé", "sugr"], k=1)
+    assert [p.barcode for p in predictions] == ["1", "2"]
+    assert all(p.type == PredictionType.ingredient_spellcheck for p in predictions)
+    assert predictions[0].value_tag == "fr"
+    assert predictions[0].data == {
+        "original": "farine de blé",
+        "correction": "farine",
+        "lang": "fr",
+        "lang_confidence": 0.9,
+    }
+    assert predictions[1].data["lang"] is None
+    assert predictions[1].data["lang_confidence"] is None
+    assert predictions[1].predictor_version == "llm-v1-test"
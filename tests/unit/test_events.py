@@ -0,0 +1,82 @@
+import queue
+
+import pytest
+import requests
+
+from robotoff import settings
+from robotoff.app import events
+
+
+def test_collect_batch():
+    event_queue: queue.Queue = queue.Queue()
+    for i in range(5):
+        event_queue.put(i)
+
+    assert events.collect_batch(event_queue, batch_size=3, flush_interval=1) == [
+        0,
+        1,
+        2,
+    ]
+    # the flush interval elapses before the batch is full
+    assert events.collect_batch(event_queue, batch_size=3, flush_interval=0.01) == [
+        3,
+        4,
+    ]
+
+
+def test_flush_events(mocker):
+    session = mocker.Mock()
+    error_response = mocker.Mock()
+    error_response.raise_for_status.side_effect = requests.HTTPError("500")
+    session.post.side_effect = [
+        mocker.Mock(),
+        requests.ConnectionError(),
+        error_response,
+    ]
+    stats = events.EventDeliveryStats()
+    batch = [
+        ("http://events", 0.0, ("question_answered", "a", "device"), {}),
+        ("http://events", 0.0, ("question_answered", "b", "device"), {}),
+        ("http://events", 0.0, ("question_answered", "c", "device"), {}),
+    ]
+    events.flush_events(session, batch, stats)
+
+    assert session.post.call_count == 3
+    assert session.post.call_args_list[0].kwargs["json"]["user_id"] == "a"
+    data = stats.to_dict()
+    assert data["sent"] == 1
+    # the HTTP error response counts as a failure
+    assert data["failed"] == 2
+    assert data["dropped"] == 0
+    assert data["max_lag"] > 0
+
+
+def test_send_async_drop_when_full(mocker, monkeypatch):
+    monkeypatch.setenv("EVENTS_API_URL", "http://events")
+    monkeypatch.setattr(settings, "EVENTS_QUEUE_PUT_TIMEOUT", 0)
+    processor = events.EventProcessor()
+    # don't start the delivery process
+    processor.process = mocker.Mock()
+    processor.queue = queue.Queue(maxsize=1)
+    processor.stats = events.EventDeliveryStats()
+
+    assert processor.send_async("question_answered", "a", "device") is True
+    assert processor.send_async("question_answered", "b", "device") is False
+    assert processor.get_stats()["dropped"] == 1
+    assert processor.queue.qsize() == 1
+
+
+def test_send_events_logs_stats(mocker, caplog):
+    event_queue: queue.Queue = queue.Queue()
+    event_queue.put(("http://events", 0.0, ("question_answered", "a", "device"), {}))
+    mocker.patch.object(events.requests.Session, "post")
+    # the delivery loop stops (StopIteration) once the batches are exhausted
+    mocker.patch.object(events, "collect_batch", side_effect=[[event_queue.get()]])
+    stats = events.EventDeliveryStats()
+
+    with caplog.at_level("INFO", logger=events.__name__):
+        with pytest.raises(StopIteration):
+            events.send_events(event_queue, stats, stats_log_interval=0)
+
+    assert stats.to_dict()["sent"] == 1
+    assert "Event delivery stats" in caplog.text
@@ -1,9 +1,10 @@
 from pathlib import Path
 
+import pytest
 from openfoodfacts.images import download_image
 from PIL import Image
 
-from robotoff.images import generate_image_fingerprint
+from robotoff.images import backfill_image_fingerprints, generate_image_fingerprint
 
 IMAGE_DATA_DIR = Path(__file__).parent / "data/upc_image"
 
@@ -29,3 +30,9 @@ def test_generate_image_fingerprint():
     assert fingerprint_1 != fingerprint_2
     # fingerprints should be invariant to rescaling
     assert fingerprint_1 == fingerprint_rescaled_1
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_backfill_image_fingerprints_invalid_limit(limit):
+    with pytest.raises(ValueError, match="limit must be at least 1"):
+        backfill_image_fingerprints(limit=limit)
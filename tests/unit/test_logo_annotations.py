@@ -0,0 +1,140 @@
+import pytest
+from redis.exceptions import ConnectionError
+
+from robotoff.logo_annotations import (
+    LOGO_ANNOTATION_CHANGES_KEY,
+    LOGO_ANNOTATION_INDEX_KEY,
+    LOGO_ANNOTATION_VERSION_KEY,
+    LogoAnnotationIndex,
+    LogoAnnotationIndexCheck,
+    get_logo_label,
+    update_logo_annotation_index,
+)
+
+
+@pytest.mark.parametrize(
+    "annotation_type,annotation_value,taxonomy_value,expected",
+    [
+        (None, None, None, None),
+        ("packager_code", None, None, ("packager_code", None)),
+        (
+            "label",
+            "AB Agriculture Biologique",
+            "fr:ab-agriculture-biologique",
+            ("label", "fr:ab-agriculture-biologique"),
+        ),
+        # Values that are not in the taxonomy are not used
+        ("brand", "unknown", None, None),
+    ],
+)
+def test_get_logo_label(annotation_type, annotation_value, taxonomy_value, expected):
+    assert get_logo_label(annotation_type, annotation_value, taxonomy_value) == expected
+
+
+def test_get_loads_full_index_then_changes(mocker):
+    connection = mocker.MagicMock()
+    pipeline = connection.pipeline.return_value.__enter__.return_value
+    pipeline.execute.return_value = [
+        b"3",
+        {b"1": b'["label","en:organic"]', b"2": b'["brand","nestle"]'},
+    ]
+    connection.mget.return_value = [b"3", b"2"]
+    index = LogoAnnotationIndex(connection)
+    assert index.get() == {1: ("label", "en:organic"), 2: ("brand", "nestle")}
+    assert index.version == 3
+
+    # Up to date: nothing is fetched
+    connection.reset_mock()
+    index.get()
+    connection.zrangebyscore.assert_not_called()
+    pipeline.execute.assert_not_called()
+
+    # Logo 1 was removed and logo 3 was added
+    connection.mget.return_value = [b"5", b"2"]
+    connection.zrangebyscore.return_value = [b"1", b"3"]
+    connection.hmget.return_value = [None, b'["packager_code",null]']
+    assert index.get() == {2: ("brand", "nestle"), 3: ("packager_code", None)}
+    connection.zrangebyscore.assert_called_once_with(
+        LOGO_ANNOTATION_CHANGES_KEY, "(3", 5
+    )
+    assert index.version == 5
+
+    # The index was rebuilt: the full index is reloaded
+    connection.mget.return_value = [b"6", b"6"]
+    pipeline.execute.return_value = [b"6", {b"4": b'["label","en:vegan"]'}]
+    assert index.get() == {4: ("label", "en:vegan")}
+    assert index.version == 6
+
+
+def test_get_index_being_built(mocker):
+    connection = mocker.MagicMock()
+    connection.mget.return_value = [None, None]
+    mocker.patch.object(LogoAnnotationIndex, "build", autospec=True, return_value=False)
+    iter_logo_labels = mocker.patch(
+        "robotoff.logo_annotations.iter_logo_labels",
+        return_value=iter([(1, ("label", "en:organic"))]),
+    )
+    index = LogoAnnotationIndex(connection)
+    # Another process is building the index: the labels are fetched from the
+    # DB, and the local copy is not updated
+    assert index.get() == {1: ("label", "en:organic")}
+    iter_logo_labels.assert_called_once_with()
+    connection.pipeline.assert_not_called()
+    assert index.version is None
+    assert index.annotations == {}
+
+
+def test_update(mocker):
+    connection = mocker.Mock()
+    index = LogoAnnotationIndex(connection)
+    index.update({})
+    connection.transaction.assert_not_called()
+
+    index.update({1: ("label", "en:organic"), 2: None})
+    func, watched_key = connection.transaction.call_args.args
+    assert watched_key == LOGO_ANNOTATION_VERSION_KEY
+    pipeline = mocker.Mock()
+    pipeline.get.return_value = b"7"
+    func(pipeline)
+    pipeline.multi.assert_called_once()
+    pipeline.hset.assert_called_once_with(
+        LOGO_ANNOTATION_INDEX_KEY, 1, b'["label","en:organic"]'
+    )
+    pipeline.hdel.assert_called_once_with(LOGO_ANNOTATION_INDEX_KEY, 2)
+    pipeline.zadd.assert_called_once_with(LOGO_ANNOTATION_CHANGES_KEY, {"1": 8, "2": 8})
+    pipeline.set.assert_called_once_with(LOGO_ANNOTATION_VERSION_KEY, 8)
+
+
+def test_update_logo_annotation_index_redis_error(mocker):
+    index = mocker.Mock()
+    index.update.side_effect = ConnectionError()
+    mocker.patch(
+        "robotoff.logo_annotations.get_logo_annotation_index", return_value=index
+    )
+    logo = mocker.Mock(
+        id=1, annotation_type=None, annotation_value=None, taxonomy_value=None
+    )
+    # Errors are not raised
+    update_logo_annotation_index([logo])
+    index.update.assert_called_once_with({1: None})
+
+
+def test_check(mocker):
+    connection = mocker.Mock()
+    connection.hlen.return_value = 3
+    connection.hrandfield.return_value = [b"1", b"2"]
+    connection.hmget.return_value = [b'["label","en:organic"]', b'["brand","nestle"]']
+    select = mocker.patch("robotoff.logo_annotations.LogoAnnotation.select")
+    select.return_value.where.return_value.count.return_value = 3
+    mocker.patch(
+        "robotoff.logo_annotations.iter_logo_labels",
+        return_value=iter([(1, ("label", "en:organic")), (2, ("brand", "nestle-2"))]),
+    )
+    check = LogoAnnotationIndex(connection).check(sample_size=2)
+    assert check == LogoAnnotationIndexCheck(
+        db_count=3, index_count=3, mismatched_ids=[2]
+    )
+    assert not check.is_consistent
+    assert LogoAnnotationIndexCheck(
+        db_count=3, index_count=3, mismatched_ids=[]
+    ).is_consistent
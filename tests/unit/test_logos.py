@@ -1,10 +1,21 @@
 from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pytest
 from elasticsearch import Elasticsearch
 from elasticsearch.helpers import BulkIndexError
 
-from robotoff.logos import compute_iou, delete_ann_logos, generate_prediction
+from robotoff.logos import (
+    UNKNOWN_LABEL,
+    compute_exact_nearest_neighbors,
+    compute_iou,
+    compute_iou_matrix,
+    delete_ann_logos,
+    filter_logos,
+    generate_prediction,
+    predict_proba,
+    predict_proba_batch,
+)
 from robotoff.types import ElasticSearchIndex, Prediction, PredictionType, ServerType
 
 
@@ -105,3 +116,127 @@ def test_delete_ann_logos(mock_bulk):
     call = mock_bulk.mock_calls[0]
     assert call.args[0] == es_client
     assert list(call.args[1]) == actions
+
+
+def test_compute_exact_nearest_neighbors():
+    rng = np.random.default_rng(42)
+    embeddings = rng.normal(size=(50, 8)).astype(np.float32)
+    logo_ids = np.arange(100, 150)
+    query_indices = [0, 10, 49]
+    k = 5
+
+    neighbor_ids = compute_exact_nearest_neighbors(
+        logo_ids[query_indices],
+        embeddings[query_indices],
+        (
+            (int(logo_id), embedding, "off")
+            for logo_id, embedding in zip(logo_ids, embeddings)
+        ),
+        k,
+        # Several chunks, to check that the top-k are merged correctly
+        chunk_size=7,
+    )
+
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1)[:, None]
+    for query_index, ids in zip(query_indices, neighbor_ids):
+        scores = normalized @ normalized[query_index]
+        scores[query_index] = -np.inf
+        assert ids.tolist() == logo_ids[np.argsort(-scores)[:k]].tolist()
+
+
+def test_compute_exact_nearest_neighbors_not_enough_logos():
+    embeddings = np.eye(3, dtype=np.float32)
+    neighbor_ids = compute_exact_nearest_neighbors(
+        np.array([1]),
+        embeddings[:1],
+        (
+            (logo_id, embedding, None)
+            for logo_id, embedding in zip([1, 2, 3], embeddings)
+        ),
+        k=4,
+    )
+    assert sorted(neighbor_ids[0].tolist()[:2]) == [2, 3]
+    assert neighbor_ids[0].tolist()[2:] == [-1, -1]
+
+
+def test_compute_iou_matrix():
+    boxes = [
+        (0.0, 0.0, 0.1, 0.1),
+        (0.2, 0.2, 0.4, 0.4),
+        (0.1, 0.1, 0.5, 0.5),
+        (0.2, 0.2, 0.6, 0.6),
+        # empty box
+        (0.3, 0.3, 0.3, 0.3),
+    ]
+    iou = compute_iou_matrix(np.array(boxes))
+    assert iou.shape == (5, 5)
+    for i in range(4):
+        for j in range(4):
+            assert iou[i, j] == pytest.approx(compute_iou(boxes[i], boxes[j]))
+    assert iou[4, 4] == 0.0
+
+
+def test_filter_logos():
+    logos = [
+        {"bounding_box": (0.1, 0.1, 0.5, 0.5), "score": 0.9},
+        # hidden by logo 0
+        {"bounding_box": (0.1, 0.1, 0.5, 0.52), "score": 0.8},
+        {"bounding_box": (0.6, 0.6, 0.8, 0.8), "score": 0.7},
+        # logo 1 is ignored, so it doesn't hide logo 3
+        {"bounding_box": (0.1, 0.1, 0.5, 0.54), "score": 0.6},
+        {"bounding_box": (0.0, 0.0, 0.1, 0.1), "score": 0.2},
+    ]
+    assert [i for i, _ in filter_logos(logos, score_threshold=0.5)] == [0, 2, 3]
+    assert [
+        i for i, _ in filter_logos(logos, score_threshold=0.1, iou_threshold=0.99)
+    ] == [0, 1, 2, 3, 4]
+    assert filter_logos([], score_threshold=0.5) == []
+
+
+def test_filter_logos_suppression():
+    box = (0.0, 0.0, 0.5, 0.5)
+    logos = [
+        {"bounding_box": box, "score": 0.9},
+        # duplicates of logo 0 are dropped
+        {"bounding_box": box, "score": 0.8},
+        {"bounding_box": box, "score": 0.7},
+        # IoU with logo 0 is 0.5: dropped as the threshold is inclusive
+        {"bounding_box": (0.0, 0.0, 0.25, 0.5), "score": 0.6},
+    ]
+    assert [i for i, _ in filter_logos(logos, 0.5, iou_threshold=0.5)] == [0]
+    assert [i for i, _ in filter_logos(logos, 0.5, iou_threshold=0.6)] == [0, 3]
+
+
+def test_predict_proba_batch(mocker):
+    mocker.patch(
+        "robotoff.logos.get_logo_annotations",
+        return_value={1: ("brand", "carrefour"), 2: ("label", "en:organic")},
+    )
+    logos = [
+        MagicMock(
+            nearest_neighbors={"logo_ids": [1, 2, 3], "distances": [0.1, 0.2, 0.2]}
+        ),
+        MagicMock(nearest_neighbors=None),
+        # A neighbor at zero distance: only this neighbor is taken into account
+        MagicMock(nearest_neighbors={"logo_ids": [2, 1], "distances": [0.0, 0.1]}),
+        MagicMock(nearest_neighbors={"logo_ids": [3], "distances": [0.5]}),
+    ]
+    results = predict_proba_batch(logos)
+    assert results[0] == {
+        UNKNOWN_LABEL: pytest.approx(0.25),
+        ("brand", "carrefour"): pytest.approx(0.5),
+        ("label", "en:organic"): pytest.approx(0.25),
+    }
+    assert results[1] is None
+    assert results[2] == {
+        UNKNOWN_LABEL: 0.0,
+        ("label", "en:organic"): 1.0,
+        ("brand", "carrefour"): 0.0,
+    }
+    assert results[3] == {UNKNOWN_LABEL: 1.0}
+    assert predict_proba(logos[0]) == results[0]
+    assert predict_proba_batch(logos[:2], weights="uniform")[0] == {
+        UNKNOWN_LABEL: pytest.approx(1 / 3),
+        ("brand", "carrefour"): pytest.approx(1 / 3),
+        ("label", "en:organic"): pytest.approx(1 / 3),
+    }
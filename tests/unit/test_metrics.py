@@ -0,0 +1,115 @@
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+from robotoff import metrics
+from robotoff.types import ServerType
+from robotoff.workers.scheduling import AdmissionController
+
+
+class FakeProductOpenerHandler(BaseHTTPRequestHandler):
+    """Local stand-in for Product Opener facet endpoints."""
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/3.json":
+            body = {"count": 200}
+        elif path == "/states":
+            # simulate a slow endpoint, the request must time out
+            time.sleep(1.0)
+            body = {"tags": []}
+        elif path == "/misc":
+            self.send_response(500)
+            self.end_headers()
+            return
+        else:
+            body = {
+                "tags": [{"id": "en:tag", "name": "Tag", "products": 50}],
+            }
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def product_opener_server(mocker):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeProductOpenerHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    mocker.patch.object(
+        metrics.settings.BaseURLProvider,
+        "country",
+        return_value=base_url,
+    )
+    yield base_url
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_facet_metric_paths():
+    paths = metrics.get_facet_metric_paths(datetime.datetime(2023, 5, 2))
+    country_tags = list(dict.fromkeys(metrics.COUNTRY_TAGS))
+    assert len(paths) == len(country_tags) * (len(metrics.URL_PATHS) + 1) + 1
+    contributors_path = "/entry-date/2023-05-01/contributors?json=1"
+    assert ("fr", contributors_path, "contributors") in paths
+    assert paths[-1] == ("world", "/countries?json=1", None)
+
+
+def test_collect_facet_metrics(product_opener_server, mocker):
+    mocker.patch.object(metrics, "COUNTRY_TAGS", ["world", "fr", "fr"])
+    target_datetime = datetime.datetime(2023, 5, 2)
+    inserts = metrics.collect_facet_metrics(
+        ServerType.off, target_datetime, max_workers=4, rate_limit=0, timeout=0.2
+    )
+
+    # per country: ingredients-analysis, data-quality, ingredients and
+    # contributors succeed, states times out and misc fails (HTTP 500)
+    # + 1 for the world countries facet
+    assert len(inserts) == 2 * 4 + 1
+    facets = {
+        (insert["tags"]["country"], insert["tags"]["facet"]) for insert in inserts
+    }
+    assert ("fr", "contributors") in facets
+    assert ("world", "countries") in facets
+    assert not any(facet in ("states", "misc") for _, facet in facets)
+    for insert in inserts:
+        assert insert["time"] == target_datetime.isoformat()
+        if insert["tags"]["facet"] in ("contributors", "countries"):
+            # no percentage for facets that are not part of URL_PATHS
+            assert insert["fields"] == {"products": 50}
+        else:
+            assert insert["fields"] == {"products": 50, "percent": 25.0}
+
+
+def test_generate_job_metrics(mocker):
+    connection = mocker.Mock()
+    connection.hgetall.return_value = {
+        b"upload": b"2.5",
+        b"upload:updated_at": b"2024-01-01T00:00:10+00:00",
+    }
+    connection.hvals.return_value = [b"upload", b"backfill", b"backfill"]
+    controller = AdmissionController(connection, shares={}, num_workers=4)
+    target_datetime = datetime.datetime(2024, 1, 1)
+
+    inserts = metrics.generate_job_metrics(controller, target_datetime)
+    fields = {insert["tags"]["job_class"]: insert["fields"] for insert in inserts}
+    assert fields == {
+        "interactive": {"running": 0},
+        "upload": {"running": 1, "lag": 2.5},
+        "update": {"running": 0},
+        "backfill": {"running": 2},
+    }
+    assert all(insert["measurement"] == "jobs" for insert in inserts)
+    assert all(insert["time"] == target_datetime.isoformat() for insert in inserts)
@@ -2,8 +2,18 @@ import re
 
 import pytest
 import requests
+from diskcache import Cache
 
-from robotoff.off import get_product_type, get_source_from_url
+from robotoff.off import (
+    OFFAuthentication,
+    add_category,
+    add_label_tag,
+    batch_product_updates,
+    get_product_type,
+    get_source_from_url,
+    parse_ingredients,
+    update_quantity,
+)
 from robotoff.types import ProductIdentifier, ServerType
 
 
@@ -130,3 +140,121 @@ class TestGetProductType:
             get_product_type(
                 ProductIdentifier(barcode=barcode, server_type=ServerType.off)
             )
+
+
+class TestBatchProductUpdates:
+    def test_merge_add_fields(self, mocker):
+        post_mock = mocker.patch("robotoff.off.requests.post")
+        product_id = ProductIdentifier(barcode="1", server_type=ServerType.off)
+        with batch_product_updates() as batch:
+            add_category(product_id, "en:salmons", insight_id="1")
+            add_category(product_id, "en:smoked-salmons", insight_id="2")
+            add_label_tag(product_id, "en:organic", insight_id="3")
+
+        post_mock.assert_not_called()
+        assert len(batch) == 1
+        params, server_type, auth, kwargs = batch.requests[0]
+        assert server_type == ServerType.off
+        assert auth is None
+        assert kwargs == {}
+        assert params["code"] == "1"
+        assert params["add_categories"] == "en:salmons,en:smoked-salmons"
+        assert params["add_labels"] == "en:organic"
+        assert params["comment"].count("[robotoff]") == 3
+
+    def test_no_merge(self):
+        product_id = ProductIdentifier(barcode="1", server_type=ServerType.off)
+        auth = OFFAuthentication(username="user", password="password")
+        with batch_product_updates() as batch:
+            # different products
+            add_category(product_id, "en:salmons")
+            add_category(
+                ProductIdentifier(barcode="2", server_type=ServerType.off),
+                "en:salmons",
+            )
+            # fields that are not `add_*` fields can't be merged
+            update_quantity(product_id, "100 g")
+            update_quantity(product_id, "200 g")
+            # different authentication
+            add_category(product_id, "en:tuna", auth=auth)
+
+        assert [
+            (params["code"], params.get("add_categories"), params.get("quantity"))
+            for params, _, _, _ in batch.requests
+        ] == [
+            ("1", "en:salmons", "100 g"),
+            ("2", "en:salmons", None),
+            ("1", None, "200 g"),
+            ("1", "en:tuna", None),
+        ]
+        assert batch.requests[3][2] is auth
+
+    def test_kwargs(self):
+        product_id = ProductIdentifier(barcode="1", server_type=ServerType.off)
+        with batch_product_updates() as batch:
+            add_category(product_id, "en:salmons", timeout=30)
+            add_category(product_id, "en:smoked-salmons", timeout=30)
+            # updates with different `update_product` parameters are not merged
+            add_category(product_id, "en:tuna")
+
+        assert [
+            (params["add_categories"], kwargs)
+            for params, _, _, kwargs in batch.requests
+        ] == [
+            ("en:salmons,en:smoked-salmons", {"timeout": 30}),
+            ("en:tuna", {}),
+        ]
+
+
+class TestParseIngredients:
+    @pytest.fixture
+    def ingredient_parsing_cache(self, mocker, tmp_path):
+        cache = Cache(tmp_path)
+        mocker.patch("robotoff.off.ingredient_parsing_cache", cache)
+        return cache
+
+    def test_parse_ingredients_cached(self, requests_mock, ingredient_parsing_cache):
+        parsed_ingredients = [{"id": "en:water", "text": "water"}]
+        patch_mock = requests_mock.patch(
+            "https://world.openfoodfacts.net/api/v3/product/test",
+            json={"status": "success", "product": {"ingredients": parsed_ingredients}},
+        )
+        assert parse_ingredients("water", "en") == parsed_ingredients
+        assert patch_mock.call_count == 1
+        assert patch_mock.last_request.json()["product"] == {
+            "lang": "en",
+            "ingredients_text_en": "water",
+        }
+
+        # Texts that only differ by their spacing share the same cache entry
+        ingredients = parse_ingredients("  water \n", "en")
+        assert ingredients == parsed_ingredients
+        assert patch_mock.call_count == 1
+        # The cached value can't be altered by the caller
+        ingredients[0]["in_taxonomy"] = True
+        assert parse_ingredients("water", "en") == parsed_ingredients
+
+        # The language is part of the cache key
+        parse_ingredients("water", "fr")
+        assert patch_mock.call_count == 2
+
+    def test_parse_ingredients_error_not_cached(
+        self, requests_mock, ingredient_parsing_cache
+    ):
+        patch_mock = requests_mock.patch(
+            "https://world.openfoodfacts.net/api/v3/product/test", status_code=502
+        )
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                parse_ingredients("water", "en")
+        assert patch_mock.call_count == 2
+
+    def test_parse_ingredients_local(
+        self, mocker, requests_mock, ingredient_parsing_cache
+    ):
+        mocker.patch("robotoff.settings.INGREDIENT_PARSER", "local")
+        assert parse_ingredients("water, salt", "en") == [
+            {"id": "en:water", "text": "water"},
+            {"id": "en:salt", "text": "salt"},
+        ]
+        assert not requests_mock.called
@@ -0,0 +1,111 @@
+import os
+import time
+
+import pytest
+from openfoodfacts.taxonomy import create_taxonomy_mapping
+
+from robotoff.taxonomy import Taxonomy, TaxonomyType
+from robotoff.taxonomy_snapshot import (
+    TaxonomySnapshot,
+    dump_taxonomy_snapshot,
+    get_taxonomy_snapshot,
+)
+
+LABEL_TAXONOMY_DATA = {
+    "en:organic": {
+        "name": {"en": "Organic", "fr": "Bio"},
+        "synonyms": {"en": ["Organic", "organically grown"], "fr": ["Bio"]},
+        "wikidata": {"en": "Q380627"},
+    },
+    "en:eu-organic": {
+        "name": {"en": "EU Organic", "fr": "Bio européen"},
+        "synonyms": {"fr": ["Bio européen", "AB Europe"]},
+        "parents": ["en:organic"],
+    },
+    "fr:ab-agriculture-biologique": {
+        "name": {"fr": "AB Agriculture Biologique"},
+        "parents": ["en:organic", "en:eu-organic"],
+    },
+    "en:fair-trade": {"name": {"xx": "Fair trade", "en": "Fair trade"}},
+}
+
+
+@pytest.fixture(scope="module")
+def label_taxonomy() -> Taxonomy:
+    return Taxonomy.from_dict(LABEL_TAXONOMY_DATA)
+
+
+@pytest.fixture(scope="module")
+def label_snapshot(label_taxonomy, tmp_path_factory) -> TaxonomySnapshot:
+    snapshot_path = tmp_path_factory.mktemp("snapshot") / "label.snapshot"
+    dump_taxonomy_snapshot(label_taxonomy, snapshot_path)
+    return TaxonomySnapshot.from_path(snapshot_path)
+
+
+def test_snapshot_nodes(label_taxonomy, label_snapshot):
+    assert len(label_snapshot) == len(label_taxonomy)
+    assert sorted(label_snapshot.keys()) == sorted(label_taxonomy.keys())
+    assert "en:eu-organic" in label_snapshot
+    assert "en:unknown-label" not in label_snapshot
+    assert label_snapshot["en:unknown-label"] is None
+
+    for node_id in ("en:eu-organic", "en:organic", "fr:ab-agriculture-biologique"):
+        node = label_taxonomy[node_id]
+        snapshot_node = label_snapshot[node_id]
+        assert snapshot_node.id == node.id
+        assert snapshot_node.names == node.names
+        assert snapshot_node.synonyms == node.synonyms
+        assert snapshot_node.properties == node.properties
+        assert [p.id for p in snapshot_node.parents] == [p.id for p in node.parents]
+        assert [c.id for c in snapshot_node.children] == [c.id for c in node.children]
+        assert [p.id for p in snapshot_node.get_parents_hierarchy()] == [
+            p.id for p in node.get_parents_hierarchy()
+        ]
+        assert snapshot_node.get_localized_name("fr") == node.get_localized_name("fr")
+
+    assert label_snapshot.get_localized_name("en:fair-trade", "de") == "Fair trade"
+    assert label_snapshot.to_dict() == label_taxonomy.to_dict()
+
+
+def test_snapshot_traversal(label_snapshot):
+    assert label_snapshot["en:eu-organic"].is_child_of(label_snapshot["en:organic"])
+    assert not label_snapshot["en:organic"].is_child_of(label_snapshot["en:eu-organic"])
+    assert label_snapshot.is_parent_of_any("en:organic", ["en:eu-organic"])
+    assert [
+        node.id
+        for node in label_snapshot.find_deepest_nodes(
+            [label_snapshot["en:organic"], label_snapshot["en:eu-organic"]]
+        )
+    ] == ["en:eu-organic"]
+
+
+def test_snapshot_mapping(label_taxonomy, label_snapshot):
+    assert create_taxonomy_mapping(label_snapshot) == create_taxonomy_mapping(
+        label_taxonomy
+    )
+
+
+def test_get_taxonomy_snapshot(label_taxonomy, tmp_path, mocker):
+    json_path = tmp_path / "label.json"
+    json_path.write_bytes(b"{}")
+    mocker.patch(
+        "robotoff.taxonomy_snapshot.Taxonomy.from_path", return_value=label_taxonomy
+    )
+    should_download_file = mocker.patch(
+        "robotoff.taxonomy_snapshot.should_download_file", return_value=False
+    )
+    snapshot = get_taxonomy_snapshot(TaxonomyType.label, tmp_path, max_age=3600)
+    assert len(snapshot) == len(label_taxonomy)
+    assert should_download_file.call_count == 1
+
+    # The snapshot was checked recently, no new check is performed
+    get_taxonomy_snapshot(TaxonomyType.label, tmp_path, max_age=3600)
+    assert should_download_file.call_count == 1
+
+    snapshot_path = tmp_path / "label.snapshot"
+    past = time.time() - 7200
+    os.utime(snapshot_path, (past, past))
+    get_taxonomy_snapshot(TaxonomyType.label, tmp_path, max_age=3600)
+    assert should_download_file.call_count == 2
+    # the snapshot is up-to-date, it's not compiled again
+    assert snapshot_path.stat().st_mtime > past
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from diskcache import Cache
+
+from robotoff import settings, triton
+
+
+class CLIPResponse:
+    def __init__(self, embeddings: np.ndarray):
+        self.raw_output_contents = [embeddings.astype(np.float32).tobytes()]
+
+
+class CLIPStub:
+    """Fake Triton stub, the embedding of an image is the mean of its pixel
+    values on each channel."""
+
+    def __init__(self):
+        self.batch_sizes: list[int] = []
+
+    def ModelInfer(self, request):
+        (inputs,) = request.raw_input_contents[:1]
+        shape = list(request.inputs[0].shape)
+        pixel_values = np.frombuffer(inputs, dtype=np.float32).reshape(shape)
+        self.batch_sizes.append(shape[0])
+        return CLIPResponse(pixel_values.mean(axis=(2, 3)))
+
+
+@pytest.fixture
+def clip_embedding_cache(tmp_path, mocker):
+    cache = Cache(tmp_path)
+    mocker.patch.object(triton, "clip_embedding_cache", cache)
+    mocker.patch.object(settings, "ENABLE_CLIP_EMBEDDING_CACHE", True)
+    # Images are "preprocessed" by casting them to float32 arrays
+    mocker.patch.object(
+        triton,
+        "preprocess_clip_images",
+        side_effect=lambda images: np.stack(images).astype(np.float32),
+    )
+    yield cache
+    cache.close()
+
+
+def generate_images(values: list[float]) -> list[np.ndarray]:
+    return [np.full((3, 4, 4), value, dtype=np.float32) for value in values]
+
+
+def test_generate_clip_embedding_cache(clip_embedding_cache):
+    stub = CLIPStub()
+    embeddings = triton.generate_clip_embedding(generate_images([1, 2, 3]), stub)
+    np.testing.assert_array_equal(embeddings, [[1] * 3, [2] * 3, [3] * 3])
+    assert stub.batch_sizes == [3]
+    assert len(clip_embedding_cache) == 3
+
+    # Only the embeddings of the new images are computed
+    embeddings = triton.generate_clip_embedding(generate_images([3, 4, 1]), stub)
+    np.testing.assert_array_equal(embeddings, [[3] * 3, [4] * 3, [1] * 3])
+    assert stub.batch_sizes == [3, 1]
+    assert embeddings.dtype == np.float32
+
+    # All embeddings are cached, Triton is not called
+    triton.generate_clip_embedding(generate_images([4]), stub)
+    assert stub.batch_sizes == [3, 1]
+
+
+def test_generate_clip_embedding_cache_key_model_version(clip_embedding_cache, mocker):
+    stub = CLIPStub()
+    triton.generate_clip_embedding(generate_images([1]), stub)
+    mocker.patch.object(settings, "CLIP_MODEL_VERSION", "new-version")
+    triton.generate_clip_embedding(generate_images([1]), stub)
+    assert stub.batch_sizes == [1, 1]
+
+
+def test_generate_clip_embedding_cache_disabled(clip_embedding_cache, mocker):
+    mocker.patch.object(settings, "ENABLE_CLIP_EMBEDDING_CACHE", False)
+    stub = CLIPStub()
+    triton.generate_clip_embedding(generate_images([1]), stub)
+    triton.generate_clip_embedding(generate_images([1]), stub)
+    assert stub.batch_sizes == [1, 1]
+    assert len(clip_embedding_cache) == 0
+
+
+def test_cache_clip_embedding_float16(clip_embedding_cache, mocker):
+    mocker.patch.object(settings, "CLIP_EMBEDDING_CACHE_DTYPE", "float16")
+    embedding = np.random.default_rng(0).normal(size=512).astype(np.float32)
+    triton.cache_clip_embedding("key", embedding)
+    assert clip_embedding_cache.get("key").dtype == np.float16
+    cached_embedding = triton.get_cached_clip_embedding("key")
+    assert cached_embedding.dtype == np.float32
+    assert triton.cosine_similarity(embedding, cached_embedding) >= (
+        settings.CLIP_EMBEDDING_CACHE_MIN_COSINE_SIMILARITY
+    )
+
+    # float16 can't represent this value (overflow), the embedding is stored
+    # in full precision
+    embedding = np.array([1e5, 1.0], dtype=np.float32)
+    triton.cache_clip_embedding("key_2", embedding)
+    assert clip_embedding_cache.get("key_2").dtype == np.float32
+
+
+@pytest.mark.parametrize(
+    "lengths,batch_size,max_padding_ratio,expected",
+    [
+        ([], 8, 0.25, []),
+        ([10, 30, 11, 12], 8, 0.25, [[0, 2, 3], [1]]),
+        ([10, 30, 11, 12], 2, 0.25, [[0, 2], [3], [1]]),
+        ([10, 30, 11, 12], 8, 1.0, [[0, 2, 3, 1]]),
+        ([10, 30, 11, 12], 8, 0.0, [[0], [2], [3], [1]]),
+    ],
+)
+def test_create_batches(lengths, batch_size, max_padding_ratio, expected):
+    assert triton.create_batches(lengths, batch_size, max_padding_ratio) == expected
@@ -0,0 +1,234 @@
+import grpc
+import numpy as np
+import pytest
+from PIL import Image
+from tritonclient.grpc import service_pb2
+
+from robotoff import triton
+from robotoff.prediction.category.neural import keras_category_classifier_3_0
+from robotoff.prediction.category.neural.keras_category_classifier_3_0.preprocessing import (
+    build_ingredient_processor,
+)
+from robotoff.prediction.image_classifier import MODELS_CONFIG as CLASSIFIER_CONFIGS
+from robotoff.prediction.image_classifier import ImageClassifier
+from robotoff.prediction.ingredient_list import send_ner_infer_request
+from robotoff.prediction.object_detection.core import MODELS_CONFIG, RemoteModel
+from robotoff.taxonomy import Taxonomy
+from robotoff.triton_stand_in import (
+    DEFAULT_CATEGORY_LABELS,
+    LatencyConfig,
+    get_default_models,
+    start_stand_in_server,
+)
+from robotoff.types import (
+    ImageClassificationModel,
+    NeuralCategoryClassifierModel,
+    ObjectDetectionModel,
+)
+
+
+@pytest.fixture(scope="module")
+def stand_in():
+    server, servicer, port = start_stand_in_server(
+        "localhost:0", models=get_default_models(nutrition_extractor_num_labels=5)
+    )
+    yield servicer, f"localhost:{port}"
+    server.stop(None)
+
+
+@pytest.fixture
+def ingredient_taxonomy(mocker):
+    ingredient_taxonomy = Taxonomy.from_dict(
+        {"en:salt": {"name": {"en": "salt"}, "parents": []}}
+    )
+    preprocessing = keras_category_classifier_3_0.preprocessing
+    mocker.patch.object(
+        preprocessing, "get_ingredient_taxonomy", return_value=ingredient_taxonomy
+    )
+    mocker.patch.object(
+        preprocessing,
+        "get_ingredient_processor",
+        return_value=build_ingredient_processor(ingredient_taxonomy),
+    )
+
+
+def generate_clip_inputs(num_images: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.random((num_images, 3, 224, 224), dtype=np.float32)
+
+
+def test_clip(stand_in):
+    servicer, uri = stand_in
+    stub = triton.get_triton_inference_stub(uri)
+    inputs = generate_clip_inputs(3)
+
+    def infer(pixel_values: np.ndarray) -> np.ndarray:
+        response = stub.ModelInfer(triton.build_clip_embedding_request(pixel_values))
+        return np.frombuffer(response.raw_output_contents[0], dtype=np.float32).reshape(
+            (len(pixel_values), -1)
+        )
+
+    embeddings = infer(inputs)
+    assert embeddings.shape == (3, 512)
+    np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, rtol=1e-5)
+    # The output of an item doesn't depend on the other items of the batch
+    np.testing.assert_array_equal(infer(inputs[1:2])[0], embeddings[1])
+    assert not np.array_equal(embeddings[0], embeddings[1])
+    assert servicer.stats["clip"].items >= 4
+
+
+def test_clip_max_batch_size(stand_in):
+    _, uri = stand_in
+    stub = triton.get_triton_inference_stub(uri)
+    request = triton.build_clip_embedding_request(
+        generate_clip_inputs(triton.CLIP_MAX_BATCH_SIZE + 1)
+    )
+    with pytest.raises(grpc.RpcError) as exc_info:
+        stub.ModelInfer(request)
+    assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert "batch-size" in exc_info.value.details()
+
+
+def test_invalid_requests(stand_in):
+    _, uri = stand_in
+    stub = triton.get_triton_inference_stub(uri)
+
+    request = service_pb2.ModelInferRequest(model_name="unknown")
+    with pytest.raises(grpc.RpcError) as exc_info:
+        stub.ModelInfer(request)
+    assert exc_info.value.code() == grpc.StatusCode.NOT_FOUND
+
+    # Wrong data type
+    request = service_pb2.ModelInferRequest(model_name="ingredient-ner")
+    triton.add_triton_infer_input_tensor(
+        request, "input_ids", np.ones((1, 4), dtype=np.int32), "INT32"
+    )
+    with pytest.raises(grpc.RpcError) as exc_info:
+        stub.ModelInfer(request)
+    assert exc_info.value.code() == grpc.StatusCode.INVALID_ARGUMENT
+    assert "data-type" in exc_info.value.details()
+
+    # Missing input
+    request = service_pb2.ModelInferRequest(model_name="ingredient-ner")
+    triton.add_triton_infer_input_tensor(
+        request, "input_ids", np.ones((1, 4), dtype=np.int64), "INT64"
+    )
+    with pytest.raises(grpc.RpcError) as exc_info:
+        stub.ModelInfer(request)
+    assert "missing: attention_mask" in exc_info.value.details()
+
+    # Wrong image size
+    request = service_pb2.ModelInferRequest(model_name="nutrition_table")
+    triton.add_triton_infer_input_tensor(
+        request, "images", np.zeros((1, 3, 320, 320), dtype=np.float32), "FP32"
+    )
+    with pytest.raises(grpc.RpcError) as exc_info:
+        stub.ModelInfer(request)
+    assert "unexpected shape" in exc_info.value.details()
+
+
+def test_ingredient_ner_padding(stand_in):
+    _, uri = stand_in
+    stub = triton.get_triton_inference_stub(uri)
+    input_ids = np.array([[0, 10, 11, 12, 2, 1, 1], [0, 20, 2, 1, 1, 1, 1]])
+    attention_mask = (input_ids != 1).astype(np.int64)
+    logits = send_ner_infer_request(input_ids, attention_mask, "ingredient-ner", stub)
+    assert logits.shape == (2, 7, 3)
+
+    # Same tokens, with less padding
+    single_logits = send_ner_infer_request(
+        input_ids[1:, :4], attention_mask[1:, :4], "ingredient-ner", stub
+    )
+    np.testing.assert_array_equal(single_logits[0, :3], logits[1, :3])
+
+
+def test_category_classifier(stand_in, ingredient_taxonomy):
+    _, uri = stand_in
+    stub = triton.get_triton_inference_stub(uri)
+    inputs_list = [
+        keras_category_classifier_3_0.generate_inputs_dict(
+            {"product_name": name}, [], None
+        )
+        for name in ("chocolate", "orange juice")
+    ]
+    inputs_list[0]["ingredients_tags"] = ["en:cocoa", "en:sugar"]
+    model_name = NeuralCategoryClassifierModel.keras_image_embeddings_3_0
+    scores, labels = keras_category_classifier_3_0._predict_batch(
+        inputs_list, model_name, stub
+    )
+    assert scores.shape == (2, len(DEFAULT_CATEGORY_LABELS))
+    assert labels == DEFAULT_CATEGORY_LABELS
+    # ingredients_tags padding doesn't change the output of the 2nd product
+    single_scores, _ = keras_category_classifier_3_0._predict_batch(
+        inputs_list[1:], model_name, stub
+    )
+    np.testing.assert_array_equal(single_scores[0], scores[1])
+
+
+def test_yolo_object_detection(stand_in):
+    _, uri = stand_in
+    model = RemoteModel(MODELS_CONFIG[ObjectDetectionModel.nutrition_table])
+    image = Image.new("RGB", (300, 400), color="white")
+    result = model.detect_from_image(image, triton_uri=uri, threshold=0.1)
+    np.testing.assert_array_equal(
+        result.detection_boxes,
+        model.detect_from_image(image, triton_uri=uri, threshold=0.1).detection_boxes,
+    )
+    assert len(result.detection_scores) <= 3
+    assert (result.detection_boxes >= 0).all() and (result.detection_boxes <= 1).all()
+
+
+def test_tf_object_detection(stand_in):
+    _, uri = stand_in
+    model = RemoteModel(MODELS_CONFIG[ObjectDetectionModel.universal_logo_detector])
+    result = model.detect_from_image(
+        Image.new("RGB", (300, 400), color="white"), triton_uri=uri, threshold=0.4
+    )
+    assert len(result.detection_scores) <= 3
+    assert set(result.detection_classes.tolist()) <= {1, 2}
+
+
+def test_image_classifier(stand_in):
+    _, uri = stand_in
+    config = CLASSIFIER_CONFIGS[ImageClassificationModel.front_image_classification]
+    results = ImageClassifier(config).predict(
+        Image.new("RGB", (300, 400), color="white"), triton_uri=uri
+    )
+    assert sorted(label for label, _ in results) == ["FRONT", "OTHER"]
+    assert sum(score for _, score in results) == pytest.approx(1.0, rel=1e-5)
+
+
+def test_repository(stand_in):
+    servicer, uri = stand_in
+    stub = triton.get_triton_inference_stub(uri)
+    model_names = {model.name for model in triton.list_models(stub)}
+    assert model_names == set(servicer.models)
+
+    config = triton.get_model_config(stub, "clip")
+    assert config.max_batch_size == triton.CLIP_MAX_BATCH_SIZE
+    assert [input_.name for input_ in config.input] == [
+        "pixel_values",
+        "attention_mask",
+        "input_ids",
+    ]
+
+    triton.unload_model(stub, "nutriscore")
+    try:
+        assert not stub.ModelReady(
+            service_pb2.ModelReadyRequest(name="nutriscore")
+        ).ready
+        request = service_pb2.ModelInferRequest(model_name="nutriscore")
+        with pytest.raises(grpc.RpcError) as exc_info:
+            stub.ModelInfer(request)
+        assert exc_info.value.code() == grpc.StatusCode.UNAVAILABLE
+    finally:
+        stub.RepositoryModelLoad(
+            service_pb2.RepositoryModelLoadRequest(model_name="nutriscore")
+        )
+    assert stub.ModelReady(service_pb2.ModelReadyRequest(name="nutriscore")).ready
+
+
+def test_latency_config(mocker):
+    assert LatencyConfig(base=0.1, per_item=0.01).get_delay(10) == pytest.approx(0.2)
+    mocker.patch("robotoff.triton_stand_in.random.uniform", return_value=1.5)
+    assert LatencyConfig(base=0.1, jitter=0.5).get_delay(1) == pytest.approx(0.15)
@@ -0,0 +1,42 @@
+import pytest
+
+from robotoff.utils.ingredient_parser import parse_ingredients_locally
+
+
+@pytest.mark.parametrize(
+    "text,lang,expected",
+    [
+        (
+            "water, salt, sugar.",
+            "en",
+            [
+                {"id": "en:water", "text": "water"},
+                {"id": "en:salt", "text": "salt"},
+                {"id": "en:sugar", "text": "sugar"},
+            ],
+        ),
+        (
+            "Farine de blé 60%; chocolat (sucre, pâte de cacao 12,5%), sel (1%)",
+            "fr",
+            [
+                {"id": "fr:farine-de-ble", "text": "Farine de blé", "percent": 60.0},
+                {
+                    "id": "fr:chocolat",
+                    "text": "chocolat",
+                    "ingredients": [
+                        {"id": "fr:sucre", "text": "sucre"},
+                        {
+                            "id": "fr:pate-de-cacao",
+                            "text": "pâte de cacao",
+                            "percent": 12.5,
+                        },
+                    ],
+                },
+                {"id": "fr:sel", "text": "sel", "percent": 1.0},
+            ],
+        ),
+        ("  ,  ", "en", []),
+    ],
+)
+def test_parse_ingredients_locally(text, lang, expected):
+    assert parse_ingredients_locally(text, lang) == expected
@@ -0,0 +1,27 @@
+from robotoff.utils.rate_limit import RateLimiter
+
+
+def test_rate_limiter(mocker):
+    monotonic_mock = mocker.patch(
+        "robotoff.utils.rate_limit.time.monotonic", return_value=100.0
+    )
+    sleep_mock = mocker.patch("robotoff.utils.rate_limit.time.sleep")
+    rate_limiter = RateLimiter(rate=2)
+
+    assert rate_limiter.acquire("a") == 0.0
+    assert rate_limiter.acquire("a") == 0.5
+    assert rate_limiter.acquire("a") == 1.0
+    # keys are rate limited independently
+    assert rate_limiter.acquire("b") == 0.0
+    sleep_mock.assert_has_calls([mocker.call(0.5), mocker.call(1.0)])
+
+    monotonic_mock.return_value = 110.0
+    assert rate_limiter.acquire("a") == 0.0
+
+
+def test_rate_limiter_disabled(mocker):
+    sleep_mock = mocker.patch("robotoff.utils.rate_limit.time.sleep")
+    rate_limiter = RateLimiter(rate=0)
+    for _ in range(10):
+        assert rate_limiter.acquire("a") == 0.0
+    sleep_mock.assert_not_called()
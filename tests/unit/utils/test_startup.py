@@ -0,0 +1,46 @@
+import sys
+
+from robotoff.utils import startup
+
+
+def test_lazy_import(mocker, monkeypatch):
+    monkeypatch.setattr(startup, "_load_records", [])
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+
+    module = startup.lazy_import("colorsys")
+    assert module is sys.modules["colorsys"]
+    # the module is already imported, the import is not recorded again
+    assert startup.lazy_import("colorsys") is module
+
+    report = startup.get_startup_report()
+    assert len(report) == 1
+    assert report[0].name == "colorsys"
+    assert report[0].kind == "module"
+    assert report[0].warm_up is False
+
+
+def test_warm_up(mocker, monkeypatch):
+    monkeypatch.setattr(startup, "_load_records", [])
+    loader = mocker.Mock()
+    failing_loader = mocker.Mock(side_effect=ValueError("error"))
+    mocker.patch.dict(
+        startup.function_cache_register.cache,
+        {"get_resource": loader, "get_failing_resource": failing_loader},
+    )
+    lazy_import_mock = mocker.patch.object(startup, "lazy_import")
+
+    startup.warm_up(["get_failing_resource", "get_resource", "some_module"])
+
+    failing_loader.assert_called_once_with()
+    loader.assert_called_once_with()
+    lazy_import_mock.assert_called_once_with("some_module")
+    report = startup.get_startup_report()
+    assert [record.name for record in report] == [
+        "get_failing_resource",
+        "get_resource",
+    ]
+    assert all(record.warm_up for record in report)
+
+    with startup.record_load("other_resource"):
+        pass
+    assert startup.get_startup_report()[-1].warm_up is False
@@ -0,0 +1,127 @@
+import pstats
+
+import orjson
+import pytest
+
+from robotoff.utils.tracing import (
+    TracedSession,
+    add_span,
+    get_current_trace,
+    is_profiling_target,
+    record_trace,
+    span,
+)
+
+
+@pytest.fixture
+def tracing_dir(mocker, tmp_path):
+    mocker.patch("robotoff.settings.TRACING_DIR", tmp_path)
+    return tmp_path
+
+
+def load_trace(tracing_dir):
+    trace_paths = list(tracing_dir.glob("*.trace.json"))
+    assert len(trace_paths) == 1
+    return orjson.loads(trace_paths[0].read_bytes())
+
+
+def test_span_without_trace(tracing_dir):
+    assert get_current_trace() is None
+    with span("query", "sql") as span_args:
+        span_args["rows"] = 1
+    add_span("find", "mongodb", 1000)
+    assert list(tracing_dir.iterdir()) == []
+
+
+def test_record_trace_disabled(mocker, tracing_dir):
+    mocker.patch("robotoff.settings.ENABLE_TRACING", False)
+    with record_trace("my_job", "job") as trace:
+        assert trace is None
+        with span("query", "sql"):
+            pass
+    assert list(tracing_dir.iterdir()) == []
+
+
+def test_record_trace(mocker, tracing_dir):
+    mocker.patch("robotoff.settings.ENABLE_TRACING", True)
+    with record_trace("robotoff.workers.tasks.my_job", "job") as trace:
+        assert get_current_trace() is trace
+        with span("SELECT", "sql", sql="SELECT 1") as span_args:
+            span_args["rows"] = 1
+        add_span("find", "mongodb", 2_000, {"database": "off"})
+
+    assert get_current_trace() is None
+    data = load_trace(tracing_dir)
+    assert data["otherData"]["name"] == "robotoff.workers.tasks.my_job"
+    events = data["traceEvents"]
+    assert [(e["name"], e["cat"]) for e in events] == [
+        ("SELECT", "sql"),
+        ("find", "mongodb"),
+        ("robotoff.workers.tasks.my_job", "job"),
+    ]
+    assert events[0]["args"] == {"sql": "SELECT 1", "rows": 1}
+    assert events[1]["dur"] == 2.0
+    assert all(e["ph"] == "X" for e in events)
+    # the root span covers all the other spans
+    assert events[2]["ts"] == 0
+    assert events[2]["dur"] >= events[0]["ts"] + events[0]["dur"]
+    assert list(tracing_dir.glob("*.prof")) == []
+
+
+def test_record_trace_error(mocker, tracing_dir):
+    mocker.patch("robotoff.settings.ENABLE_TRACING", True)
+    with pytest.raises(ValueError):
+        with record_trace("my_job", "job"):
+            with span("POST world.openfoodfacts.org", "http"):
+                raise ValueError()
+
+    events = load_trace(tracing_dir)["traceEvents"]
+    assert events[0]["args"] == {"error": "ValueError"}
+    assert events[1]["args"] == {"error": "ValueError"}
+
+
+@pytest.mark.parametrize(
+    "name,targets,expected",
+    [
+        ("robotoff.workers.tasks.my_job", set(), False),
+        ("robotoff.workers.tasks.my_job", {"my_job"}, True),
+        ("robotoff.workers.tasks.my_job", {"robotoff.workers.tasks.my_job"}, True),
+        ("robotoff.workers.tasks.other_job", {"my_job"}, False),
+        ("GET /api/v1/questions/{barcode}", {"GET /api/v1/questions/{barcode}"}, True),
+    ],
+)
+def test_is_profiling_target(mocker, name, targets, expected):
+    mocker.patch("robotoff.settings.PROFILING_TARGETS", targets)
+    assert is_profiling_target(name) is expected
+
+
+def test_record_trace_profiling(mocker, tracing_dir):
+    mocker.patch("robotoff.settings.ENABLE_TRACING", False)
+    mocker.patch("robotoff.settings.PROFILING_TARGETS", {"my_job"})
+    mocker.patch("robotoff.settings.PROFILING_SAMPLE_RATE", 1.0)
+
+    with record_trace("robotoff.workers.tasks.my_job", "job") as trace:
+        assert trace is not None
+        sorted(range(1000))
+
+    prof_paths = list(tracing_dir.glob("*.prof"))
+    assert len(prof_paths) == 1
+    stats = pstats.Stats(str(prof_paths[0]))
+    assert stats.total_calls > 0
+
+
+def test_traced_session(mocker, tracing_dir, requests_mock):
+    mocker.patch("robotoff.settings.ENABLE_TRACING", True)
+    requests_mock.get("https://world.openfoodfacts.org/api/v2/product/1", json={})
+    session = TracedSession()
+
+    with record_trace("my_job", "job"):
+        session.get("https://world.openfoodfacts.org/api/v2/product/1?token=secret")
+
+    event = load_trace(tracing_dir)["traceEvents"][0]
+    assert event["name"] == "GET world.openfoodfacts.org"
+    assert event["cat"] == "http"
+    assert event["args"] == {
+        "url": "https://world.openfoodfacts.org/api/v2/product/1",
+        "status_code": 200,
+    }
@@ -7,11 +7,17 @@ from robotoff.prediction.ingredient_list import (
 )
 from robotoff.prediction.langid import LanguagePrediction
 from robotoff.taxonomy import get_taxonomy
+from robotoff.types import ImportImageFlag, ProductIdentifier, ServerType
+from robotoff.workers.tasks.common import add_category_insight_job
 from robotoff.workers.tasks.import_image import (
+    add_image_fingerprint_job,
     add_ingredient_in_taxonomy_field,
     convert_legacy_ingredient_image_prediction_data,
+    generate_import_image_job_specs,
     generate_ingredient_prediction_data,
     get_text_from_bounding_box,
+    parse_ingredient_lists,
+    run_logo_object_detection,
 )
 
 from ...pytest_utils import get_ocr_result_asset
@@ -339,3 +345,57 @@ def test_convert_legacy_all_with_ingredients():
 
     second_entity = result["entities"][1]
     assert second_entity["fraction_known_ingredients"] == 0.0  # 0/1
+
+
+def test_parse_ingredient_lists(mocker):
+    def parse_ingredients(text, lang):
+        if text == "error":
+            raise RuntimeError()
+        return [{"id": f"{lang}:{text}", "text": text}]
+
+    parse_mock = mocker.patch(
+        "robotoff.workers.tasks.import_image.parse_ingredients",
+        side_effect=parse_ingredients,
+    )
+    entities = [
+        {"text": "water", "lang": {"lang": "en"}},
+        # the same ingredient list is only parsed once
+        {"text": "water", "lang": {"lang": "en"}},
+        {"text": "water", "lang": {"lang": "fr"}},
+        {"text": "error", "lang": {"lang": "en"}},
+        {"text": "water", "lang": None},
+    ]
+    assert parse_ingredient_lists(entities) == {
+        ("water", "en"): [{"id": "en:water", "text": "water"}],
+        ("water", "fr"): [{"id": "fr:water", "text": "water"}],
+    }
+    assert parse_mock.call_count == 3
+
+
+def test_generate_import_image_job_specs():
+    product_id = ProductIdentifier("3456300016208", ServerType.off)
+    job_specs = generate_import_image_job_specs(
+        product_id,
+        image_model_id=1,
+        image_url="https://images.openfoodfacts.org/images/products/345/630/001/6208/1.jpg",
+        ocr_url="https://images.openfoodfacts.org/images/products/345/630/001/6208/1.json",
+        flags=[ImportImageFlag.add_image_fingerprint, ImportImageFlag.predict_category],
+    )
+    assert [(spec.func, spec.queue.name, spec.kwargs) for spec in job_specs] == [
+        (add_image_fingerprint_job, "robotoff-low", {"image_model_id": 1}),
+        (add_category_insight_job, "robotoff-high-1", {"product_id": product_id}),
+    ]
+
+    # Non-food products: no category prediction, all jobs in the low queue
+    job_specs = generate_import_image_job_specs(
+        ProductIdentifier("3456300016208", ServerType.obf),
+        image_model_id=1,
+        image_url="",
+        ocr_url="",
+        use_high_queue=False,
+    )
+    assert {spec.queue.name for spec in job_specs} == {"robotoff-low"}
+    assert [spec.func for spec in job_specs] == [
+        add_image_fingerprint_job,
+        run_logo_object_detection,
+    ]
@@ -0,0 +1,42 @@
+from rq import Queue
+from rq.job import Job
+
+from robotoff.workers.main import CustomWorker
+from robotoff.workers.scheduling import AdmissionController, JobClass
+
+
+def test_dequeue_job_behind_limited_job(mocker):
+    connection = mocker.MagicMock()
+    worker = CustomWorker(
+        queues=[Queue("robotoff-high-1", connection=connection)],
+        connection=connection,
+        name="worker-1",
+    )
+    worker.admission_controller = AdmissionController(
+        connection, shares={JobClass.backfill: 0.5}, num_workers=4
+    )
+    mocker.patch.object(
+        CustomWorker,
+        "should_run_maintenance_tasks",
+        new_callable=mocker.PropertyMock,
+        return_value=False,
+    )
+    mocker.patch.object(worker, "get_redis_server_version")
+    dequeue_any = mocker.patch.object(Queue, "dequeue_any")
+    sleep_mock = mocker.patch("robotoff.workers.main.time.sleep")
+
+    # 2 backfill jobs are running: backfill reached its capacity
+    connection.hvals.return_value = [b"backfill", b"backfill"]
+    connection.lrem.return_value = 1
+    # A job enqueued by a backfill job is in front of an upload job
+    backfill_job = mocker.Mock(id="job-1", meta={"job_class": "backfill"})
+    upload_job = mocker.Mock(id="job-2", meta={"job_class": "upload"})
+    mocker.patch.object(Queue, "get_job_ids", return_value=["job-1", "job-2"])
+    mocker.patch.object(Job, "fetch_many", return_value=[backfill_job, upload_job])
+
+    job, queue = worker.dequeue_job_and_maintain_ttl(timeout=60)
+    assert job is upload_job
+    assert queue.name == "robotoff-high-1"
+    connection.lrem.assert_called_once_with("rq:queue:robotoff-high-1", 1, "job-2")
+    dequeue_any.assert_not_called()
+    sleep_mock.assert_not_called()
@@ -1,7 +1,10 @@
 import pytest
+from rq import Queue
+from rq.job import Job
 
 from robotoff.types import ProductIdentifier, ServerType
-from robotoff.workers.queues import get_high_queue
+from robotoff.workers.queues import JobSpec, enqueue_jobs, get_high_queue, low_queue
+from robotoff.workers.scheduling import JobClass
 
 
 @pytest.mark.parametrize(
@@ -22,3 +25,102 @@ def test_get_high_queue(barcode: str, queue_name: str):
         ).name
         == queue_name
     )
+
+
+def dummy_job(value: int):
+    return value
+
+
+@pytest.fixture
+def pipeline(mocker):
+    redis_conn = mocker.patch("robotoff.workers.queues.redis_conn")
+    return redis_conn.pipeline.return_value.__enter__.return_value
+
+
+def test_enqueue_jobs(pipeline):
+    barcodes = ["3456300016208", "3456300016212", "3456300016214"]
+    job_specs = [
+        JobSpec(
+            dummy_job,
+            kwargs={"value": i},
+            product_id=ProductIdentifier(barcode, ServerType.off),
+        )
+        for i, barcode in enumerate(barcodes)
+    ]
+    job_specs.append(JobSpec(dummy_job, kwargs={"value": 3}, queue=low_queue))
+    progress = []
+    assert enqueue_jobs(iter(job_specs), batch_size=3, on_progress=progress.append) == 4
+
+    # One pipeline execution per batch
+    assert pipeline.execute.call_count == 2
+    assert progress == [3, 1]
+    # Jobs are routed to the product-specific queue
+    assert [call.args[0] for call in pipeline.rpush.call_args_list] == [
+        "rq:queue:robotoff-high-1",
+        "rq:queue:robotoff-high-2",
+        "rq:queue:robotoff-high-3",
+        "rq:queue:robotoff-low",
+    ]
+
+
+def test_enqueue_jobs_max_rate(pipeline, mocker):
+    mocker.patch("robotoff.workers.queues.time.monotonic", return_value=0.0)
+    sleep_mock = mocker.patch("robotoff.workers.queues.time.sleep")
+    job_specs = [
+        JobSpec(dummy_job, kwargs={"value": i}, queue=low_queue) for i in range(5)
+    ]
+    assert enqueue_jobs(job_specs, batch_size=2, max_rate=10) == 5
+    assert [call.args[0] for call in sleep_mock.call_args_list] == [
+        pytest.approx(0.2),
+        pytest.approx(0.4),
+        pytest.approx(0.5),
+    ]
+
+
+def test_enqueue_jobs_job_class(pipeline, mocker):
+    create_mock = mocker.spy(Job, "create")
+    job_specs = [
+        JobSpec(dummy_job, kwargs={"value": 0}, queue=low_queue),
+        JobSpec(
+            dummy_job,
+            kwargs={"value": 1},
+            queue=low_queue,
+            job_kwargs={"result_ttl": 0},
+            job_class=JobClass.upload,
+        ),
+    ]
+    enqueue_jobs(job_specs, job_class=JobClass.backfill)
+    assert [call.kwargs["meta"] for call in create_mock.call_args_list] == [
+        {"job_class": "backfill"},
+        {"job_class": "upload"},
+    ]
+    assert create_mock.call_args_list[1].kwargs["result_ttl"] == 0
+
+
+def test_enqueue_jobs_max_queue_depth(pipeline, mocker):
+    sleep_mock = mocker.patch("robotoff.workers.queues.time.sleep")
+    mocker.patch.object(
+        Queue, "count", new_callable=mocker.PropertyMock, side_effect=[12, 10, 3, 5]
+    )
+    job_specs = [
+        JobSpec(dummy_job, kwargs={"value": i}, queue=low_queue) for i in range(4)
+    ]
+    assert enqueue_jobs(job_specs, batch_size=2, max_queue_depth=10) == 4
+    # We waited twice before the first batch, the queue was short enough
+    # before the second one
+    assert sleep_mock.call_count == 2
+    assert pipeline.execute.call_count == 2
+
+
+def test_enqueue_jobs_log_level(pipeline, caplog):
+    job_specs = [
+        JobSpec(dummy_job, kwargs={"value": i}, queue=low_queue) for i in range(3)
+    ]
+    with caplog.at_level("DEBUG", logger="robotoff.workers.queues"):
+        enqueue_jobs(job_specs[:2], batch_size=3)
+        enqueue_jobs(job_specs, batch_size=3)
+    assert [
+        (record.levelname, record.getMessage().split(" in ")[0])
+        for record in caplog.records
+        if "jobs enqueued" in record.getMessage()
+    ] == [("DEBUG", "2 jobs enqueued"), ("INFO", "3 jobs enqueued")]
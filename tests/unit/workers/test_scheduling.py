@@ -0,0 +1,183 @@
+import datetime
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from robotoff.workers.scheduling import (
+    JOB_LAG_KEY,
+    RUNNING_JOBS_KEY,
+    AdmissionController,
+    JobClass,
+    get_job_class,
+    get_job_meta,
+    parse_job_class_shares,
+    set_current_job_class,
+)
+
+
+def test_parse_job_class_shares():
+    assert parse_job_class_shares("interactive=1, backfill=0.5,") == {
+        JobClass.interactive: 1.0,
+        JobClass.backfill: 0.5,
+    }
+    with pytest.raises(ValueError, match="unknown job class"):
+        parse_job_class_shares("bulk=0.5")
+    with pytest.raises(ValueError, match="invalid job class share"):
+        parse_job_class_shares("backfill")
+
+
+def test_get_job_class(mocker):
+    job = mocker.Mock(meta={}, origin="robotoff-high-1")
+    assert get_job_class(job) == JobClass.update
+    assert get_job_class(job, "robotoff-low") == JobClass.backfill
+    job.meta = {"job_class": "upload"}
+    assert get_job_class(job, "robotoff-low") == JobClass.upload
+    job.meta = {"job_class": "unknown"}
+    assert get_job_class(job) == JobClass.update
+
+
+def test_get_job_meta():
+    assert get_job_meta(None) == {}
+    assert get_job_meta(JobClass.upload) == {"job_class": "upload"}
+    # Jobs enqueued from a job inherit its class
+    set_current_job_class(JobClass.backfill)
+    try:
+        assert get_job_meta(None) == {"job_class": "backfill"}
+        assert get_job_meta(JobClass.interactive) == {"job_class": "interactive"}
+    finally:
+        set_current_job_class(None)
+
+
+def test_get_capacity(mocker):
+    controller = AdmissionController(
+        mocker.Mock(),
+        shares={JobClass.backfill: 0.5, JobClass.update: 0.1},
+        num_workers=4,
+    )
+    assert controller.get_capacity(JobClass.backfill) == 2
+    # A class can always use at least one worker
+    assert controller.get_capacity(JobClass.update) == 1
+    assert controller.get_capacity(JobClass.interactive) is None
+    assert controller.is_throttled()
+    assert not AdmissionController(
+        mocker.Mock(), shares={JobClass.backfill: 1}, num_workers=4
+    ).is_throttled()
+
+
+def create_queue(mocker, name: str, job_classes: list[str | None]):
+    """Create a queue containing one job per item of `job_classes` (None for
+    a job that was deleted)."""
+    queue = mocker.Mock()
+    queue.name = name
+    queue.key = f"rq:queue:{name}"
+    queue.get_job_ids.return_value = [f"{name}-{i}" for i in range(len(job_classes))]
+    queue.job_class.fetch_many.return_value = [
+        (
+            None
+            if job_class is None
+            else mocker.Mock(
+                id=f"{name}-{i}", meta={"job_class": job_class}, origin=name
+            )
+        )
+        for i, job_class in enumerate(job_classes)
+    ]
+    return queue
+
+
+def create_controller(mocker, running: list[bytes]) -> AdmissionController:
+    connection = mocker.Mock()
+    connection.hvals.return_value = running
+    connection.lrem.return_value = 1
+    return AdmissionController(
+        connection,
+        shares={JobClass.backfill: 0.5, JobClass.upload: 0.8},
+        num_workers=4,
+        lookahead=10,
+    )
+
+
+def test_dequeue_admitted_job(mocker):
+    controller = create_controller(mocker, [b"backfill", b"upload"])
+    queues = [
+        create_queue(mocker, "robotoff-high-1", []),
+        create_queue(mocker, "robotoff-high-2", ["backfill", "upload"]),
+        create_queue(mocker, "robotoff-low", ["backfill"]),
+    ]
+    # No class reached its capacity: the head of the first non-empty queue
+    # is dequeued
+    job, queue = controller.dequeue_admitted_job(queues)
+    assert (job.id, queue) == ("robotoff-high-2-0", queues[1])
+    controller.connection.lrem.assert_called_once_with(
+        "rq:queue:robotoff-high-2", 1, "robotoff-high-2-0"
+    )
+    queues[1].get_job_ids.assert_called_once_with(0, 10)
+
+
+def test_dequeue_admitted_job_behind_limited_job(mocker):
+    # 2 backfill jobs are running: backfill reached its capacity
+    controller = create_controller(mocker, [b"backfill", b"backfill"])
+    queues = [
+        create_queue(mocker, "robotoff-high-1", [None, "backfill", "upload"]),
+        create_queue(mocker, "robotoff-low", ["backfill"]),
+    ]
+    # The upload job is not blocked by the backfill job in front of it
+    job, queue = controller.dequeue_admitted_job(queues)
+    assert (job.id, queue) == ("robotoff-high-1-2", queues[0])
+    controller.connection.lrem.assert_called_once_with(
+        "rq:queue:robotoff-high-1", 1, "robotoff-high-1-2"
+    )
+
+    # Only backfill jobs are left
+    queues[0] = create_queue(mocker, "robotoff-high-1", ["backfill"])
+    assert controller.dequeue_admitted_job(queues) is None
+
+    # The upload job was dequeued by another worker
+    queues[0] = create_queue(mocker, "robotoff-high-1", ["backfill", "upload"])
+    controller.connection.lrem.return_value = 0
+    assert controller.dequeue_admitted_job(queues) is None
+
+
+def test_dequeue_admitted_job_redis_error(mocker):
+    controller = create_controller(mocker, [b"backfill", b"backfill"])
+    queues = [create_queue(mocker, "robotoff-low", ["backfill"])]
+    # Fail open if the running jobs are not available
+    controller.connection.hvals.side_effect = ConnectionError()
+    job, queue = controller.dequeue_admitted_job(queues)
+    assert (job.id, queue) == ("robotoff-low-0", queues[0])
+
+
+def test_start_finish_job(mocker):
+    connection = mocker.MagicMock()
+    pipeline = connection.pipeline.return_value.__enter__.return_value
+    mocker.patch(
+        "robotoff.workers.scheduling.utcnow",
+        return_value=datetime.datetime(2024, 1, 1, 0, 0, 10),
+    )
+    controller = AdmissionController(connection, shares={}, num_workers=4)
+    job = mocker.Mock(enqueued_at=datetime.datetime(2024, 1, 1, 0, 0, 0))
+    controller.start_job("worker-1", job, JobClass.upload)
+    assert pipeline.hset.call_args_list[:2] == [
+        mocker.call(RUNNING_JOBS_KEY, "worker-1", "upload"),
+        mocker.call(JOB_LAG_KEY, "upload", 10.0),
+    ]
+    pipeline.execute.assert_called_once()
+
+    controller.finish_job("worker-1")
+    connection.hdel.assert_called_once_with(RUNNING_JOBS_KEY, "worker-1")
+
+    connection.hgetall.return_value = {
+        b"upload": b"10.0",
+        b"upload:updated_at": b"2024-01-01T00:00:10+00:00",
+    }
+    assert controller.get_lags() == {JobClass.upload: 10.0}
+
+
+def test_prune(mocker):
+    connection = mocker.Mock()
+    connection.hkeys.return_value = [b"worker-1", b"worker-2"]
+    controller = AdmissionController(connection, shares={}, num_workers=4)
+    controller.prune(["worker-1"])
+    connection.hdel.assert_called_once_with(RUNNING_JOBS_KEY, "worker-2")
+    connection.hdel.reset_mock()
+    controller.prune(["worker-1", "worker-2"])
+    connection.hdel.assert_not_called()
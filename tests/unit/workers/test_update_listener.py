@@ -1,16 +1,23 @@
 import datetime
 
+import pytest
 from openfoodfacts.redis import RedisUpdate
+from redis.exceptions import ResponseError
 from rq.queue import Queue
 
 from robotoff.types import JSONType, ProductIdentifier, ServerType
+from robotoff.workers.scheduling import JobClass
 from robotoff.workers.tasks import delete_product_insights_job
 from robotoff.workers.tasks.import_image import run_import_image_job
 from robotoff.workers.tasks.product_updated import (
     deleted_image_job,
     update_insights_job,
 )
-from robotoff.workers.update_listener import UpdateListener
+from robotoff.workers.update_listener import (
+    ConsumerGroupUpdateListener,
+    UpdateListener,
+    get_partition,
+)
 
 REDIS_STREAM_NAME = "product_updates"
 REDIS_LATEST_ID_KEY = "robotoff:product_updates:latest_id"
@@ -159,6 +166,7 @@ class TestUpdateListener:
             "func",
             "queue",
             "job_kwargs",
+            "job_class",
             "product_id",
             "image_url",
             "ocr_url",
@@ -166,6 +174,7 @@ class TestUpdateListener:
         assert kwargs["func"] == run_import_image_job
         assert isinstance(kwargs["queue"], Queue)
         assert kwargs["job_kwargs"] == {"result_ttl": 0}
+        assert kwargs["job_class"] == JobClass.upload
         assert kwargs["product_id"] == ProductIdentifier(
             redis_update.code, ServerType[redis_update.flavor]
         )
@@ -207,3 +216,162 @@ class TestUpdateListener:
             redis_update.code, ServerType[redis_update.flavor]
         )
         assert kwargs["image_id"] == "4"
+
+
+def test_get_partition():
+    barcodes = [str(3000000000000 + i) for i in range(1000)]
+    partitions = [get_partition(barcode, 4) for barcode in barcodes]
+    # Partitions are stable and evenly distributed
+    assert partitions == [get_partition(barcode, 4) for barcode in barcodes]
+    assert all(200 < partitions.count(i) < 300 for i in range(4))
+    assert get_partition("3274080005003", 1) == 0
+
+
+def create_stream_entry(entry_id: str, code: str) -> tuple[str, dict]:
+    return (
+        entry_id,
+        {
+            "code": code,
+            "flavor": "off",
+            "user_id": "test_user",
+            "action": "updated",
+            "comment": "Test update",
+            "product_type": "food",
+        },
+    )
+
+
+class TestConsumerGroupUpdateListener:
+    def create_listener(self, mocker, **kwargs) -> ConsumerGroupUpdateListener:
+        return ConsumerGroupUpdateListener(
+            redis_client=mocker.MagicMock(),
+            redis_stream_name=REDIS_STREAM_NAME,
+            redis_latest_id_key=REDIS_LATEST_ID_KEY,
+            group_name="robotoff",
+            consumer_name="listener-1",
+            **kwargs,
+        )
+
+    def test_invalid_partition(self, mocker):
+        with pytest.raises(ValueError, match="invalid partition"):
+            self.create_listener(mocker, partition=2, num_partitions=2)
+
+    def test_create_group(self, mocker):
+        listener = self.create_listener(mocker, partition=1, num_partitions=2)
+        assert listener.group_name == "robotoff-1"
+        redis_client = listener.redis_client
+        redis_client.get.return_value = "1700000000000-0"
+        listener.create_group()
+        redis_client.xgroup_create.assert_called_once_with(
+            REDIS_STREAM_NAME, "robotoff-1", id="1700000000000-0", mkstream=True
+        )
+        # The group already exists
+        redis_client.xgroup_create.side_effect = ResponseError(
+            "BUSYGROUP Consumer Group name already exists"
+        )
+        listener.create_group()
+
+    def test_process_entries(self, mocker):
+        listener = self.create_listener(mocker, partition=1, num_partitions=2)
+        process_redis_update = mocker.patch.object(listener, "process_redis_update")
+        codes = [str(3000000000000 + i) for i in range(10)]
+        entries = [
+            create_stream_entry(f"170000000000{i}-0", code)
+            for i, code in enumerate(codes)
+        ]
+        # Deleted entry
+        entries.append(("1700000000010-0", {}))
+
+        # partition 0 is behind partition 1
+        listener.redis_client.hmget.return_value = [
+            "1699999999999-5",
+            "1700000000010-0",
+        ]
+
+        expected_codes = [code for code in codes if get_partition(code, 2) == 1]
+        assert listener.process_entries(entries) == len(expected_codes)
+        # Only updates of the partition are processed, in order
+        assert [
+            call.args[0].code for call in process_redis_update.call_args_list
+        ] == expected_codes
+        # All entries are acknowledged
+        listener.redis_client.xack.assert_called_once_with(
+            REDIS_STREAM_NAME, "robotoff-1", *(entry_id for entry_id, _ in entries)
+        )
+        assert listener.last_id == "1700000000010-0"
+        # The latest ID is the position of the slowest partition
+        listener.redis_client.hset.assert_called_once_with(
+            f"{REDIS_LATEST_ID_KEY}:partitions", "1", "1700000000010-0"
+        )
+        listener.redis_client.set.assert_called_once_with(
+            REDIS_LATEST_ID_KEY, "1699999999999-5"
+        )
+
+    def test_save_latest_id(self, mocker):
+        listener = self.create_listener(mocker)
+        listener.save_latest_id("1700000000000-0")
+        listener.redis_client.set.assert_called_once_with(
+            REDIS_LATEST_ID_KEY, "1700000000000-0"
+        )
+
+        listener = self.create_listener(mocker, partition=0, num_partitions=3)
+        redis_client = listener.redis_client
+        # partition 2 didn't process any update yet
+        redis_client.hmget.return_value = ["1700000000000-0", "1700000000000-1", None]
+        listener.save_latest_id("1700000000000-0")
+        redis_client.set.assert_not_called()
+
+        redis_client.hmget.return_value = [
+            "1700000000000-10",
+            "1700000000000-9",
+            "1700000000001-0",
+        ]
+        listener.save_latest_id("1700000000000-10")
+        # IDs are compared numerically
+        redis_client.set.assert_called_once_with(REDIS_LATEST_ID_KEY, "1700000000000-9")
+
+    def test_process_entries_error(self, mocker):
+        listener = self.create_listener(mocker)
+        mocker.patch.object(listener, "process_redis_update", side_effect=ValueError)
+        entries = [create_stream_entry("1700000000000-0", "3274080005003")]
+        assert listener.process_entries(entries) == 1
+        listener.redis_client.xack.assert_called_once()
+
+    def test_process_pending(self, mocker):
+        listener = self.create_listener(mocker)
+        redis_client = listener.redis_client
+        redis_client.xautoclaim.side_effect = [
+            ["1700000000005-0", [], []],
+            ["0-0", [], []],
+        ]
+        redis_client.xreadgroup.side_effect = [
+            [
+                [
+                    REDIS_STREAM_NAME,
+                    [
+                        create_stream_entry("1700000000000-0", "1"),
+                        create_stream_entry("1700000000001-0", "2"),
+                    ],
+                ]
+            ],
+            [[REDIS_STREAM_NAME, []]],
+        ]
+        process_redis_update = mocker.patch.object(listener, "process_redis_update")
+        assert listener.process_pending() == 2
+        assert process_redis_update.call_count == 2
+        assert redis_client.xautoclaim.call_args_list[1].kwargs["start_id"] == (
+            "1700000000005-0"
+        )
+        # Pending updates of the consumer are read with ID "0"
+        assert redis_client.xreadgroup.call_args.args == (
+            "robotoff",
+            "listener-1",
+            {REDIS_STREAM_NAME: "0"},
+        )
+
+    def test_get_lag(self, mocker):
+        listener = self.create_listener(mocker)
+        assert listener.get_lag() is None
+        mocker.patch("robotoff.workers.update_listener.time.time", return_value=1000)
+        listener.last_id = "990000-0"
+        assert listener.get_lag() == 10